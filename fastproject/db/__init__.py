@@ -1,11 +1,51 @@
 """Init module."""
 
-from .conn import get_connection_pool, init_connection_pool, with_connection
-from .utils import updater_fields
+from . import lanes
+from .conn import (
+    DEFAULT_SHARD,
+    acquire_connection,
+    close_connection_pools,
+    configured_shards,
+    get_connection_pool,
+    get_lane_limiter,
+    init_connection_pool,
+    lane_stats,
+    recent_acquire_wait,
+    with_connection,
+)
+from .lanes import use_lane
+from .notify import NotificationListener, notification_listener
+from .shards import (
+    BucketMovedError,
+    check_not_moved,
+    get_shard_map,
+    shard_connection,
+    shard_of,
+)
+from .tracing import TracingAsyncPGAdapter
+from .utils import select_list, updater_fields
 
 __all__ = [
+    "BucketMovedError",
+    "DEFAULT_SHARD",
+    "NotificationListener",
+    "TracingAsyncPGAdapter",
+    "acquire_connection",
+    "check_not_moved",
+    "close_connection_pools",
+    "configured_shards",
     "get_connection_pool",
+    "get_lane_limiter",
+    "get_shard_map",
     "init_connection_pool",
+    "lane_stats",
+    "lanes",
+    "notification_listener",
+    "recent_acquire_wait",
+    "select_list",
+    "shard_connection",
+    "shard_of",
     "updater_fields",
+    "use_lane",
     "with_connection",
 ]
@@ -1,19 +1,33 @@
 """Utilities to get database connections based on the application settings."""
 
+import asyncio
+import contextlib
 import functools
-from collections.abc import Awaitable
-from typing import Callable, Optional, TypeVar
+import inspect
+import math
+import time
+from collections.abc import AsyncIterator, Awaitable
+from typing import Any, Callable, Optional, TypeVar
 
+import asyncpg.exceptions
 import asyncpg.pool
+
 # TODO: Remove them when switching to Python 3.10
 from typing_extensions import Concatenate, ParamSpec
 
 from .. import config
+from ..utils import deadlines, timing, tracing
+from . import lanes
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
+# The shard of the section [DATABASE], see the module shards.
+DEFAULT_SHARD = 0
+
 _conn_pool: Optional[asyncpg.pool.Pool] = None
+_shard_conn_pools: dict[int, asyncio.Task] = {}
+_lane_limiters: dict[int, lanes.LaneLimiter] = {}
 
 
 async def init_connection_pool(
@@ -56,35 +70,230 @@ async def init_connection_pool(
         min_size=min_connections,
         max_size=max_connections,
     )
+    _lane_limiters[DEFAULT_SHARD] = lanes.LaneLimiter(
+        max_connections, lanes.lanes_from_settings()
+    )
+
+
+def configured_shards() -> list[int]:
+    """Returns the shards configured in the settings, DEFAULT_SHARD first.
+
+    The shard n > 0 is configured in the section [DATABASE.n], with the same
+    keys as the section [DATABASE].
+    """
+    return [
+        DEFAULT_SHARD,
+        *sorted(
+            int(section.split(".", 1)[1])
+            for section in config.settings.sections()
+            if section.startswith("DATABASE.")
+        ),
+    ]
+
+
+async def _create_shard_connection_pool(shard: int) -> asyncpg.pool.Pool:
+    settings = config.settings[f"DATABASE.{shard}"]
+    return await asyncpg.pool.create_pool(
+        host=settings["host"],
+        port=int(settings["port"]),
+        database=settings["dbname"],
+        user=settings["user"],
+        password=settings["password"],
+        min_size=int(settings["min_connections"]),
+        max_size=int(settings["max_connections"]),
+    )
+
+
+async def get_connection_pool(shard: int = DEFAULT_SHARD) -> asyncpg.pool.Pool:
+    """Returns the database connection pool of a shard.
+
+    The pool of the DEFAULT_SHARD is the one of init_connection_pool, the
+    pools of the other shards are created on first use.
+    """
+    if shard == DEFAULT_SHARD:
+        if _conn_pool is None:
+            await init_connection_pool(use_settings=True)
+        return _conn_pool
+    creation = _shard_conn_pools.get(shard)
+    if creation is None:
+        creation = asyncio.ensure_future(_create_shard_connection_pool(shard))
+        _shard_conn_pools[shard] = creation
+    try:
+        return await asyncio.shield(creation)
+    except Exception:
+        if _shard_conn_pools.get(shard) is creation and creation.done():
+            del _shard_conn_pools[shard]
+        raise
+
+
+def get_lane_limiter(shard: int = DEFAULT_SHARD) -> lanes.LaneLimiter:
+    """Returns the limiter that splits the connection pool of a shard in lanes."""
+    limiter = _lane_limiters.get(shard)
+    if limiter is None:
+        section = "DATABASE" if shard == DEFAULT_SHARD else f"DATABASE.{shard}"
+        limiter = lanes.LaneLimiter(
+            config.settings.getint(section, "max_connections"),
+            lanes.lanes_from_settings(),
+        )
+        _lane_limiters[shard] = limiter
+    return limiter
+
+
+def lane_stats() -> dict[int, dict[str, dict[str, float]]]:
+    """Returns the acquire-wait metrics of every lane of every shard."""
+    return {shard: limiter.stats() for shard, limiter in _lane_limiters.items()}
+
+
+def recent_acquire_wait(lane: str = lanes.INTERACTIVE) -> float:
+    """
+    Returns the mean acquire wait of a lane during the last second, of the
+    shard where it is the longest.
+    """
+    return max(
+        (limiter.recent_wait(lane) for limiter in _lane_limiters.values()),
+        default=0.0,
+    )
+
 
+@contextlib.asynccontextmanager
+async def acquire_connection(
+    shard: int = DEFAULT_SHARD, lane: Optional[str] = None
+) -> AsyncIterator[asyncpg.pool.PoolAcquireContext]:
+    """Acquires a connection to a shard in a lane.
 
-async def get_connection_pool() -> asyncpg.pool.Pool:
-    """Returns the database connection pool."""
-    if _conn_pool is None:
-        await init_connection_pool(use_settings=True)
-    return _conn_pool
+    The time waited for the connection is recorded as the phase "db_acquire"
+    (see utils.timing) and the attribute "db.pool_wait_ms" of the current span
+    (see utils.tracing). If there is a deadline (see utils.deadlines), the
+    connection is not waited for after it, and the statement_timeout of the
+    connection is the time left until it, so the statements of an abandoned
+    request are cancelled by the server. The connection is reset when it is
+    released.
+
+    Args:
+      shard: The shard.
+      lane: The lane, if None, the one of lanes.current_lane.
+
+    Raises:
+      utils.deadlines.DeadlineExceededError: If the deadline passed while
+        waiting for the connection or running a statement.
+    """
+    conn_pool = await get_connection_pool(shard)
+    limiter = get_lane_limiter(shard)
+    lane = lane or lanes.current_lane.get()
+    async with contextlib.AsyncExitStack() as stack:
+        started = time.perf_counter()
+        try:
+            await deadlines.wait_for(limiter.acquire(lane))
+            stack.callback(limiter.release, lane)
+            conn = await stack.enter_async_context(
+                conn_pool.acquire(timeout=deadlines.remaining())
+            )
+        except asyncio.TimeoutError as exc:
+            raise deadlines.DeadlineExceededError() from exc
+        finally:
+            pool_wait = time.perf_counter() - started
+            timing.record("db_acquire", pool_wait)
+            tracing.set_attribute("db.pool_wait_ms", round(pool_wait * 1000, 3))
+        timeout = deadlines.remaining()
+        if timeout is None:
+            yield conn
+            return
+        if timeout <= 0:
+            raise deadlines.DeadlineExceededError()
+        await conn.execute(f"SET statement_timeout = {math.ceil(timeout * 1000)}")
+        try:
+            yield conn
+        except asyncpg.exceptions.QueryCanceledError as exc:
+            timeout = deadlines.remaining()
+            if timeout is not None and timeout <= 0:
+                raise deadlines.DeadlineExceededError() from exc
+            raise
+
+
+async def close_connection_pools() -> None:
+    """Closes the database connection pools of every shard."""
+    global _conn_pool
+    conn_pools = [_conn_pool] if _conn_pool is not None else []
+    for creation in _shard_conn_pools.values():
+        if creation.done() and creation.exception() is None:
+            conn_pools.append(creation.result())
+    _conn_pool = None
+    _shard_conn_pools.clear()
+    _lane_limiters.clear()
+    for conn_pool in conn_pools:
+        await conn_pool.close()
 
 
 def with_connection(
-    func: Callable[Concatenate[asyncpg.pool.PoolAcquireContext, P], Awaitable[T]]
-) -> Callable[P, Awaitable[T]]:
+    func: Optional[
+        Callable[Concatenate[asyncpg.pool.PoolAcquireContext, P], Awaitable[T]]
+    ] = None,
+    *,
+    shard_key: Optional[str] = None,
+    lane: Optional[str] = None,
+) -> Any:
     """
     Injects a database connection into an async function as the first
     parameter.
 
+    It is used as @with_connection, or with arguments, for instance
+    @with_connection(shard_key="user_id", lane=lanes.BULK). A new connection is
+    given up once the deadline of the request passes, see acquire_connection.
+    A call with a new connection runs in a span named after the function, see
+    utils.tracing.
+
     Args:
+      shard_key: The parameter whose value is hashed to pick the shard, if
+        None, the connection is to the DEFAULT_SHARD.
+      lane: The lane the connection is acquired in, if None, the one of
+        lanes.current_lane when the function is called.
       **conn (asyncpg.pool.PoolAcquireContext): A database connection, if None,
       a new connection is opened and closed. If the connection is provided, the
       responsibility of closing it is leveraged to the user of the function.
+
+    Raises:
+      shards.BucketMovedError: If a shard rejected a write because the bucket
+        of the row is not in it, the shard map is forgotten then.
     """
+    if func is None:
+        return functools.partial(with_connection, shard_key=shard_key, lane=lane)
+    name = tracing.span_name(func)
+    # The module shards imports this one.
+    from .shards import (  # pylint: disable=import-outside-toplevel
+        BUCKET_MOVED_SQLSTATE,
+        BucketMovedError,
+        invalidate_shard_map,
+        shard_of,
+    )
+
+    if shard_key is not None:
+
+        # The position of the key in *args, the connection is not in them.
+        position = list(inspect.signature(func).parameters).index(shard_key) - 1
 
     @functools.wraps(func)
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
         conn = kwargs.pop("conn", None)
         if conn is not None:
             return await func(conn, *args, **kwargs)
-        conn_pool = await get_connection_pool()
-        async with conn_pool.acquire() as conn:
-            return await func(conn, *args, **kwargs)
+        with tracing.start_span(name) as span:
+            shard = DEFAULT_SHARD
+            if shard_key is not None:
+                key = kwargs[shard_key] if shard_key in kwargs else args[position]
+                shard = await shard_of(key)
+            if span is not None:
+                span.set_attribute("db.shard", shard)
+                span.set_attribute("db.lane", lane or lanes.current_lane.get())
+            try:
+                async with acquire_connection(shard, lane) as conn:
+                    # The statement_timeout bounds every statement, this bounds them all.
+                    with timing.span("sql"):
+                        return await deadlines.wait_for(func(conn, *args, **kwargs))
+            except asyncpg.exceptions.PostgresError as e:
+                if e.sqlstate != BUCKET_MOVED_SQLSTATE:
+                    raise
+                # The shard map may be stale, it is read again on next use.
+                invalidate_shard_map()
+                raise BucketMovedError(str(e)) from e
 
     return wrapper
@@ -0,0 +1,193 @@
+"""Partitions of a connection pool (lanes) with reserved slots and priorities.
+
+Every connection is acquired in a lane. A lane has a number of reserved slots
+that only it can use, and a limit of connections it can hold at once. The
+slots that are not reserved are shared and borrowed by the lanes in priority
+order, so bulk jobs can not take the connections the API needs.
+
+The lanes are configured in the section [POOL_LANES] of the configuration
+file, for instance "bulk_reserved = 0" and "bulk_limit = 3".
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import time
+from collections.abc import AsyncIterator, Iterator, Mapping
+
+from .. import config
+from ..utils import saturation
+
+# Requests of the API, they should never wait behind the other lanes.
+INTERACTIVE = "interactive"
+# Operational tasks, like resharding or the notification listener.
+ADMIN = "admin"
+# Background jobs and batch endpoints, they use whatever is left.
+BULK = "bulk"
+
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_lane", default=INTERACTIVE
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Lane:
+    """The configuration of a lane, the lower the priority the sooner served."""
+
+    priority: int
+    reserved: int
+    limit: int
+
+
+_DEFAULT_LANES = {
+    INTERACTIVE: Lane(priority=0, reserved=6, limit=10),
+    ADMIN: Lane(priority=1, reserved=2, limit=3),
+    BULK: Lane(priority=2, reserved=0, limit=3),
+}
+
+
+def lanes_from_settings() -> dict[str, Lane]:
+    """Returns the lanes configured in the section [POOL_LANES]."""
+    return {
+        name: Lane(
+            priority=lane.priority,
+            reserved=config.settings.getint(
+                "POOL_LANES", f"{name}_reserved", fallback=lane.reserved
+            ),
+            limit=config.settings.getint(
+                "POOL_LANES", f"{name}_limit", fallback=lane.limit
+            ),
+        )
+        for name, lane in _DEFAULT_LANES.items()
+    }
+
+
+@contextlib.contextmanager
+def use_lane(lane: str) -> Iterator[None]:
+    """Acquires the connections of the enclosed code in the given lane."""
+    token = current_lane.set(lane)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+@dataclasses.dataclass
+class LaneStats:
+    """The acquire-wait metrics of a lane."""
+
+    acquires: int = 0
+    waits: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    def record(self, wait_time: float) -> None:
+        self.acquires += 1
+        if wait_time > 0:
+            self.waits += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+class LaneLimiter:
+    """Admits at most size connection acquisitions at once, split in lanes.
+
+    Waiters are admitted by priority, then in arrival order. A waiter whose
+    lane is at its limit does not block the waiters of other lanes.
+    """
+
+    def __init__(self, size: int, lanes: Mapping[str, Lane]):
+        reserved = sum(lane.reserved for lane in lanes.values())
+        if reserved > size:
+            raise ValueError(
+                f"The lanes reserve {reserved} connections, the pool has {size}."
+            )
+        self.size = size
+        self.lanes = dict(lanes)
+        self._shared = size - reserved
+        self._in_use = {name: 0 for name in lanes}
+        self._stats = {name: LaneStats() for name in lanes}
+        self._recent_waits = {name: saturation.WaitMonitor() for name in lanes}
+        self._waiters: dict[str, collections.deque[asyncio.Future]] = {
+            name: collections.deque() for name in lanes
+        }
+        self._by_priority = sorted(lanes, key=lambda name: lanes[name].priority)
+
+    def _shared_in_use(self) -> int:
+        return sum(
+            max(0, in_use - self.lanes[name].reserved)
+            for name, in_use in self._in_use.items()
+        )
+
+    def _can_acquire(self, lane: str) -> bool:
+        in_use = self._in_use[lane]
+        if in_use >= self.lanes[lane].limit:
+            return False
+        return (
+            in_use < self.lanes[lane].reserved or self._shared_in_use() < self._shared
+        )
+
+    def _wake(self) -> None:
+        for lane in self._by_priority:
+            waiters = self._waiters[lane]
+            while waiters and self._can_acquire(lane):
+                future = waiters.popleft()
+                if not future.done():
+                    self._in_use[lane] += 1
+                    future.set_result(None)
+
+    async def acquire(self, lane: str) -> None:
+        """Waits until a connection can be acquired in the lane.
+
+        Raises:
+          KeyError: If the lane does not exist.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        self._wake()
+        if future.done():
+            self._record(lane, 0.0)
+            return
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(lane)
+            raise
+        self._record(lane, time.perf_counter() - start)
+
+    def _record(self, lane: str, wait_time: float) -> None:
+        self._stats[lane].record(wait_time)
+        self._recent_waits[lane].record(wait_time)
+
+    def recent_wait(self, lane: str) -> float:
+        """Returns the mean acquire wait of the lane during the last second."""
+        return self._recent_waits[lane].value()
+
+    def release(self, lane: str) -> None:
+        """Gives back a connection acquired in the lane."""
+        self._in_use[lane] -= 1
+        self._wake()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[None]:
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Returns the acquire-wait metrics of every lane."""
+        return {
+            name: {
+                **dataclasses.asdict(stats),
+                "recent_wait": self._recent_waits[name].value(),
+                "in_use": self._in_use[name],
+                "waiting": sum(not future.done() for future in self._waiters[name]),
+            }
+            for name, stats in self._stats.items()
+        }
@@ -0,0 +1,5 @@
+-- Junction: uuser & skill
+-- Lookups by uuser_id are already served by the unique index of
+-- UNIQUE(uuser_id, skill_id). The reverse lookup (users holding a skill) is
+-- paginated by uuser_id, so the index includes it to allow index-only scans.
+CREATE INDEX idx_uuser_skill_skill_id ON uuser_skill USING btree (skill_id, uuser_id);
@@ -0,0 +1,17 @@
+-- Entity: skill_stats
+-- Number of users holding every skill. It is maintained by the application
+-- with batched deltas from the user-skill write path and it is reconciled
+-- periodically with uuser_skill, so it may lag slightly behind.
+CREATE TABLE skill_stats (
+    PRIMARY KEY (skill_id),
+    skill_id   UUID,
+               FOREIGN KEY (skill_id) REFERENCES skill (skill_id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    user_count BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_skill_stats_user_count ON skill_stats USING btree (user_count DESC, skill_id);
+
+INSERT INTO skill_stats (skill_id, user_count)
+     SELECT skill.skill_id, count(uuser_skill.uuser_id)
+       FROM skill
+  LEFT JOIN uuser_skill ON uuser_skill.skill_id = skill.skill_id
+   GROUP BY skill.skill_id;
@@ -0,0 +1,52 @@
+-- Entity: auth_version
+-- Single row counter bumped on every change that may alter the effective
+-- permissions of a user. Every bump is notified on the channel "auth_changed"
+-- with the new version as payload, so caches can be invalidated.
+CREATE TABLE auth_version (
+    PRIMARY KEY (auth_version_id),
+    auth_version_id BOOLEAN DEFAULT TRUE,
+                    CHECK (auth_version_id),
+    version         BIGINT NOT NULL
+);
+INSERT INTO auth_version (version) VALUES (1);
+
+
+CREATE FUNCTION bump_auth_version() RETURNS TRIGGER AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE auth_version SET version = version + 1 RETURNING version INTO new_version;
+    PERFORM pg_notify('auth_changed', new_version::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE TRIGGER trg_permission_auth_version
+ AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON permission
+   FOR EACH STATEMENT EXECUTE FUNCTION bump_auth_version();
+
+CREATE TRIGGER trg_ggroup_auth_version
+ AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ggroup
+   FOR EACH STATEMENT EXECUTE FUNCTION bump_auth_version();
+
+CREATE TRIGGER trg_ggroup_permission_auth_version
+ AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ggroup_permission
+   FOR EACH STATEMENT EXECUTE FUNCTION bump_auth_version();
+
+CREATE TRIGGER trg_uuser_ggroup_auth_version
+ AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON uuser_ggroup
+   FOR EACH STATEMENT EXECUTE FUNCTION bump_auth_version();
+
+CREATE TRIGGER trg_uuser_permission_auth_version
+ AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON uuser_permission
+   FOR EACH STATEMENT EXECUTE FUNCTION bump_auth_version();
+
+-- Superusers have every permission and inactive users have none, but most
+-- updates of uuser do not change those flags, so it is checked per row.
+CREATE TRIGGER trg_uuser_auth_version
+ AFTER UPDATE ON uuser
+   FOR EACH ROW
+  WHEN (OLD.is_superuser IS DISTINCT FROM NEW.is_superuser
+        OR OLD.is_active IS DISTINCT FROM NEW.is_active)
+       EXECUTE FUNCTION bump_auth_version();
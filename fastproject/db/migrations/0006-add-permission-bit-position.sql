@@ -0,0 +1,22 @@
+-- Entity: permission
+-- Every permission gets a stable bit position, so the permissions of a user can
+-- be stored as a bitset. Positions come from a sequence and are never reused,
+-- even when permissions are deleted.
+CREATE SEQUENCE permission_bit_position_seq AS INTEGER MINVALUE 0 START WITH 0;
+
+ALTER TABLE permission ADD COLUMN bit_position INTEGER;
+
+UPDATE permission
+   SET bit_position = numbered.bit_position
+  FROM (SELECT permission_id,
+               nextval('permission_bit_position_seq') AS bit_position
+          FROM (SELECT permission_id FROM permission ORDER BY codename) AS ordered
+       ) AS numbered
+ WHERE permission.permission_id = numbered.permission_id;
+
+ALTER TABLE permission
+      ALTER COLUMN bit_position SET DEFAULT nextval('permission_bit_position_seq'),
+      ALTER COLUMN bit_position SET NOT NULL,
+      ADD UNIQUE (bit_position);
+
+ALTER SEQUENCE permission_bit_position_seq OWNED BY permission.bit_position;
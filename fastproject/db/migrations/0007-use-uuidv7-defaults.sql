@@ -0,0 +1,37 @@
+-- Function: uuid_generate_v7
+-- Returns a version 7 UUID (RFC 9562): the Unix timestamp in milliseconds
+-- followed by random bits. It is built from a random version 4 UUID whose
+-- first 48 bits are replaced by the timestamp and whose version is set to 7.
+-- Time-ordered keys are inserted next to each other in the btree indexes,
+-- instead of scattered across them like random keys.
+-- The application generates UUIDv7 keys itself for uuser and skill (see
+-- fastproject.utils.uuids), this default covers the rows inserted by SQL.
+CREATE FUNCTION uuid_generate_v7() RETURNS UUID AS $$
+    SELECT encode(
+               set_bit(
+                   set_bit(
+                       overlay(
+                           uuid_send(gen_random_uuid())
+                           PLACING substring(
+                               int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::BIGINT)
+                               FROM 3
+                           )
+                           FROM 1 FOR 6
+                       ),
+                       52, 1
+                   ),
+                   53, 1
+               ),
+               'hex'
+           )::UUID;
+$$ LANGUAGE sql VOLATILE;
+
+-- The existing keys are kept, only the new rows get time-ordered keys.
+ALTER TABLE permission ALTER COLUMN permission_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE ggroup ALTER COLUMN ggroup_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE uuser ALTER COLUMN uuser_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE ggroup_permission ALTER COLUMN ggroup_permission_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE uuser_ggroup ALTER COLUMN uuser_ggroup_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE uuser_permission ALTER COLUMN uuser_permission_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE skill ALTER COLUMN skill_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE uuser_skill ALTER COLUMN uuser_skill_id SET DEFAULT uuid_generate_v7();
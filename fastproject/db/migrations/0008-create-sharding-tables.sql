@@ -0,0 +1,55 @@
+-- Entity: shard_bucket
+-- The shard map of the hash-sharded tables (see fastproject.db.shards): the
+-- shard every bucket of keys is assigned to. Buckets without a row belong to
+-- shard 0. It is only read on shard 0.
+CREATE TABLE shard_bucket (
+    PRIMARY KEY (bucket),
+    bucket INTEGER NOT NULL,
+           CHECK (bucket >= 0),
+    shard  INTEGER NOT NULL,
+           CHECK (shard >= 0)
+);
+
+
+-- Entity: uuser_directory
+-- The rows of uuser are spread across the shards, this global lookup table
+-- holds what must be unique or checked across all of them: the usernames,
+-- the emails and the flags that decide the effective permissions of a user.
+-- It is only used on shard 0, the junctions of the users reference it.
+CREATE TABLE uuser_directory (
+    PRIMARY KEY (uuser_id),
+    uuser_id     UUID                     NOT NULL,
+    username     VARCHAR(150)             NOT NULL,
+                 UNIQUE(username),
+    email        VARCHAR(254)             NOT NULL,
+                 UNIQUE(email),
+    is_superuser BOOLEAN                  NOT NULL,
+    is_active    BOOLEAN                  NOT NULL
+);
+INSERT INTO uuser_directory (uuser_id, username, email, is_superuser, is_active)
+     SELECT uuser_id, username, email, is_superuser, is_active
+       FROM uuser;
+
+
+ALTER TABLE uuser_ggroup DROP CONSTRAINT uuser_ggroup_uuser_id_fkey;
+ALTER TABLE uuser_ggroup
+  ADD FOREIGN KEY (uuser_id) REFERENCES uuser_directory (uuser_id) DEFERRABLE INITIALLY DEFERRED;
+
+ALTER TABLE uuser_permission DROP CONSTRAINT uuser_permission_uuser_id_fkey;
+ALTER TABLE uuser_permission
+  ADD FOREIGN KEY (uuser_id) REFERENCES uuser_directory (uuser_id) DEFERRABLE INITIALLY DEFERRED;
+
+ALTER TABLE uuser_skill DROP CONSTRAINT uuser_skill_uuser_id_fkey;
+ALTER TABLE uuser_skill
+  ADD FOREIGN KEY (uuser_id) REFERENCES uuser_directory (uuser_id) DEFERRABLE INITIALLY DEFERRED;
+
+
+-- The flags of a user are changed in uuser_directory, not in uuser.
+DROP TRIGGER trg_uuser_auth_version ON uuser;
+
+CREATE TRIGGER trg_uuser_directory_auth_version
+ AFTER UPDATE ON uuser_directory
+   FOR EACH ROW
+  WHEN (OLD.is_superuser IS DISTINCT FROM NEW.is_superuser
+        OR OLD.is_active IS DISTINCT FROM NEW.is_active)
+       EXECUTE FUNCTION bump_auth_version();
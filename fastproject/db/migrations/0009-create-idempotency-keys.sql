@@ -0,0 +1,18 @@
+-- Entity: idempotency_key
+-- The Idempotency-Key headers of the requests (see
+-- fastproject.middleware.idempotency) and the responses they got, so a retry
+-- gets the stored response instead of running the request again. The status
+-- code is NULL while the first request runs. A row expires at expires_at: a
+-- key whose request is still running can then be claimed by a retry, and the
+-- expired rows are deleted periodically. It is only used on shard 0.
+CREATE TABLE idempotency_key (
+    PRIMARY KEY (idempotency_key),
+    idempotency_key VARCHAR(255)             NOT NULL,
+    fingerprint     BYTEA                    NOT NULL,
+    status_code     SMALLINT,
+    headers         JSONB,
+    body            BYTEA,
+    created_at      TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    expires_at      TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX idx_idempotency_key_expires_at ON idempotency_key USING btree (expires_at);
@@ -0,0 +1,13 @@
+-- Entity: revoked_token
+-- The access tokens revoked before they expire (see
+-- fastproject.modules.auth.service.revoke_token). Every worker loads them at
+-- startup and whenever its notification listener reconnects, so a revocation
+-- is not lost by a worker that missed its notification. expires_at is the
+-- expiration of the token as a Unix timestamp, the expired rows are deleted
+-- when a token is revoked. It is only used on shard 0.
+CREATE TABLE revoked_token (
+    PRIMARY KEY (token_id),
+    token_id   BYTEA  NOT NULL,
+    expires_at BIGINT NOT NULL
+);
+CREATE INDEX idx_revoked_token_expires_at ON revoked_token USING btree (expires_at);
@@ -0,0 +1,73 @@
+-- Entity: moved_bucket
+-- The buckets of the hash-sharded tables (see fastproject.db.shards) that were
+-- moved away from this shard, or are being moved, by fastproject.db.reshard.
+-- buckets is the number of buckets the bucket was computed with. The rows of
+-- uuser of these buckets can not be written here, so a process with a stale
+-- shard map fails instead of writing to the wrong shard. It is used on every
+-- shard.
+CREATE TABLE moved_bucket (
+    PRIMARY KEY (bucket),
+    bucket  INTEGER NOT NULL,
+            CHECK (bucket >= 0),
+    buckets INTEGER NOT NULL,
+            CHECK (buckets > 0)
+);
+
+
+-- Checked once per statement, and only when a bucket was moved away from this
+-- shard, so the writes of a shard that never lost a bucket only look at the
+-- empty moved_bucket. The writes that started before a bucket is fenced are
+-- waited for by reshard, which locks uuser while it inserts the row of
+-- moved_bucket. reshard bypasses the check with
+-- SET LOCAL fastproject.resharding = 'on'.
+CREATE FUNCTION check_buckets_not_moved() RETURNS TRIGGER AS $$
+DECLARE
+    row_id UUID;
+BEGIN
+    IF current_setting('fastproject.resharding', TRUE) = 'on'
+       OR NOT EXISTS (SELECT 1 FROM moved_bucket) THEN
+        RETURN NULL;
+    END IF;
+    -- Every size of buckets is tried, so the buckets are looked up by the
+    -- primary key of moved_bucket.
+    IF TG_OP = 'DELETE' THEN
+        SELECT changed.uuser_id INTO row_id
+          FROM old_uuser AS changed
+               CROSS JOIN (SELECT DISTINCT buckets FROM moved_bucket) AS sizes
+               JOIN moved_bucket
+                 ON moved_bucket.bucket = ('x' || left(md5(changed.uuser_id::text), 8))::bit(32)::bigint % sizes.buckets
+                AND moved_bucket.buckets = sizes.buckets
+         LIMIT 1;
+    ELSE
+        SELECT changed.uuser_id INTO row_id
+          FROM new_uuser AS changed
+               CROSS JOIN (SELECT DISTINCT buckets FROM moved_bucket) AS sizes
+               JOIN moved_bucket
+                 ON moved_bucket.bucket = ('x' || left(md5(changed.uuser_id::text), 8))::bit(32)::bigint % sizes.buckets
+                AND moved_bucket.buckets = sizes.buckets
+         LIMIT 1;
+    END IF;
+    IF row_id IS NOT NULL THEN
+        RAISE EXCEPTION 'The bucket of the user % is not in this shard.', row_id
+              USING ERRCODE = 'FPBKT';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- A trigger with transition tables only fires for one event.
+CREATE TRIGGER trg_uuser_insert_bucket_not_moved
+ AFTER INSERT ON uuser
+       REFERENCING NEW TABLE AS new_uuser
+   FOR EACH STATEMENT EXECUTE FUNCTION check_buckets_not_moved();
+
+CREATE TRIGGER trg_uuser_update_bucket_not_moved
+ AFTER UPDATE ON uuser
+       REFERENCING NEW TABLE AS new_uuser
+   FOR EACH STATEMENT EXECUTE FUNCTION check_buckets_not_moved();
+
+CREATE TRIGGER trg_uuser_delete_bucket_not_moved
+ AFTER DELETE ON uuser
+       REFERENCING OLD TABLE AS old_uuser
+   FOR EACH STATEMENT EXECUTE FUNCTION check_buckets_not_moved();
@@ -0,0 +1,53 @@
+-- Entity: skill_stats_delta
+-- The changes of uuser_skill that are not in skill_stats yet. The triggers of
+-- uuser_skill add one row per skill and statement, in the transaction of the
+-- change, and fastproject.modules.skills.service.flush_skill_stats moves them
+-- to skill_stats in batches, so the rows of the popular skills are not
+-- updated by every change. skill_stats plus the deltas is always the count of
+-- uuser_skill, which is what the reconciliation checks. It is only used on
+-- shard 0.
+CREATE TABLE skill_stats_delta (
+    PRIMARY KEY (skill_stats_delta_id),
+    skill_stats_delta_id BIGINT GENERATED ALWAYS AS IDENTITY,
+    skill_id             UUID   NOT NULL,
+    delta                BIGINT NOT NULL
+);
+
+
+CREATE FUNCTION record_skill_stats_deltas() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO skill_stats_delta (skill_id, delta)
+             SELECT skill_id, count(*) FROM new_uuser_skill GROUP BY skill_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO skill_stats_delta (skill_id, delta)
+             SELECT skill_id, -count(*) FROM old_uuser_skill GROUP BY skill_id;
+    ELSE
+        INSERT INTO skill_stats_delta (skill_id, delta)
+             SELECT skill_id, sum(delta)
+               FROM (SELECT skill_id, 1 AS delta FROM new_uuser_skill
+                     UNION ALL
+                     SELECT skill_id, -1 AS delta FROM old_uuser_skill) AS changes
+           GROUP BY skill_id
+             HAVING sum(delta) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- A trigger with transition tables only fires for one event.
+CREATE TRIGGER trg_uuser_skill_insert_skill_stats
+ AFTER INSERT ON uuser_skill
+       REFERENCING NEW TABLE AS new_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION record_skill_stats_deltas();
+
+CREATE TRIGGER trg_uuser_skill_update_skill_stats
+ AFTER UPDATE ON uuser_skill
+       REFERENCING OLD TABLE AS old_uuser_skill NEW TABLE AS new_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION record_skill_stats_deltas();
+
+CREATE TRIGGER trg_uuser_skill_delete_skill_stats
+ AFTER DELETE ON uuser_skill
+       REFERENCING OLD TABLE AS old_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION record_skill_stats_deltas();
@@ -0,0 +1,72 @@
+-- Every change of uuser_skill is notified on the channel "user_skills_changed"
+-- when it is committed, so every worker keeps its search index of the skills
+-- (see fastproject.modules.skills.service) up to date. The payload lists the
+-- changes per user, "uuser_id:+skill_id,-skill_id;uuser_id:+skill_id", with +
+-- for the skills added and - for the ones removed. A payload must be shorter
+-- than 8000 bytes, so larger changes are split into several notifications.
+CREATE FUNCTION notify_user_skills_changed() RETURNS TRIGGER AS $$
+DECLARE
+    uuser_ids UUID[];
+    skill_ids TEXT[];
+    payload   TEXT := '';
+    item      TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(uuser_id ORDER BY uuser_id),
+               array_agg('+' || skill_id::text ORDER BY uuser_id)
+          INTO uuser_ids, skill_ids
+          FROM new_uuser_skill;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(uuser_id ORDER BY uuser_id),
+               array_agg('-' || skill_id::text ORDER BY uuser_id)
+          INTO uuser_ids, skill_ids
+          FROM old_uuser_skill;
+    ELSE
+        SELECT array_agg(uuser_id ORDER BY uuser_id),
+               array_agg(sign || skill_id::text ORDER BY uuser_id)
+          INTO uuser_ids, skill_ids
+          FROM ((SELECT uuser_id, skill_id, '+' AS sign FROM new_uuser_skill
+                 EXCEPT
+                 SELECT uuser_id, skill_id, '+' AS sign FROM old_uuser_skill)
+                UNION ALL
+                (SELECT uuser_id, skill_id, '-' AS sign FROM old_uuser_skill
+                 EXCEPT
+                 SELECT uuser_id, skill_id, '-' AS sign FROM new_uuser_skill))
+               AS changes;
+    END IF;
+    FOR i IN 1 .. coalesce(array_length(uuser_ids, 1), 0) LOOP
+        IF i > 1 AND uuser_ids[i] = uuser_ids[i - 1] THEN
+            item := ',' || skill_ids[i];
+        ELSE
+            item := ';' || uuser_ids[i]::text || ':' || skill_ids[i];
+        END IF;
+        IF octet_length(payload) + octet_length(item) >= 8000 THEN
+            PERFORM pg_notify('user_skills_changed', substr(payload, 2));
+            item := ';' || uuser_ids[i]::text || ':' || skill_ids[i];
+            payload := '';
+        END IF;
+        payload := payload || item;
+    END LOOP;
+    IF payload <> '' THEN
+        PERFORM pg_notify('user_skills_changed', substr(payload, 2));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- A trigger with transition tables only fires for one event.
+CREATE TRIGGER trg_uuser_skill_insert_notify
+ AFTER INSERT ON uuser_skill
+       REFERENCING NEW TABLE AS new_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION notify_user_skills_changed();
+
+CREATE TRIGGER trg_uuser_skill_update_notify
+ AFTER UPDATE ON uuser_skill
+       REFERENCING OLD TABLE AS old_uuser_skill NEW TABLE AS new_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION notify_user_skills_changed();
+
+CREATE TRIGGER trg_uuser_skill_delete_notify
+ AFTER DELETE ON uuser_skill
+       REFERENCING OLD TABLE AS old_uuser_skill
+   FOR EACH STATEMENT EXECUTE FUNCTION notify_user_skills_changed();
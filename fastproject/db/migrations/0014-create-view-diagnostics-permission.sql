@@ -0,0 +1,7 @@
+-- Entity: permission
+-- The permission of the endpoints /admin, see fastproject.modules.admin.
+INSERT INTO permission (name, codename)
+     SELECT 'Can view the diagnostics', 'admin.view_diagnostics'
+      WHERE NOT EXISTS (
+            SELECT 1 FROM permission WHERE codename = 'admin.view_diagnostics'
+      );
@@ -0,0 +1,8 @@
+-- Entity: permission
+-- The permission to profile a request with the header X-Profile, see
+-- fastproject.modules.admin.service.can_profile.
+INSERT INTO permission (name, codename)
+     SELECT 'Can profile requests', 'admin.profile_requests'
+      WHERE NOT EXISTS (
+            SELECT 1 FROM permission WHERE codename = 'admin.profile_requests'
+      );
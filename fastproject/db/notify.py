@@ -0,0 +1,112 @@
+"""Utilities to receive PostgreSQL notifications (LISTEN/NOTIFY)."""
+
+import asyncio
+import collections
+import logging
+from typing import Callable, Optional
+
+import asyncpg
+import asyncpg.pool
+
+from . import lanes
+from .conn import get_connection_pool, get_lane_limiter
+
+logger = logging.getLogger(__name__)
+
+# A callback receives the payload of a notification, or None when
+# notifications may have been lost (the listening connection was closed).
+NotificationCallback = Callable[[Optional[str]], None]
+
+
+class NotificationListener:
+    """Holds a dedicated connection that LISTENs to the subscribed channels."""
+
+    def __init__(self):
+        self._callbacks: dict[str, list[NotificationCallback]] = (
+            collections.defaultdict(list)
+        )
+        self._conn: Optional[asyncpg.Connection] = None
+        self._conn_pool: Optional[asyncpg.pool.Pool] = None
+        self._lane_limiter: Optional[lanes.LaneLimiter] = None
+        # The release of a connection that was closed while listening.
+        self._releasing: Optional[asyncio.Future] = None
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None
+
+    def subscribe(self, channel: str, callback: NotificationCallback) -> None:
+        """Subscribes a callback to a channel, call it before start()."""
+        self._callbacks[channel].append(callback)
+
+    def _dispatch(self, conn, pid, channel, payload) -> None:
+        for callback in self._callbacks[channel]:
+            try:
+                callback(payload)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Notification callback for %s failed.", channel)
+
+    async def _release(self, conn: asyncpg.Connection) -> None:
+        # The admin slot is only freed once the connection is back in the pool
+        # (a closed one is terminated by the pool), so the limiter never
+        # admits more connections than the pool has.
+        try:
+            await self._conn_pool.release(conn)
+        finally:
+            self._lane_limiter.release(lanes.ADMIN)
+
+    def _on_termination(self, conn) -> None:
+        logger.warning("The notification listener connection was closed.")
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._releasing = asyncio.ensure_future(self._release(conn))
+        for channel in self._callbacks:
+            self._dispatch(conn, None, channel, None)
+
+    async def start(self) -> None:
+        """
+        Acquires a connection from the pool (in the admin lane) and starts
+        listening. Once listening, the callbacks receive None, since the
+        notifications sent before were not received.
+        """
+        if self._conn is not None or not self._callbacks:
+            return
+        if self._releasing is not None:
+            releasing, self._releasing = self._releasing, None
+            try:
+                await releasing
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Could not release the closed connection.")
+        self._conn_pool = await get_connection_pool()
+        self._lane_limiter = get_lane_limiter()
+        await self._lane_limiter.acquire(lanes.ADMIN)
+        try:
+            conn = await self._conn_pool.acquire()
+        except BaseException:
+            self._lane_limiter.release(lanes.ADMIN)
+            raise
+        try:
+            for channel in self._callbacks:
+                await conn.add_listener(channel, self._dispatch)
+        except BaseException:
+            await self._release(conn)
+            raise
+        conn.add_termination_listener(self._on_termination)
+        self._conn = conn
+        for channel in self._callbacks:
+            self._dispatch(conn, None, channel, None)
+
+    async def stop(self) -> None:
+        """Stops listening and gives the connection back to the pool."""
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        conn.remove_termination_listener(self._on_termination)
+        try:
+            for channel in self._callbacks:
+                await conn.remove_listener(channel, self._dispatch)
+        finally:
+            await self._release(conn)
+
+
+notification_listener = NotificationListener()
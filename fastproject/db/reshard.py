@@ -0,0 +1,317 @@
+"""Moves buckets of users between shards, see the module shards.
+
+Run it from the project root, the shards are taken from the configuration
+file ".env":
+
+  python -m fastproject.db.reshard status
+  python -m fastproject.db.reshard move 12 13 --to 1
+  python -m fastproject.db.reshard rebalance
+  python -m fastproject.db.reshard resume
+
+A bucket is moved in five steps:
+
+1. It is fenced in the source shard (a row of moved_bucket): the writes of its
+   rows that already started are waited for, the later ones fail with
+   shards.BucketMovedError until the move is done.
+2. Its rows are copied to the target shard, nothing changes them meanwhile.
+3. The fence of the target shard, if the bucket was moved away from it
+   before, is lifted.
+4. The shard map is updated and the change is notified to the running
+   processes.
+5. After a grace period, so the processes that did not receive the
+   notification yet still read the rows from the source shard, the rows are
+   deleted from the source shard.
+
+The fence of the source shard is kept: a process with a stale shard map can
+not write there, it gets a BucketMovedError and reads the shard map again. The
+writes of a bucket fail while it is copied, so move buckets when the traffic
+is low.
+
+If reshard stops in the middle of a move (the process is killed, the host
+crashes), the bucket stays fenced in the source shard and its writes keep
+failing. Run resume once no move is running: it rolls back the moves that
+were stopped before the shard map was updated (the fence is lifted, the
+bucket stays in the source shard and can be moved again), and finishes the
+ones that were stopped after it (the rows left in the source shard are
+deleted).
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+from typing import Optional
+
+import asyncpg
+
+from . import lanes
+from .conn import (
+    DEFAULT_SHARD,
+    acquire_connection,
+    close_connection_pools,
+    configured_shards,
+    init_connection_pool,
+)
+from .shards import SHARD_MAP_CHANNEL, ShardMap, bucket_sql, load_shard_map
+
+_UUSER_COLUMNS = (
+    "uuser_id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "password",
+    "is_superuser",
+    "is_staff",
+    "is_active",
+    "date_joined",
+    "last_login",
+)
+_UUSER_COLUMN_TYPES = (
+    "uuid",
+    "varchar",
+    "varchar",
+    "varchar",
+    "varchar",
+    "varchar",
+    "boolean",
+    "boolean",
+    "boolean",
+    "timestamptz",
+    "timestamptz",
+)
+# Lets the statements of reshard write the rows of fenced buckets, in a
+# transaction.
+_BYPASS_FENCE = "SET LOCAL fastproject.resharding = 'on'"
+
+
+async def _copy_bucket(
+    source: asyncpg.Connection,
+    target: asyncpg.Connection,
+    shard_map: ShardMap,
+    bucket: int,
+) -> int:
+    """Copies the rows of a bucket, returns the number of rows copied.
+
+    The rows that already exist in the target are overwritten.
+    """
+    records = await source.fetch(
+        f"SELECT {', '.join(_UUSER_COLUMNS)} FROM uuser "
+        f"WHERE {bucket_sql('uuser_id', '$1')} = $2",
+        shard_map.buckets,
+        bucket,
+    )
+    if not records:
+        return 0
+    unnest = ", ".join(
+        f"${i}::{column_type}[]"
+        for i, column_type in enumerate(_UUSER_COLUMN_TYPES, start=1)
+    )
+    async with target.transaction():
+        await target.execute(_BYPASS_FENCE)
+        status = await target.execute(
+            f"INSERT INTO uuser ({', '.join(_UUSER_COLUMNS)}) "
+            f"SELECT * FROM unnest({unnest}) "
+            "ON CONFLICT (uuser_id) DO UPDATE SET "
+            + ", ".join(
+                f"{column} = EXCLUDED.{column}" for column in _UUSER_COLUMNS[1:]
+            ),
+            *([record[column] for record in records] for column in _UUSER_COLUMNS),
+        )
+    return int(status.rsplit(" ", 1)[1])
+
+
+async def _fence_bucket(conn: asyncpg.Connection, shard_map: ShardMap, bucket: int):
+    """Rejects the writes of the rows of a bucket in a shard.
+
+    Waits for the writes that already started: the lock SHARE conflicts with
+    the one of every INSERT, UPDATE and DELETE, and the later writes wait for
+    the fence to be committed, so they see it.
+    """
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE uuser IN SHARE MODE")
+        await conn.execute(
+            "INSERT INTO moved_bucket (bucket, buckets) VALUES ($1, $2) "
+            "ON CONFLICT (bucket) DO UPDATE SET buckets = EXCLUDED.buckets",
+            bucket,
+            shard_map.buckets,
+        )
+
+
+async def _unfence_bucket(conn: asyncpg.Connection, bucket: int) -> None:
+    await conn.execute("DELETE FROM moved_bucket WHERE bucket = $1", bucket)
+
+
+async def _delete_bucket(
+    conn: asyncpg.Connection, shard_map: ShardMap, bucket: int
+) -> int:
+    """Deletes the rows of a bucket, returns the number of rows deleted."""
+    async with conn.transaction():
+        await conn.execute(_BYPASS_FENCE)
+        status = await conn.execute(
+            f"DELETE FROM uuser WHERE {bucket_sql('uuser_id', '$1')} = $2",
+            shard_map.buckets,
+            bucket,
+        )
+    return int(status.rsplit(" ", 1)[1])
+
+
+async def move_bucket(bucket: int, to_shard: int, grace: float = 5.0) -> dict:
+    """Moves the rows of a bucket to another shard.
+
+    Args:
+      bucket: The bucket.
+      to_shard: The shard the bucket will be assigned to.
+      grace: The seconds to wait for the running processes to read the new
+        shard map before the rows are deleted from the source shard.
+
+    Returns:
+      A dict with the source shard and the number of rows copied and deleted.
+
+    Raises:
+      ValueError: If the bucket does not exist or the shard is not configured.
+    """
+    if to_shard not in configured_shards():
+        raise ValueError(f"The shard {to_shard} is not configured.")
+    async with acquire_connection(DEFAULT_SHARD, lanes.ADMIN) as directory_conn:
+        shard_map = await load_shard_map(directory_conn)
+        if not 0 <= bucket < shard_map.buckets:
+            raise ValueError(f"The bucket {bucket} does not exist.")
+        from_shard = shard_map.shard_of_bucket(bucket)
+        report = {"bucket": bucket, "from": from_shard, "to": to_shard}
+        if from_shard == to_shard:
+            return {**report, "copied": 0, "deleted": 0}
+        async with acquire_connection(
+            from_shard, lanes.ADMIN
+        ) as source, acquire_connection(to_shard, lanes.ADMIN) as target:
+            await _fence_bucket(source, shard_map, bucket)
+            try:
+                copied = await _copy_bucket(source, target, shard_map, bucket)
+                async with directory_conn.transaction():
+                    await directory_conn.execute(
+                        "INSERT INTO shard_bucket (bucket, shard) VALUES ($1, $2) "
+                        "ON CONFLICT (bucket) DO UPDATE SET shard = EXCLUDED.shard",
+                        bucket,
+                        to_shard,
+                    )
+                    await directory_conn.execute(
+                        "SELECT pg_notify($1, $2)", SHARD_MAP_CHANNEL, str(bucket)
+                    )
+                    # Lifted right before the shard map is committed, nobody
+                    # writes to the target until then.
+                    await _unfence_bucket(target, bucket)
+            except BaseException:
+                await _unfence_bucket(source, bucket)
+                raise
+            await asyncio.sleep(grace)
+            deleted = await _delete_bucket(source, shard_map, bucket)
+    return {**report, "copied": copied, "deleted": deleted}
+
+
+async def resume_moves() -> list[dict]:
+    """Rolls back or finishes the moves of buckets that were stopped midway.
+
+    A fenced bucket that is still assigned to its shard was being moved away
+    when reshard stopped, before the shard map was updated: the fence is
+    lifted. One assigned to another shard was moved: the rows left in its
+    former shard are deleted. Do not run it while a move is running.
+
+    Returns:
+      A list of dicts with the bucket, the shard and what was done there.
+    """
+    async with acquire_connection(DEFAULT_SHARD, lanes.ADMIN) as directory_conn:
+        shard_map = await load_shard_map(directory_conn)
+    report = []
+    for shard in configured_shards():
+        async with acquire_connection(shard, lanes.ADMIN) as conn:
+            fenced = await conn.fetch("SELECT bucket FROM moved_bucket ORDER BY bucket")
+            for record in fenced:
+                bucket = record["bucket"]
+                if shard_map.shard_of_bucket(bucket) == shard:
+                    await _unfence_bucket(conn, bucket)
+                    report.append({"bucket": bucket, "shard": shard, "unfenced": True})
+                else:
+                    deleted = await _delete_bucket(conn, shard_map, bucket)
+                    if deleted:
+                        report.append(
+                            {"bucket": bucket, "shard": shard, "deleted": deleted}
+                        )
+    return report
+
+
+def plan_rebalance(shard_map: ShardMap, shards: list[int]) -> list[tuple[int, int]]:
+    """
+    Returns the (bucket, shard) moves that spread the buckets evenly across
+    the shards, moving as few buckets as possible.
+    """
+    target, extra = divmod(shard_map.buckets, len(shards))
+    quotas = {shard: target + (i < extra) for i, shard in enumerate(shards)}
+    buckets_of = collections.defaultdict(list)
+    for bucket in range(shard_map.buckets):
+        buckets_of[shard_map.shard_of_bucket(bucket)].append(bucket)
+    surplus = []
+    for shard, buckets in buckets_of.items():
+        surplus.extend(buckets[quotas.get(shard, 0) :])
+    moves = []
+    for shard in shards:
+        while len(buckets_of[shard]) < quotas[shard]:
+            bucket = surplus.pop()
+            buckets_of[shard].append(bucket)
+            moves.append((bucket, shard))
+    return moves
+
+
+async def _status() -> dict:
+    async with acquire_connection(DEFAULT_SHARD, lanes.ADMIN) as directory_conn:
+        shard_map = await load_shard_map(directory_conn)
+    report = {}
+    for shard in configured_shards():
+        async with acquire_connection(shard, lanes.ADMIN) as conn:
+            users = await conn.fetchval("SELECT count(*) FROM uuser")
+        report[shard] = {"buckets": len(shard_map.buckets_of(shard)), "users": users}
+    return report
+
+
+async def main(command: str, buckets: list[int], to_shard: Optional[int], grace: float):
+    await init_connection_pool(use_settings=True)
+    try:
+        if command == "status":
+            return await _status()
+        if command == "resume":
+            return await resume_moves()
+        if command == "rebalance":
+            async with acquire_connection(DEFAULT_SHARD, lanes.ADMIN) as directory_conn:
+                shard_map = await load_shard_map(directory_conn)
+            moves = plan_rebalance(shard_map, configured_shards())
+        else:
+            moves = [(bucket, to_shard) for bucket in buckets]
+        return [await move_bucket(bucket, shard, grace) for bucket, shard in moves]
+    finally:
+        await close_connection_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="show the buckets and users per shard")
+    subparsers.add_parser(
+        "resume", help="roll back or finish the moves that were stopped midway"
+    )
+    move_parser = subparsers.add_parser("move", help="move buckets to a shard")
+    move_parser.add_argument("buckets", type=int, nargs="+")
+    move_parser.add_argument("--to", type=int, required=True, dest="to_shard")
+    rebalance_parser = subparsers.add_parser(
+        "rebalance", help="spread the buckets evenly across the configured shards"
+    )
+    for subparser in (move_parser, rebalance_parser):
+        subparser.add_argument("--grace", type=float, default=5.0)
+    args = parser.parse_args()
+    report = asyncio.run(
+        main(
+            args.command,
+            getattr(args, "buckets", []),
+            getattr(args, "to_shard", None),
+            getattr(args, "grace", 0.0),
+        )
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,166 @@
+"""Hash-sharding of rows across several databases.
+
+Every key (a UUID) belongs to one of a fixed number of buckets and every bucket
+is assigned to a shard. Shard 0 is the database of the section [DATABASE] of
+the configuration file, it also holds the shard map (the table shard_bucket)
+and the global lookup tables. The other shards are configured in sections
+[DATABASE.<shard>] with the same keys as [DATABASE]. Buckets not listed in
+shard_bucket belong to shard 0, so without extra shards nothing changes.
+
+The number of buckets ([SHARDING] buckets) must not change once rows were
+stored. Buckets are moved between shards with fastproject.db.reshard, which
+notifies the change on the channel "shard_map_changed". Every shard rejects
+the writes of the rows of the buckets moved away from it (see the table
+moved_bucket), a process with a stale shard map gets a BucketMovedError and
+reads the shard map again.
+"""
+
+import contextlib
+import hashlib
+import uuid
+from collections.abc import AsyncIterator, Iterable, Mapping
+from typing import Optional
+
+import asyncpg
+import asyncpg.pool
+
+from .. import config
+from .conn import DEFAULT_SHARD, acquire_connection, configured_shards
+from .notify import notification_listener
+
+SHARD_MAP_CHANNEL = "shard_map_changed"
+# The SQLSTATE of the error raised by a shard when a row of a bucket that is
+# not in it is written, see the migration 0011-create-moved-buckets.sql.
+BUCKET_MOVED_SQLSTATE = "FPBKT"
+
+_shard_map: Optional["ShardMap"] = None
+
+
+class BucketMovedError(RuntimeError):
+    """
+    Raised when a row is written to a shard its bucket was moved from, or is
+    being moved from: the shard map was stale or the move did not finish, a
+    retry may succeed.
+    """
+
+
+def bucket_of(key: uuid.UUID, buckets: int) -> int:
+    """Returns the bucket of a key.
+
+    The first 32 bits of the MD5 of the key, so the bucket can be computed in
+    SQL too, see bucket_sql().
+    """
+    digest = hashlib.md5(str(key).encode("ascii")).digest()
+    return int.from_bytes(digest[:4], "big") % buckets
+
+
+def bucket_sql(column: str, buckets_param: str) -> str:
+    """Returns the SQL expression that computes the bucket of a UUID column."""
+    return f"(('x' || left(md5({column}::text), 8))::bit(32)::bigint % {buckets_param})"
+
+
+class ShardMap:
+    """Maps every bucket to the shard that holds its rows."""
+
+    def __init__(self, buckets: int, assignments: Optional[Mapping[int, int]] = None):
+        self.buckets = buckets
+        self._shards = [DEFAULT_SHARD] * buckets
+        for bucket, shard in (assignments or {}).items():
+            self._shards[bucket] = shard
+
+    def shard_of_bucket(self, bucket: int) -> int:
+        return self._shards[bucket]
+
+    def shard_of(self, key: uuid.UUID) -> int:
+        return self._shards[bucket_of(key, self.buckets)]
+
+    def buckets_of(self, shard: int) -> list[int]:
+        """Returns the buckets assigned to a shard."""
+        return [bucket for bucket, s in enumerate(self._shards) if s == shard]
+
+
+def _buckets() -> int:
+    return config.settings.getint("SHARDING", "buckets", fallback=1024)
+
+
+async def load_shard_map(conn: asyncpg.Connection) -> ShardMap:
+    """Reads the shard map from the table shard_bucket of shard 0."""
+    records = await conn.fetch("SELECT bucket, shard FROM shard_bucket")
+    return ShardMap(
+        _buckets(), {record["bucket"]: record["shard"] for record in records}
+    )
+
+
+async def get_shard_map() -> ShardMap:
+    """Returns the shard map, it is loaded on first use.
+
+    Without extra shards configured every bucket belongs to shard 0 and the
+    database is not read.
+    """
+    global _shard_map
+    if _shard_map is None:
+        if len(configured_shards()) == 1:
+            _shard_map = ShardMap(_buckets())
+        else:
+            async with acquire_connection() as conn:
+                _shard_map = await load_shard_map(conn)
+    return _shard_map
+
+
+def invalidate_shard_map(payload: Optional[str] = None) -> None:
+    """Forgets the shard map, so it is read again on next use."""
+    global _shard_map
+    _shard_map = None
+
+
+notification_listener.subscribe(SHARD_MAP_CHANNEL, invalidate_shard_map)
+
+
+async def shard_of(key: uuid.UUID) -> int:
+    """Returns the shard that holds the rows of a key."""
+    return (await get_shard_map()).shard_of(key)
+
+
+async def check_not_moved(
+    conn: asyncpg.pool.PoolAcquireContext, keys: Iterable[uuid.UUID]
+) -> None:
+    """
+    Raises BucketMovedError if the bucket of one of the keys was moved away
+    from the shard of conn, and forgets the shard map.
+
+    Call it when the rows of the keys were not found: with a stale shard map
+    they are looked for in the wrong shard, and taken for missing.
+    """
+    if len(configured_shards()) == 1:
+        return
+    moved = await conn.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM moved_bucket, unnest($1::uuid[]) AS k(key) "
+        f"WHERE bucket = {bucket_sql('k.key', 'buckets')})",
+        list(keys),
+    )
+    if moved:
+        invalidate_shard_map()
+        raise BucketMovedError("The bucket of a key was moved to another shard.")
+
+
+@contextlib.asynccontextmanager
+async def shard_connection(
+    shard: int,
+    conn: Optional[asyncpg.pool.PoolAcquireContext] = None,
+    conn_shard: int = DEFAULT_SHARD,
+    lane: Optional[str] = None,
+) -> AsyncIterator[asyncpg.pool.PoolAcquireContext]:
+    """Yields a connection to a shard.
+
+    Args:
+      shard: The shard the connection is needed for.
+      conn: A connection that is already held, it is yielded if it is
+        connected to the shard, so statements can share its transaction.
+      conn_shard: The shard conn is connected to.
+      lane: The lane a new connection is acquired in, see acquire_connection.
+    """
+    if conn is not None and shard == conn_shard:
+        yield conn
+        return
+    async with acquire_connection(shard, lane) as shard_conn:
+        yield shard_conn
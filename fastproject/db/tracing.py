@@ -0,0 +1,64 @@
+"""The spans of the aiosql queries, see utils.tracing."""
+
+from aiosql.adapters.asyncpg import AsyncPGAdapter
+
+from ..utils import tracing
+
+
+def _query_span(query_name: str) -> tracing.SpanScope:
+    return tracing.start_span(
+        f"aiosql {query_name}",
+        tracing.CLIENT,
+        {"db.system": "postgresql", "db.query.name": query_name},
+    )
+
+
+class TracingAsyncPGAdapter(AsyncPGAdapter):
+    """The asyncpg adapter of aiosql, running every query in a child span.
+
+    The span is named after the query and has the number of rows it returned
+    or was given, as the attribute "db.rows". It is used instead of "asyncpg":
+
+      _queries = aiosql.from_path(path, db.TracingAsyncPGAdapter)
+    """
+
+    async def select(self, conn, query_name, sql, parameters, record_class=None):
+        with _query_span(query_name) as span:
+            results = await super().select(
+                conn, query_name, sql, parameters, record_class
+            )
+            if span is not None:
+                span.set_attribute("db.rows", len(results))
+            return results
+
+    async def select_one(self, conn, query_name, sql, parameters, record_class=None):
+        with _query_span(query_name) as span:
+            result = await super().select_one(
+                conn, query_name, sql, parameters, record_class
+            )
+            if span is not None:
+                span.set_attribute("db.rows", int(result is not None))
+            return result
+
+    async def select_value(self, conn, query_name, sql, parameters):
+        with _query_span(query_name):
+            return await super().select_value(conn, query_name, sql, parameters)
+
+    async def insert_returning(self, conn, query_name, sql, parameters):
+        with _query_span(query_name) as span:
+            result = await super().insert_returning(conn, query_name, sql, parameters)
+            if span is not None:
+                span.set_attribute("db.rows", int(result is not None))
+            return result
+
+    async def insert_update_delete(self, conn, query_name, sql, parameters):
+        with _query_span(query_name):
+            return await super().insert_update_delete(conn, query_name, sql, parameters)
+
+    async def insert_update_delete_many(self, conn, query_name, sql, parameters):
+        with _query_span(query_name) as span:
+            if span is not None:
+                span.set_attribute("db.rows", len(parameters))
+            return await super().insert_update_delete_many(
+                conn, query_name, sql, parameters
+            )
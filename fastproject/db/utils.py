@@ -1,6 +1,6 @@
 """Utilities to be used in repository modules."""
 
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 from typing import Any, Optional
 
 
@@ -76,3 +76,38 @@ def updater_fields(
         **{field: kwargs.get(field) for field in fields + null_fields},
         **{f"{updater_flag_preffix}{field}": field in kwargs for field in null_fields},
     }
+
+
+def select_list(fields: Optional[Iterable[str]], columns: Mapping[str, str]) -> str:
+    """Returns the SELECT list of a projection of the given fields.
+
+    The fields are selected in the order of columns, whatever order they were
+    requested in, so every set of fields always produces the same SQL and
+    reuses the same prepared statement.
+
+    Args:
+      fields: The requested fields, if None, all of them are selected.
+      columns: Maps every field that can be selected to the SQL expression of
+        its column. Only these are ever written into the SQL, so user input
+        never reaches the query text.
+
+    Returns:
+      The SELECT list, for example: "uuser_id AS user_id, username".
+
+    Raises:
+      ValueError: If a field can not be selected, or no field was requested.
+    """
+    if fields is None:
+        selected = list(columns)
+    else:
+        requested = set(fields)
+        unknown = requested.difference(columns)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        selected = [field for field in columns if field in requested]
+        if not selected:
+            raise ValueError("At least one field must be requested.")
+    return ", ".join(
+        field if columns[field] == field else f"{columns[field]} AS {field}"
+        for field in selected
+    )
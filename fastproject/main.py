@@ -1,12 +1,178 @@
 """Main module."""
 
+from typing import Optional
+
 import fastapi
 
-from .modules import skills, users
+from . import config, db, middleware
+from .modules import admin, auth, skills, users
+from .utils import json_responses, otlp, tasks
+
+app = fastapi.FastAPI(default_response_class=json_responses.FastJSONResponse)
+# Added first so it runs last, next to the routes, and the requests that are
+# shed are not profiled.
+if config.settings.getboolean("PROFILING", "enabled", fallback=False):
+    app.add_middleware(
+        middleware.ProfilingMiddleware,
+        store=admin.service.profile_store,
+        authorize=admin.service.can_profile,
+        sample_interval=config.settings.getfloat(
+            "PROFILING", "sample_interval", fallback=0.001
+        ),
+    )
+if config.settings.getboolean("LOAD_SHEDDING", "enabled", fallback=True):
+    app.add_middleware(
+        middleware.LoadSheddingMiddleware,
+        limits=middleware.route_limits_from_settings(),
+        signals={
+            "db_acquire": middleware.Signal(
+                db.recent_acquire_wait,
+                config.settings.getfloat(
+                    "LOAD_SHEDDING", "acquire_wait_target", fallback=0.05
+                ),
+            ),
+            # Only the routes that hash passwords wait for the hashing threads.
+            "hashing": middleware.Signal(
+                users.password_hashing.recent_thread_wait,
+                config.settings.getfloat(
+                    "LOAD_SHEDDING", "hashing_wait_target", fallback=0.25
+                ),
+                routes=frozenset(
+                    (
+                        "POST /auth/login",
+                        "POST /users",
+                        "PATCH /users/{user_id}",
+                        "PATCH /users:batch",
+                    )
+                ),
+            ),
+        },
+        queue_timeout=config.settings.getfloat(
+            "LOAD_SHEDDING", "queue_timeout", fallback=1.0
+        ),
+        queue_wait_target=config.settings.getfloat(
+            "LOAD_SHEDDING", "queue_wait_target", fallback=0.1
+        ),
+        retry_after=config.settings.getint("LOAD_SHEDDING", "retry_after", fallback=1),
+    )
+# Before load shedding, the retries that wait for a key do not hold its slots.
+if config.settings.getboolean("IDEMPOTENCY", "enabled", fallback=True):
+    app.add_middleware(
+        middleware.IdempotencyMiddleware,
+        routes=middleware.idempotency.routes_from_settings(),
+        ttl=config.settings.getfloat("IDEMPOTENCY", "ttl", fallback=86400.0),
+        lock_timeout=config.settings.getfloat(
+            "IDEMPOTENCY", "lock_timeout", fallback=60.0
+        ),
+        poll_interval=config.settings.getfloat(
+            "IDEMPOTENCY", "poll_interval", fallback=1.0
+        ),
+    )
+# The time queued for load shedding counts.
+if config.settings.getboolean("DEADLINES", "enabled", fallback=True):
+    app.add_middleware(
+        middleware.DeadlineMiddleware,
+        route_timeouts=middleware.route_timeouts_from_settings(),
+        header=config.settings.get(
+            "DEADLINES", "header", fallback=middleware.deadlines.TIMEOUT_HEADER
+        ),
+    )
+trace_exporter: Optional[otlp.FileExporter] = None
+if config.settings.getboolean("TRACING", "enabled", fallback=False):
+    trace_exporter = otlp.FileExporter(
+        config.settings.get("TRACING", "path", fallback="traces.otlp.jsonl"),
+        max_queue=config.settings.getint("TRACING", "max_queue", fallback=1000),
+    )
+    app.add_middleware(
+        middleware.TracingMiddleware,
+        export=trace_exporter.export,
+        head_sample_ratio=config.settings.getfloat(
+            "TRACING", "head_sample_ratio", fallback=0.01
+        ),
+        tail_latency_threshold=config.settings.getfloat(
+            "TRACING", "tail_latency_threshold", fallback=0.5
+        ),
+        max_spans=config.settings.getint("TRACING", "max_spans", fallback=1000),
+    )
+# Added last so it runs first, its total is the whole time of the request.
+if config.settings.getboolean("SERVER_TIMING", "enabled", fallback=True):
+    app.add_middleware(
+        middleware.ServerTimingMiddleware,
+        header=config.settings.getboolean("SERVER_TIMING", "header", fallback=False),
+        access_log=config.settings.getboolean(
+            "SERVER_TIMING", "access_log", fallback=True
+        ),
+    )
+
+
+@app.exception_handler(db.BucketMovedError)
+async def bucket_moved(
+    request: fastapi.Request, exc: db.BucketMovedError
+) -> json_responses.FastJSONResponse:
+    # The shard map is read again, or the move of the bucket ends, soon.
+    return json_responses.FastJSONResponse(
+        {"detail": str(exc)},
+        status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
 
-app = fastapi.FastAPI()
+
+app.include_router(admin.controller)
+app.include_router(auth.controller)
 app.include_router(users.controller)
 app.include_router(skills.router)
+app.include_router(skills.user_skills_router)
+
+# Starts the notification listener and restarts it if its connection is lost.
+_notification_listener_keeper = tasks.PeriodicTask(
+    db.notification_listener.start, 5.0, name="notification_listener"
+)
+
+_idempotency_key_cleaner = tasks.PeriodicTask(
+    middleware.idempotency.delete_expired_keys,
+    config.settings.getfloat("IDEMPOTENCY", "cleanup_interval", fallback=3600.0),
+    name="idempotency_key_cleaner",
+)
+
+_trace_exporter_flusher: Optional[tasks.PeriodicTask] = None
+if trace_exporter is not None:
+    _trace_exporter_flusher = tasks.PeriodicTask(
+        trace_exporter.flush,
+        config.settings.getfloat("TRACING", "flush_interval", fallback=1.0),
+        name="trace_exporter",
+    )
+
+
+@app.on_event("startup")
+async def check_settings():
+    # Refuses to start rather than sign tokens that anyone could forge.
+    auth.service.check_secret_key()
+
+
+@app.on_event("startup")
+async def start_periodic_tasks():
+    _notification_listener_keeper.start(run_first=True)
+    skills.skill_stats_flusher.start()
+    skills.skill_stats_reconciler.start()
+    users.service.last_login_flusher.start()
+    _idempotency_key_cleaner.start()
+    if _trace_exporter_flusher is not None:
+        _trace_exporter_flusher.start()
+    if config.settings.getboolean("LOOP_WATCHDOG", "enabled", fallback=False):
+        admin.service.loop_watchdog.start()
+
+
+@app.on_event("shutdown")
+async def stop_periodic_tasks():
+    await skills.skill_stats_reconciler.stop()
+    await skills.skill_stats_flusher.stop(run_last=True)
+    await users.service.last_login_flusher.stop(run_last=True)
+    await _idempotency_key_cleaner.stop()
+    if _trace_exporter_flusher is not None:
+        await _trace_exporter_flusher.stop(run_last=True)
+    await admin.service.loop_watchdog.stop()
+    await _notification_listener_keeper.stop()
+    await db.notification_listener.stop()
 
 
 @app.get("/")
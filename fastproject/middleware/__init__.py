@@ -0,0 +1,29 @@
+"""Init module."""
+
+from .deadlines import DeadlineMiddleware, route_timeouts_from_settings
+from .idempotency import IdempotencyMiddleware
+from .load_shedding import (
+    LoadSheddingMiddleware,
+    RouteLimit,
+    Signal,
+    route_limits_from_settings,
+)
+from .profiling import ProfilingMiddleware
+from .routing import DEFAULT_ROUTE, route_key
+from .timing import ServerTimingMiddleware
+from .tracing import TracingMiddleware
+
+__all__ = [
+    "DEFAULT_ROUTE",
+    "DeadlineMiddleware",
+    "IdempotencyMiddleware",
+    "LoadSheddingMiddleware",
+    "ProfilingMiddleware",
+    "RouteLimit",
+    "ServerTimingMiddleware",
+    "Signal",
+    "TracingMiddleware",
+    "route_key",
+    "route_limits_from_settings",
+    "route_timeouts_from_settings",
+]
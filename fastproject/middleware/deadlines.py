@@ -0,0 +1,129 @@
+"""Deadlines of the requests, from a header or a per-route default.
+
+The deadline is set in utils.deadlines.current_deadline while the request is
+handled, so the database connections and the password hashes it waits for are
+given up once the client stopped waiting. A request whose deadline passed
+before a response was started gets 504 Gateway Timeout.
+"""
+
+import json
+import logging
+from collections.abc import Mapping
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .. import config
+from ..utils import deadlines
+from .routing import DEFAULT_ROUTE, route_key
+
+logger = logging.getLogger(__name__)
+
+# The header a client sends its own timeout in, in seconds.
+TIMEOUT_HEADER = "x-request-timeout"
+
+
+def route_timeouts_from_settings() -> dict[str, float]:
+    """
+    Returns the timeouts configured in the sections [DEADLINES] (the one of
+    DEFAULT_ROUTE) and [DEADLINES.ROUTES], whose keys are free names and whose
+    values are "<METHOD> <path format>, <seconds>", for instance:
+
+      create_user = POST /users, 5
+    """
+    timeouts = {
+        DEFAULT_ROUTE: config.settings.getfloat(
+            "DEADLINES", "default_timeout", fallback=10.0
+        )
+    }
+    if config.settings.has_section("DEADLINES.ROUTES"):
+        for timeout in config.settings["DEADLINES.ROUTES"].values():
+            route, seconds = timeout.rsplit(",", 1)
+            method, path = route.split()
+            timeouts[f"{method.upper()} {path}"] = float(seconds)
+    return timeouts
+
+
+def _header_timeout(scope: Scope, header: str) -> Optional[float]:
+    value = Headers(scope=scope).get(header)
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that sets the deadline of every request.
+
+    The timeout of a request is the one of its route, or the one sent by the
+    client in the header, whichever is shorter.
+
+    Args:
+      app: The ASGI application.
+      route_timeouts: The timeout of every route in seconds, keyed by
+        "<METHOD> <path format>". The one of DEFAULT_ROUTE, if any, is the
+        timeout of the other routes.
+      header: The header with the timeout of the client, in seconds.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        route_timeouts: Optional[Mapping[str, float]] = None,
+        header: str = TIMEOUT_HEADER,
+    ):
+        self.app = app
+        self.route_timeouts = dict(route_timeouts or {})
+        self.header = header.lower()
+
+    def timeout(self, scope: Scope) -> Optional[float]:
+        """Returns the timeout of a request, None if it has none."""
+        timeouts = [
+            timeout
+            for timeout in (
+                self.route_timeouts.get(route_key(scope, self.app))
+                or self.route_timeouts.get(DEFAULT_ROUTE),
+                _header_timeout(scope, self.header),
+            )
+            if timeout is not None
+        ]
+        return min(timeouts, default=None)
+
+    async def _reject(self, send: Send) -> None:
+        body = json.dumps({"detail": "The request deadline was exceeded."}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        with deadlines.use_deadline(self.timeout(scope)):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except deadlines.DeadlineExceededError:
+                if response_started:
+                    raise
+                logger.info("Deadline exceeded: %s %s", scope["method"], scope["path"])
+                await self._reject(send)
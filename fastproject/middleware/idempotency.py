@@ -0,0 +1,389 @@
+"""Idempotency keys, so the retries of a request do not run it again.
+
+A client sends a unique Idempotency-Key header with a request it may retry,
+for instance POST /users on a flaky network. The first request with a key
+claims it in the table idempotency_key and its response is stored there. A
+retry with the same key gets the stored response without running the request
+again, and a retry that arrives while the first request is still running
+waits for its response instead of doing the same work concurrently.
+
+A key is bound to the request that claimed it (its fingerprint): a request
+with a used key and another method, path or body gets 422 Unprocessable
+Entity. The responses that may change if the request is retried are not
+stored (5xx, 408, 429, 401 and 403), the key is released so a retry runs the
+request again.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+from collections.abc import Collection
+from typing import Optional
+
+import asyncpg
+import asyncpg.pool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .. import config, db
+from ..utils import deadlines
+from .routing import route_key
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+# The header added to the stored responses when they are replayed.
+REPLAYED_HEADER = "idempotent-replayed"
+# Notified with the key when a key is completed or released.
+KEY_DONE_CHANNEL = "idempotency_key_done"
+MAX_KEY_LENGTH = 255
+
+_NOT_STORED_STATUS_CODES = frozenset((401, 403, 408, 429))
+
+# The events the requests waiting for a key in this worker wait on, by key.
+_done_events: dict[str, asyncio.Event] = {}
+
+
+def _on_key_done(payload: Optional[str]) -> None:
+    if payload is None:
+        # Notifications may have been lost, the waiters check their keys.
+        events = list(_done_events.values())
+        _done_events.clear()
+    else:
+        event = _done_events.pop(payload, None)
+        events = [] if event is None else [event]
+    for event in events:
+        event.set()
+
+
+db.notification_listener.subscribe(KEY_DONE_CHANNEL, _on_key_done)
+
+
+@dataclasses.dataclass
+class IdempotencyKey:
+    """A key claimed by another request, and its response if it is done."""
+
+    fingerprint: bytes
+    status_code: Optional[int]
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+    @property
+    def done(self) -> bool:
+        return self.status_code is not None
+
+
+@db.with_connection
+async def claim_key(
+    conn: asyncpg.pool.PoolAcquireContext,
+    key: str,
+    fingerprint: bytes,
+    lock_timeout: float,
+) -> Optional[IdempotencyKey]:
+    """Claims a key for a request.
+
+    Args:
+      key: The idempotency key.
+      fingerprint: The fingerprint of the request.
+      lock_timeout: The seconds the key is held for the request at most, a
+        retry can claim it afterwards, if the request did not complete it.
+
+    Returns:
+      None if the key was claimed, or the IdempotencyKey of the request that
+      holds it.
+    """
+    while True:
+        claimed = await conn.fetchval(
+            """
+            INSERT INTO idempotency_key (idempotency_key, fingerprint, expires_at)
+                 VALUES ($1, $2, now() + make_interval(secs => $3))
+            ON CONFLICT (idempotency_key) DO UPDATE
+                    SET fingerprint = EXCLUDED.fingerprint,
+                        status_code = NULL,
+                        headers = NULL,
+                        body = NULL,
+                        created_at = now(),
+                        expires_at = EXCLUDED.expires_at
+                  WHERE idempotency_key.expires_at < now()
+              RETURNING TRUE
+            """,
+            key,
+            fingerprint,
+            lock_timeout,
+        )
+        if claimed:
+            return None
+        record = await conn.fetchrow(
+            "SELECT fingerprint, status_code, headers, body "
+            "FROM idempotency_key WHERE idempotency_key = $1",
+            key,
+        )
+        # Otherwise the key was released meanwhile, it can be claimed again.
+        if record is not None:
+            return IdempotencyKey(
+                fingerprint=record["fingerprint"],
+                status_code=record["status_code"],
+                headers=[
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in json.loads(record["headers"] or "[]")
+                ],
+                body=record["body"] or b"",
+            )
+
+
+@db.with_connection
+async def complete_key(
+    conn: asyncpg.pool.PoolAcquireContext,
+    key: str,
+    status_code: int,
+    headers: list[tuple[bytes, bytes]],
+    body: bytes,
+    ttl: float,
+) -> None:
+    """Stores the response of the request that claimed a key.
+
+    Args:
+      key: The idempotency key.
+      status_code: The status code of the response.
+      headers: The headers of the response.
+      body: The body of the response.
+      ttl: The seconds the response is stored.
+    """
+    await conn.execute(
+        """
+        WITH completed AS (
+               UPDATE idempotency_key
+                  SET status_code = $2,
+                      headers = $3::jsonb,
+                      body = $4,
+                      expires_at = now() + make_interval(secs => $5)
+                WHERE idempotency_key = $1
+            RETURNING idempotency_key
+        )
+        SELECT pg_notify($6, idempotency_key) FROM completed
+        """,
+        key,
+        status_code,
+        json.dumps(
+            [
+                (name.decode("latin-1"), value.decode("latin-1"))
+                for name, value in headers
+            ]
+        ),
+        body,
+        ttl,
+        KEY_DONE_CHANNEL,
+    )
+
+
+@db.with_connection
+async def release_key(conn: asyncpg.pool.PoolAcquireContext, key: str) -> None:
+    """Releases a key whose request did not complete, so it can be claimed again."""
+    await conn.execute(
+        """
+        WITH released AS (
+            DELETE FROM idempotency_key
+                  WHERE idempotency_key = $1 AND status_code IS NULL
+              RETURNING idempotency_key
+        )
+        SELECT pg_notify($2, idempotency_key) FROM released
+        """,
+        key,
+        KEY_DONE_CHANNEL,
+    )
+
+
+@db.with_connection(lane=db.lanes.BULK)
+async def delete_expired_keys(conn: asyncpg.pool.PoolAcquireContext) -> int:
+    """Deletes the expired keys, returns how many were deleted."""
+    result = await conn.execute("DELETE FROM idempotency_key WHERE expires_at < now()")
+    return int(result.split()[-1])
+
+
+def fingerprint(scope: Scope, body: bytes) -> bytes:
+    """Returns the fingerprint of a request: its method, path, query and body."""
+    digest = hashlib.sha256()
+    for part in (
+        scope["method"].encode("ascii"),
+        scope["path"].encode("utf-8"),
+        scope["query_string"],
+    ):
+        digest.update(part)
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.digest()
+
+
+async def _read_body(receive: Receive) -> Optional[bytes]:
+    """Returns the body of a request, None if the client disconnected."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send_json(send: Send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def routes_from_settings() -> frozenset[str]:
+    """
+    Returns the routes configured in [IDEMPOTENCY] routes, separated by commas,
+    for instance "POST /users, POST /skills".
+    """
+    routes = config.settings.get(
+        "IDEMPOTENCY", "routes", fallback="POST /users, POST /skills"
+    )
+    return frozenset(
+        f"{method.upper()} {path}"
+        for method, path in (route.split() for route in routes.split(",") if route)
+    )
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware that honors the Idempotency-Key header of some routes.
+
+    Args:
+      app: The ASGI application.
+      routes: The routes that honor the header, "<METHOD> <path format>".
+      ttl: The seconds the response of a key is stored.
+      lock_timeout: The seconds a key is held for the request that claimed it
+        at most, in case its worker died before completing it.
+      poll_interval: The seconds a request waiting for a key checks it again
+        at most, in case its notification was missed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: Collection[str],
+        ttl: float = 86400.0,
+        lock_timeout: float = 60.0,
+        poll_interval: float = 1.0,
+    ):
+        self.app = app
+        self.routes = frozenset(routes)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.replayed = 0
+
+    async def _wait_for_key(self, key: str) -> None:
+        deadlines.check()
+        timeout = deadlines.remaining()
+        if timeout is None or timeout > self.poll_interval:
+            timeout = self.poll_interval
+        event = _done_events.setdefault(key, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _replay(self, send: Send, claimed: IdempotencyKey) -> None:
+        self.replayed += 1
+        await send(
+            {
+                "type": "http.response.start",
+                "status": claimed.status_code,
+                "headers": [*claimed.headers, (REPLAYED_HEADER.encode(), b"true")],
+            }
+        )
+        await send({"type": "http.response.body", "body": claimed.body})
+
+    async def _run(self, key: str, scope: Scope, receive: Receive, send: Send) -> None:
+        """Runs the request that claimed the key and stores its response."""
+        start: Optional[Message] = None
+        chunks: list[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+            status_code = start["status"] if start is not None else 500
+            if status_code < 500 and status_code not in _NOT_STORED_STATUS_CODES:
+                # The response is stored even if the deadline passed meanwhile.
+                with deadlines.without_deadline():
+                    await complete_key(
+                        key,
+                        status_code,
+                        list(start.get("headers", [])),
+                        b"".join(chunks),
+                        self.ttl,
+                    )
+                stored = True
+        finally:
+            if not stored:
+                try:
+                    with deadlines.without_deadline():
+                        await release_key(key)
+                except Exception:  # pylint: disable=broad-except
+                    # The key is released when its lock times out.
+                    logger.exception("Could not release the idempotency key.")
+            _on_key_done(key)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or route_key(scope, self.app) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            await _send_json(
+                send,
+                400,
+                f"The Idempotency-Key must have 1 to {MAX_KEY_LENGTH} characters.",
+            )
+            return
+        body = await _read_body(receive)
+        if body is None:
+            return
+        request_fingerprint = fingerprint(scope, body)
+        while True:
+            claimed = await claim_key(key, request_fingerprint, self.lock_timeout)
+            if claimed is not None and claimed.fingerprint != request_fingerprint:
+                await _send_json(
+                    send, 422, "The Idempotency-Key was used by another request."
+                )
+                return
+            if claimed is None:
+                break
+            if claimed.done:
+                await self._replay(send, claimed)
+                return
+            await self._wait_for_key(key)
+        body_sent = False
+
+        async def receive_body() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self._run(key, scope, receive_body, send)
@@ -0,0 +1,252 @@
+"""Per-route concurrency limits with bounded queues and adaptive shedding.
+
+Every route runs at most max_concurrency requests at once, the next ones wait
+in a queue of at most max_queue requests for at most queue_timeout seconds.
+A request that can not run right away is rejected with 503 Service
+Unavailable and a Retry-After header, instead of being queued, when:
+
+- the queue of the route is full,
+- the oldest request in the queue waited longer than queue_wait_target, or
+- a saturation signal, like the time spent waiting for a database connection,
+  is above its target.
+
+So under overload the requests that are admitted keep a bounded latency and
+the others fail fast, instead of every client waiting until it times out.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import json
+import time
+from collections.abc import Mapping
+from typing import Callable, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .. import config
+from ..utils import deadlines
+from .routing import DEFAULT_ROUTE, route_key
+
+
+@dataclasses.dataclass(frozen=True)
+class RouteLimit:
+    """The concurrency limit of a route."""
+
+    max_concurrency: int
+    max_queue: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Signal:
+    """A measure of saturation, like the recent wait for a database connection.
+
+    The requests that can not run right away are shed while value() is above
+    target (in seconds). If routes is not None, only the requests of those
+    routes are shed.
+    """
+
+    value: Callable[[], float]
+    target: float
+    routes: Optional[frozenset[str]] = None
+
+
+def route_limits_from_settings() -> dict[str, RouteLimit]:
+    """
+    Returns the limits configured in the sections [LOAD_SHEDDING] (the one of
+    DEFAULT_ROUTE) and [LOAD_SHEDDING.ROUTES], whose keys are free names and
+    whose values are "<METHOD> <path format>, <max_concurrency>, <max_queue>",
+    for instance:
+
+      create_user = POST /users, 16, 32
+    """
+    limits = {
+        DEFAULT_ROUTE: RouteLimit(
+            max_concurrency=config.settings.getint(
+                "LOAD_SHEDDING", "max_concurrency", fallback=64
+            ),
+            max_queue=config.settings.getint(
+                "LOAD_SHEDDING", "max_queue", fallback=128
+            ),
+        )
+    }
+    if config.settings.has_section("LOAD_SHEDDING.ROUTES"):
+        for limit in config.settings["LOAD_SHEDDING.ROUTES"].values():
+            route, max_concurrency, max_queue = limit.rsplit(",", 2)
+            method, path = route.split()
+            limits[f"{method.upper()} {path}"] = RouteLimit(
+                int(max_concurrency), int(max_queue)
+            )
+    return limits
+
+
+class ConcurrencyLimiter:
+    """Runs at most max_concurrency tasks at once, the next ones wait in a FIFO.
+
+    It is not thread-safe, it is meant to be used from the event loop.
+    """
+
+    def __init__(self, limit: RouteLimit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._queue: collections.deque[tuple[float, asyncio.Future]] = (
+            collections.deque()
+        )
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    def try_acquire(self) -> bool:
+        """Acquires a slot if one is free, without waiting."""
+        if self.in_flight < self.limit.max_concurrency:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        return False
+
+    @property
+    def queue_full(self) -> bool:
+        return self.waiting >= self.limit.max_queue
+
+    def queue_wait(self) -> float:
+        """Returns the seconds the oldest request in the queue has waited."""
+        while self._queue and self._queue[0][1].done():
+            self._queue.popleft()
+        if not self._queue:
+            return 0.0
+        return time.monotonic() - self._queue[0][0]
+
+    async def acquire(self, timeout: float) -> bool:
+        """Waits for a slot at most timeout seconds, returns if it got it."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((time.monotonic(), future))
+        self.queued += 1
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Hands the slot to the oldest waiter, or frees it."""
+        while self._queue:
+            _, future = self._queue.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware that limits the concurrency of every route.
+
+    Args:
+      app: The ASGI application, its routes are matched to find the limit of
+        every request.
+      limits: The limit of every route, keyed by "<METHOD> <path format>", for
+        instance "GET /users/{user_id}". DEFAULT_ROUTE is the limit of the
+        other routes, every route gets its own limiter.
+      signals: The saturation signals, keyed by name.
+      queue_timeout: The seconds a request waits in the queue at most, less if
+        its deadline is sooner.
+      queue_wait_target: Requests are not queued anymore once the oldest
+        request in the queue waited longer than this.
+      retry_after: The value of the header Retry-After, in seconds.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: Mapping[str, RouteLimit],
+        signals: Optional[Mapping[str, Signal]] = None,
+        queue_timeout: float = 1.0,
+        queue_wait_target: float = 0.1,
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.limits = dict(limits)
+        self.signals = dict(signals or {})
+        self.queue_timeout = queue_timeout
+        self.queue_wait_target = queue_wait_target
+        self.retry_after = retry_after
+        self.limiters: dict[str, ConcurrencyLimiter] = {}
+
+    def _limiter(self, route_key: str) -> ConcurrencyLimiter:
+        limiter = self.limiters.get(route_key)
+        if limiter is None:
+            limit = self.limits.get(route_key) or self.limits[DEFAULT_ROUTE]
+            limiter = self.limiters[route_key] = ConcurrencyLimiter(limit)
+        return limiter
+
+    def saturated_signals(self, route_key: str) -> list[str]:
+        """Returns the names of the signals of a route above their target."""
+        return [
+            name
+            for name, signal in self.signals.items()
+            if (signal.routes is None or route_key in signal.routes)
+            and signal.value() > signal.target
+        ]
+
+    def _should_shed(self, route_key: str, limiter: ConcurrencyLimiter) -> bool:
+        return (
+            limiter.queue_full
+            or limiter.queue_wait() > self.queue_wait_target
+            or bool(self.saturated_signals(route_key))
+        )
+
+    async def _reject(self, send: Send) -> None:
+        body = json.dumps({"detail": "Service Unavailable, retry later."}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = route_key(scope, self.app)
+        limiter = self._limiter(key)
+        if not limiter.try_acquire():
+            # A request does not wait in the queue beyond its deadline.
+            timeout = deadlines.remaining()
+            if timeout is None or timeout > self.queue_timeout:
+                timeout = self.queue_timeout
+            if self._should_shed(key, limiter) or not await limiter.acquire(timeout):
+                limiter.shed += 1
+                await self._reject(send)
+                return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Returns the counters of every route."""
+        return {key: limiter.stats() for key, limiter in self.limiters.items()}
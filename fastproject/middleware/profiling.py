@@ -0,0 +1,88 @@
+"""Profiles of the requests that ask for one, see utils.profiling.
+
+A request with the X-Profile header runs under a profiler if authorize lets
+it (for instance, its user has a permission), and its response carries the
+X-Profile-Id of the profile, which is saved in a ProfileStore. The value of
+the header picks the profiler: "sampling" for SamplingProfiler, anything else
+for DeterministicProfiler.
+
+One request is profiled at a time, the profilers measure the whole thread of
+the event loop. The requests without the header, or that are not authorized,
+or that arrive while another one is profiled, run as usual; the only work
+done for them is looking for the header.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils import profiling
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "x-profile-id"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles the requests with the X-Profile header.
+
+    Args:
+      app: The ASGI application.
+      store: Where the profiles are saved.
+      authorize: Called with the headers of a request that asks for a profile,
+        returns if it may be profiled.
+      sample_interval: The seconds between the samples of SamplingProfiler.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: profiling.ProfileStore,
+        authorize: Callable[[Headers], Awaitable[bool]],
+        sample_interval: float = 0.001,
+    ):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.sample_interval = sample_interval
+        self._lock = asyncio.Lock()
+        self._header = PROFILE_HEADER.encode()
+
+    def _profiler(self, mode: str) -> profiling.Profiler:
+        if mode.strip().lower() == "sampling":
+            return profiling.SamplingProfiler(self.sample_interval)
+        return profiling.DeterministicProfiler()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(
+            name == self._header for name, _ in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        # Not awaiting between the check and the acquire, nobody takes the lock.
+        if not await self.authorize(headers) or self._lock.locked():
+            await self.app(scope, receive, send)
+            return
+        async with self._lock:
+            profile_id = self.store.new_profile_id()
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (PROFILE_ID_HEADER.encode(), profile_id.encode()),
+                        ],
+                    }
+                await send(message)
+
+            profiler = self._profiler(headers[PROFILE_HEADER])
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.stop()
+                await asyncio.to_thread(self.store.save, profile_id, profiler)
@@ -0,0 +1,30 @@
+"""The routes of the requests seen by the middleware."""
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Scope
+
+# The key of the requests that match no route.
+DEFAULT_ROUTE = "*"
+
+# Where the route key is kept in the scope, so it is matched once per request.
+_SCOPE_KEY = "fastproject.route_key"
+
+
+def route_key(scope: Scope, app: ASGIApp) -> str:
+    """Returns "<METHOD> <path format>" of the route of a request.
+
+    The routes are the ones of the application of the scope, or of app if the
+    scope has none, for instance "GET /users/{user_id}". It is DEFAULT_ROUTE if
+    no route matches.
+    """
+    if _SCOPE_KEY in scope:
+        return scope[_SCOPE_KEY]
+    key = DEFAULT_ROUTE
+    router = getattr(scope.get("app"), "router", None) or getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            key = f"{scope['method']} {route.path_format}"
+            break
+    scope[_SCOPE_KEY] = key
+    return key
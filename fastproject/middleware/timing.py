@@ -0,0 +1,86 @@
+"""The Server-Timing header and the access log of the requests.
+
+The phases measured with utils.timing while a request is handled can be sent
+in the Server-Timing header of its response, along with the total, for
+instance:
+
+  Server-Timing: validate;dur=0.412, hash;dur=48.120, sql;dur=2.051, total;dur=52.3
+
+The header is off by default, the phases tell the clients how the server
+spends its time.
+
+Once the response is sent, a line with the route, the status, the duration
+and the phases of the request (and how many times each one ran), encoded as
+JSON, is written to the access log.
+"""
+
+import json
+import logging
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils import timing
+from .routing import route_key
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = "server-timing"
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that reports the phases of every request.
+
+    Args:
+      app: The ASGI application.
+      header: If True, the phases are sent in the Server-Timing header.
+      access_log: If True, every request is written to the access log.
+    """
+
+    def __init__(self, app: ASGIApp, header: bool = False, access_log: bool = True):
+        self.app = app
+        self.header = header
+        self.access_log = access_log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.header:
+                    value = timings.server_timing(total=time.perf_counter() - start)
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (SERVER_TIMING_HEADER.encode(), value.encode("ascii")),
+                        ],
+                    }
+            await send(message)
+
+        with timing.use_timings() as timings:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if self.access_log and logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        json.dumps(
+                            {
+                                "method": scope["method"],
+                                "route": route_key(scope, self.app),
+                                "path": scope["path"],
+                                "status": status,
+                                "duration_ms": round(
+                                    (time.perf_counter() - start) * 1000, 3
+                                ),
+                                "phases": timings.milliseconds(),
+                                "counts": timings.counts,
+                            }
+                        )
+                    )
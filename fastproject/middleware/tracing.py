@@ -0,0 +1,112 @@
+"""The root spans of the traces of the requests, see utils.tracing.
+
+A request that sends a valid traceparent header continues the trace of the
+client, the others start a new trace. Every trace is recorded while the
+request is handled, and once it ends it is exported if it was sampled:
+
+- head-based: when it started, the client sampled it (the sampled flag of
+  traceparent) or it was picked at random with head_sample_ratio, or
+- tail-based: it was slower than tail_latency_threshold, or it failed (an
+  exception or a 5xx response), so the slow and failed requests are always
+  kept.
+"""
+
+import random
+from collections.abc import Callable
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..utils import tracing
+from .routing import route_key
+
+TRACEPARENT_HEADER = "traceparent"
+
+
+class TracingMiddleware:
+    """ASGI middleware that runs every request in the root span of a trace.
+
+    Args:
+      app: The ASGI application.
+      export: Called with every sampled trace once it ended, for instance
+        utils.otlp.FileExporter.export.
+      head_sample_ratio: The ratio of the traces sampled when they start.
+      tail_latency_threshold: The traces slower than this, in seconds, are
+        sampled when they end. If None, they are not.
+      max_spans: The spans recorded per trace at most.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        export: Callable[[tracing.Trace], None],
+        head_sample_ratio: float = 0.01,
+        tail_latency_threshold: Optional[float] = 0.5,
+        max_spans: int = 1000,
+    ):
+        self.app = app
+        self.export = export
+        self.head_sample_ratio = head_sample_ratio
+        self.tail_latency_threshold = tail_latency_threshold
+        self.max_spans = max_spans
+        self.traces = 0
+        self.exported = 0
+
+    def _tail_sampled(self, root: tracing.Span) -> bool:
+        if root.status_code == tracing.STATUS_ERROR:
+            return True
+        return (
+            self.tail_latency_threshold is not None
+            and root.duration >= self.tail_latency_threshold
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        parent = tracing.parse_traceparent(Headers(scope=scope).get(TRACEPARENT_HEADER))
+        if parent is None:
+            trace_id, parent_span_id = tracing.new_trace_id(), None
+            sampled = random.random() < self.head_sample_ratio
+        else:
+            trace_id, parent_span_id, sampled = parent
+        trace = tracing.Trace(trace_id, sampled, self.max_spans)
+        route = route_key(scope, self.app)
+        root = tracing.Span(
+            trace,
+            route,
+            parent_span_id,
+            tracing.SERVER,
+            {
+                "http.request.method": scope["method"],
+                "http.route": route,
+                "url.path": scope["path"],
+            },
+        )
+        trace.add(root)
+        self.traces += 1
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                root.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    root.set_error()
+            await send(message)
+
+        token = tracing.current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            root.set_error(f"{type(exc).__qualname__}: {exc}")
+            raise
+        finally:
+            tracing.current_span.reset(token)
+            root.end()
+            trace.ended = True
+            if trace.dropped_spans:
+                root.set_attribute("fastproject.dropped_spans", trace.dropped_spans)
+            if trace.sampled or self._tail_sampled(root):
+                self.exported += 1
+                self.export(trace)
@@ -0,0 +1,10 @@
+"""Init module."""
+
+from . import models, service
+from .controller import controller
+
+__all__ = [
+    "controller",
+    "models",
+    "service",
+]
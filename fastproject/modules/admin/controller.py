@@ -0,0 +1,70 @@
+"""Controller module."""
+
+import fastapi
+
+from ...utils import http_responses, json_responses
+from ..permissions import require_permission
+from . import models, service
+
+controller = fastapi.APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    route_class=json_responses.FastJSONRoute,
+    dependencies=[fastapi.Depends(require_permission("admin.view_diagnostics"))],
+)
+
+
+@controller.get(
+    "/event-loop",
+    response_model=models.EventLoopReport,
+    status_code=fastapi.status.HTTP_200_OK,
+)
+async def get_event_loop_report(
+    limit: int = fastapi.Query(20, ge=1, le=100)
+) -> models.EventLoopReport:
+    return models.EventLoopReport(**service.get_event_loop_report(limit))
+
+
+@controller.delete("/event-loop", status_code=fastapi.status.HTTP_204_NO_CONTENT)
+async def reset_event_loop_report() -> fastapi.Response:
+    service.reset_event_loop_report()
+    return fastapi.Response(status_code=fastapi.status.HTTP_204_NO_CONTENT)
+
+
+@controller.get(
+    "/profiles",
+    response_model=list[models.Profile],
+    status_code=fastapi.status.HTTP_200_OK,
+)
+async def get_profiles() -> list[models.Profile]:
+    return [models.Profile(**profile) for profile in await service.get_profiles()]
+
+
+# The media types of the formats of the profiles.
+_PROFILE_MEDIA_TYPES = {
+    "pstats": "application/octet-stream",
+    "collapsed": "text/plain",
+}
+
+
+@controller.get(
+    "/profiles/{profile_id}",
+    response_class=fastapi.responses.FileResponse,
+    status_code=fastapi.status.HTTP_200_OK,
+    responses={
+        fastapi.status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse,
+    },
+)
+async def download_profile(profile_id: str) -> fastapi.responses.FileResponse:
+    path = await service.get_profile_path(profile_id)
+    if path is None:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_404_NOT_FOUND,
+            detail="Profile not found.",
+        )
+    format_ = path.suffix[1:]
+    return fastapi.responses.FileResponse(
+        path,
+        media_type=_PROFILE_MEDIA_TYPES.get(format_, "application/octet-stream"),
+        filename=f"{profile_id}.{format_}",
+    )
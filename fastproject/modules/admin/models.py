@@ -0,0 +1,39 @@
+"""Models module."""
+
+import datetime
+
+import pydantic
+
+
+class BlockingSite(pydantic.BaseModel):
+    """Represents a call site that blocked the event loop."""
+
+    call_site: str
+    samples: int
+    blocked_estimate: float
+    blocks: int
+    stack: list[str]
+
+
+class EventLoopReport(pydantic.BaseModel):
+    """Represents the lag of the event loop and the call sites that blocked it."""
+
+    running: bool
+    threshold: float
+    interval: float
+    beats: int
+    lag_mean: float
+    lag_max: float
+    blocks: int
+    blocked_total: float
+    dropped_samples: int
+    sites: list[BlockingSite]
+
+
+class Profile(pydantic.BaseModel):
+    """Represents the profile of a request."""
+
+    profile_id: str
+    format: str
+    size: int
+    created_at: datetime.datetime
@@ -0,0 +1,72 @@
+"""Service module."""
+
+import asyncio
+import pathlib
+from typing import Any, Optional
+
+from starlette.datastructures import Headers
+
+from ... import config
+from ...utils import loop_watchdog as loop_watchdogs
+from ...utils import profiling
+from ..auth import exceptions as auth_exceptions
+from ..auth import service as auth_service
+from ..permissions import service as permissions_service
+
+# The permission to profile a request with the X-Profile header.
+PROFILE_PERMISSION = "admin.profile_requests"
+
+# It is started by the application if [LOOP_WATCHDOG] enabled is true.
+loop_watchdog = loop_watchdogs.LoopWatchdog(
+    threshold=config.settings.getfloat("LOOP_WATCHDOG", "threshold", fallback=0.1),
+    interval=config.settings.getfloat("LOOP_WATCHDOG", "interval", fallback=0.02),
+    stack_depth=config.settings.getint("LOOP_WATCHDOG", "stack_depth", fallback=30),
+    max_sites=config.settings.getint("LOOP_WATCHDOG", "max_sites", fallback=100),
+)
+
+
+def get_event_loop_report(limit: int = 20) -> dict[str, Any]:
+    """Returns the lag of the event loop and the call sites that blocked it.
+
+    Args:
+      limit: The call sites returned at most, the ones sampled most first.
+    """
+    return loop_watchdog.report(limit)
+
+
+def reset_event_loop_report() -> None:
+    """Forgets the lag and the call sites measured so far."""
+    loop_watchdog.reset()
+
+
+# Used by middleware.ProfilingMiddleware if [PROFILING] enabled is true.
+profile_store = profiling.ProfileStore(
+    config.settings.get("PROFILING", "directory", fallback="profiles"),
+    max_profiles=config.settings.getint("PROFILING", "max_profiles", fallback=20),
+)
+
+
+async def can_profile(headers: Headers) -> bool:
+    """
+    Returns if the access token of a request belongs to a user who may
+    profile it, a user with the permission PROFILE_PERMISSION (superusers have
+    every permission).
+    """
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        claims = auth_service.verify_token(token)
+    except auth_exceptions.InvalidTokenError:
+        return False
+    return await permissions_service.has_permission(claims.user_id, PROFILE_PERMISSION)
+
+
+async def get_profiles() -> list[dict[str, Any]]:
+    """Returns the kept profiles, the newest first."""
+    return await asyncio.to_thread(profile_store.profiles)
+
+
+async def get_profile_path(profile_id: str) -> Optional[pathlib.Path]:
+    """Returns the file of a profile, None if it is not kept."""
+    return await asyncio.to_thread(profile_store.path, profile_id)
@@ -0,0 +1,15 @@
+"""Init module."""
+
+from . import exceptions, models, repository, service, tokens
+from .controller import controller
+from .dependencies import get_token
+
+__all__ = [
+    "controller",
+    "exceptions",
+    "get_token",
+    "models",
+    "repository",
+    "service",
+    "tokens",
+]
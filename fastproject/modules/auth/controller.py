@@ -0,0 +1,51 @@
+"""Controller module."""
+
+import time
+
+import fastapi
+
+from ...utils import http_responses, json_responses
+from . import dependencies, exceptions, models, service, tokens
+
+controller = fastapi.APIRouter(
+    prefix="/auth", tags=["auth"], route_class=json_responses.FastJSONRoute
+)
+
+
+@controller.post(
+    "/login",
+    response_model=models.AccessToken,
+    status_code=fastapi.status.HTTP_200_OK,
+    responses={
+        fastapi.status.HTTP_401_UNAUTHORIZED: http_responses.UnauthorizedResponse
+    },
+)
+async def login(login_data: models.LoginData) -> models.AccessToken:
+    try:
+        token, claims = await service.login(login_data.username, login_data.password)
+    except exceptions.InvalidCredentialsError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_401_UNAUTHORIZED, detail=str(e)
+        ) from e
+    return models.AccessToken(
+        access_token=token, expires_in=claims.expires_at - int(time.time())
+    )
+
+
+@controller.post(
+    "/logout",
+    status_code=fastapi.status.HTTP_204_NO_CONTENT,
+    responses={
+        fastapi.status.HTTP_503_SERVICE_UNAVAILABLE: http_responses.ServiceUnavailableResponse
+    },
+)
+async def logout(
+    token: tokens.Token = fastapi.Depends(dependencies.get_token),
+) -> fastapi.Response:
+    try:
+        await service.revoke_token(token)
+    except exceptions.DenyListFullError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+        ) from e
+    return fastapi.Response(status_code=fastapi.status.HTTP_204_NO_CONTENT)
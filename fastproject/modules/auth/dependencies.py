@@ -0,0 +1,35 @@
+"""FastAPI dependencies module."""
+
+from typing import Optional
+
+import fastapi
+import fastapi.security
+
+from . import exceptions, service, tokens
+
+_bearer = fastapi.security.HTTPBearer(auto_error=False)
+
+
+async def get_token(
+    credentials: Optional[
+        fastapi.security.HTTPAuthorizationCredentials
+    ] = fastapi.Depends(_bearer),
+) -> tokens.Token:
+    """Returns the claims of the access token sent in the Authorization header.
+
+    The token is verified without touching the database.
+    """
+    if credentials is None:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return service.verify_token(credentials.credentials)
+    except exceptions.InvalidTokenError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        ) from e
@@ -0,0 +1,26 @@
+"""Exceptions module."""
+
+
+class InvalidCredentialsError(ValueError):
+    """Raised when the username or the password of a user are wrong."""
+
+
+class InvalidTokenError(ValueError):
+    """
+    Raised when an access token is malformed, its signature is wrong, it
+    expired or it was revoked.
+    """
+
+
+class DenyListFullError(RuntimeError):
+    """
+    Raised when a token can not be revoked because the deny list is full of
+    revocations that did not expire.
+    """
+
+
+class InsecureSecretKeyError(ValueError):
+    """
+    Raised when the secret key that signs the access tokens is missing, is the
+    placeholder of .env.example or is too short.
+    """
@@ -0,0 +1,18 @@
+"""Models module."""
+
+import pydantic
+
+
+class LoginData(pydantic.BaseModel):
+    """Represents the credentials used by a user to log in."""
+
+    username: str = pydantic.Field(..., description="Username")
+    password: str = pydantic.Field(..., description="Password")
+
+
+class AccessToken(pydantic.BaseModel):
+    """Represents an access token issued to a user."""
+
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
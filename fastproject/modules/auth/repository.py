@@ -0,0 +1,69 @@
+"""Repository module."""
+
+import pathlib
+
+import aiosql
+import asyncpg.pool
+
+from ... import db
+
+_queries = aiosql.from_path(
+    pathlib.Path(__file__).resolve().parent / "sql", db.TracingAsyncPGAdapter
+)
+
+
+@db.with_connection
+async def notify(
+    conn: asyncpg.pool.PoolAcquireContext, channel: str, payload: str
+) -> None:
+    """Sends a notification to the listeners of a channel in every worker.
+
+    Args:
+      conn: A database connection.
+      channel: The name of the channel.
+      payload: The payload of the notification.
+    """
+    await _queries.notify(conn, channel=channel, payload=payload)
+
+
+@db.with_connection
+async def revoke_token(
+    conn: asyncpg.pool.PoolAcquireContext,
+    token_id: bytes,
+    expires_at: int,
+    channel: str,
+    payload: str,
+) -> None:
+    """
+    Stores the revocation of a token and notifies the workers, in a single
+    transaction, so the notification is only sent once it is stored.
+
+    Args:
+      conn: A database connection to shard 0.
+      token_id: The token_id of the token.
+      expires_at: The expiration of the token, as a Unix timestamp.
+      channel: The channel of the notification.
+      payload: The payload of the notification.
+    """
+    async with conn.transaction():
+        await _queries.delete_expired_revoked_tokens(conn)
+        await _queries.insert_revoked_token(
+            conn, token_id=token_id, expires_at=expires_at
+        )
+        await _queries.notify(conn, channel=channel, payload=payload)
+
+
+@db.with_connection
+async def get_revoked_tokens(
+    conn: asyncpg.pool.PoolAcquireContext,
+) -> list[tuple[bytes, int]]:
+    """Returns the token_id and the expiration of the revoked tokens that did
+    not expire, the ones that expire first first.
+
+    Args:
+      conn: A database connection to shard 0.
+    """
+    return [
+        (record["token_id"], record["expires_at"])
+        for record in await _queries.get_revoked_tokens(conn)
+    ]
@@ -0,0 +1,192 @@
+"""Service module."""
+
+import asyncio
+import functools
+import logging
+from typing import Optional
+
+from ... import config, db
+from ...utils import encoding
+from ..permissions import service as permissions_service
+from ..users import password_hashing
+from ..users import repository as users_repository
+from ..users import service as users_service
+from . import exceptions, repository, tokens
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REVOKED_CHANNEL = "token_revoked"
+# Anyone who knows the secret key can forge access tokens.
+MIN_SECRET_KEY_LENGTH = 32
+_PLACEHOLDER_SECRET_KEY = "change-me-to-a-long-random-string"
+
+_deny_list = tokens.DenyList(
+    maxsize=config.settings.getint("SECURITY", "deny_list_size", fallback=100_000)
+)
+_dummy_password_hash: Optional[str] = None
+# The running reloads of the revoked tokens, the event loop only keeps weak
+# references to its tasks.
+_revoked_token_loads: set[asyncio.Task] = set()
+
+
+@functools.lru_cache(maxsize=None)
+def _secret_key() -> bytes:
+    secret_key = config.settings.get("SECURITY", "secret_key", fallback="")
+    if secret_key == _PLACEHOLDER_SECRET_KEY:
+        raise exceptions.InsecureSecretKeyError(
+            "Set [SECURITY] secret_key, it is the placeholder of .env.example."
+        )
+    if len(secret_key.encode()) < MIN_SECRET_KEY_LENGTH:
+        raise exceptions.InsecureSecretKeyError(
+            f"[SECURITY] secret_key must have {MIN_SECRET_KEY_LENGTH} bytes at "
+            "least, for instance a random string of that length."
+        )
+    return secret_key.encode()
+
+
+def check_secret_key() -> None:
+    """Checks the secret key that signs the access tokens.
+
+    Raises:
+      InsecureSecretKeyError: If [SECURITY] secret_key is missing, it is the
+        placeholder of .env.example or it is shorter than
+        MIN_SECRET_KEY_LENGTH bytes.
+    """
+    _secret_key()
+
+
+def _token_ttl() -> int:
+    return config.settings.getint("SECURITY", "token_ttl", fallback=900)
+
+
+def _deny(token_id: bytes, expires_at: int) -> None:
+    try:
+        _deny_list.add(token_id, expires_at)
+    except exceptions.DenyListFullError:
+        # The revocation is stored, the workers that have room still deny it.
+        logger.exception("Could not deny the token %s.", token_id.hex())
+
+
+async def _load_revoked_tokens_in_background() -> None:
+    try:
+        await load_revoked_tokens()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not load the revoked tokens.")
+
+
+def _on_token_revoked(payload: Optional[str]) -> None:
+    if payload is None:
+        # Revocations may have been missed, they are stored.
+        task = asyncio.ensure_future(_load_revoked_tokens_in_background())
+        _revoked_token_loads.add(task)
+        task.add_done_callback(_revoked_token_loads.discard)
+        return
+    token_id, expires_at = payload.split(":")
+    _deny(bytes.fromhex(token_id), int(expires_at))
+
+
+db.notification_listener.subscribe(TOKEN_REVOKED_CHANNEL, _on_token_revoked)
+
+
+async def authenticate(username: str, password: str) -> Optional[users_repository.User]:
+    """Returns the user with the given credentials, None if they are wrong.
+
+    The password is checked in a worker thread, so Argon2 does not block the
+    event loop. When the user does not exist a password is checked anyway, so
+    the response time does not reveal which usernames exist.
+
+    Args:
+      username: The username of the user.
+      password: The password (not hashed) of the user.
+
+    Returns:
+      A users.repository.User, None if the credentials are wrong or the user
+      is not active.
+    """
+    global _dummy_password_hash
+    user = await users_repository.get_user_by_username(encoding.normalize_str(username))
+    if user is None:
+        if _dummy_password_hash is None:
+            _dummy_password_hash = await password_hashing.run_in_thread(
+                password_hashing.make_password, "dummy password"
+            )
+        await password_hashing.run_in_thread(
+            password_hashing.check_password, password, _dummy_password_hash
+        )
+        return None
+    if not await password_hashing.run_in_thread(
+        password_hashing.check_password, password, user.password
+    ):
+        return None
+    if not user.is_active:
+        return None
+    return user
+
+
+async def login(username: str, password: str) -> tuple[str, tokens.Token]:
+    """Authenticates a user and issues an access token.
+
+    Args:
+      username: The username of the user.
+      password: The password (not hashed) of the user.
+
+    Returns:
+      The signed access token and its claims.
+
+    Raises:
+      InvalidCredentialsError: If the credentials are wrong.
+    """
+    user = await authenticate(username, password)
+    if user is None:
+        raise exceptions.InvalidCredentialsError("Invalid username or password.")
+    token, claims = tokens.issue_token(
+        _secret_key(),
+        user.user_id,
+        _token_ttl(),
+        is_staff=user.is_staff,
+        is_superuser=user.is_superuser,
+        permission_version=permissions_service.get_version(),
+    )
+    users_service.record_last_login(user.user_id)
+    return token, claims
+
+
+def verify_token(token: str) -> tokens.Token:
+    """Returns the claims of a valid access token.
+
+    Raises:
+      InvalidTokenError: If the token is not valid or it was revoked.
+    """
+    claims = tokens.verify_token(_secret_key(), token)
+    if claims.token_id in _deny_list:
+        raise exceptions.InvalidTokenError("Revoked token.")
+    return claims
+
+
+async def load_revoked_tokens() -> None:
+    """Adds the stored revocations that did not expire to the deny list."""
+    for token_id, expires_at in await repository.get_revoked_tokens():
+        _deny(token_id, expires_at)
+
+
+async def revoke_token(claims: tokens.Token) -> None:
+    """Revokes a token until it expires.
+
+    The revocation is stored, so the workers that start later or that missed
+    the notification load it, and the workers are notified.
+
+    Raises:
+      DenyListFullError: If the deny list of this worker is full, nothing is
+        revoked then.
+    """
+    if _deny_list.full():
+        raise exceptions.DenyListFullError(
+            f"The deny list holds {_deny_list.maxsize} revocations."
+        )
+    await repository.revoke_token(
+        claims.token_id,
+        claims.expires_at,
+        TOKEN_REVOKED_CHANNEL,
+        f"{claims.token_id.hex()}:{claims.expires_at}",
+    )
+    _deny_list.add(claims.token_id, claims.expires_at)
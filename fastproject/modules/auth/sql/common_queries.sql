@@ -0,0 +1,20 @@
+-- name: notify$
+-- Send a notification with the given payload to the listeners of a channel
+SELECT pg_notify(:channel, :payload);
+
+-- name: delete-expired-revoked-tokens!
+-- Delete the revocations of the tokens that expired
+DELETE FROM revoked_token WHERE expires_at <= EXTRACT(EPOCH FROM now());
+
+-- name: insert-revoked-token!
+-- Insert the revocation of a token, until it expires
+INSERT INTO revoked_token (token_id, expires_at)
+VALUES (:token_id, :expires_at)
+ON CONFLICT (token_id) DO NOTHING;
+
+-- name: get-revoked-tokens
+-- Get the revocations of the tokens that did not expire, the oldest first
+SELECT token_id, expires_at
+  FROM revoked_token
+ WHERE expires_at > EXTRACT(EPOCH FROM now())
+ ORDER BY expires_at;
@@ -0,0 +1,11 @@
+"""Init module."""
+
+from . import bitsets, repository, service
+from .dependencies import require_permission
+
+__all__ = [
+    "bitsets",
+    "repository",
+    "require_permission",
+    "service",
+]
@@ -0,0 +1,86 @@
+"""Bitset encoding of permissions.
+
+Every permission has a stable bit position (permission.bit_position), so a set
+of permissions is a Python int with those bits set, and checking a permission
+is a mask test. Superusers have ALL_PERMISSIONS, the bitset with every bit
+set, which also holds the permissions that are not in the table.
+"""
+
+import uuid
+from collections.abc import Iterable
+
+# Every bit set: -1 & mask == mask for any mask.
+ALL_PERMISSIONS = -1
+
+
+def to_mask(bit_positions: Iterable[int]) -> int:
+    """Returns the bitset with the given bit positions set."""
+    mask = 0
+    for bit_position in bit_positions:
+        mask |= 1 << bit_position
+    return mask
+
+
+class PermissionRegistry:
+    """
+    Maps permission codenames to their masks and holds the precomputed bitset
+    of every group, as read at a given auth_version.
+    """
+
+    __slots__ = ("version", "_codename_masks", "_ggroup_masks")
+
+    def __init__(
+        self,
+        version: int,
+        codename_bits: Iterable[tuple[str, int]],
+        ggroup_bits: Iterable[tuple[uuid.UUID, Iterable[int]]],
+    ):
+        self.version = version
+        self._codename_masks: dict[str, int] = {}
+        for codename, bit_position in codename_bits:
+            self._codename_masks[codename] = self._codename_masks.get(codename, 0) | (
+                1 << bit_position
+            )
+        self._ggroup_masks = {
+            ggroup_id: to_mask(bit_positions)
+            for ggroup_id, bit_positions in ggroup_bits
+        }
+
+    def mask_of(self, codename: str) -> int:
+        """Returns the mask of a permission, 0 if the codename is unknown."""
+        return self._codename_masks.get(codename, 0)
+
+    def user_mask(
+        self,
+        is_superuser: bool,
+        bit_positions: Iterable[int],
+        ggroup_ids: Iterable[uuid.UUID],
+    ) -> int:
+        """
+        Returns the bitset of the effective permissions of a user, that is the
+        bits of the permissions granted to the user OR-ed with the bitsets of
+        the groups of the user. Superusers have every permission,
+        ALL_PERMISSIONS.
+        """
+        if is_superuser:
+            return ALL_PERMISSIONS
+        mask = to_mask(bit_positions)
+        for ggroup_id in ggroup_ids:
+            mask |= self._ggroup_masks.get(ggroup_id, 0)
+        return mask
+
+    def codenames(self, mask: int) -> frozenset[str]:
+        """Returns the codenames of the permissions in a bitset."""
+        return frozenset(
+            codename
+            for codename, codename_mask in self._codename_masks.items()
+            if mask & codename_mask
+        )
+
+
+def has_permission(mask: int, permission_mask: int) -> bool:
+    """
+    Returns True if the bitset mask contains the permission. ALL_PERMISSIONS
+    contains every permission, even the unknown ones (permission_mask 0).
+    """
+    return mask == ALL_PERMISSIONS or mask & permission_mask != 0
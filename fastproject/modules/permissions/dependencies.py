@@ -0,0 +1,36 @@
+"""FastAPI dependencies module."""
+
+from collections.abc import Awaitable
+from typing import Callable
+
+import fastapi
+
+from ..auth import dependencies as auth_dependencies
+from ..auth import tokens
+from . import service
+
+
+def require_permission(codename: str) -> Callable[..., Awaitable[None]]:
+    """
+    Returns a FastAPI dependency that rejects the request if the authenticated
+    user does not have the permission with the given codename. Example:
+
+      @router.post("", dependencies=[fastapi.Depends(require_permission("skills.add"))])
+
+    The user is taken from the access token, but the permissions are always
+    the current ones of the user (superusers have every permission), not the
+    flags of the token, so a demoted or deactivated superuser is rejected.
+    Once the permissions of the user are cached, the check does not touch the
+    database.
+    """
+
+    async def dependency(
+        token: tokens.Token = fastapi.Depends(auth_dependencies.get_token),
+    ) -> None:
+        if not await service.has_permission(token.user_id, codename):
+            raise fastapi.HTTPException(
+                status_code=fastapi.status.HTTP_403_FORBIDDEN,
+                detail="Permission denied.",
+            )
+
+    return dependency
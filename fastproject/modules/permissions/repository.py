@@ -0,0 +1,78 @@
+"""Repository module."""
+
+import dataclasses
+import pathlib
+import uuid
+from typing import Optional
+
+import aiosql
+import asyncpg.pool
+
+from ... import db
+from . import bitsets
+
+_queries = aiosql.from_path(
+    pathlib.Path(__file__).resolve().parent / "sql", db.TracingAsyncPGAdapter
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class UserPermissionBits:
+    """Represents what is needed to compute the effective permissions of a user."""
+
+    version: int
+    is_superuser: Optional[bool]
+    bit_positions: list[int]
+    ggroup_ids: list[uuid.UUID]
+
+    @property
+    def is_active(self) -> bool:
+        return self.is_superuser is not None
+
+
+@db.with_connection
+async def get_user_permission_bits(
+    conn: asyncpg.pool.PoolAcquireContext, user_id: uuid.UUID
+) -> UserPermissionBits:
+    """
+    Returns the bit positions of the permissions granted directly to the user
+    with the specified user_id and the groups of the user, read with a single
+    query.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user.
+
+    Returns:
+      A UserPermissionBits. If the user does not exist or is not active,
+      is_superuser is None.
+    """
+    searched = await _queries.get_user_permission_bits(conn, uuser_id=user_id)
+    return UserPermissionBits(
+        version=searched["version"],
+        is_superuser=searched["is_superuser"],
+        bit_positions=searched["bit_positions"],
+        ggroup_ids=searched["ggroup_ids"],
+    )
+
+
+@db.with_connection
+async def get_permission_registry(
+    conn: asyncpg.pool.PoolAcquireContext,
+) -> bitsets.PermissionRegistry:
+    """
+    Returns a PermissionRegistry with the bit positions of every permission and
+    the bitsets of every group, read from the same snapshot.
+
+    Args:
+      conn: A database connection.
+    """
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        version = await _queries.get_auth_version(conn)
+        codename_bits = await _queries.get_permission_bits(conn)
+        ggroup_bits = await _queries.get_ggroup_permission_bits(conn)
+    return bitsets.PermissionRegistry(
+        version,
+        ((record["codename"], record["bit_position"]) for record in codename_bits),
+        ((record["ggroup_id"], record["bit_positions"]) for record in ggroup_bits),
+    )
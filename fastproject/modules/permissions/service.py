@@ -0,0 +1,93 @@
+"""Service module."""
+
+import uuid
+from typing import Optional
+
+from ... import config, db
+from ...utils import caches
+from . import bitsets, repository
+
+AUTH_CHANGED_CHANNEL = "auth_changed"
+
+# Caches the permission bitset (a single int) of every user. It is cleared
+# whenever the auth_version changes, so entries do not carry their version.
+_cache = caches.LRUCache(
+    maxsize=config.settings.getint("PERMISSIONS", "cache_size", fallback=100_000),
+    ttl=config.settings.getfloat("PERMISSIONS", "cache_ttl", fallback=300.0),
+)
+# The highest auth_version seen.
+_version = 0
+_registry: Optional[bitsets.PermissionRegistry] = None
+
+
+def _on_auth_changed(payload: Optional[str]) -> None:
+    global _version
+    _cache.clear()
+    if payload is not None:
+        _version = max(_version, int(payload))
+
+
+db.notification_listener.subscribe(AUTH_CHANGED_CHANNEL, _on_auth_changed)
+
+
+async def get_registry(min_version=0) -> bitsets.PermissionRegistry:
+    """
+    Returns the PermissionRegistry, it is read again from the database if it
+    is older than min_version.
+    """
+    global _registry
+    if _registry is None or _registry.version < min_version:
+        _registry = await repository.get_permission_registry()
+    return _registry
+
+
+async def get_user_mask(user_id: uuid.UUID) -> int:
+    """Returns the bitset of the effective permissions of a user.
+
+    The bitsets are cached per user and they are only computed again when
+    they are not cached or when the auth_version changed since they were
+    cached.
+
+    Args:
+      user_id: The user_id of the user.
+    """
+    global _version
+    mask = _cache.get(user_id)
+    if mask is not None:
+        return mask
+    bits = await repository.get_user_permission_bits(user_id)
+    _version = max(_version, bits.version)
+    registry = await get_registry(bits.version)
+    if not bits.is_active:
+        mask = 0
+    else:
+        mask = registry.user_mask(
+            bits.is_superuser, bits.bit_positions, bits.ggroup_ids
+        )
+    # Without the listener, invalidations would go unnoticed. And a newer
+    # version may have been notified while the bits were read.
+    if db.notification_listener.listening and bits.version >= _version:
+        _cache.set(user_id, mask)
+    return mask
+
+
+async def get_user_permissions(user_id: uuid.UUID) -> frozenset[str]:
+    """Returns the codenames of the effective permissions of a user."""
+    mask = await get_user_mask(user_id)
+    return (await get_registry()).codenames(mask)
+
+
+async def has_permission(user_id: uuid.UUID, codename: str) -> bool:
+    """Returns True if the user has the permission with the given codename."""
+    mask = await get_user_mask(user_id)
+    return bitsets.has_permission(mask, (await get_registry()).mask_of(codename))
+
+
+def get_version() -> int:
+    """Returns the highest auth_version seen by this worker."""
+    return _version
+
+
+def cache_stats() -> dict[str, int]:
+    """Returns the hit, miss and eviction counters of the permissions cache."""
+    return {**_cache.stats(), "version": _version}
@@ -0,0 +1,44 @@
+-- name: get-user-permission-bits^
+-- Get what is needed to compute the effective permissions of the user with the
+-- given uuser_id: the bit positions of the permissions granted directly to the
+-- user, the groups of the user and the auth_version they were read at.
+-- is_superuser is NULL if the user does not exist or is not active.
+  WITH target AS (
+           SELECT is_superuser
+             FROM uuser_directory
+            WHERE uuser_id = :uuser_id
+              AND is_active
+       )
+SELECT (SELECT version FROM auth_version) AS version,
+       (SELECT is_superuser FROM target) AS is_superuser,
+       ARRAY(
+           SELECT permission.bit_position
+             FROM uuser_permission
+             JOIN permission
+               ON permission.permission_id = uuser_permission.permission_id
+            WHERE uuser_permission.uuser_id = :uuser_id
+       ) AS bit_positions,
+       ARRAY(
+           SELECT uuser_ggroup.ggroup_id
+             FROM uuser_ggroup
+            WHERE uuser_ggroup.uuser_id = :uuser_id
+       ) AS ggroup_ids;
+
+
+-- name: get-auth-version$
+-- Get the current auth_version
+SELECT version FROM auth_version;
+
+
+-- name: get-permission-bits
+-- Get the bit position of every permission
+SELECT codename, bit_position FROM permission;
+
+
+-- name: get-ggroup-permission-bits
+-- Get the bit positions of the permissions of every group
+  SELECT ggroup_permission.ggroup_id,
+         array_agg(permission.bit_position) AS bit_positions
+    FROM ggroup_permission
+    JOIN permission ON permission.permission_id = ggroup_permission.permission_id
+GROUP BY ggroup_permission.ggroup_id;
@@ -1 +1,2 @@
-from .controller import router
+from .controller import router, user_skills_router
+from .service import skill_stats_flusher, skill_stats_reconciler
@@ -0,0 +1,175 @@
+"""Compressed bitmaps of non-negative integers.
+
+The integers are split in chunks of 2^16 values (like roaring bitmaps do), every
+chunk is stored as a Python int used as a bitset, and empty chunks are not
+stored at all. This keeps sparse bitmaps small while the set operations between
+chunks run at C speed using Python int bitwise operators.
+"""
+
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+
+    def _popcount(value: int) -> int:
+        return bin(value).count("1")
+
+
+def _iter_bits(value: int) -> Iterator[int]:
+    """Yields the positions of the bits set in value, in ascending order."""
+    data = value.to_bytes((value.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (byte_index << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+class Bitmap:
+    """A compressed set of non-negative integers."""
+
+    __slots__ = ("_chunks",)
+
+    def __init__(self, values: Optional[Iterable[int]] = None):
+        self._chunks: dict[int, int] = {}
+        if values is not None:
+            for value in values:
+                self.add(value)
+
+    @classmethod
+    def _from_chunks(cls, chunks: dict[int, int]) -> "Bitmap":
+        bitmap = cls()
+        bitmap._chunks = chunks
+        return bitmap
+
+    def add(self, value: int) -> None:
+        key = value >> CHUNK_BITS
+        self._chunks[key] = self._chunks.get(key, 0) | (1 << (value & CHUNK_MASK))
+
+    def discard(self, value: int) -> None:
+        key = value >> CHUNK_BITS
+        chunk = self._chunks.get(key, 0) & ~(1 << (value & CHUNK_MASK))
+        if chunk:
+            self._chunks[key] = chunk
+        else:
+            self._chunks.pop(key, None)
+
+    def chunk(self, key: int) -> int:
+        """Returns the bitset of the chunk with the given key (0 if empty)."""
+        return self._chunks.get(key, 0)
+
+    def chunk_keys(self) -> Iterable[int]:
+        return self._chunks.keys()
+
+    def __contains__(self, value: int) -> bool:
+        return bool(
+            self._chunks.get(value >> CHUNK_BITS, 0) >> (value & CHUNK_MASK) & 1
+        )
+
+    def __len__(self) -> int:
+        return sum(_popcount(chunk) for chunk in self._chunks.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._chunks):
+            base = key << CHUNK_BITS
+            for bit in _iter_bits(self._chunks[key]):
+                yield base + bit
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        return self._chunks == other._chunks
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if len(self._chunks) > len(other._chunks):
+            self, other = other, self
+        chunks = {}
+        for key, chunk in self._chunks.items():
+            chunk &= other._chunks.get(key, 0)
+            if chunk:
+                chunks[key] = chunk
+        return Bitmap._from_chunks(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self._chunks)
+        for key, chunk in other._chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return Bitmap._from_chunks(chunks)
+
+    def __repr__(self) -> str:
+        return f"Bitmap(cardinality={len(self)}, chunks={len(self._chunks)})"
+
+
+def intersection(bitmaps: list[Bitmap]) -> Bitmap:
+    """Returns the intersection of the bitmaps, smallest bitmaps first."""
+    if not bitmaps:
+        return Bitmap()
+    bitmaps = sorted(bitmaps, key=lambda bitmap: len(bitmap._chunks))
+    result = bitmaps[0]
+    for bitmap in bitmaps[1:]:
+        if not result:
+            break
+        result = result & bitmap
+    return result
+
+
+def union(bitmaps: list[Bitmap]) -> Bitmap:
+    """Returns the union of the bitmaps."""
+    chunks: dict[int, int] = {}
+    for bitmap in bitmaps:
+        for key, chunk in bitmap._chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+    return Bitmap._from_chunks(chunks)
+
+
+def top_overlap(bitmaps: list[Bitmap], k: int) -> list[tuple[int, int]]:
+    """
+    Returns up to k (value, count) pairs with the values present in the most
+    bitmaps, where count is the number of bitmaps containing the value. Ties are
+    broken by the smallest value.
+
+    For every chunk, the membership counts are accumulated with bit-sliced
+    counters: plane i holds the bit i of the count of every value, so adding a
+    bitmap is a ripple-carry addition over a few Python ints.
+    """
+    if k <= 0 or not bitmaps:
+        return []
+    planes_by_key: dict[int, list[int]] = {}
+    for key in union(bitmaps).chunk_keys():
+        planes: list[int] = []
+        for bitmap in bitmaps:
+            carry = bitmap.chunk(key)
+            i = 0
+            while carry:
+                if i == len(planes):
+                    planes.append(carry)
+                    break
+                planes[i], carry = planes[i] ^ carry, planes[i] & carry
+                i += 1
+        planes_by_key[key] = planes
+    found: list[tuple[int, int]] = []
+    for count in range(len(bitmaps), 0, -1):
+        for key in sorted(planes_by_key):
+            planes = planes_by_key[key]
+            if count.bit_length() > len(planes):
+                continue
+            equal = -1
+            for i, plane in enumerate(planes):
+                equal &= plane if count >> i & 1 else ~plane
+            if equal <= 0:
+                continue
+            base = key << CHUNK_BITS
+            for bit in _iter_bits(equal):
+                found.append((base + bit, count))
+                if len(found) == k:
+                    return found
+    return found
@@ -1,11 +1,32 @@
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 
+from ...utils import http_responses
+from ...utils.etags import if_none_match as etag_if_none_match
+from ...utils.etags import make_etag
+from ...utils.fieldsets import fields_query
+from ...utils.json_responses import FastJSONResponse, FastJSONRoute
 from . import service
-from .dtos import CreateSkillDTO, PublicSkillDTO, UpdateSkillNameDTO
+from .contypes import SkillConTypes
+from .dtos import (
+    CreateSkillDTO,
+    PublicSkillDTO,
+    SearchBySkillsDTO,
+    SkillSearchResultDTO,
+    SkillUsersPageDTO,
+    TopSkillDTO,
+    UpdateSkillNameDTO,
+    UserSkillIdsDTO,
+    UserSkillsChangeDTO,
+)
+from .exceptions import SkillDoesNotExistError, UserDoesNotExistError
 
-router = APIRouter(prefix="/skills", tags=["skills"])
+router = APIRouter(prefix="/skills", tags=["skills"], route_class=FastJSONRoute)
+user_skills_router = APIRouter(
+    prefix="/users", tags=["skills"], route_class=FastJSONRoute
+)
 
 
 @router.post("", response_model=PublicSkillDTO)
@@ -13,11 +34,129 @@ async def create_skill(create_skill_dto: CreateSkillDTO):
     return await service.create_skill(create_skill_dto.name)
 
 
-@router.get("/{skill_id}", response_model=PublicSkillDTO)
-async def get_skill_by_id(skill_id: UUID):
-    return await service.get_skill_by_id(skill_id)
+@router.get("/top", response_model=list[TopSkillDTO])
+async def get_top_skills(limit: SkillConTypes.TopLimit = 10):
+    return await service.get_top_skills(limit)
+
+
+@router.get(
+    "/{skill_id}",
+    response_model=PublicSkillDTO,
+    responses={
+        status.HTTP_304_NOT_MODIFIED: http_responses.NotModifiedResponse,
+        status.HTTP_400_BAD_REQUEST: http_responses.BadRequestResponse,
+        status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse,
+    },
+)
+async def get_skill_by_id(
+    skill_id: UUID,
+    fields: Optional[list[str]] = Depends(fields_query),
+    if_none_match: Optional[str] = Header(None),
+):
+    if if_none_match is not None:
+        # Only the version is read to tell if the client copy is fresh.
+        version = await service.get_skill_version(skill_id)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        etag = make_etag(version)
+        if etag_if_none_match(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+    try:
+        searched = await service.get_skill_fields_by_id(skill_id, fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+    if searched is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    skill, version = searched
+    headers = {"ETag": make_etag(version)}
+    if fields is None:
+        return FastJSONResponse(PublicSkillDTO(**skill), headers=headers)
+    return FastJSONResponse(skill, headers=headers)
 
 
 @router.patch("/{skill_id}/name", response_model=PublicSkillDTO)
 async def update_skill_name(skill_id: UUID, update_skill_name_dto: UpdateSkillNameDTO):
     pass
+
+
+@router.get("/{skill_id}/users", response_model=SkillUsersPageDTO)
+async def get_skill_users(
+    skill_id: UUID, after: Optional[UUID] = None, limit: SkillConTypes.PageLimit = 100
+):
+    return await service.get_skill_users(skill_id, after, limit)
+
+
+@user_skills_router.get(
+    "/{user_id}/skills",
+    response_model=list[PublicSkillDTO],
+    responses={status.HTTP_400_BAD_REQUEST: http_responses.BadRequestResponse},
+)
+async def get_user_skills(
+    user_id: UUID, fields: Optional[list[str]] = Depends(fields_query)
+):
+    try:
+        skills = await service.get_user_skills_fields(user_id, fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+    if fields is None:
+        return skills
+    return FastJSONResponse(skills)
+
+
+@user_skills_router.put(
+    "/{user_id}/skills",
+    response_model=UserSkillsChangeDTO,
+    responses={status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse},
+)
+async def set_user_skills(user_id: UUID, user_skill_ids_dto: UserSkillIdsDTO):
+    try:
+        return await service.set_user_skills(user_id, user_skill_ids_dto.skill_ids)
+    except UserDoesNotExistError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
+        ) from e
+    except SkillDoesNotExistError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found."
+        ) from e
+
+
+@user_skills_router.post(
+    "/{user_id}/skills:add",
+    response_model=UserSkillsChangeDTO,
+    responses={status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse},
+)
+async def add_user_skills(user_id: UUID, user_skill_ids_dto: UserSkillIdsDTO):
+    try:
+        added = await service.add_user_skills(user_id, user_skill_ids_dto.skill_ids)
+        return UserSkillsChangeDTO(added=added, removed=[])
+    except UserDoesNotExistError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
+        ) from e
+    except SkillDoesNotExistError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found."
+        ) from e
+
+
+@user_skills_router.post("/{user_id}/skills:remove", response_model=UserSkillsChangeDTO)
+async def remove_user_skills(user_id: UUID, user_skill_ids_dto: UserSkillIdsDTO):
+    removed = await service.remove_user_skills(user_id, user_skill_ids_dto.skill_ids)
+    return UserSkillsChangeDTO(added=[], removed=removed)
+
+
+@user_skills_router.post(":searchBySkills", response_model=SkillSearchResultDTO)
+async def search_users_by_skills(search_by_skills_dto: SearchBySkillsDTO):
+    users = await service.search_users_by_skills(
+        search_by_skills_dto.skill_ids,
+        search_by_skills_dto.mode,
+        search_by_skills_dto.limit,
+    )
+    return SkillSearchResultDTO(users=users)
@@ -1,5 +1,11 @@
-from pydantic import constr
+from uuid import UUID
+
+from pydantic import conint, conlist, constr
 
 
 class SkillConTypes:
     Name = constr(min_length=1, max_length=50, strip_whitespace=True)
+    SkillIds = conlist(UUID, max_items=1000)
+    SearchSkillIds = conlist(UUID, min_items=1, max_items=100)
+    PageLimit = conint(ge=1, le=1000)
+    TopLimit = conint(ge=1, le=100)
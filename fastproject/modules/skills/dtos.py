@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -16,3 +17,43 @@ class CreateSkillDTO(BaseModel):
 
 class UpdateSkillNameDTO(BaseModel):
     name: SkillConTypes.Name
+
+
+class TopSkillDTO(BaseModel):
+    skill_id: UUID
+    name: str
+    user_count: int
+
+
+class UserSkillIdsDTO(BaseModel):
+    skill_ids: SkillConTypes.SkillIds
+
+
+class UserSkillsChangeDTO(BaseModel):
+    added: list[UUID]
+    removed: list[UUID]
+
+
+class SkillUserDTO(BaseModel):
+    user_id: UUID
+    username: str
+
+
+class SkillUsersPageDTO(BaseModel):
+    users: list[SkillUserDTO]
+    next_after: Optional[UUID]
+
+
+class SearchBySkillsDTO(BaseModel):
+    skill_ids: SkillConTypes.SearchSkillIds
+    mode: Literal["all", "any", "top"] = "all"
+    limit: SkillConTypes.PageLimit = 100
+
+
+class SkillSearchMatchDTO(BaseModel):
+    user_id: UUID
+    matched: Optional[int]
+
+
+class SkillSearchResultDTO(BaseModel):
+    users: list[SkillSearchMatchDTO]
@@ -1,4 +1,4 @@
-from asyncpg.exceptions import UniqueViolationError
+from asyncpg.exceptions import ForeignKeyViolationError, UniqueViolationError
 
 
 class SkillNameAlreadyExistsError(UniqueViolationError):
@@ -6,3 +6,17 @@ class SkillNameAlreadyExistsError(UniqueViolationError):
     Raised when inserting skill objects in the database and the name of the
     skill that will be inserted already exists in the database.
     """
+
+
+class UserDoesNotExistError(ForeignKeyViolationError):
+    """
+    Raised when associating skills to a user and the user does not exist in the
+    database.
+    """
+
+
+class SkillDoesNotExistError(ForeignKeyViolationError):
+    """
+    Raised when associating skills to a user and one of the skills does not
+    exist in the database.
+    """
@@ -2,10 +2,12 @@ from pathlib import Path
 
 import aiosql
 
-from ...db import with_connection
+from ...db import TracingAsyncPGAdapter, with_connection
 from .dtos import PublicSkillDTO
 
-_queries = aiosql.from_path(Path(__file__).resolve().parent / "sql", "asyncpg")
+_queries = aiosql.from_path(
+    Path(__file__).resolve().parent / "sql", TracingAsyncPGAdapter
+)
 
 
 @with_connection
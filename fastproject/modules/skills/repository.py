@@ -1,15 +1,34 @@
+from collections.abc import Iterable
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+from uuid import UUID
 
 import aiosql
 import asyncpg
 from asyncpg.pool import PoolAcquireContext
 
-from ...db import with_connection
-from .dtos import PublicSkillDTO
-from .exceptions import SkillNameAlreadyExistsError
+from ...db import TracingAsyncPGAdapter, lanes, select_list, with_connection
+from ...utils.uuids import uuid7
+from .dtos import (
+    PublicSkillDTO,
+    SkillUserDTO,
+    SkillUsersPageDTO,
+    TopSkillDTO,
+    UserSkillsChangeDTO,
+)
+from .exceptions import (
+    SkillDoesNotExistError,
+    SkillNameAlreadyExistsError,
+    UserDoesNotExistError,
+)
+from .search_index import SkillSearchIndex
 
-_queries = aiosql.from_path(Path(__file__).resolve().parent / "sql", "asyncpg")
+_queries = aiosql.from_path(
+    Path(__file__).resolve().parent / "sql", TracingAsyncPGAdapter
+)
+
+# The fields of a skill that can be requested, and their columns.
+SKILL_COLUMNS = {"skill_id": "skill.skill_id", "name": "skill.name"}
 
 
 @with_connection
@@ -17,7 +36,8 @@ async def insert_skill(conn: PoolAcquireContext, name: str) -> Optional[PublicSk
     """Inserts a skill into the database.
 
     This function inserts the given values "as-is", so you must make the
-    desired transformations to the values before using this function.
+    desired transformations to the values before using this function. The
+    skill_id is a time-ordered UUIDv7 generated by the application.
 
     Args:
       conn: A database connection.
@@ -30,7 +50,7 @@ async def insert_skill(conn: PoolAcquireContext, name: str) -> Optional[PublicSk
       SkillNameAlreadyExistsError: If the name already exists.
     """
     try:
-        inserted = await _queries.insert_skill(conn, name=name)
+        inserted = await _queries.insert_skill(conn, skill_id=uuid7(), name=name)
         return PublicSkillDTO(**inserted)
     except asyncpg.UniqueViolationError as e:
         msg = str(e)
@@ -57,3 +77,288 @@ async def get_skill_by_id(
     if searched:
         return PublicSkillDTO(**searched)
     return None
+
+
+@with_connection
+async def get_skill_version(conn: PoolAcquireContext, skill_id: UUID) -> Optional[str]:
+    """Returns the version of the row of a skill, see utils.etags.
+
+    Args:
+      conn: A database connection.
+      skill_id: The skill_id of the searched skill.
+
+    Returns:
+      The version, None if the skill was not found.
+    """
+    return await _queries.get_skill_version(conn, skill_id=skill_id)
+
+
+@with_connection
+async def get_skill_fields_by_id(
+    conn: PoolAcquireContext, skill_id: UUID, fields: Optional[Iterable[str]] = None
+) -> Optional[tuple[dict[str, Any], str]]:
+    """Returns the requested fields of a skill with the given skill_id.
+
+    Args:
+      conn: A database connection.
+      skill_id: The skill_id of the searched skill.
+      fields: The fields to return, keys of SKILL_COLUMNS. If None, all of
+        them are returned.
+
+    Returns:
+      A dict with the requested fields of the searched skill and the version
+      of its row, None if the skill was not found.
+
+    Raises:
+      ValueError: If a field is not a field of the skill.
+    """
+    searched = await conn.fetchrow(
+        f"SELECT {select_list(fields, SKILL_COLUMNS)}, "
+        "skill.xmin::text AS version FROM skill WHERE skill.skill_id = $1",
+        skill_id,
+    )
+    if searched:
+        searched = dict(searched)
+        return searched, searched.pop("version")
+    return None
+
+
+def _reraise_foreign_key_violation(e: asyncpg.ForeignKeyViolationError):
+    msg = str(e)
+    if "uuser_id" in msg:
+        raise UserDoesNotExistError from e
+    if "skill_id" in msg:
+        raise SkillDoesNotExistError from e
+    raise e from e
+
+
+@with_connection
+async def set_user_skills(
+    conn: PoolAcquireContext, user_id: UUID, skill_ids: list[UUID]
+) -> UserSkillsChangeDTO:
+    """Replaces the skills of a user with the given skills.
+
+    The replacement is done with a single statement, the skills the user
+    already had and are in skill_ids are left untouched.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user whose skills will be replaced.
+      skill_ids: The skill_ids of the skills the user will have.
+
+    Returns:
+      A UserSkillsChangeDTO with the skill_ids added and removed.
+
+    Raises:
+      UserDoesNotExistError: If the user does not exist.
+      SkillDoesNotExistError: If any of the skills does not exist.
+    """
+    try:
+        changed = await _queries.set_user_skills(
+            conn, uuser_id=user_id, skill_ids=skill_ids
+        )
+    except asyncpg.ForeignKeyViolationError as e:
+        _reraise_foreign_key_violation(e)
+    return UserSkillsChangeDTO(added=changed["added"], removed=changed["removed"])
+
+
+@with_connection
+async def add_user_skills(
+    conn: PoolAcquireContext, user_id: UUID, skill_ids: list[UUID]
+) -> list[UUID]:
+    """Adds the given skills to a user.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user that will receive the skills.
+      skill_ids: The skill_ids of the skills that will be added.
+
+    Returns:
+      The skill_ids that were added, the skills the user already had are not
+      included.
+
+    Raises:
+      UserDoesNotExistError: If the user does not exist.
+      SkillDoesNotExistError: If any of the skills does not exist.
+    """
+    try:
+        added = await _queries.add_user_skills(
+            conn, uuser_id=user_id, skill_ids=skill_ids
+        )
+    except asyncpg.ForeignKeyViolationError as e:
+        _reraise_foreign_key_violation(e)
+    return [record["skill_id"] for record in added]
+
+
+@with_connection
+async def remove_user_skills(
+    conn: PoolAcquireContext, user_id: UUID, skill_ids: list[UUID]
+) -> list[UUID]:
+    """Removes the given skills from a user.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user whose skills will be removed.
+      skill_ids: The skill_ids of the skills that will be removed.
+
+    Returns:
+      The skill_ids that were removed, the skills the user did not have are
+      not included.
+    """
+    removed = await _queries.remove_user_skills(
+        conn, uuser_id=user_id, skill_ids=skill_ids
+    )
+    return [record["skill_id"] for record in removed]
+
+
+@with_connection
+async def get_user_skills(
+    conn: PoolAcquireContext, user_id: UUID
+) -> list[PublicSkillDTO]:
+    """Returns the skills of a user, ordered by name.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user whose skills are wanted.
+
+    Returns:
+      A list of PublicSkillDTO representing the skills of the user.
+    """
+    skills = await _queries.get_user_skills(conn, uuser_id=user_id)
+    return [PublicSkillDTO(**skill) for skill in skills]
+
+
+@with_connection
+async def get_user_skills_fields(
+    conn: PoolAcquireContext, user_id: UUID, fields: Optional[Iterable[str]] = None
+) -> list[dict[str, Any]]:
+    """Returns the requested fields of the skills of a user, ordered by name.
+
+    Args:
+      conn: A database connection.
+      user_id: The user_id of the user whose skills are wanted.
+      fields: The fields to return, keys of SKILL_COLUMNS. If None, all of
+        them are returned.
+
+    Returns:
+      A list of dicts with the requested fields of the skills of the user.
+
+    Raises:
+      ValueError: If a field is not a field of the skill.
+    """
+    skills = await conn.fetch(
+        f"SELECT {select_list(fields, SKILL_COLUMNS)} "
+        "FROM uuser_skill JOIN skill ON skill.skill_id = uuser_skill.skill_id "
+        "WHERE uuser_skill.uuser_id = $1 ORDER BY skill.name",
+        user_id,
+    )
+    return [dict(skill) for skill in skills]
+
+
+@with_connection
+async def get_skill_users(
+    conn: PoolAcquireContext,
+    skill_id: UUID,
+    after: Optional[UUID] = None,
+    limit: int = 100,
+) -> SkillUsersPageDTO:
+    """Returns a page of the users holding a skill, ordered by user_id.
+
+    Args:
+      conn: A database connection.
+      skill_id: The skill_id of the skill the users hold.
+      after: The user_id of the last user of the previous page, None to get
+        the first page.
+      limit: The maximum number of users in the page.
+
+    Returns:
+      A SkillUsersPageDTO with the users of the page and the value of "after"
+      that must be used to get the next page (None if this is the last page).
+    """
+    if after is None:
+        users = await _queries.get_skill_users(conn, skill_id=skill_id, limit=limit)
+    else:
+        users = await _queries.get_skill_users_after(
+            conn, skill_id=skill_id, after=after, limit=limit
+        )
+    users = [
+        SkillUserDTO(user_id=user["uuser_id"], username=user["username"])
+        for user in users
+    ]
+    next_after = users[-1].user_id if len(users) == limit else None
+    return SkillUsersPageDTO(users=users, next_after=next_after)
+
+
+@with_connection(lane=lanes.BULK)
+async def load_search_index(conn: PoolAcquireContext, index: SkillSearchIndex) -> None:
+    """Adds every user-skill association in the database to the index.
+
+    The associations are streamed with a cursor, so they are never loaded in
+    memory all at once.
+
+    Args:
+      conn: A database connection.
+      index: The SkillSearchIndex that will receive the associations.
+    """
+    user_id, skill_ids = None, []
+    async with _queries.get_all_user_skills_cursor(conn) as cursor:
+        async for record in cursor:
+            if record["uuser_id"] != user_id:
+                if skill_ids:
+                    index.add(user_id, skill_ids)
+                user_id, skill_ids = record["uuser_id"], []
+            skill_ids.append(record["skill_id"])
+    if skill_ids:
+        index.add(user_id, skill_ids)
+
+
+@with_connection(lane=lanes.BULK)
+async def flush_skill_stats_deltas(conn: PoolAcquireContext) -> int:
+    """
+    Adds the deltas recorded by the changes of the skills of the users to the
+    number of users holding the skills, see the table skill_stats_delta. The
+    deltas of the skills that were deleted are dropped.
+
+    Args:
+      conn: A database connection.
+
+    Returns:
+      The number of deltas that were added.
+    """
+    return await _queries.flush_skill_stats_deltas(conn)
+
+
+@with_connection(lane=lanes.BULK)
+async def reconcile_skill_stats(conn: PoolAcquireContext) -> list[UUID]:
+    """
+    Recounts the users holding every skill and fixes the skill stats that
+    drifted.
+
+    The flushes wait meanwhile, so the deltas that were not flushed yet are
+    taken into account exactly.
+
+    Args:
+      conn: A database connection.
+
+    Returns:
+      The skill_ids of the skills whose stats were fixed.
+    """
+    async with conn.transaction():
+        await _queries.lock_skill_stats(conn)
+        fixed = await _queries.reconcile_skill_stats(conn)
+    return [record["skill_id"] for record in fixed]
+
+
+@with_connection
+async def get_top_skills(conn: PoolAcquireContext, limit: int) -> list[TopSkillDTO]:
+    """Returns the skills held by the most users.
+
+    Args:
+      conn: A database connection.
+      limit: The maximum number of skills returned.
+
+    Returns:
+      A list of TopSkillDTO ordered by user_count, descending.
+    """
+    skills = await _queries.get_top_skills(conn, limit=limit)
+    return [TopSkillDTO(**skill) for skill in skills]
@@ -0,0 +1,94 @@
+"""In-memory index to search users by the skills they hold.
+
+Every user gets a process-local ordinal, and every skill a Bitmap with the
+ordinals of the users holding it, so "users with all/any of these skills"
+queries become bitmap intersections/unions.
+"""
+
+from collections.abc import Iterable
+from uuid import UUID
+
+from . import bitmaps
+
+
+class SkillSearchIndex:
+    """Per-skill bitmaps of user ordinals, kept up to date incrementally."""
+
+    def __init__(self):
+        self._ordinals: dict[UUID, int] = {}
+        self._user_ids: list[UUID] = []
+        self._bitmaps: dict[UUID, bitmaps.Bitmap] = {}
+
+    def _ordinal(self, user_id: UUID) -> int:
+        ordinal = self._ordinals.get(user_id)
+        if ordinal is None:
+            ordinal = len(self._user_ids)
+            self._ordinals[user_id] = ordinal
+            self._user_ids.append(user_id)
+        return ordinal
+
+    def add(self, user_id: UUID, skill_ids: Iterable[UUID]) -> None:
+        """Records that the user holds the given skills."""
+        ordinal = self._ordinal(user_id)
+        for skill_id in skill_ids:
+            bitmap = self._bitmaps.get(skill_id)
+            if bitmap is None:
+                bitmap = self._bitmaps[skill_id] = bitmaps.Bitmap()
+            bitmap.add(ordinal)
+
+    def remove(self, user_id: UUID, skill_ids: Iterable[UUID]) -> None:
+        """Records that the user does not hold the given skills anymore."""
+        ordinal = self._ordinals.get(user_id)
+        if ordinal is None:
+            return
+        for skill_id in skill_ids:
+            bitmap = self._bitmaps.get(skill_id)
+            if bitmap is None:
+                continue
+            bitmap.discard(ordinal)
+            if not bitmap:
+                del self._bitmaps[skill_id]
+
+    def _to_user_ids(self, bitmap: bitmaps.Bitmap, limit: int) -> list[UUID]:
+        user_ids = []
+        for ordinal in bitmap:
+            if len(user_ids) == limit:
+                break
+            user_ids.append(self._user_ids[ordinal])
+        return user_ids
+
+    def search_all(self, skill_ids: Iterable[UUID], limit: int) -> list[UUID]:
+        """Returns up to limit users holding all the given skills."""
+        skill_bitmaps = []
+        for skill_id in set(skill_ids):
+            bitmap = self._bitmaps.get(skill_id)
+            if bitmap is None:
+                return []
+            skill_bitmaps.append(bitmap)
+        return self._to_user_ids(bitmaps.intersection(skill_bitmaps), limit)
+
+    def search_any(self, skill_ids: Iterable[UUID], limit: int) -> list[UUID]:
+        """Returns up to limit users holding any of the given skills."""
+        skill_bitmaps = [
+            self._bitmaps[skill_id]
+            for skill_id in set(skill_ids)
+            if skill_id in self._bitmaps
+        ]
+        return self._to_user_ids(bitmaps.union(skill_bitmaps), limit)
+
+    def search_top(
+        self, skill_ids: Iterable[UUID], limit: int
+    ) -> list[tuple[UUID, int]]:
+        """
+        Returns up to limit (user_id, matched) pairs with the users holding the
+        most of the given skills, where matched is how many of them they hold.
+        """
+        skill_bitmaps = [
+            self._bitmaps[skill_id]
+            for skill_id in set(skill_ids)
+            if skill_id in self._bitmaps
+        ]
+        return [
+            (self._user_ids[ordinal], count)
+            for ordinal, count in bitmaps.top_overlap(skill_bitmaps, limit)
+        ]
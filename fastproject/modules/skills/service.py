@@ -1,14 +1,216 @@
-from typing import Optional
+import asyncio
+import logging
+from typing import Any, Optional
+from uuid import UUID
 
+from ... import config, db
+from ...utils import deadlines
 from ...utils.encoding import normalize_str
+from ...utils.tasks import PeriodicTask
+from ...utils.tracing import traced
 from . import repository
-from .dtos import PublicSkillDTO
+from .dtos import (
+    PublicSkillDTO,
+    SkillSearchMatchDTO,
+    SkillUsersPageDTO,
+    TopSkillDTO,
+    UserSkillsChangeDTO,
+)
+from .search_index import SkillSearchIndex
 
+logger = logging.getLogger(__name__)
 
+# Every committed change of the skills of the users, by any worker, is notified
+# on this channel by a trigger, see the migration
+# 0013-notify-user-skills-changed.sql.
+USER_SKILLS_CHANGED_CHANNEL = "user_skills_changed"
+
+# The search index is loaded on first use and kept up to date with the
+# notifications, in the order the changes were committed. Changes notified
+# while it is loading are kept in _pending_changes and replayed on top of it
+# once loaded; replaying a change that the load already saw is harmless
+# because changes are idempotent. A load that started before the index was
+# forgotten is not kept, see _search_index_generation. Without the listener,
+# the changes of the other workers would go unnoticed, so the index is not
+# kept either and every search loads it again.
+_search_index: Optional[SkillSearchIndex] = None
+_search_index_loading: Optional[asyncio.Future] = None
+_search_index_generation = 0
+_pending_changes: Optional[list[tuple[UUID, list[UUID], list[UUID]]]] = None
+
+
+def _record_change(user_id: UUID, added: list[UUID], removed: list[UUID]) -> None:
+    if _search_index is not None:
+        _search_index.add(user_id, added)
+        _search_index.remove(user_id, removed)
+    elif _pending_changes is not None:
+        _pending_changes.append((user_id, added, removed))
+
+
+def _forget_search_index() -> None:
+    global _search_index, _search_index_loading, _search_index_generation
+    _search_index = None
+    _search_index_loading = None
+    _search_index_generation += 1
+
+
+def _on_user_skills_changed(payload: Optional[str]) -> None:
+    if payload is None:
+        # Notifications may have been lost, the index is loaded again on next
+        # use.
+        _forget_search_index()
+        return
+    for change in payload.split(";"):
+        user_id, skill_ids = change.split(":")
+        added, removed = [], []
+        for skill_id in skill_ids.split(","):
+            (added if skill_id[0] == "+" else removed).append(UUID(skill_id[1:]))
+        _record_change(UUID(user_id), added, removed)
+
+
+db.notification_listener.subscribe(USER_SKILLS_CHANGED_CHANNEL, _on_user_skills_changed)
+
+
+async def _load_search_index() -> SkillSearchIndex:
+    global _search_index, _search_index_loading, _pending_changes
+    generation = _search_index_generation
+    _pending_changes = pending = []
+    index = SkillSearchIndex()
+    try:
+        await repository.load_search_index(index)
+    except BaseException:
+        if generation == _search_index_generation:
+            _search_index_loading = None
+        raise
+    finally:
+        if _pending_changes is pending:
+            _pending_changes = None
+    for user_id, added, removed in pending:
+        index.add(user_id, added)
+        index.remove(user_id, removed)
+    if generation == _search_index_generation:
+        if db.notification_listener.listening:
+            _search_index = index
+        else:
+            _search_index_loading = None
+    return index
+
+
+async def get_search_index() -> SkillSearchIndex:
+    global _search_index_loading
+    if _search_index is not None:
+        if db.notification_listener.listening:
+            return _search_index
+        _forget_search_index()
+    if _search_index_loading is None:
+        # Every request waits for it, the deadline of the first one is not its.
+        with deadlines.without_deadline():
+            _search_index_loading = asyncio.ensure_future(_load_search_index())
+    return await asyncio.shield(_search_index_loading)
+
+
+@traced
+async def flush_skill_stats() -> None:
+    await repository.flush_skill_stats_deltas()
+
+
+@traced
+async def reconcile_skill_stats() -> list[UUID]:
+    fixed = await repository.reconcile_skill_stats()
+    if fixed:
+        logger.info("Reconciled the stats of %d skills.", len(fixed))
+    return fixed
+
+
+skill_stats_flusher = PeriodicTask(
+    flush_skill_stats,
+    config.settings.getfloat("SKILLS", "stats_flush_interval", fallback=1.0),
+)
+skill_stats_reconciler = PeriodicTask(
+    reconcile_skill_stats,
+    config.settings.getfloat("SKILLS", "stats_reconcile_interval", fallback=3600.0),
+)
+
+
+@traced
 async def create_skill(name: str) -> PublicSkillDTO:
     name = normalize_str(name)
     return await repository.insert_skill(name)
 
 
+@traced
 async def get_skill_by_id(skill_id: str) -> Optional[PublicSkillDTO]:
     return await repository.get_skill_by_id(skill_id)
+
+
+@traced
+async def get_skill_version(skill_id: UUID) -> Optional[str]:
+    return await repository.get_skill_version(skill_id)
+
+
+@traced
+async def get_skill_fields_by_id(
+    skill_id: UUID, fields: Optional[list[str]] = None
+) -> Optional[tuple[dict[str, Any], str]]:
+    return await repository.get_skill_fields_by_id(skill_id, fields)
+
+
+@traced
+async def set_user_skills(user_id: UUID, skill_ids: list[UUID]) -> UserSkillsChangeDTO:
+    return await repository.set_user_skills(user_id, skill_ids)
+
+
+@traced
+async def add_user_skills(user_id: UUID, skill_ids: list[UUID]) -> list[UUID]:
+    return await repository.add_user_skills(user_id, skill_ids)
+
+
+@traced
+async def remove_user_skills(user_id: UUID, skill_ids: list[UUID]) -> list[UUID]:
+    return await repository.remove_user_skills(user_id, skill_ids)
+
+
+@traced
+async def get_user_skills(user_id: UUID) -> list[PublicSkillDTO]:
+    return await repository.get_user_skills(user_id)
+
+
+@traced
+async def get_user_skills_fields(
+    user_id: UUID, fields: Optional[list[str]] = None
+) -> list[dict[str, Any]]:
+    return await repository.get_user_skills_fields(user_id, fields)
+
+
+@traced
+async def get_skill_users(
+    skill_id: UUID, after: Optional[UUID] = None, limit: int = 100
+) -> SkillUsersPageDTO:
+    return await repository.get_skill_users(skill_id, after, limit)
+
+
+@traced
+async def search_users_by_skills(
+    skill_ids: list[UUID], mode: str = "all", limit: int = 100
+) -> list[SkillSearchMatchDTO]:
+    index = await get_search_index()
+    if mode == "top":
+        return [
+            SkillSearchMatchDTO(user_id=user_id, matched=matched)
+            for user_id, matched in index.search_top(skill_ids, limit)
+        ]
+    if mode == "any":
+        return [
+            SkillSearchMatchDTO(user_id=user_id, matched=None)
+            for user_id in index.search_any(skill_ids, limit)
+        ]
+    matched = len(set(skill_ids))
+    return [
+        SkillSearchMatchDTO(user_id=user_id, matched=matched)
+        for user_id in index.search_all(skill_ids, limit)
+    ]
+
+
+@traced
+async def get_top_skills(limit: int = 10) -> list[TopSkillDTO]:
+    return await repository.get_top_skills(limit)
@@ -1,19 +1,26 @@
 -- name: insert-skill<!
 -- Insert a single skill
-INSERT INTO skill (name) VALUES (:name) RETURNING skill_id, name;
+INSERT INTO skill (skill_id, name) VALUES (:skill_id, :name) RETURNING skill_id, name;
 
 
 -- name: get-skill-by-id^
 -- Get a single skill with the given skill_id
-SELECT *
+SELECT skill_id,
+       name
   FROM skill
  WHERE skill_id = :skill_id;
 
 
+-- name: get-skill-version$
+-- Get the version of the row of the skill with the given skill_id, it changes
+-- every time the row is updated
+SELECT xmin::text FROM skill WHERE skill_id = :skill_id;
+
+
 -- name: get-skill^
 -- Get a single skill
-SELECT * FROM skill WHERE skill_id = :skill_id;
+SELECT skill_id, name FROM skill WHERE skill_id = :skill_id;
 
 
 -- name: get-all-skill
-SELECT * FROM skill;
+SELECT skill_id, name FROM skill;
@@ -0,0 +1,61 @@
+-- name: flush-skill-stats-deltas$
+-- Move the deltas in skill_stats_delta to skill_stats, the ones of the skills
+-- that were deleted are dropped. The deltas locked by a concurrent flush are
+-- skipped, the skills are updated sorted by skill_id so concurrent flushes
+-- lock rows in the same order. Returns the number of deltas moved.
+  WITH drained AS (
+           DELETE FROM skill_stats_delta
+            WHERE skill_stats_delta_id IN (SELECT skill_stats_delta_id
+                                             FROM skill_stats_delta
+                                              FOR UPDATE SKIP LOCKED)
+        RETURNING skill_id, delta
+       ),
+       applied AS (
+           INSERT INTO skill_stats (skill_id, user_count)
+                SELECT drained.skill_id, sum(drained.delta)
+                  FROM drained
+                  JOIN skill ON skill.skill_id = drained.skill_id
+              GROUP BY drained.skill_id
+              ORDER BY drained.skill_id
+           ON CONFLICT (skill_id)
+         DO UPDATE SET user_count = skill_stats.user_count + EXCLUDED.user_count
+       )
+SELECT count(*) FROM drained;
+
+
+-- name: lock-skill-stats!
+-- Block the flushes until the end of the transaction, not the reads of
+-- skill_stats nor the changes of uuser_skill.
+LOCK TABLE skill_stats IN SHARE ROW EXCLUSIVE MODE;
+
+
+-- name: reconcile-skill-stats
+-- Fix the user_count of the skills that drifted from the real count in
+-- uuser_skill minus the deltas that were not flushed yet, run it after
+-- lock-skill-stats in the same transaction. Returns the skill_ids that were
+-- fixed.
+     INSERT INTO skill_stats (skill_id, user_count)
+          SELECT skill.skill_id,
+                 COALESCE(held.user_count, 0) - COALESCE(pending.delta, 0)
+            FROM skill
+       LEFT JOIN (SELECT skill_id, count(*) AS user_count
+                    FROM uuser_skill
+                GROUP BY skill_id) AS held
+              ON held.skill_id = skill.skill_id
+       LEFT JOIN (SELECT skill_id, sum(delta) AS delta
+                    FROM skill_stats_delta
+                GROUP BY skill_id) AS pending
+              ON pending.skill_id = skill.skill_id
+     ON CONFLICT (skill_id)
+   DO UPDATE SET user_count = EXCLUDED.user_count
+           WHERE skill_stats.user_count <> EXCLUDED.user_count
+       RETURNING skill_id;
+
+
+-- name: get-top-skills
+-- Get the skills held by the most users
+    SELECT skill.skill_id, skill.name, skill_stats.user_count
+      FROM skill_stats
+      JOIN skill ON skill.skill_id = skill_stats.skill_id
+  ORDER BY skill_stats.user_count DESC, skill_stats.skill_id
+     LIMIT :limit;
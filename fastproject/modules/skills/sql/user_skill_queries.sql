@@ -0,0 +1,75 @@
+-- name: set-user-skills^
+-- Replace the skills of a user with the given skill_ids in a single statement.
+-- Returns the skill_ids that were added and the ones that were removed.
+  WITH removed AS (
+           DELETE FROM uuser_skill
+                 WHERE uuser_id = :uuser_id
+                   AND skill_id <> ALL(:skill_ids::uuid[])
+             RETURNING skill_id
+       ),
+       added AS (
+           INSERT INTO uuser_skill (uuser_id, skill_id)
+                SELECT :uuser_id::uuid, skill_id
+                  FROM unnest(:skill_ids::uuid[]) AS skill_id
+           ON CONFLICT (uuser_id, skill_id) DO NOTHING
+             RETURNING skill_id
+       )
+SELECT COALESCE((SELECT array_agg(skill_id) FROM added), '{}') AS added,
+       COALESCE((SELECT array_agg(skill_id) FROM removed), '{}') AS removed;
+
+
+-- name: add-user-skills
+-- Add the given skill_ids to a user. Returns the skill_ids that were added
+-- (the ones the user already had are ignored).
+     INSERT INTO uuser_skill (uuser_id, skill_id)
+          SELECT :uuser_id::uuid, skill_id
+            FROM unnest(:skill_ids::uuid[]) AS skill_id
+     ON CONFLICT (uuser_id, skill_id) DO NOTHING
+  RETURNING skill_id;
+
+
+-- name: remove-user-skills
+-- Remove the given skill_ids from a user. Returns the skill_ids that were
+-- removed.
+DELETE FROM uuser_skill
+      WHERE uuser_id = :uuser_id
+        AND skill_id = ANY(:skill_ids::uuid[])
+  RETURNING skill_id;
+
+
+-- name: get-user-skills
+-- Get the skills of a user with the given uuser_id
+    SELECT skill.skill_id, skill.name
+      FROM uuser_skill
+      JOIN skill ON skill.skill_id = uuser_skill.skill_id
+     WHERE uuser_skill.uuser_id = :uuser_id
+  ORDER BY skill.name;
+
+
+-- name: get-skill-users
+-- Get the first page of the users holding the skill with the given skill_id.
+    SELECT uuser_directory.uuser_id, uuser_directory.username
+      FROM uuser_skill
+      JOIN uuser_directory ON uuser_directory.uuser_id = uuser_skill.uuser_id
+     WHERE uuser_skill.skill_id = :skill_id
+  ORDER BY uuser_skill.uuser_id
+     LIMIT :limit;
+
+
+-- name: get-skill-users-after
+-- Get a page of the users holding the skill with the given skill_id. Pages are
+-- delimited by the last uuser_id of the previous page (keyset pagination).
+    SELECT uuser_directory.uuser_id, uuser_directory.username
+      FROM uuser_skill
+      JOIN uuser_directory ON uuser_directory.uuser_id = uuser_skill.uuser_id
+     WHERE uuser_skill.skill_id = :skill_id
+       AND uuser_skill.uuser_id > :after
+  ORDER BY uuser_skill.uuser_id
+     LIMIT :limit;
+
+
+-- name: get-all-user-skills
+-- Get every (uuser_id, skill_id) pair, grouped by uuser_id
+    SELECT uuser_id, skill_id
+      FROM uuser_skill
+  ORDER BY uuser_id;
@@ -1,6 +1,6 @@
 """Init module."""
 
-from . import contypes, exceptions, models, repository, service
+from . import contypes, exceptions, models, password_hashing, repository, service
 from .controller import controller
 
 __all__ = [
@@ -8,6 +8,7 @@ __all__ = [
     "contypes",
     "exceptions",
     "models",
+    "password_hashing",
     "repository",
     "service",
 ]
@@ -1,14 +1,17 @@
 """Controller module."""
 
+import dataclasses
 import uuid
-from typing import Optional
+from typing import Optional, Union
 
 import fastapi
 
-from ...utils import http_responses
+from ...utils import etags, fieldsets, http_responses, json_responses
 from . import exceptions, models, service
 
-controller = fastapi.APIRouter(prefix="/users", tags=["users"])
+controller = fastapi.APIRouter(
+    prefix="/users", tags=["users"], route_class=json_responses.FastJSONRoute
+)
 
 
 @controller.post(
@@ -21,14 +24,14 @@ async def register_user(
     user_registration_data: models.UserRegistrationData,
 ) -> models.PublicUser:
     try:
-        inserted = await service.insert_user(
+        inserted = await service.create_user(
             username=user_registration_data.username,
             email=user_registration_data.email,
             first_name=user_registration_data.first_name,
             last_name=user_registration_data.last_name,
             password=user_registration_data.password,
         )
-        return models.PublicUser(**inserted.dict())
+        return models.PublicUser(**dataclasses.asdict(inserted))
     except exceptions.UsernameAlreadyExistsError as e:
         raise fastapi.HTTPException(
             status_code=fastapi.status.HTTP_409_CONFLICT,
@@ -44,27 +47,79 @@ async def register_user(
     "/{user_id}",
     response_model=models.PublicUser,
     status_code=fastapi.status.HTTP_200_OK,
-    responses={fastapi.status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse},
+    responses={
+        fastapi.status.HTTP_304_NOT_MODIFIED: http_responses.NotModifiedResponse,
+        fastapi.status.HTTP_400_BAD_REQUEST: http_responses.BadRequestResponse,
+        fastapi.status.HTTP_404_NOT_FOUND: http_responses.NotFoundResponse,
+    },
 )
-async def get_user(user_id: uuid.UUID) -> Optional[models.PublicUser]:
-    searched = await service.get_user_by_id(user_id)
+async def get_user(
+    user_id: uuid.UUID,
+    fields: Optional[list[str]] = fastapi.Depends(fieldsets.fields_query),
+    if_none_match: Optional[str] = fastapi.Header(None),
+) -> fastapi.Response:
+    if if_none_match is not None:
+        # Only the version is read to tell if the client copy is fresh.
+        version = await service.get_user_version(user_id)
+        if version is None:
+            raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND)
+        etag = etags.make_etag(version)
+        if etags.if_none_match(if_none_match, etag):
+            return fastapi.Response(
+                status_code=fastapi.status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag},
+            )
+    try:
+        searched = await service.get_user_fields_by_id(user_id, fields)
+    except ValueError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
     if not searched:
         raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND)
-    return models.PublicUser(**searched.dict())
+    user, version = searched
+    headers = {"ETag": etags.make_etag(version)}
+    if fields is None:
+        return json_responses.FastJSONResponse(
+            models.PublicUser(**user), headers=headers
+        )
+    # A sparse fieldset does not fit the response model, it is serialized as is.
+    return json_responses.FastJSONResponse(user, headers=headers)
 
 
-@controller.patch("/{user_id}", response_model=models.PublicUser)
+@controller.patch(
+    "/{user_id}",
+    response_model=models.PublicUser,
+    responses={
+        fastapi.status.HTTP_412_PRECONDITION_FAILED: (
+            http_responses.PreconditionFailedResponse
+        )
+    },
+)
 async def patch_user(
-    user_id: uuid.UUID, patchable_user_data: models.PatchableUserData
-) -> Optional[models.PublicUser]:
+    user_id: uuid.UUID,
+    patchable_user_data: models.PatchableUserData,
+    if_match: Optional[str] = fastapi.Header(None),
+) -> Union[models.PublicUser, json_responses.FastJSONResponse, None]:
     patchable_user_data = patchable_user_data.dict(exclude_unset=True)
     try:
+        # The version is checked by the update itself, without reading first.
         updated = await service.update_user_by_id(
-            user_id=user_id, **patchable_user_data
+            user_id=user_id,
+            versions=etags.if_match_versions(if_match),
+            **patchable_user_data,
         )
         if not updated:
             return None
-        return models.PublicUser(**updated.dict())
+        return json_responses.FastJSONResponse(
+            models.PublicUser(**dataclasses.asdict(updated)),
+            headers={"ETag": etags.make_etag(updated.version)},
+        )
+    except exceptions.UserVersionMismatchError as e:
+        raise fastapi.HTTPException(
+            status_code=fastapi.status.HTTP_412_PRECONDITION_FAILED,
+            detail="The user was modified.",
+        ) from e
     except exceptions.UsernameAlreadyExistsError as e:
         raise fastapi.HTTPException(
             status_code=fastapi.status.HTTP_409_CONFLICT,
@@ -76,9 +131,57 @@ async def patch_user(
         ) from e
 
 
+@controller.patch(":batch", response_model=models.UsersBatchPatchResult)
+async def patch_users(
+    users_batch_patch: models.UsersBatchPatch,
+) -> models.UsersBatchPatchResult:
+    patches = [
+        (item.user_id, item.dict(exclude_unset=True, exclude={"user_id"}))
+        for item in users_batch_patch.items
+    ]
+    updated = await service.update_users(patches)
+    results = []
+    for (user_id, _), result in zip(patches, updated):
+        if result is None:
+            results.append(
+                models.UserPatchResult(
+                    user_id=user_id,
+                    status=fastapi.status.HTTP_404_NOT_FOUND,
+                    detail="User not found.",
+                )
+            )
+        elif isinstance(result, exceptions.UsernameAlreadyExistsError):
+            results.append(
+                models.UserPatchResult(
+                    user_id=user_id,
+                    status=fastapi.status.HTTP_409_CONFLICT,
+                    detail="Username already taken.",
+                )
+            )
+        elif isinstance(result, exceptions.EmailAlreadyExistsError):
+            results.append(
+                models.UserPatchResult(
+                    user_id=user_id,
+                    status=fastapi.status.HTTP_409_CONFLICT,
+                    detail="Email already taken.",
+                )
+            )
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            results.append(
+                models.UserPatchResult(
+                    user_id=user_id,
+                    status=fastapi.status.HTTP_200_OK,
+                    user=models.PublicUser(**dataclasses.asdict(result)),
+                )
+            )
+    return models.UsersBatchPatchResult(results=results)
+
+
 @controller.delete("/{user_id}", response_model=models.PublicUser)
 async def delete_user(user_id: uuid.UUID) -> Optional[models.PublicUser]:
     deleted = await service.delete_user_by_id(user_id)
     if not deleted:
         return None
-    return models.PublicUser(**deleted.dict())
+    return models.PublicUser(**dataclasses.asdict(deleted))
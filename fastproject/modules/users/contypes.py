@@ -2,6 +2,9 @@
 
 import pydantic
 
+# The maximum number of items of a batch request.
+MAX_BATCH_SIZE = 1000
+
 Username = pydantic.constr(
     strip_whitespace=True, min_length=4, max_length=15, regex="[a-zA-Z0-9_]"
 )
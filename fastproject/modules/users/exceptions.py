@@ -19,3 +19,10 @@ class EmailAlreadyExistsError(exceptions.UniqueViolationError):
     Raised when inserting user records in the database and the email of the
     user that will be inserted already exists in the database.
     """
+
+
+class UserVersionMismatchError(ValueError):
+    """
+    Raised when updating a user in the database only if its row has one of the
+    expected versions, and it has another one: it was updated in the meantime.
+    """
@@ -0,0 +1,43 @@
+"""In-memory buffer of last_login updates waiting to be written."""
+
+import datetime
+import uuid
+from collections.abc import Iterable
+
+
+class LastLoginBuffer:
+    """Keeps the latest last_login of every user until it is flushed.
+
+    Logging in several times between two flushes only produces one write, the
+    one with the latest datetime.
+    """
+
+    def __init__(self):
+        self._last_logins: dict[uuid.UUID, datetime.datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self._last_logins)
+
+    def record(self, user_id: uuid.UUID, last_login: datetime.datetime) -> None:
+        """Records that a user logged in at the given datetime."""
+        current = self._last_logins.get(user_id)
+        if current is None or current < last_login:
+            self._last_logins[user_id] = last_login
+
+    def drain(self) -> tuple[list[uuid.UUID], list[datetime.datetime]]:
+        """
+        Returns the buffered updates sorted by user_id, as a list of user_ids
+        and a list of datetimes, and clears the buffer.
+        """
+        last_logins, self._last_logins = self._last_logins, {}
+        user_ids = sorted(last_logins)
+        return user_ids, [last_logins[user_id] for user_id in user_ids]
+
+    def restore(
+        self,
+        user_ids: Iterable[uuid.UUID],
+        last_logins: Iterable[datetime.datetime],
+    ) -> None:
+        """Puts back drained updates that could not be flushed."""
+        for user_id, last_login in zip(user_ids, last_logins):
+            self.record(user_id, last_login)
@@ -50,6 +50,45 @@ class PatchableUserData(pydantic.BaseModel):
     )
 
 
+class UserPatch(PatchableUserData):
+    """Represents the partial update of one user in a batch."""
+
+    user_id: uuid.UUID = pydantic.Field(..., description="User id")
+
+
+class UsersBatchPatch(pydantic.BaseModel):
+    """Represents the partial update of many users at once."""
+
+    items: list[UserPatch] = pydantic.Field(
+        ...,
+        min_items=1,
+        max_items=contypes.MAX_BATCH_SIZE,
+        description="Partial updates, at most one per user",
+    )
+
+    @pydantic.validator("items")
+    def validate_unique_user_ids(cls, value: list[UserPatch]) -> list[UserPatch]:
+        """Validates that every user is updated only once."""
+        if len({item.user_id for item in value}) != len(value):
+            raise ValueError("every user_id must appear only once")
+        return value
+
+
+class UserPatchResult(pydantic.BaseModel):
+    """Represents the result of the partial update of one user in a batch."""
+
+    user_id: uuid.UUID
+    status: int
+    user: Optional[PublicUser] = None
+    detail: Optional[str] = None
+
+
+class UsersBatchPatchResult(pydantic.BaseModel):
+    """Represents the results of a batch of partial updates, in order."""
+
+    results: list[UserPatchResult]
+
+
 class UserRegistrationData(pydantic.BaseModel):
     """
     Represents user data that can be used to register a user in the system and
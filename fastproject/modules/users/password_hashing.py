@@ -1,12 +1,16 @@
 """Utilities to hash and verify passwords using Argon2 algorithm."""
 
+import asyncio
 import base64
 import math
-from typing import Any, Optional
+import time
+from typing import Any, Callable, Optional, TypeVar
 
 import argon2
 
-from ...utils import crypto
+from ...utils import crypto, deadlines, saturation, timing
+
+T = TypeVar("T")
 
 SALT_ENTROPY = 128
 
@@ -27,6 +31,48 @@ _ARGON2_PARAMS = argon2.Parameters(
 )
 
 
+# How long hashing calls waited for a worker thread.
+_thread_waits = saturation.WaitMonitor()
+
+
+async def run_in_thread(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a hashing function in a worker thread, so it does not block the event
+    loop, and measure how long it waited for a free thread.
+
+    Once the deadline of the request passes it is not waited for anymore, and
+    if it is still queued for a thread it does not run.
+
+    Raises:
+      utils.deadlines.DeadlineExceededError: If the deadline passed first.
+    """
+    submitted = time.perf_counter()
+    started: Optional[float] = None
+
+    def run() -> T:
+        nonlocal started
+        started = time.perf_counter()
+        # The thread runs in a copy of the context, with the same deadline.
+        deadlines.check()
+        return func(*args)
+
+    try:
+        return await deadlines.wait_for(asyncio.to_thread(run))
+    finally:
+        # If it is still queued, it has waited until now.
+        wait = (started or time.perf_counter()) - submitted
+        _thread_waits.record(wait)
+        timing.record("hash_wait", wait)
+
+
+def recent_thread_wait() -> float:
+    """
+    Return the mean time hashing calls waited for a worker thread during the
+    last second.
+    """
+    return _thread_waits.value()
+
+
 def is_password_usable(encoded: Optional[str]) -> bool:
     """
     Return True if this password wasn't generated by make_password(None).
@@ -42,7 +88,8 @@ def check_password(password: str, encoded: str) -> bool:
     if not is_password_usable(encoded):
         return False
     try:
-        return argon2.PasswordHasher().verify(encoded, password)
+        with timing.span("hash"):
+            return argon2.PasswordHasher().verify(encoded, password)
     except argon2.exceptions.VerificationError:
         return False
 
@@ -83,15 +130,16 @@ def make_password(password: Optional[str], salt: Optional[str] = None) -> str:
         )
     salt = salt or generate_salt()
     params = _ARGON2_PARAMS
-    encoded = argon2.low_level.hash_secret(
-        password.encode(),
-        salt.encode(),
-        time_cost=params.time_cost,
-        memory_cost=params.memory_cost,
-        parallelism=params.parallelism,
-        hash_len=params.hash_len,
-        type=params.type,
-    )
+    with timing.span("hash"):
+        encoded = argon2.low_level.hash_secret(
+            password.encode(),
+            salt.encode(),
+            time_cost=params.time_cost,
+            memory_cost=params.memory_cost,
+            parallelism=params.parallelism,
+            hash_len=params.hash_len,
+            type=params.type,
+        )
     return encoded.decode("ascii")
 
 
@@ -1,19 +1,54 @@
 """Repository module."""
 
+import collections
 import dataclasses
 import datetime
 import pathlib
 import uuid
-from typing import Any, Optional
+from collections.abc import Iterable
+from typing import Any, Optional, Union
 
 import aiosql
 import asyncpg
 import asyncpg.pool
 
 from ... import db
+from ...utils import uuids
 from . import exceptions
 
-_queries = aiosql.from_path(pathlib.Path(__file__).resolve().parent / "sql", "asyncpg")
+_queries = aiosql.from_path(
+    pathlib.Path(__file__).resolve().parent / "sql", db.TracingAsyncPGAdapter
+)
+
+_UPDATABLE_FIELDS = (
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "password",
+    "is_superuser",
+    "is_staff",
+    "is_active",
+    "date_joined",
+)
+_NULLABLE_UPDATABLE_FIELDS = ("last_login",)
+# The fields of a user that are also stored in the directory, see
+# sql/directory_queries.sql.
+_DIRECTORY_FIELDS = ("username", "email", "is_superuser", "is_active")
+
+# The fields of a user that can be shared with the public, and their columns.
+PUBLIC_USER_COLUMNS = {
+    "user_id": "uuser_id",
+    "username": "username",
+    "email": "email",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "is_superuser": "is_superuser",
+    "is_staff": "is_staff",
+    "is_active": "is_active",
+    "date_joined": "date_joined",
+    "last_login": "last_login",
+}
 
 
 @dataclasses.dataclass
@@ -31,6 +66,26 @@ class User:
     is_active: bool
     date_joined: datetime.datetime
     last_login: Optional[datetime.datetime]
+    # The version of the row (its xmin), if it was read, see utils.etags.
+    version: Optional[str] = dataclasses.field(default=None, compare=False)
+
+
+def _user_from_record(record: asyncpg.Record) -> User:
+    user = dict(record)
+    user["user_id"] = user.pop("uuser_id")
+    return User(**user)
+
+
+def _already_exists_error(
+    e: asyncpg.UniqueViolationError,
+) -> asyncpg.UniqueViolationError:
+    """Returns the error that tells which field of a user already exists."""
+    msg = str(e)
+    if "username" in msg:
+        return exceptions.UsernameAlreadyExistsError()
+    if "email" in msg:
+        return exceptions.EmailAlreadyExistsError()
+    return e
 
 
 @db.with_connection
@@ -38,10 +93,15 @@ async def insert_user(conn: asyncpg.pool.PoolAcquireContext, **kwargs: Any) -> U
     """Inserts a user into the database.
 
     This function inserts the given values "as-is", so you must make the
-    desired transformations to the values before using this function.
+    desired transformations to the values before using this function. The
+    user_id is a time-ordered UUIDv7 generated by the application.
+
+    The username and the email are reserved in the directory (shard 0) and the
+    user is inserted into its shard, the directory is committed last. If the
+    directory is not committed, the user is deleted from its shard.
 
     Args:
-      conn: A database connection.
+      conn: A database connection to shard 0.
       **kwargs: The fields of the user and the value they will have. Example:
         username="snowball99".
 
@@ -52,20 +112,118 @@ async def insert_user(conn: asyncpg.pool.PoolAcquireContext, **kwargs: Any) -> U
       UsernameAlreadyExistsError: If the username already exists.
       EmailAlreadyExistsError: If the email already exists.
     """
+    user_id = uuids.uuid7()
+    shard = await db.shard_of(user_id)
+    shard_written = False
     try:
-        inserted = await _queries.insert_user(conn, **kwargs)
-        inserted["user_id"] = inserted.pop("uuser_id")
-        return User(**inserted)
+        async with conn.transaction():
+            await _queries.insert_directory_entry(
+                conn,
+                uuser_id=user_id,
+                **{field: kwargs[field] for field in _DIRECTORY_FIELDS},
+            )
+            async with db.shard_connection(shard, conn) as shard_conn:
+                shard_written = shard != db.DEFAULT_SHARD
+                inserted = await _queries.insert_user(
+                    shard_conn, uuser_id=user_id, **kwargs
+                )
     except asyncpg.UniqueViolationError as e:
-        msg = str(e)
-        if "username" in msg:
-            raise exceptions.UsernameAlreadyExistsError from e
-        if "email" in msg:
-            raise exceptions.EmailAlreadyExistsError from e
-        raise e from e
+        raise _already_exists_error(e) from e
+    except BaseException:
+        if shard_written:
+            # The shard may be committed, the directory was not.
+            async with db.shard_connection(shard) as shard_conn:
+                await _queries.delete_user_by_id(shard_conn, uuser_id=user_id)
+        raise
+    return _user_from_record(inserted)
 
 
 @db.with_connection
+async def insert_users(
+    conn: asyncpg.pool.PoolAcquireContext, users: list[dict[str, Any]]
+) -> list[Union[User, asyncpg.UniqueViolationError]]:
+    """Inserts many users into the database with a single statement per shard.
+
+    Like insert_user, the given values are inserted "as-is", and the users
+    are deleted from their shards if the directory is not committed. A user
+    whose username or email already exists (in the database or earlier in
+    users) is not inserted, and the others are inserted anyway.
+
+    Args:
+      conn: A database connection to shard 0.
+      users: The fields of every user and the value they will have, every dict
+        takes the same keys as the **kwargs of insert_user.
+
+    Returns:
+      A list with one item per user, in the same order: a User representing the
+      inserted user, or a UsernameAlreadyExistsError or EmailAlreadyExistsError
+      if it was not inserted.
+    """
+    user_ids = [uuids.uuid7() for _ in users]
+    results: list[Union[User, asyncpg.UniqueViolationError, None]] = [None] * len(users)
+    written_ids_by_shard = {}
+    try:
+        async with conn.transaction():
+            reserved = await _queries.insert_directory_entries(
+                conn,
+                uuser_ids=user_ids,
+                **{
+                    f"{field}s": [user[field] for user in users]
+                    for field in _DIRECTORY_FIELDS
+                },
+            )
+            reserved_ids = {record["uuser_id"] for record in reserved}
+            shard_map = await db.get_shard_map()
+            indexes_by_shard = collections.defaultdict(list)
+            for i, user_id in enumerate(user_ids):
+                if user_id in reserved_ids:
+                    indexes_by_shard[shard_map.shard_of(user_id)].append(i)
+            for shard, indexes in indexes_by_shard.items():
+                async with db.shard_connection(shard, conn) as shard_conn:
+                    if shard != db.DEFAULT_SHARD:
+                        written_ids_by_shard[shard] = [user_ids[i] for i in indexes]
+                    inserted = await _queries.insert_users(
+                        shard_conn,
+                        uuser_ids=[user_ids[i] for i in indexes],
+                        **{
+                            f"{field}s": [users[i][field] for i in indexes]
+                            for field in (
+                                *_UPDATABLE_FIELDS,
+                                *_NULLABLE_UPDATABLE_FIELDS,
+                            )
+                        },
+                    )
+                for i, record in zip(indexes, inserted):
+                    results[i] = _user_from_record(record)
+            rejected = [
+                user["username"]
+                for user, result in zip(users, results)
+                if result is None
+            ]
+            if not rejected:
+                return results
+            # The rejected users conflicted on their username or on their email,
+            # the usernames that exist now (including the ones just inserted)
+            # tell which.
+            existing = await _queries.get_existing_usernames(conn, usernames=rejected)
+    except BaseException:
+        # The shards may be committed, the directory was not.
+        for shard, written_ids in written_ids_by_shard.items():
+            async with db.shard_connection(shard) as shard_conn:
+                await _queries.delete_users_by_ids(shard_conn, uuser_ids=written_ids)
+        raise
+    existing_usernames = {record["username"] for record in existing}
+    for i, user in enumerate(users):
+        if results[i] is not None:
+            continue
+        if user["username"] in existing_usernames:
+            results[i] = exceptions.UsernameAlreadyExistsError()
+        else:
+            results[i] = exceptions.EmailAlreadyExistsError()
+    return results
+
+
+@db.with_connection(shard_key="user_id")
 async def get_user_by_id(
     conn: asyncpg.pool.PoolAcquireContext, user_id: uuid.UUID
 ) -> Optional[User]:
@@ -73,7 +231,7 @@ async def get_user_by_id(
 
     Args:
       user_id: The user_id of the searched user.
-      conn: A database connection.
+      conn: A database connection to the shard of the user.
 
     Returns:
       A User representing the searched user, None if the user was not
@@ -81,79 +239,410 @@ async def get_user_by_id(
     """
     searched = await _queries.get_user_by_id(conn, uuser_id=user_id)
     if not searched:
+        await db.check_not_moved(conn, [user_id])
+        return None
+    return _user_from_record(searched)
+
+
+@db.with_connection(shard_key="user_id")
+async def get_user_version(
+    conn: asyncpg.pool.PoolAcquireContext, user_id: uuid.UUID
+) -> Optional[str]:
+    """Returns the version of the row of a user, see utils.etags.
+
+    Args:
+      user_id: The user_id of the searched user.
+      conn: A database connection to the shard of the user.
+
+    Returns:
+      The version, None if the user was not found.
+    """
+    version = await _queries.get_user_version(conn, uuser_id=user_id)
+    if version is None:
+        await db.check_not_moved(conn, [user_id])
+    return version
+
+
+@db.with_connection(shard_key="user_id")
+async def get_user_fields_by_id(
+    conn: asyncpg.pool.PoolAcquireContext,
+    user_id: uuid.UUID,
+    fields: Optional[Iterable[str]] = None,
+) -> Optional[tuple[dict[str, Any], str]]:
+    """
+    Returns the public fields of the user with the specified user_id from the
+    database, only the requested fields are selected.
+
+    Args:
+      user_id: The user_id of the searched user.
+      fields: The fields to return, keys of PUBLIC_USER_COLUMNS. If None, all
+        of them are returned.
+      conn: A database connection to the shard of the user.
+
+    Returns:
+      A dict with the requested fields of the searched user and the version of
+      its row, None if the user was not found.
+
+    Raises:
+      ValueError: If a field is not a public field of the user.
+    """
+    searched = await conn.fetchrow(
+        f"SELECT {db.select_list(fields, PUBLIC_USER_COLUMNS)}, "
+        "xmin::text AS version FROM uuser WHERE uuser_id = $1",
+        user_id,
+    )
+    if not searched:
+        await db.check_not_moved(conn, [user_id])
         return None
-    searched["user_id"] = searched.pop("uuser_id")
-    return User(**searched)
+    searched = dict(searched)
+    return searched, searched.pop("version")
 
 
 @db.with_connection
+async def get_user_by_username(
+    conn: asyncpg.pool.PoolAcquireContext, username: str
+) -> Optional[User]:
+    """Returns the user with the specified username from the database.
+
+    The user_id is looked up in the directory (shard 0), then the user is read
+    from its shard.
+
+    Args:
+      username: The username of the searched user.
+      conn: A database connection to shard 0.
+
+    Returns:
+      A User representing the searched user, None if the user was not
+      found.
+    """
+    user_id = await _queries.get_uuser_id_by_username(conn, username=username)
+    if user_id is None:
+        return None
+    async with db.shard_connection(await db.shard_of(user_id), conn) as shard_conn:
+        searched = await _queries.get_user_by_id(shard_conn, uuser_id=user_id)
+        if not searched:
+            await db.check_not_moved(shard_conn, [user_id])
+            return None
+    return _user_from_record(searched)
+
+
+async def _update_user(
+    conn: asyncpg.pool.PoolAcquireContext,
+    user_id: uuid.UUID,
+    versions: Optional[list[str]],
+    update_data: dict[str, Any],
+) -> Optional[asyncpg.Record]:
+    updated = await _queries.update_user_by_id(
+        conn, uuser_id=user_id, versions=versions, **update_data
+    )
+    if updated is None:
+        if versions is not None:
+            if await _queries.get_user_version(conn, uuser_id=user_id) is not None:
+                raise exceptions.UserVersionMismatchError()
+        await db.check_not_moved(conn, [user_id])
+    return updated
+
+
+async def _restore_user(
+    conn: asyncpg.pool.PoolAcquireContext,
+    previous: asyncpg.Record,
+    updated: asyncpg.Record,
+    update_data: dict[str, Any],
+) -> None:
+    """
+    Restores the fields of update_data of a user to their previous values,
+    unless the user was updated again.
+    """
+    restored = {
+        field: previous[field]
+        for field in _UPDATABLE_FIELDS
+        if update_data[field] is not None
+    }
+    restored.update(
+        (field, previous[field])
+        for field in _NULLABLE_UPDATABLE_FIELDS
+        if update_data[f"update_{field}"]
+    )
+    await _queries.update_user_by_id(
+        conn,
+        uuser_id=previous["uuser_id"],
+        versions=[updated["version"]],
+        **db.updater_fields(_UPDATABLE_FIELDS, _NULLABLE_UPDATABLE_FIELDS, **restored),
+    )
+
+
+@db.with_connection(shard_key="user_id")
 async def update_user_by_id(
-    conn: asyncpg.pool.PoolAcquireContext, user_id: uuid.UUID, **kwargs: Any
+    conn: asyncpg.pool.PoolAcquireContext,
+    user_id: uuid.UUID,
+    versions: Optional[list[str]] = None,
+    **kwargs: Any,
 ) -> Optional[User]:
     """
     Updates the data of a user with the specified user_id in the database. Not
     provided fields won't be updated.
 
+    Only the shard of the user is touched, unless one of _DIRECTORY_FIELDS is
+    updated: then the directory (shard 0) is updated too and committed last.
+    If the directory is not committed, the updated fields of the user are
+    restored in its shard, unless the user was updated again meanwhile.
+
     Args:
       user_id: The user_id of the user that will be updated.
-      conn: A database connection.
+      versions: If not None, the user is only updated if the version of its
+        row is one of them (optimistic concurrency, see utils.etags).
+      conn: A database connection to the shard of the user.
       **kwargs: The fields of the user and the value they will have. Example:
         username="snowball99".
 
     Returns:
-      A User representing the updated user, None if the user was not
-      updated.
+      A User representing the updated user, with the new version of its row,
+      None if the user was not updated.
 
     Raises:
       UsernameAlreadyExistsError: If the username already exists.
       EmailAlreadyExistsError: If the email already exists.
+      UserVersionMismatchError: If the version of the row of the user is not
+        one of versions.
     """
-    fields = (
-        "username",
-        "email",
-        "first_name",
-        "last_name",
-        "password",
-        "is_superuser",
-        "is_staff",
-        "is_active",
-        "date_joined",
+    update_data = db.updater_fields(
+        _UPDATABLE_FIELDS, _NULLABLE_UPDATABLE_FIELDS, **kwargs
     )
-    null_fields = ("last_login",)
-    update_data = db.updater_fields(fields, null_fields, **kwargs)
     try:
-        updated = await _queries.update_user_by_id(
-            conn, uuser_id=user_id, **update_data
-        )
-        if not updated:
-            return None
-        updated["user_id"] = updated.pop("uuser_id")
-        return User(**updated)
+        if all(update_data[field] is None for field in _DIRECTORY_FIELDS):
+            updated = await _update_user(conn, user_id, versions, update_data)
+        else:
+            shard = await db.shard_of(user_id)
+            async with db.shard_connection(
+                db.DEFAULT_SHARD, conn, conn_shard=shard
+            ) as directory_conn:
+                committed = None
+                try:
+                    async with directory_conn.transaction():
+                        found = await _queries.update_directory_entry(
+                            directory_conn,
+                            uuser_id=user_id,
+                            **{
+                                field: update_data[field] for field in _DIRECTORY_FIELDS
+                            },
+                        )
+                        if found is None:
+                            return None
+                        # A mismatch rolls the directory back.
+                        if shard == db.DEFAULT_SHARD:
+                            updated = await _update_user(
+                                conn, user_id, versions, update_data
+                            )
+                        else:
+                            async with conn.transaction():
+                                previous = await _queries.get_user_by_id_for_update(
+                                    conn, uuser_id=user_id
+                                )
+                                updated = await _update_user(
+                                    conn, user_id, versions, update_data
+                                )
+                            if updated is not None:
+                                committed = previous, updated
+                except BaseException:
+                    if committed is not None:
+                        # The shard was committed first, the directory was not.
+                        await _restore_user(conn, *committed, update_data)
+                    raise
     except asyncpg.UniqueViolationError as e:
-        msg = str(e)
-        if "username" in msg:
-            raise exceptions.UsernameAlreadyExistsError from e
-        if "email" in msg:
-            raise exceptions.EmailAlreadyExistsError from e
-        raise e from e
+        raise _already_exists_error(e) from e
+    if not updated:
+        return None
+    return _user_from_record(updated)
 
 
-@db.with_connection
+@db.with_connection(lane=db.lanes.BULK)
+async def update_users(
+    conn: asyncpg.pool.PoolAcquireContext,
+    patches: list[tuple[uuid.UUID, dict[str, Any]]],
+) -> list[Union[User, None, asyncpg.UniqueViolationError]]:
+    """
+    Updates the data of many users in the database, every user can update
+    different fields. Not provided fields won't be updated.
+
+    The entries of the directory (shard 0) are updated with a single statement.
+    If it fails because a username or an email already exists, every entry is
+    updated on its own (inside a savepoint), so only the conflicting users are
+    not updated. Then the users are updated with a single statement per shard,
+    and the directory is committed last.
+
+    Args:
+      conn: A database connection to shard 0.
+      patches: A list of (user_id, fields) tuples, the fields of the user and
+        the value they will have take the same keys as the **kwargs of
+        update_user_by_id. A user_id must appear only once.
+
+    Returns:
+      A list with one item per patch, in the same order: a User representing
+      the updated user, None if the user was not found, or a
+      UsernameAlreadyExistsError or EmailAlreadyExistsError if it was not
+      updated.
+    """
+    update_data = [
+        db.updater_fields(_UPDATABLE_FIELDS, _NULLABLE_UPDATABLE_FIELDS, **fields)
+        for _, fields in patches
+    ]
+    results: list[Union[User, None, asyncpg.UniqueViolationError]] = [None] * len(
+        patches
+    )
+    # The indexes of the patches that update the directory, and of those that
+    # can not be applied to the shards.
+    directory_indexes = [
+        i
+        for i, data in enumerate(update_data)
+        if any(data[field] is not None for field in _DIRECTORY_FIELDS)
+    ]
+    skipped = set()
+    async with conn.transaction():
+        if directory_indexes:
+            try:
+                async with conn.transaction():
+                    found = await _queries.update_directory_entries(
+                        conn,
+                        uuser_ids=[patches[i][0] for i in directory_indexes],
+                        **{
+                            f"{field}s": [
+                                update_data[i][field] for i in directory_indexes
+                            ]
+                            for field in _DIRECTORY_FIELDS
+                        },
+                    )
+                found_ids = {record["uuser_id"] for record in found}
+                skipped.update(
+                    i for i in directory_indexes if patches[i][0] not in found_ids
+                )
+            except asyncpg.UniqueViolationError:
+                for i in directory_indexes:
+                    try:
+                        async with conn.transaction():
+                            found = await _queries.update_directory_entry(
+                                conn,
+                                uuser_id=patches[i][0],
+                                **{
+                                    field: update_data[i][field]
+                                    for field in _DIRECTORY_FIELDS
+                                },
+                            )
+                        if found is None:
+                            skipped.add(i)
+                    except asyncpg.UniqueViolationError as e:
+                        error = _already_exists_error(e)
+                        error.__cause__ = e
+                        results[i] = error
+                        skipped.add(i)
+        shard_map = await db.get_shard_map()
+        indexes_by_shard = collections.defaultdict(list)
+        for i, (user_id, _) in enumerate(patches):
+            if i not in skipped:
+                indexes_by_shard[shard_map.shard_of(user_id)].append(i)
+        for shard, indexes in indexes_by_shard.items():
+            async with db.shard_connection(
+                shard, conn, lane=db.lanes.BULK
+            ) as shard_conn:
+                updated = await _queries.update_users(
+                    shard_conn,
+                    uuser_ids=[patches[i][0] for i in indexes],
+                    **{
+                        f"{field}s": [update_data[i][field] for i in indexes]
+                        for field in (
+                            *_UPDATABLE_FIELDS,
+                            *_NULLABLE_UPDATABLE_FIELDS,
+                            *(
+                                f"update_{field}"
+                                for field in _NULLABLE_UPDATABLE_FIELDS
+                            ),
+                        )
+                    },
+                )
+                updated_users = {record["uuser_id"]: record for record in updated}
+                missing = [
+                    patches[i][0] for i in indexes if patches[i][0] not in updated_users
+                ]
+                if missing:
+                    await db.check_not_moved(shard_conn, missing)
+            for i in indexes:
+                if patches[i][0] in updated_users:
+                    results[i] = _user_from_record(updated_users[patches[i][0]])
+    return results
+
+
+async def update_last_logins(
+    user_ids: list[uuid.UUID],
+    last_logins: list[datetime.datetime],
+    conn: Optional[asyncpg.pool.PoolAcquireContext] = None,
+) -> None:
+    """Updates the last_login of many users with a single statement per shard.
+
+    A last_login is only updated if the given datetime is later than the
+    stored one.
+
+    Args:
+      user_ids: The user_ids of the users, sorted.
+      last_logins: The datetime every user in user_ids last logged in.
+      conn: A database connection to shard 0, if None, the connections needed
+        are opened and closed.
+    """
+    shard_map = await db.get_shard_map()
+    logins_by_shard = collections.defaultdict(lambda: ([], []))
+    for user_id, last_login in zip(user_ids, last_logins):
+        shard_user_ids, shard_last_logins = logins_by_shard[shard_map.shard_of(user_id)]
+        shard_user_ids.append(user_id)
+        shard_last_logins.append(last_login)
+    for shard, (shard_user_ids, shard_last_logins) in logins_by_shard.items():
+        async with db.shard_connection(shard, conn, lane=db.lanes.BULK) as shard_conn:
+            await _queries.update_last_logins(
+                shard_conn, uuser_ids=shard_user_ids, last_logins=shard_last_logins
+            )
+            # Which users were not found is not known.
+            await db.check_not_moved(shard_conn, shard_user_ids)
+
+
+@db.with_connection(shard_key="user_id")
 async def delete_user_by_id(
     conn: asyncpg.pool.PoolAcquireContext, user_id: uuid.UUID
 ) -> Optional[User]:
     """Deletes the user with the specified user_id from the database.
 
+    The entry of the directory (shard 0) is deleted first, it fails if the user
+    still has skills, groups or permissions. The directory is committed last.
+
     Args:
       user_id: The user_id of the user that will be deleted.
-      conn: A database connection.
+      conn: A database connection to the shard of the user.
 
     Returns:
       A User representing the deleted user, None if the user was not
       deleted.
     """
-    deleted = await _queries.delete_user_by_id(conn, uuser_id=user_id)
+    async with db.shard_connection(
+        db.DEFAULT_SHARD, conn, conn_shard=await db.shard_of(user_id)
+    ) as directory_conn, directory_conn.transaction():
+        await _queries.set_constraints_immediate(directory_conn)
+        await _queries.delete_directory_entry(directory_conn, uuser_id=user_id)
+        deleted = await _queries.delete_user_by_id(conn, uuser_id=user_id)
+        if not deleted:
+            # Rolls the directory back.
+            await db.check_not_moved(conn, [user_id])
     if not deleted:
         return None
-    deleted["user_id"] = deleted.pop("uuser_id")
-    return User(**deleted)
+    return _user_from_record(deleted)
+
+
+@db.with_connection
+async def notify_users_changed(
+    conn: asyncpg.pool.PoolAcquireContext, channel: str, payloads: list[str]
+) -> None:
+    """Sends the notifications that tell the other workers users changed.
+
+    They are sent on shard 0, where the workers listen.
+
+    Args:
+      channel: The channel of the notifications.
+      payloads: The payload of every notification.
+      conn: A database connection to shard 0.
+    """
+    await _queries.notify_users_changed(conn, channel=channel, payloads=payloads)
@@ -1,15 +1,110 @@
 """Service module."""
 
+import asyncio
 import datetime
+import logging
 import uuid
 import zoneinfo
-from typing import Any, Optional
+from collections.abc import Iterable
+from typing import Any, Optional, Union
 
-from ... import config
-from ...utils import encoding
+import asyncpg
+
+from ... import config, db
+from ...utils import batching, caches, deadlines, encoding, tasks, timing, tracing
 from . import password_hashing, repository
+from .last_login import LastLoginBuffer
+
+logger = logging.getLogger(__name__)
+
+USERS_CHANGED_CHANNEL = "users_changed"
+# The user_ids sent per notification, a payload must be under 8000 bytes.
+_NOTIFY_BATCH_SIZE = 200
+
+# Read-through cache of the public fields of the users and the version of their
+# rows, keyed by user_id; the password hash is never cached. An entry is
+# forgotten when its user is written: right away in this worker and through
+# USERS_CHANGED_CHANNEL in the others. The TTL bounds how long an entry can be
+# stale if a notification is lost.
+_cache = caches.LRUCache(
+    maxsize=config.settings.getint("USERS", "cache_size", fallback=10_000),
+    ttl=config.settings.getfloat("USERS", "cache_ttl", fallback=30.0),
+)
+# Incremented by every invalidation: a read does not cache what it read if an
+# invalidation happened meanwhile, it may be older than the invalidated entry.
+_invalidations = 0
+
+# last_login updates are written behind: they are buffered and flushed as a
+# single UPDATE every last_login_flush_interval seconds, or as soon as
+# last_login_flush_size users are waiting. At most the buffered updates are lost
+# if the process dies without a clean shutdown.
+_last_logins = LastLoginBuffer()
+_last_login_flush_size = config.settings.getint(
+    "USERS", "last_login_flush_size", fallback=1000
+)
+_last_login_flushes: set[asyncio.Task] = set()
+
+# When registration coalescing is enabled, the registrations that arrive within
+# registration_batch_delay milliseconds are inserted with one statement (and
+# one commit) instead of one each.
+_registrations: Optional[batching.Coalescer] = None
+if config.settings.getboolean("USERS", "registration_coalescing", fallback=False):
+    _registrations = batching.Coalescer(
+        repository.insert_users,
+        config.settings.getfloat("USERS", "registration_batch_delay", fallback=2.0)
+        / 1000,
+        config.settings.getint("USERS", "registration_batch_size", fallback=100),
+    )
+
+
+def _forget(user_ids: Iterable[uuid.UUID]) -> None:
+    global _invalidations
+    _invalidations += 1
+    for user_id in user_ids:
+        _cache.pop(user_id)
+
+
+def _forget_all(payload: Optional[str] = None) -> None:
+    global _invalidations
+    _invalidations += 1
+    _cache.clear()
+
+
+def _on_users_changed(payload: Optional[str]) -> None:
+    if payload is None:
+        # Notifications may have been lost.
+        _forget_all()
+    else:
+        _forget(uuid.UUID(user_id) for user_id in payload.split(","))
+
+
+db.notification_listener.subscribe(USERS_CHANGED_CHANNEL, _on_users_changed)
+# A user moved to another shard has a new row, so a new version.
+db.notification_listener.subscribe(db.shards.SHARD_MAP_CHANNEL, _forget_all)
+
+
+async def _invalidate(user_ids: list[uuid.UUID]) -> None:
+    """Forgets the cached users in this worker, then in the others."""
+    if not user_ids:
+        return
+    _forget(user_ids)
+    payloads = [
+        ",".join(str(user_id) for user_id in user_ids[i : i + _NOTIFY_BATCH_SIZE])
+        for i in range(0, len(user_ids), _NOTIFY_BATCH_SIZE)
+    ]
+    try:
+        await repository.notify_users_changed(USERS_CHANGED_CHANNEL, payloads)
+    except Exception:  # pylint: disable=broad-except
+        # The write is done, the other workers forget the users after the TTL.
+        logger.exception("Could not notify that %d users changed.", len(user_ids))
 
 
+def cache_stats() -> dict[str, int]:
+    """Returns the hit, miss and eviction counters of the user cache."""
+    return _cache.stats()
+
+
+@tracing.traced
 async def create_user(
     username: str,
     email: str,
@@ -24,6 +119,10 @@ async def create_user(
 ) -> repository.User:
     """Inserts a user into the database.
 
+    The password is hashed in a worker thread, so Argon2 does not block the
+    event loop. If registration coalescing is enabled, the user is inserted
+    together with the other users registered at the same time.
+
     Args:
       username: The username of the user.
       email: The email of the user.
@@ -43,31 +142,40 @@ async def create_user(
       UsernameAlreadyExistsError: If the username already exists.
       EmailAlreadyExistsError: If the email already exists.
     """
-    username = encoding.normalize_str(username)
-    email = encoding.normalize_str(email)
-    first_name = encoding.normalize_str(first_name)
-    last_name = encoding.normalize_str(last_name)
+    with timing.span("normalize"):
+        username = encoding.normalize_str(username)
+        email = encoding.normalize_str(email)
+        first_name = encoding.normalize_str(first_name)
+        last_name = encoding.normalize_str(last_name)
     if date_joined is None:
         tzinfo = zoneinfo.ZoneInfo(config.settings["APPLICATION"]["timezone"])
         date_joined = datetime.datetime.now(tz=tzinfo)
-    password_hash = password_hashing.make_password(password)
-    return await repository.insert_user(
-        username=username,
-        email=email,
-        first_name=first_name,
-        last_name=last_name,
-        password=password_hash,
-        date_joined=date_joined,
-        is_superuser=is_superuser,
-        is_staff=is_staff,
-        is_active=is_active,
-        last_login=last_login,
+    password_hash = await password_hashing.run_in_thread(
+        password_hashing.make_password, password
     )
+    user = {
+        "username": username,
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "password": password_hash,
+        "date_joined": date_joined,
+        "is_superuser": is_superuser,
+        "is_staff": is_staff,
+        "is_active": is_active,
+        "last_login": last_login,
+    }
+    if _registrations is not None:
+        return await _registrations.submit(user)
+    return await repository.insert_user(**user)
 
 
+@tracing.traced
 async def get_user_by_id(user_id: uuid.UUID) -> Optional[repository.User]:
     """Returns the user with the specified user_id from the database.
 
+    It is not cached, the user has the password hash.
+
     Args:
       user_id: The user_id of the searched user.
 
@@ -78,13 +186,83 @@ async def get_user_by_id(user_id: uuid.UUID) -> Optional[repository.User]:
     return await repository.get_user_by_id(user_id)
 
 
+@tracing.traced
+async def get_user_version(user_id: uuid.UUID) -> Optional[str]:
+    """Returns the version of the user with the given user_id.
+
+    Args:
+      user_id: The user_id of the searched user.
+
+    Returns:
+      The version of the row of the user, see utils.etags, None if the user
+      was not found.
+    """
+    cached = _cache.get(user_id)
+    if cached is not None:
+        return cached[1]
+    return await repository.get_user_version(user_id)
+
+
+@tracing.traced
+async def get_user_fields_by_id(
+    user_id: uuid.UUID, fields: Optional[list[str]] = None
+) -> Optional[tuple[dict[str, Any], str]]:
+    """Returns the requested public fields of the user with the given user_id.
+
+    They are read through the user cache: on a miss every public field is read
+    and cached, whatever fields were requested.
+
+    Args:
+      user_id: The user_id of the searched user.
+      fields: The fields to return, all the public fields if None.
+
+    Returns:
+      A dict with the requested fields of the searched user and the version of
+      its row, None if the user was not found.
+
+    Raises:
+      ValueError: If a field is not a public field of the user.
+    """
+    # Validates the fields, like the query would.
+    db.select_list(fields, repository.PUBLIC_USER_COLUMNS)
+    cached = _cache.get(user_id)
+    if cached is None:
+        invalidations = _invalidations
+        cached = await repository.get_user_fields_by_id(user_id)
+        if cached is None:
+            return None
+        # Without the listener, the writes of other workers would go unnoticed.
+        if db.notification_listener.listening and invalidations == _invalidations:
+            _cache.set(user_id, cached)
+    user, version = cached
+    if fields is None:
+        return dict(user), version
+    return {field: value for field, value in user.items() if field in fields}, version
+
+
+def _prepare_update_fields(fields: dict[str, Any]) -> dict[str, Any]:
+    fields = dict(fields)
+    with timing.span("normalize"):
+        for field in ("username", "email", "first_name", "last_name"):
+            if field in fields:
+                fields[field] = encoding.normalize_str(fields[field])
+    if "password" in fields:
+        fields["password"] = password_hashing.make_password(fields["password"])
+    return fields
+
+
+@tracing.traced
 async def update_user_by_id(
-    user_id: uuid.UUID, **kwargs: Any
+    user_id: uuid.UUID, versions: Optional[list[str]] = None, **kwargs: Any
 ) -> Optional[repository.User]:
     """Updates the data of the user with the specified user_id in the database.
 
+    The new password, if any, is hashed in a worker thread.
+
     Args:
       user_id: The user_id of the user that will be updated.
+      versions: If not None, the user is only updated if the version of its
+        row is one of them.
       **username (str): The username of the user.
       **email (str): The email of the user.
       **first_name (str): The first name of the user.
@@ -104,20 +282,57 @@ async def update_user_by_id(
     Raises:
       UsernameAlreadyExistsError: If the username already exists.
       EmailAlreadyExistsError: If the email already exists.
+      UserVersionMismatchError: If the version of the row of the user is not
+        one of versions.
+    """
+    password = kwargs.pop("password", None)
+    kwargs = _prepare_update_fields(kwargs)
+    if password is not None:
+        kwargs["password"] = await password_hashing.run_in_thread(
+            password_hashing.make_password, password
+        )
+    updated = await repository.update_user_by_id(user_id, versions, **kwargs)
+    if updated is not None:
+        await _invalidate([user_id])
+    return updated
+
+
+@tracing.traced
+async def update_users(
+    patches: list[tuple[uuid.UUID, dict[str, Any]]],
+) -> list[Union[repository.User, None, asyncpg.UniqueViolationError]]:
+    """Updates the data of many users in the database at once.
+
+    The fields are normalized (and the passwords hashed) in a worker thread.
+
+    Args:
+      patches: A list of (user_id, fields) tuples, the fields take the same
+        keys as the **kwargs of update_user_by_id. A user_id must appear only
+        once.
+
+    Returns:
+      A list with one item per patch, in the same order: a repository.User
+      representing the updated user, None if the user was not found, or a
+      UsernameAlreadyExistsError or EmailAlreadyExistsError if it was not
+      updated.
     """
-    if "username" in kwargs:
-        kwargs["username"] = encoding.normalize_str(kwargs["username"])
-    if "email" in kwargs:
-        kwargs["email"] = encoding.normalize_str(kwargs["email"])
-    if "first_name" in kwargs:
-        kwargs["first_name"] = encoding.normalize_str(kwargs["first_name"])
-    if "last_name" in kwargs:
-        kwargs["last_name"] = encoding.normalize_str(kwargs["last_name"])
-    if "password" in kwargs:
-        kwargs["password"] = password_hashing.make_password(kwargs["password"])
-    return await repository.update_user_by_id(user_id, **kwargs)
+    prepared = await password_hashing.run_in_thread(
+        lambda: [
+            (user_id, _prepare_update_fields(fields)) for user_id, fields in patches
+        ]
+    )
+    updated = await repository.update_users(prepared)
+    await _invalidate(
+        [
+            user_id
+            for (user_id, _), result in zip(patches, updated)
+            if isinstance(result, repository.User)
+        ]
+    )
+    return updated
 
 
+@tracing.traced
 async def delete_user_by_id(user_id: uuid.UUID) -> Optional[repository.User]:
     """Deletes the user with the specified user_id from the database.
 
@@ -128,4 +343,59 @@ async def delete_user_by_id(user_id: uuid.UUID) -> Optional[repository.User]:
       A repository.User representing the deleted user, None if the user was not
       deleted.
     """
-    return await repository.delete_user_by_id(user_id)
+    deleted = await repository.delete_user_by_id(user_id)
+    if deleted is not None:
+        await _invalidate([user_id])
+    return deleted
+
+
+def record_last_login(
+    user_id: uuid.UUID, last_login: Optional[datetime.datetime] = None
+) -> None:
+    """Records that a user logged in, the database is updated later.
+
+    Args:
+      user_id: The user_id of the user that logged in.
+      last_login: The datetime the user logged in, defaults to now.
+    """
+    if last_login is None:
+        last_login = datetime.datetime.now(tz=datetime.timezone.utc)
+    _last_logins.record(user_id, last_login)
+    if len(_last_logins) >= _last_login_flush_size:
+        # The flush is for every login, not only the one of this request.
+        with deadlines.without_deadline():
+            task = asyncio.ensure_future(_flush_last_logins_in_background())
+        _last_login_flushes.add(task)
+        task.add_done_callback(_last_login_flushes.discard)
+
+
+async def _flush_last_logins_in_background() -> None:
+    try:
+        await flush_last_logins()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not flush the last_login updates.")
+
+
+@tracing.traced
+async def flush_last_logins() -> int:
+    """Writes the buffered last_login updates to the database.
+
+    Returns:
+      The number of users whose last_login was written.
+    """
+    user_ids, last_logins = _last_logins.drain()
+    if not user_ids:
+        return 0
+    try:
+        await repository.update_last_logins(user_ids, last_logins)
+    except BaseException:
+        _last_logins.restore(user_ids, last_logins)
+        raise
+    await _invalidate(user_ids)
+    return len(user_ids)
+
+
+last_login_flusher = tasks.PeriodicTask(
+    flush_last_logins,
+    config.settings.getfloat("USERS", "last_login_flush_interval", fallback=1.0),
+)
@@ -1,6 +1,7 @@
 -- name: insert-user<!
 -- Insert a user
 INSERT INTO uuser (
+    uuser_id,
     username,
     email,
     first_name,
@@ -12,6 +13,7 @@ INSERT INTO uuser (
     date_joined,
     last_login
 ) VALUES (
+    :uuser_id,
     :username,
     :email,
     :first_name,
@@ -22,32 +24,128 @@ INSERT INTO uuser (
     :is_active,
     :date_joined,
     :last_login
-) RETURNING uuser.*;
+)
+RETURNING uuser.uuser_id,
+          uuser.username,
+          uuser.email,
+          uuser.first_name,
+          uuser.last_name,
+          uuser.password,
+          uuser.is_superuser,
+          uuser.is_staff,
+          uuser.is_active,
+          uuser.date_joined,
+          uuser.last_login;
+
+
+-- name: insert-users
+-- Insert many users with a single statement. Their usernames and emails must
+-- be reserved in uuser_directory first.
+INSERT INTO uuser (
+    uuser_id,
+    username,
+    email,
+    first_name,
+    last_name,
+    password,
+    is_superuser,
+    is_staff,
+    is_active,
+    date_joined,
+    last_login
+)
+SELECT *
+  FROM unnest(
+           :uuser_ids::uuid[],
+           :usernames::varchar[],
+           :emails::varchar[],
+           :first_names::varchar[],
+           :last_names::varchar[],
+           :passwords::varchar[],
+           :is_superusers::boolean[],
+           :is_staffs::boolean[],
+           :is_actives::boolean[],
+           :date_joineds::timestamptz[],
+           :last_logins::timestamptz[]
+       )
+RETURNING uuser.uuser_id,
+          uuser.username,
+          uuser.email,
+          uuser.first_name,
+          uuser.last_name,
+          uuser.password,
+          uuser.is_superuser,
+          uuser.is_staff,
+          uuser.is_active,
+          uuser.date_joined,
+          uuser.last_login;
 
 
 -- name: get-all-users
 -- Get all users
-SELECT *
+SELECT uuser_id,
+       username,
+       email,
+       first_name,
+       last_name,
+       password,
+       is_superuser,
+       is_staff,
+       is_active,
+       date_joined,
+       last_login
   FROM uuser;
 
 
--- name: get-user-by-username^
--- Get a user with the given username field
-SELECT *
+-- name: get-user-by-id^
+-- Get a user with the given uuser_id, and the version of its row
+SELECT uuser_id,
+       username,
+       email,
+       first_name,
+       last_name,
+       password,
+       is_superuser,
+       is_staff,
+       is_active,
+       date_joined,
+       last_login,
+       xmin::text AS version
   FROM uuser
- WHERE username = :username;
+ WHERE uuser_id = :uuser_id;
 
 
--- name: get-user-by-id^
--- Get a user with the given uuser_id
-SELECT *
+-- name: get-user-by-id-for-update^
+-- Get a user with the given uuser_id and lock its row until the end of the
+-- transaction
+SELECT uuser_id,
+       username,
+       email,
+       first_name,
+       last_name,
+       password,
+       is_superuser,
+       is_staff,
+       is_active,
+       date_joined,
+       last_login,
+       xmin::text AS version
   FROM uuser
- WHERE uuser_id = :uuser_id;
+ WHERE uuser_id = :uuser_id
+   FOR UPDATE;
+
+
+-- name: get-user-version$
+-- Get the version of the row of the user with the given uuser_id, it changes
+-- every time the row is updated
+SELECT xmin::text FROM uuser WHERE uuser_id = :uuser_id;
 
 
 -- name: update-user-by-id^
 -- Update a user with the given uuser_id. The "coalesced" fields that were not
 -- provided will be updated with their current value (their value won't change).
+-- If versions is not NULL, the user is only updated if the version of its row
+-- is one of them.
    UPDATE uuser
       SET username = COALESCE(:username, username),
           email = COALESCE(:email, email),
@@ -60,11 +158,110 @@ SELECT *
           date_joined = COALESCE(:date_joined, date_joined),
           last_login = CASE WHEN :update_last_login THEN :last_login ELSE last_login END
     WHERE uuser_id = :uuser_id
-RETURNING uuser.*;
+      AND (:versions::text[] IS NULL OR xmin::text = ANY(:versions::text[]))
+RETURNING uuser.uuser_id,
+          uuser.username,
+          uuser.email,
+          uuser.first_name,
+          uuser.last_name,
+          uuser.password,
+          uuser.is_superuser,
+          uuser.is_staff,
+          uuser.is_active,
+          uuser.date_joined,
+          uuser.last_login,
+          uuser.xmin::text AS version;
+
+
+-- name: update-users
+-- Update many users with a single statement, every user can update different
+-- fields. Like in update-user-by-id, the non-nullable fields that are NULL and
+-- the nullable fields whose update flag is false keep their current value.
+   UPDATE uuser
+      SET username = COALESCE(v.username, uuser.username),
+          email = COALESCE(v.email, uuser.email),
+          first_name = COALESCE(v.first_name, uuser.first_name),
+          last_name = COALESCE(v.last_name, uuser.last_name),
+          password = COALESCE(v.password, uuser.password),
+          is_superuser = COALESCE(v.is_superuser, uuser.is_superuser),
+          is_staff = COALESCE(v.is_staff, uuser.is_staff),
+          is_active = COALESCE(v.is_active, uuser.is_active),
+          date_joined = COALESCE(v.date_joined, uuser.date_joined),
+          last_login = CASE WHEN v.update_last_login THEN v.last_login ELSE uuser.last_login END
+     FROM unnest(
+              :uuser_ids::uuid[],
+              :usernames::varchar[],
+              :emails::varchar[],
+              :first_names::varchar[],
+              :last_names::varchar[],
+              :passwords::varchar[],
+              :is_superusers::boolean[],
+              :is_staffs::boolean[],
+              :is_actives::boolean[],
+              :date_joineds::timestamptz[],
+              :last_logins::timestamptz[],
+              :update_last_logins::boolean[]
+          ) AS v(
+              uuser_id,
+              username,
+              email,
+              first_name,
+              last_name,
+              password,
+              is_superuser,
+              is_staff,
+              is_active,
+              date_joined,
+              last_login,
+              update_last_login
+          )
+    WHERE uuser.uuser_id = v.uuser_id
+RETURNING uuser.uuser_id,
+          uuser.username,
+          uuser.email,
+          uuser.first_name,
+          uuser.last_name,
+          uuser.password,
+          uuser.is_superuser,
+          uuser.is_staff,
+          uuser.is_active,
+          uuser.date_joined,
+          uuser.last_login;
 
 
 -- name: delete-user-by-id^
 -- Delete a user with the given uuser_id
 DELETE FROM uuser
       WHERE uuser_id = :uuser_id
-  RETURNING uuser.*;
+  RETURNING uuser.uuser_id,
+            uuser.username,
+            uuser.email,
+            uuser.first_name,
+            uuser.last_name,
+            uuser.password,
+            uuser.is_superuser,
+            uuser.is_staff,
+            uuser.is_active,
+            uuser.date_joined,
+            uuser.last_login;
+
+
+-- name: delete-users-by-ids!
+-- Delete the users with the given uuser_ids
+DELETE FROM uuser
+      WHERE uuser_id = ANY(:uuser_ids::uuid[]);
+
+
+-- name: update-last-logins!
+-- Update the last_login of many users at once. A last_login is only moved
+-- forward, so flushing the same or an older datetime twice is harmless.
+UPDATE uuser
+   SET last_login = v.last_login
+  FROM unnest(:uuser_ids::uuid[], :last_logins::timestamptz[]) AS v(uuser_id, last_login)
+ WHERE uuser.uuser_id = v.uuser_id
+   AND (uuser.last_login IS NULL OR uuser.last_login < v.last_login);
+
+
+-- name: notify-users-changed!
+-- Send one notification per payload to the listeners of a channel
+SELECT pg_notify(:channel, payload) FROM unnest(:payloads::text[]) AS payload;
@@ -0,0 +1,98 @@
+-- The queries of the global lookup table uuser_directory, they run on shard 0
+-- (see fastproject.db.shards). The other queries of this module run on the
+-- shard that holds the user.
+
+-- name: insert-directory-entry!
+-- Reserve the username and the email of a user
+INSERT INTO uuser_directory (
+    uuser_id,
+    username,
+    email,
+    is_superuser,
+    is_active
+) VALUES (
+    :uuser_id,
+    :username,
+    :email,
+    :is_superuser,
+    :is_active
+);
+
+
+-- name: insert-directory-entries
+-- Reserve the usernames and the emails of many users with a single statement.
+-- The users whose username or email already exists are skipped instead of
+-- failing the whole statement.
+INSERT INTO uuser_directory (
+    uuser_id,
+    username,
+    email,
+    is_superuser,
+    is_active
+)
+SELECT *
+  FROM unnest(
+           :uuser_ids::uuid[],
+           :usernames::varchar[],
+           :emails::varchar[],
+           :is_superusers::boolean[],
+           :is_actives::boolean[]
+       )
+    ON CONFLICT DO NOTHING
+RETURNING uuser_directory.uuser_id;
+
+
+-- name: get-existing-usernames
+-- Get the usernames that exist among the given ones
+SELECT username
+  FROM uuser_directory
+ WHERE username = ANY(:usernames::varchar[]);
+
+
+-- name: get-uuser-id-by-username$
+-- Get the uuser_id of the user with the given username
+SELECT uuser_id
+  FROM uuser_directory
+ WHERE username = :username;
+
+
+-- name: update-directory-entry$
+-- Update the entry of the user with the given uuser_id. The fields that were
+-- not provided keep their current value.
+   UPDATE uuser_directory
+      SET username = COALESCE(:username, username),
+          email = COALESCE(:email, email),
+          is_superuser = COALESCE(:is_superuser, is_superuser),
+          is_active = COALESCE(:is_active, is_active)
+    WHERE uuser_id = :uuser_id
+RETURNING uuser_directory.uuser_id;
+
+
+-- name: update-directory-entries
+-- Update the entries of many users with a single statement, like in
+-- update-directory-entry the fields that are NULL keep their current value.
+   UPDATE uuser_directory
+      SET username = COALESCE(v.username, uuser_directory.username),
+          email = COALESCE(v.email, uuser_directory.email),
+          is_superuser = COALESCE(v.is_superuser, uuser_directory.is_superuser),
+          is_active = COALESCE(v.is_active, uuser_directory.is_active)
+     FROM unnest(
+              :uuser_ids::uuid[],
+              :usernames::varchar[],
+              :emails::varchar[],
+              :is_superusers::boolean[],
+              :is_actives::boolean[]
+          ) AS v(uuser_id, username, email, is_superuser, is_active)
+    WHERE uuser_directory.uuser_id = v.uuser_id
+RETURNING uuser_directory.uuser_id;
+
+
+-- name: delete-directory-entry!
+-- Delete the entry of the user with the given uuser_id
+DELETE FROM uuser_directory
+      WHERE uuser_id = :uuser_id;
+
+
+-- name: set-constraints-immediate!
+-- Check the deferred constraints now, instead of when the transaction commits
+SET CONSTRAINTS ALL IMMEDIATE;
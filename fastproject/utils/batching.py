@@ -0,0 +1,82 @@
+"""Utilities to coalesce concurrent calls into batches."""
+
+import asyncio
+from collections.abc import Awaitable, Sequence
+from typing import Callable, Generic, Optional, TypeVar, Union
+
+from . import deadlines
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BatchFunction = Callable[[list[T]], Awaitable[Sequence[Union[R, BaseException]]]]
+
+
+class Coalescer(Generic[T, R]):
+    """Gathers the items submitted within max_delay seconds into one batch.
+
+    The batch function receives the list of items and must return one result
+    per item, in the same order. A result that is an exception is raised to the
+    caller that submitted the item, so one bad item does not fail the others.
+    If the batch function raises, every caller of the batch gets the error.
+
+    The item of a caller that is cancelled before its batch starts is left out
+    of the batch, once the batch started it is still processed. The batch runs
+    without a deadline, see utils.deadlines.
+    """
+
+    def __init__(self, func: BatchFunction, max_delay: float, max_size: int):
+        self.func = func
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """Adds an item to the next batch and returns its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._start_batch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_batch)
+        return await future
+
+    def _start_batch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        # The callers that were cancelled do not wait for their items.
+        batch = [(item, future) for item, future in pending if not future.done()]
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        try:
+            # The batch is shared, the deadline of the first caller is not its.
+            with deadlines.without_deadline():
+                results = await self.func([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{len(batch)} items were submitted, {len(results)} results "
+                    "were returned."
+                )
+        except BaseException as e:  # pylint: disable=broad-except
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,92 @@
+"""Deadlines of the work done for a request.
+
+The deadline is kept in a context variable, so the code that waits for a
+shared resource, like a database connection or a hashing thread, gives up once
+the client is not waiting for the response anymore.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import time
+from collections.abc import Awaitable, Iterator
+from typing import Optional, TypeVar
+
+T = TypeVar("T")
+
+# A time.monotonic() value, None if there is no deadline.
+current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceededError(TimeoutError):
+    """The deadline of the current request has passed."""
+
+
+@contextlib.contextmanager
+def use_deadline(timeout: Optional[float]) -> Iterator[None]:
+    """Sets the deadline of the enclosed code to timeout seconds from now.
+
+    An earlier deadline that is already set is kept. If timeout is None, the
+    deadline does not change.
+    """
+    deadline = current_deadline.get()
+    if timeout is not None:
+        new_deadline = time.monotonic() + timeout
+        if deadline is None or new_deadline < deadline:
+            deadline = new_deadline
+    token = current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+@contextlib.contextmanager
+def without_deadline() -> Iterator[None]:
+    """Removes the deadline of the enclosed code.
+
+    For the work that is shared by several requests, like a batch, and must
+    not be cancelled when one of them gives up.
+    """
+    token = current_deadline.set(None)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Returns the seconds left until the deadline, None if there is none."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check() -> None:
+    """Raises DeadlineExceededError if the deadline has passed."""
+    timeout = remaining()
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceededError()
+
+
+async def wait_for(aw: Awaitable[T]) -> T:
+    """Awaits aw, it is cancelled once the deadline passes.
+
+    Raises:
+      DeadlineExceededError: If the deadline passed before aw was done.
+    """
+    timeout = remaining()
+    if timeout is None:
+        return await aw
+    if timeout <= 0:
+        if inspect.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceededError()
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError as exc:
+        raise DeadlineExceededError() from exc
@@ -0,0 +1,45 @@
+"""Entity tags (ETags) and the conditional request headers that use them.
+
+The ETag of a row is its version, the system column xmin: it changes every
+time the row is updated, so the ETags are strong.
+"""
+
+from typing import Optional
+
+
+def make_etag(version: str) -> str:
+    """Returns the strong ETag of a version."""
+    return f'"{version}"'
+
+
+def _entity_tags(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """
+    Returns True if a If-None-Match header matches the ETag, so the response
+    is 304 Not Modified. The comparison is weak, as RFC 9110 requires.
+    """
+    if header is None:
+        return False
+    tags = _entity_tags(header)
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def if_match_versions(header: Optional[str]) -> Optional[list[str]]:
+    """
+    Returns the versions a If-Match header accepts, None if it accepts any
+    (the header is missing or it is "*"). The comparison is strong, as RFC
+    9110 requires, so the weak ETags are not versions.
+    """
+    if header is None:
+        return None
+    tags = _entity_tags(header)
+    if "*" in tags:
+        return None
+    return [
+        tag[1:-1]
+        for tag in tags
+        if len(tag) >= 2 and tag.startswith('"') and tag.endswith('"')
+    ]
@@ -0,0 +1,17 @@
+"""Utilities to support sparse fieldsets in the endpoints."""
+
+from typing import Optional
+
+import fastapi
+
+
+def fields_query(
+    fields: Optional[str] = fastapi.Query(
+        None,
+        description="Comma separated names of the fields to return, all by default",
+    )
+) -> Optional[list[str]]:
+    """Parses the "fields" query parameter, it is meant to be a dependency."""
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
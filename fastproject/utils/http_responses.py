@@ -2,9 +2,25 @@
 
 from . import rmodels
 
+BadRequestResponse = {"description": "Bad Request", "model": rmodels.DetailMessage}
+
 NotFoundResponse = {
     "description": "Not Found",
     "model": rmodels.DetailMessage,
 }
 
 ConflictResponse = {"description": "Conflict Error", "model": rmodels.DetailMessage}
+
+UnauthorizedResponse = {"description": "Unauthorized", "model": rmodels.DetailMessage}
+
+NotModifiedResponse = {"description": "Not Modified"}
+
+PreconditionFailedResponse = {
+    "description": "Precondition Failed",
+    "model": rmodels.DetailMessage,
+}
+
+ServiceUnavailableResponse = {
+    "description": "Service Unavailable",
+    "model": rmodels.DetailMessage,
+}
@@ -0,0 +1,162 @@
+"""Fast JSON responses.
+
+FastJSONResponse renders UUIDs, datetimes, dataclasses and pydantic models
+natively with orjson, or with the standard json module if orjson is not
+installed. FastJSONRoute returns the response model of an endpoint rendered
+by it directly, so FastAPI does not validate it again and walk it with
+jsonable_encoder before rendering.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import json
+import typing
+import uuid
+from collections.abc import Awaitable
+from typing import Any, Callable, Optional
+
+import fastapi
+import fastapi.routing
+import pydantic
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.models import Dependant
+
+from . import timing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, pydantic.BaseModel):
+        # The values of the fields, the nested models are encoded in turn. It
+        # is much faster than obj.dict(), which copies the whole tree first.
+        if not obj.__private_attributes__:
+            return obj.__dict__
+        return obj.dict()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__qualname__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Returns content encoded as JSON, like jsonable_encoder would."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(fastapi.responses.JSONResponse):
+    """A JSONResponse that does not need jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        with timing.span("render"):
+            return dumps(content)
+
+
+def _uses_response_param(dependant: Dependant) -> bool:
+    return dependant.response_param_name is not None or any(
+        _uses_response_param(dependency) for dependency in dependant.dependencies
+    )
+
+
+def _has_aliases(model: type[pydantic.BaseModel]) -> bool:
+    for field in model.__fields__.values():
+        if field.alias != field.name:
+            return True
+        if isinstance(field.type_, type) and issubclass(
+            field.type_, pydantic.BaseModel
+        ):
+            if _has_aliases(field.type_):
+                return True
+    return False
+
+
+def _model_instance_check(response_model: Any) -> Optional[Callable[[Any], bool]]:
+    """
+    Returns a function that tells if a value is exactly of the response model,
+    a pydantic model or a list of them, so it needs no conversion. Returns None
+    if the response model is of another kind.
+    """
+    if typing.get_origin(response_model) is list:
+        (item_model,) = typing.get_args(response_model) or (None,)
+        if not isinstance(item_model, type) or not issubclass(
+            item_model, pydantic.BaseModel
+        ):
+            return None
+        if _has_aliases(item_model):
+            return None
+        return lambda value: isinstance(value, list) and all(
+            type(item) is item_model for item in value
+        )
+    if not isinstance(response_model, type) or not issubclass(
+        response_model, pydantic.BaseModel
+    ):
+        return None
+    if _has_aliases(response_model):
+        return None
+    return lambda value: type(value) is response_model
+
+
+class FastJSONRoute(timing.TimedRoute):
+    """An APIRoute that renders its response model with FastJSONResponse.
+
+    When the endpoint returns exactly its response model, a pydantic model or
+    a list of them, the value is rendered as is: it was validated when it was
+    created, so it is not validated again. Any other value, or a route
+    that filters its response model (response_model_include, ...), or that
+    sets headers through a Response parameter, takes the usual FastAPI path.
+    Being a TimedRoute, it measures the phases "validate" and "endpoint".
+    """
+
+    @property
+    def _actual_response_class(self) -> type[fastapi.Response]:
+        if isinstance(self.response_class, DefaultPlaceholder):
+            return self.response_class.value
+        return self.response_class
+
+    def _renders_directly(self) -> bool:
+        return (
+            issubclass(self._actual_response_class, FastJSONResponse)
+            and self.response_model_include is None
+            and self.response_model_exclude is None
+            and not self.response_model_exclude_unset
+            and not self.response_model_exclude_defaults
+            and not self.response_model_exclude_none
+            and not _uses_response_param(self.dependant)
+            and asyncio.iscoroutinefunction(self.dependant.call)
+        )
+
+    def get_route_handler(self) -> Callable[[fastapi.Request], Awaitable[Any]]:
+        is_model = _model_instance_check(self.response_model)
+        if is_model is not None and self._renders_directly():
+            endpoint = self.dependant.call
+            response_class = self._actual_response_class
+            status_code = self.status_code
+
+            async def call(**kwargs: Any) -> Any:
+                content = await endpoint(**kwargs)
+                if not is_model(content):
+                    return content
+                if status_code is None:
+                    return response_class(content)
+                return response_class(content, status_code=status_code)
+
+            self.dependant.call = call
+        return super().get_route_handler()
@@ -0,0 +1,215 @@
+"""Detection of the synchronous work that blocks the event loop.
+
+A task of the event loop beats every interval seconds, the lag of a beat is
+how late it woke up. A helper thread checks the last beat: while the loop is
+blocked longer than threshold, it samples the stack of the thread of the loop
+every interval seconds. The samples are aggregated by call site, the
+innermost frame of the application, so the report shows which call sites
+blocked the loop, how often and for how long.
+
+The helper thread only reads the frames of the loop thread, it does not stop
+it, so the overhead while the loop is not blocked is one beat per interval.
+"""
+
+import asyncio
+import dataclasses
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Optional
+
+# The call sites are the frames of the files of this package.
+_PACKAGE = "fastproject"
+
+
+@dataclasses.dataclass
+class BlockingSite:
+    """The samples of a call site captured while the loop was blocked."""
+
+    call_site: str
+    # The frames of the first sample, from the innermost.
+    stack: list[str]
+    samples: int = 0
+    # The blocks of the loop during which the stack was sampled.
+    blocks: int = 0
+    last_block: int = dataclasses.field(default=-1, repr=False)
+
+
+def _format_frame(frame: traceback.FrameSummary) -> str:
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+def call_site(stack: list[traceback.FrameSummary]) -> str:
+    """
+    Returns the innermost frame of the application in a stack, or the
+    innermost frame if there is none.
+    """
+    for frame in reversed(stack):
+        if f"/{_PACKAGE}/" in frame.filename.replace("\\", "/"):
+            return _format_frame(frame)
+    return _format_frame(stack[-1]) if stack else "<unknown>"
+
+
+class LoopWatchdog:
+    """Measures the lag of an event loop and samples it while it is blocked.
+
+    Args:
+      threshold: The loop is blocked once a beat is this late, in seconds.
+      interval: The seconds between the beats and between the samples.
+      stack_depth: The innermost frames kept per sample.
+      max_sites: The call sites kept at most, the samples of the next ones are
+        only counted as dropped.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.02,
+        stack_depth: int = 30,
+        max_sites: int = 100,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.max_sites = max_sites
+        self._lock = threading.Lock()
+        self._sites: dict[str, BlockingSite] = {}
+        self._beat = time.monotonic()
+        self._beats = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._blocks = 0
+        self._blocked_total = 0.0
+        self._dropped_samples = 0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Starts watching the running event loop."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop_watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stops watching the event loop."""
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._beat - self.interval)
+            with self._lock:
+                self._beat = now
+                self._beats += 1
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+                if lag >= self.threshold:
+                    self._blocked_total += lag
+
+    def _watch(self) -> None:
+        block = None
+        while not self._stopping.wait(self.interval):
+            with self._lock:
+                beat = self._beat
+            if time.monotonic() - beat - self.interval < self.threshold:
+                block = None
+                continue
+            if block != beat:
+                # A new block: the loop has not beaten since the last one.
+                block = beat
+                with self._lock:
+                    self._blocks += 1
+            self.sample()
+
+    def sample(self) -> None:
+        """Captures the stack of the loop thread and counts it in its site."""
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            self._loop_thread_id
+        )
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=self.stack_depth)
+        del frame
+        key = call_site(stack)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    self._dropped_samples += 1
+                    return
+                site = self._sites[key] = BlockingSite(
+                    call_site=key,
+                    stack=[_format_frame(summary) for summary in reversed(stack)],
+                )
+            site.samples += 1
+            if site.last_block != self._blocks:
+                site.last_block = self._blocks
+                site.blocks += 1
+
+    def report(self, limit: int = 20) -> dict[str, Any]:
+        """Returns the lag of the loop and its blocking call sites.
+
+        The sites are sorted by their number of samples, every sample stands
+        for interval seconds of blocking.
+        """
+        with self._lock:
+            sites = sorted(
+                self._sites.values(), key=lambda site: site.samples, reverse=True
+            )
+            return {
+                "running": self.running,
+                "threshold": self.threshold,
+                "interval": self.interval,
+                "beats": self._beats,
+                "lag_mean": self._lag_total / self._beats if self._beats else 0.0,
+                "lag_max": self._lag_max,
+                "blocks": self._blocks,
+                "blocked_total": self._blocked_total,
+                "dropped_samples": self._dropped_samples,
+                "sites": [
+                    {
+                        "call_site": site.call_site,
+                        "samples": site.samples,
+                        "blocked_estimate": site.samples * self.interval,
+                        "blocks": site.blocks,
+                        "stack": site.stack,
+                    }
+                    for site in sites[:limit]
+                ],
+            }
+
+    def reset(self) -> None:
+        """Forgets the measures and the samples."""
+        with self._lock:
+            self._sites.clear()
+            self._beats = 0
+            self._lag_total = 0.0
+            self._lag_max = 0.0
+            self._blocks = 0
+            self._blocked_total = 0.0
+            self._dropped_samples = 0
@@ -0,0 +1,113 @@
+"""Export of the traces to a local file, encoded as OTLP/JSON.
+
+Every line of the file is an ExportTraceServiceRequest of OTLP encoded as
+JSON, with the spans of one trace, so the file can be read by the tools that
+understand OTLP (for instance the file receiver of the OpenTelemetry
+Collector) without running a collector next to the application.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from .tracing import AttributeValue, Span, Trace
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "fastproject"
+
+
+def _any_value(value: AttributeValue) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # The 64 bit integers are strings in the JSON encoding of protobuf.
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Mapping[str, AttributeValue]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _any_value(value)} for key, value in attributes.items()
+    ]
+
+
+def encode_span(span: Span) -> dict[str, Any]:
+    """Returns a Span of OTLP encoded as JSON."""
+    encoded = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time or span.start_time),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": span.status_code},
+    }
+    if span.parent_span_id is not None:
+        encoded["parentSpanId"] = span.parent_span_id
+    if span.status_message:
+        encoded["status"]["message"] = span.status_message
+    return encoded
+
+
+def encode_trace(trace: Trace) -> dict[str, Any]:
+    """Returns an ExportTraceServiceRequest of OTLP with the spans of a trace."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": SERVICE_NAME},
+                        "spans": [encode_span(span) for span in trace.spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class FileExporter:
+    """Appends the exported traces to a file, one OTLP/JSON request per line.
+
+    The traces are queued in memory and written to the file in a worker thread
+    by flush(), which is meant to run periodically. If the queue is full, the
+    new traces are dropped.
+
+    Args:
+      path: The path of the file.
+      max_queue: The traces queued at most.
+    """
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        self.path = path
+        self._queue: collections.deque[Trace] = collections.deque()
+        self.max_queue = max_queue
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, trace: Trace) -> None:
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(trace)
+
+    def _write(self, traces: Iterable[Trace]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            for trace in traces:
+                file.write(json.dumps(encode_trace(trace), separators=(",", ":")))
+                file.write("\n")
+
+    async def flush(self) -> None:
+        """Encodes and writes the queued traces to the file in a worker thread."""
+        traces = list(self._queue)
+        self._queue.clear()
+        if traces:
+            await asyncio.to_thread(self._write, traces)
+            self.exported += len(traces)
@@ -0,0 +1,206 @@
+"""Profiles of single requests and the ring buffer that keeps them on disk.
+
+There are two profilers, both measure the thread of the event loop while
+they run:
+
+- DeterministicProfiler records every call with cProfile, the profile is
+  saved in the format of pstats (read it with pstats.Stats or snakeviz).
+- SamplingProfiler samples the stack of the thread every interval seconds
+  from a helper thread, the profile is saved as collapsed stacks (one
+  "frame;frame;frame count" line per stack, read it with flamegraph.pl or
+  speedscope). It slows the thread far less than cProfile.
+
+The event loop runs the other requests between the awaits of the profiled
+one, so their work is in the profile too.
+"""
+
+import collections
+import cProfile
+import datetime
+import os
+import pathlib
+import re
+import sys
+import threading
+import uuid
+from typing import Any, Optional, Protocol, Union
+
+from . import uuids
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Profiler(Protocol):
+    """A profiler of the thread of the event loop."""
+
+    # The extension of the files of its profiles.
+    extension: str
+
+    def start(self) -> None: ...
+
+    def stop(self) -> None: ...
+
+    def dump(self, path: Union[str, os.PathLike]) -> None:
+        """Writes the profile to a file."""
+
+
+class DeterministicProfiler:
+    """Records every call of the thread that started it, with cProfile."""
+
+    extension = "pstats"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def dump(self, path: Union[str, os.PathLike]) -> None:
+        self._profile.dump_stats(path)
+
+
+def _frame_name(code: Any) -> str:
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread that started it.
+
+    Args:
+      interval: The seconds between the samples.
+      stack_depth: The innermost frames kept per sample.
+    """
+
+    extension = "collapsed"
+
+    def __init__(self, interval: float = 0.001, stack_depth: int = 64):
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.samples = 0
+        self._stacks: collections.Counter[str] = collections.Counter()
+        self._thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._sample_until_stopped, name="sampling_profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            # Waits for one sample at most.
+            self._thread.join()
+            self._thread = None
+
+    def _sample_until_stopped(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """Captures the stack of the profiled thread."""
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            self._thread_id
+        )
+        names = []
+        while frame is not None and len(names) < self.stack_depth:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        del frame
+        if names:
+            names.reverse()
+            self._stacks[";".join(names)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Returns the stacks sampled so far, one "stack count" line each."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self._stacks.most_common()
+        )
+
+    def dump(self, path: Union[str, os.PathLike]) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.collapsed())
+
+
+class ProfileStore:
+    """A directory that keeps the last max_profiles profiles.
+
+    A profile is a file named after its profile_id, a hex UUIDv7, so sorting
+    the names sorts the profiles by age. Saving a profile deletes the oldest
+    ones beyond max_profiles. The methods do blocking I/O, run them in a
+    worker thread.
+
+    Args:
+      directory: The directory, created when the first profile is saved.
+      max_profiles: The profiles kept at most.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], max_profiles: int = 20):
+        self.directory = pathlib.Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_profile_id() -> str:
+        return uuids.uuid7().hex
+
+    def _files(self) -> list[pathlib.Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            path
+            for path in self.directory.iterdir()
+            if _PROFILE_ID.match(path.stem) and path.suffix != ".tmp"
+        )
+
+    def save(self, profile_id: str, profiler: Profiler) -> pathlib.Path:
+        """Writes a profile and deletes the oldest ones beyond max_profiles."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{profile_id}.{profiler.extension}"
+        # Written aside and renamed, so a download never reads half a file.
+        temporary_path = path.with_name(f"{path.name}.tmp")
+        profiler.dump(temporary_path)
+        os.replace(temporary_path, path)
+        with self._lock:
+            files = self._files()
+            for old_path in files[: max(0, len(files) - self.max_profiles)]:
+                old_path.unlink(missing_ok=True)
+        return path
+
+    def profiles(self) -> list[dict[str, Any]]:
+        """Returns the kept profiles, the newest first."""
+        profiles = []
+        for path in reversed(self._files()):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            timestamp_ms = uuids.uuid7_timestamp(uuid.UUID(path.stem))
+            profiles.append(
+                {
+                    "profile_id": path.stem,
+                    "format": path.suffix[1:],
+                    "size": size,
+                    "created_at": datetime.datetime.fromtimestamp(
+                        timestamp_ms / 1000, datetime.timezone.utc
+                    ),
+                }
+            )
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[pathlib.Path]:
+        """Returns the file of a profile, None if it is not kept."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        for path in self._files():
+            if path.stem == profile_id:
+                return path
+        return None
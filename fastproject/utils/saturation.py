@@ -0,0 +1,44 @@
+"""Measures of how saturated a shared resource is."""
+
+import collections
+import time
+from typing import Callable
+
+
+class WaitMonitor:
+    """The mean time spent waiting for a resource during the last seconds.
+
+    Old waits are forgotten, so the mean goes back to zero once the resource
+    is not used anymore. It is not thread-safe, record from the event loop.
+    """
+
+    def __init__(
+        self,
+        window: float = 1.0,
+        maxlen: int = 1024,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self.maxlen = maxlen
+        self._timer = timer
+        self._waits: collections.deque[tuple[float, float]] = collections.deque()
+        self._total = 0.0
+
+    def _forget(self, now: float) -> None:
+        while self._waits and (
+            self._waits[0][0] < now - self.window or len(self._waits) > self.maxlen
+        ):
+            self._total -= self._waits.popleft()[1]
+
+    def record(self, wait: float) -> None:
+        now = self._timer()
+        self._waits.append((now, wait))
+        self._total += wait
+        self._forget(now)
+
+    def value(self) -> float:
+        """Returns the mean of the waits recorded during the last window."""
+        self._forget(self._timer())
+        if not self._waits:
+            return 0.0
+        return max(0.0, self._total / len(self._waits))
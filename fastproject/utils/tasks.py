@@ -0,0 +1,70 @@
+"""Utilities to run background tasks in the event loop."""
+
+import asyncio
+import logging
+from collections.abc import Awaitable
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs an async function every interval seconds in the event loop.
+
+    Exceptions raised by the function are logged and do not stop the task.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[], Awaitable[object]],
+        interval: float,
+        name: Optional[str] = None,
+    ):
+        self.func = func
+        self.interval = interval
+        self.name = name or getattr(func, "__qualname__", repr(func))
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run_once(self) -> None:
+        try:
+            await self.func()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Periodic task %s failed.", self.name)
+
+    async def _run(self, run_first: bool) -> None:
+        if run_first:
+            await self._run_once()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._run_once()
+
+    def start(self, run_first=False) -> None:
+        """Starts running the function periodically.
+
+        Args:
+          run_first: If True, the function runs right away instead of after
+            the first interval.
+        """
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run(run_first))
+
+    async def stop(self, run_last=False) -> None:
+        """Stops the task.
+
+        Args:
+          run_last: If True, the function runs one last time after the task
+            is stopped, useful to flush buffers on shutdown.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if run_last:
+            await self._run_once()
@@ -0,0 +1,148 @@
+"""Timings of the phases of the work done for a request.
+
+The durations are accumulated per phase in a context variable, so the code of
+every layer (controller, service, repository, db) measures its own phases
+without passing anything around:
+
+  with timing.span("sql"):
+      ...
+
+They are sent in the Server-Timing header of the response and written to
+the access log, see middleware.timing. Outside of a request a span only reads
+the context variable. The phases may nest (for instance "normalize" runs
+within "endpoint"), so their durations do not add up to the total.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import time
+from collections.abc import Awaitable, Iterator
+from typing import Any, Callable, Optional
+
+import fastapi
+import fastapi.routing
+
+
+class Timings:
+    """The total duration in seconds and the count of every phase."""
+
+    __slots__ = ("durations", "counts")
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Returns the value of a Server-Timing header, in milliseconds.
+
+        Args:
+          total: If not None, the seconds of the phase "total", added last.
+        """
+        durations = self.durations
+        if total is not None:
+            durations = {**durations, "total": total}
+        return ", ".join(
+            f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in durations.items()
+        )
+
+    def milliseconds(self) -> dict[str, float]:
+        """Returns the duration of every phase in milliseconds."""
+        return {
+            phase: round(seconds * 1000, 3) for phase, seconds in self.durations.items()
+        }
+
+
+# The timings of the current request, None outside of a request.
+current_timings: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextlib.contextmanager
+def use_timings() -> Iterator[Timings]:
+    """Accumulates the phases of the enclosed code in new Timings."""
+    timings = Timings()
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+def record(phase: str, seconds: float) -> None:
+    """Adds a duration to a phase of the current request."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.record(phase, seconds)
+
+
+class _Span:
+    # A class rather than a generator based context manager, it is several
+    # times cheaper to enter and exit.
+    __slots__ = ("phase", "timings", "start")
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self) -> None:
+        self.timings = current_timings.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        if self.timings is not None:
+            self.timings.record(self.phase, time.perf_counter() - self.start)
+
+
+def span(phase: str) -> _Span:
+    """Returns a context manager that adds the enclosed code to a phase."""
+    return _Span(phase)
+
+
+# When the route handler of the current request started.
+_route_started: contextvars.ContextVar[float] = contextvars.ContextVar(
+    "route_started", default=0.0
+)
+
+
+class TimedRoute(fastapi.routing.APIRoute):
+    """An APIRoute that measures the phases "validate" and "endpoint".
+
+    "validate" is the time from the start of the route handler to the call of
+    the endpoint: reading the body, solving the dependencies and validating
+    the parameters. "endpoint" is the call of the endpoint. Only the async
+    endpoints are measured.
+    """
+
+    def get_route_handler(self) -> Callable[[fastapi.Request], Awaitable[Any]]:
+        endpoint = self.dependant.call
+        if not asyncio.iscoroutinefunction(endpoint):
+            return super().get_route_handler()
+
+        async def call(**kwargs: Any) -> Any:
+            timings = current_timings.get()
+            if timings is None:
+                return await endpoint(**kwargs)
+            start = time.perf_counter()
+            timings.record("validate", start - _route_started.get())
+            try:
+                return await endpoint(**kwargs)
+            finally:
+                timings.record("endpoint", time.perf_counter() - start)
+
+        self.dependant.call = call
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: fastapi.Request) -> fastapi.Response:
+            token = _route_started.set(time.perf_counter())
+            try:
+                return await handler(request)
+            finally:
+                _route_started.reset(token)
+
+        return timed_handler
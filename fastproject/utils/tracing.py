@@ -0,0 +1,223 @@
+"""In-process tracing with the span model of OpenTelemetry.
+
+Every request is a trace whose root span is started by
+middleware.tracing.TracingMiddleware, and the work done for it is nested in
+child spans: the service calls (the functions decorated with traced), the
+repository functions (see db.with_connection) and the aiosql queries (see
+db.TracingAsyncPGAdapter). The current span is kept in a context variable, so
+outside of a trace starting a span does nothing.
+
+The trace context of the client is read from the traceparent header of W3C
+Trace Context. The finished traces are sent to an exporter, see utils.otlp.
+"""
+
+import contextvars
+import functools
+import os
+import re
+import time
+from collections.abc import Awaitable, Mapping
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# The kinds of the spans, as numbered by OTLP.
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+# The status codes of the spans, as numbered by OTLP.
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+AttributeValue = Any
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+
+class Trace:
+    """The spans of a trace, at most max_spans of them."""
+
+    __slots__ = ("trace_id", "sampled", "spans", "max_spans", "dropped_spans", "ended")
+
+    def __init__(self, trace_id: str, sampled: bool, max_spans: int = 1000):
+        self.trace_id = trace_id
+        # If the trace was sampled when it started (head-based sampling).
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        self.max_spans = max_spans
+        self.dropped_spans = 0
+        # The spans that start after the root ended are dropped.
+        self.ended = False
+
+    def add(self, span: "Span") -> bool:
+        """Adds a span, returns False if it was dropped."""
+        if self.ended or len(self.spans) >= self.max_spans:
+            self.dropped_spans += 1
+            return False
+        self.spans.append(span)
+        return True
+
+
+class Span:
+    """A timed operation of a trace."""
+
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_span_id",
+        "name",
+        "kind",
+        "start_time",
+        "end_time",
+        "attributes",
+        "status_code",
+        "status_message",
+    )
+
+    def __init__(
+        self,
+        trace: Trace,
+        name: str,
+        parent_span_id: Optional[str] = None,
+        kind: int = INTERNAL,
+        attributes: Optional[Mapping[str, AttributeValue]] = None,
+    ):
+        self.trace = trace
+        self.span_id = new_span_id()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        # In nanoseconds since the epoch.
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def duration(self) -> float:
+        """Returns the duration in seconds, until now if it did not end."""
+        end_time = self.end_time if self.end_time is not None else time.time_ns()
+        return (end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str = "") -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+
+
+# The span of the current operation, None outside of a trace.
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """
+    Returns the trace_id, the parent span_id and the sampled flag of a
+    traceparent header, None if it is missing or invalid.
+    """
+    if header is None:
+        return None
+    match = _TRACEPARENT.match(header.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or (version == "00" and len(header.strip()) != 55):
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def set_attribute(key: str, value: AttributeValue) -> None:
+    """Sets an attribute of the current span, if any."""
+    span = current_span.get()
+    if span is not None:
+        span.attributes[key] = value
+
+
+class SpanScope:
+    """The context manager returned by start_span."""
+
+    # A class rather than a generator based context manager, it is several
+    # times cheaper to enter and exit.
+    __slots__ = ("name", "kind", "attributes", "span", "token")
+
+    def __init__(
+        self,
+        name: str,
+        kind: int,
+        attributes: Optional[Mapping[str, AttributeValue]],
+    ):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        parent = current_span.get()
+        self.span = None
+        if parent is None or parent.trace.ended:
+            return None
+        span = Span(parent.trace, self.name, parent.span_id, self.kind, self.attributes)
+        if not parent.trace.add(span):
+            return None
+        self.span = span
+        self.token = current_span.set(span)
+        return span
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        span = self.span
+        if span is None:
+            return
+        if exc_type is not None:
+            span.set_error(f"{exc_type.__qualname__}: {exc_value}")
+        span.end()
+        current_span.reset(self.token)
+
+
+def start_span(
+    name: str,
+    kind: int = INTERNAL,
+    attributes: Optional[Mapping[str, AttributeValue]] = None,
+) -> SpanScope:
+    """Returns a context manager that runs the enclosed code in a child span.
+
+    The span is a child of the current span, it is None outside of a trace.
+    If the code raises an exception, the status of the span is an error.
+    """
+    return SpanScope(name, kind, attributes)
+
+
+def span_name(func: Callable[..., Any]) -> str:
+    """Returns the span name of a function, like "users.service.create_user"."""
+    module = func.__module__.removeprefix("fastproject.").removeprefix("modules.")
+    return f"{module}.{func.__qualname__}"
+
+
+def traced(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Decorates an async function, so every call runs in a child span."""
+    name = span_name(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        with start_span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
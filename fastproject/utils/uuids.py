@@ -0,0 +1,55 @@
+"""Utilities to generate time-ordered UUIDs."""
+
+import secrets
+import threading
+import time
+import uuid
+from typing import Optional
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_counter = 0
+
+_COUNTER_MAX = 0xFFF
+
+
+def uuid7(timestamp_ms: Optional[int] = None) -> uuid.UUID:
+    """Returns a version 7 UUID (RFC 9562).
+
+    A UUIDv7 starts with the Unix timestamp in milliseconds, so the UUIDs
+    generated one after another are close in a btree index, unlike random
+    version 4 UUIDs. The 12 bits after the version hold a counter (seeded at
+    random every millisecond), so the UUIDs generated by this process are
+    strictly increasing even within the same millisecond. If the counter
+    overflows, the timestamp moves 1 millisecond ahead.
+
+    Args:
+      timestamp_ms: The Unix timestamp in milliseconds, defaults to now.
+    """
+    global _last_timestamp, _counter
+    if timestamp_ms is None:
+        timestamp_ms = time.time_ns() // 1_000_000
+    with _lock:
+        if timestamp_ms > _last_timestamp:
+            _last_timestamp = timestamp_ms
+            # The highest bit is left at 0 so the counter can grow.
+            _counter = secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                _last_timestamp += 1
+                _counter = 0
+        timestamp_ms, counter = _last_timestamp, _counter
+    value = (
+        (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | secrets.randbits(62)
+    )
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp(value: uuid.UUID) -> int:
+    """Returns the Unix timestamp in milliseconds of a version 7 UUID."""
+    return value.int >> 80
@@ -0,0 +1,244 @@
+"""Benchmark of the CPU-bound functions that run on every write.
+
+Records the ops per second and the peak allocations of every case (see
+tests.benchmarks.harness), with inputs like the ones of real users: unicode
+names, long emails and passwords of varied lengths and alphabets. Run it
+from the project root:
+
+  python -m tests.benchmarks.bench_hot_paths
+  python -m tests.benchmarks.bench_hot_paths --save     # records the baseline
+  python -m tests.benchmarks.bench_hot_paths --compare  # fails on regressions
+
+The baseline is only meaningful on the machine that recorded it, --compare
+fails with 2 on another one (or another Python) without measuring anything;
+record the baseline again there first. make bench and make bench-baseline
+run the last two.
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+
+from fastproject import db
+from fastproject.modules.users import password_hashing, password_validators
+from fastproject.modules.users.repository import (
+    _NULLABLE_UPDATABLE_FIELDS,
+    _UPDATABLE_FIELDS,
+)
+from fastproject.utils import crypto, encoding
+
+from . import harness
+
+BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines" / "hot_paths.json"
+
+_USERS = [
+    ("snowball99", "snowball@example.com", "Snowball", "Pig"),
+    (
+        "jose_nunez",
+        "jose.nunez.fernandez@correo.universidad.example.mx",
+        "José",
+        "Núñez",
+    ),
+    (
+        "orjan_h",
+        "orjan.haugland+fastproject-signup@mail.example.no",
+        "Ørjan",
+        "Haugland",
+    ),
+    (
+        "wang_xy",
+        "wang.xiuying.1987@company-with-a-long-domain.example.cn",
+        "秀英",
+        "王",
+    ),
+    ("zoe_k", "zoe.kowalczyk.the.second@subdomain.example.co.uk", "Zoë", "Kowalczyk"),
+    ("fw_name", "fullwidth@example.jp", "Ｆｕｌｌｗｉｄｔｈ", "ﾅﾏｴ"),
+]
+
+_PASSWORDS = [
+    "correct-horse-battery",
+    "Tr0ub4dor&3xtra",
+    "contraseña-muy-segura-2024",
+    "密码安全很重要-1987",
+    "p@55w0rd-with-a-long-passphrase-that-people-paste-from-managers-0123456789",
+    "Zoë&Ørjan!#42",
+]
+
+
+def _validate_password(password: str, user: tuple[str, str, str, str]) -> None:
+    username, email, first_name, last_name = user
+    password_validators.validate_password(
+        password,
+        9,
+        128,
+        {
+            "username": username,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+        },
+    )
+
+
+def _updater_fields(changes: dict) -> None:
+    db.updater_fields(_UPDATABLE_FIELDS, _NULLABLE_UPDATABLE_FIELDS, **changes)
+
+
+def cases() -> list[harness.Case]:
+    # Each hash takes a fraction of a second, three of them are enough.
+    hashed_passwords = _PASSWORDS[::2]
+    hashes = [
+        (password, password_hashing.make_password(password))
+        for password in hashed_passwords
+    ]
+    strings = [value for user in _USERS for value in user] + _PASSWORDS
+    return [
+        harness.Case(
+            "password_validators.validate_password",
+            _validate_password,
+            list(zip(_PASSWORDS, _USERS)),
+        ),
+        harness.Case(
+            "encoding.force_bytes",
+            encoding.force_bytes,
+            [(value,) for value in strings] + [(value.encode(),) for value in strings],
+        ),
+        harness.Case(
+            "encoding.normalize_str",
+            encoding.normalize_str,
+            [(value,) for value in strings],
+        ),
+        harness.Case(
+            "crypto.get_random_string",
+            crypto.get_random_string,
+            [(12,), (22,), (32,), (password_hashing.UNUSABLE_PASSWORD_SUFFIX_LENGTH,)],
+        ),
+        harness.Case(
+            "db.updater_fields",
+            _updater_fields,
+            [
+                ({"first_name": "José", "last_name": "Núñez"},),
+                ({"email": "orjan.haugland+fastproject-signup@mail.example.no"},),
+                ({"last_login": "2024-01-22T10:00:00+00:00"},),
+                ({field: None for field in _UPDATABLE_FIELDS},),
+            ],
+        ),
+        harness.Case(
+            "password_hashing.must_update",
+            password_hashing.must_update,
+            [(encoded,) for _, encoded in hashes],
+        ),
+        harness.Case(
+            "password_hashing.decode_hash",
+            password_hashing.decode_hash,
+            [(encoded,) for _, encoded in hashes],
+        ),
+        # Last, the threads of argon2 disturb the measures of the next cases.
+        harness.Case(
+            "password_hashing.make_password",
+            password_hashing.make_password,
+            [(password,) for password in hashed_passwords],
+        ),
+        harness.Case(
+            "password_hashing.check_password", password_hashing.check_password, hashes
+        ),
+    ]
+
+
+def main(
+    select: list[str],
+    save: bool,
+    compare: bool,
+    baseline_path: pathlib.Path,
+    max_slowdown: float,
+    max_peak_growth: float,
+    round_time: float,
+    repeat: int,
+    confirmations: int,
+) -> int:
+    if compare and not save:
+        baseline = json.loads(baseline_path.read_text())
+        if baseline["machine"] != harness.machine():
+            print(
+                f"The baseline {baseline_path} was recorded on another machine, "
+                f"{baseline['machine']}, the speeds are not comparable. Record it "
+                "again on this one with --save (make bench-baseline).",
+                file=sys.stderr,
+            )
+            return 2
+    selected = [
+        case for case in cases() if not select or any(s in case.name for s in select)
+    ]
+    results = harness.run(selected, round_time, repeat)
+    print(json.dumps(results, indent=2))
+    if save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {"cases": {}}
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+        # Saving some cases keeps the baseline of the others.
+        results["cases"] = {**baseline["cases"], **results["cases"]}
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved the baseline to {baseline_path}.", file=sys.stderr)
+    if compare:
+        baseline = json.loads(baseline_path.read_text())
+        regressions = harness.compare(results, baseline, max_slowdown, max_peak_growth)
+        for _ in range(confirmations):
+            if not regressions:
+                break
+            regressed = {name for name, _ in regressions}
+            again = harness.run(
+                [case for case in selected if case.name in regressed],
+                round_time,
+                repeat,
+            )
+            for name, measures in again["cases"].items():
+                results["cases"][name] = harness.best_of(
+                    results["cases"][name], measures
+                )
+            regressions = harness.compare(
+                results, baseline, max_slowdown, max_peak_growth
+            )
+        for name, regression in regressions:
+            print(f"REGRESSION {name}: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions against {baseline_path}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "select", nargs="*", help="Only the cases whose name contains one of these."
+    )
+    parser.add_argument("--save", action="store_true", help="Record the baseline.")
+    parser.add_argument(
+        "--compare", action="store_true", help="Exit with 1 if a case regressed."
+    )
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    parser.add_argument("--max-peak-growth", type=float, default=0.2)
+    parser.add_argument("--round-time", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--confirmations",
+        type=int,
+        default=2,
+        help="How many times the regressed cases are measured again.",
+    )
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            args.select,
+            args.save,
+            args.compare,
+            args.baseline,
+            args.max_slowdown,
+            args.max_peak_growth,
+            args.round_time,
+            args.repeat,
+            args.confirmations,
+        )
+    )
@@ -0,0 +1,511 @@
+"""Load test of the HTTP API with latency percentiles per route.
+
+It starts fastproject.main:app in this process, with its startup and
+shutdown events, and sends it the requests through httpx; with --url it
+sends them to a server started apart instead (for instance with make run).
+The database is a temporary cluster created with the initdb and pg_ctl of
+--pg-bin, with the migrations of fastproject/db/migrations, and removed at
+the end (--throwaway-postgres). It only runs against the databases of the
+configuration file ".env", with the migrations applied, with the explicit
+--settings-database: it writes to them and deletes the users and skills whose
+names start with bench-lt-. Run it from the project root:
+
+  python -m tests.benchmarks.bench_http_load --throwaway-postgres \\
+      --pg-bin /usr/lib/postgresql/16/bin
+  python -m tests.benchmarks.bench_http_load --settings-database \\
+      --rate 200 --seconds 30
+  python -m tests.benchmarks.bench_http_load --settings-database \\
+      --mix get_user=90,update_user=10
+
+It seeds --users users and --skills skills, then sends --rate requests per
+second for --warmup plus --seconds seconds, each one to a route picked at
+random with the weights of --mix. The loop is open: a request is sent when it
+is due even if the previous ones did not finish, and its latency counts from
+that time, so a generator that falls behind does not hide the delay.
+
+The report, printed as JSON, has per route the throughput, the latency
+percentiles, the status codes, the error rate and the pool saturation: the
+time the requests waited for a database connection, the db_acquire phase of
+their Server-Timing header, which a server started apart only sends with
+header = true in [SERVER_TIMING]. In process, it also has the peak use of every
+lane of the pool. There, the app shares the event loop with the generator,
+so at high rates prefer --url. The users and skills it creates are deleted
+when it finishes.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import json
+import pathlib
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from typing import Any, Optional
+
+import asyncpg
+import httpx
+
+from fastproject import config, db
+from fastproject.utils import uuids
+
+PREFIX = "bench-lt-"
+PASSWORD = "load-test password 42!"
+FIRST_NAMES = ["Ana", "Bruno", "Chiara", "Dmitri", "Emeka", "Farah", "Goran"]
+MIGRATIONS_PATH = (
+    pathlib.Path(__file__).resolve().parents[2] / "fastproject" / "db" / "migrations"
+)
+
+ROUTES = {
+    "create_user": "POST /users",
+    "get_user": "GET /users/{user_id}",
+    "update_user": "PATCH /users/{user_id}",
+    "get_skill": "GET /skills/{skill_id}",
+}
+DEFAULT_MIX = "create_user=5,get_user=60,update_user=15,get_skill=20"
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Parses a mix like "get_user=60,get_skill=40" to the weight per route."""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(
+                f"Unknown route {name!r}, the routes are {', '.join(ROUTES)}."
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+@contextlib.asynccontextmanager
+async def _throwaway_postgres(pg_bin: pathlib.Path) -> AsyncIterator[None]:
+    """
+    Runs a temporary PostgreSQL cluster with the migrations applied, and
+    points the [DATABASE] settings to it. It only listens on a Unix socket in
+    its directory.
+    """
+    directory = pathlib.Path(tempfile.mkdtemp(prefix="fastproject-load-"))
+    data = directory / "data"
+    subprocess.run(
+        [pg_bin / "initdb", "-D", data, "-U", "postgres", "-A", "trust"],
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [
+            pg_bin / "pg_ctl",
+            "-D",
+            data,
+            "-l",
+            directory / "postgres.log",
+            "-o",
+            f"-c listen_addresses='' -k {directory} -c max_connections=200",
+            "-w",
+            "start",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    try:
+        conn = await asyncpg.connect(host=str(directory), user="postgres")
+        try:
+            for migration in sorted(MIGRATIONS_PATH.glob("*.sql")):
+                await conn.execute(migration.read_text())
+        finally:
+            await conn.close()
+        for section in config.settings.sections():
+            if section.startswith("DATABASE."):
+                config.settings.remove_section(section)
+        config.settings["DATABASE"].update(
+            host=str(directory), port="5432", dbname="postgres", user="postgres"
+        )
+        config.settings["DATABASE"]["password"] = ""
+        yield
+    finally:
+        subprocess.run(
+            [pg_bin / "pg_ctl", "-D", data, "-m", "fast", "stop"], capture_output=True
+        )
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+async def _seed(conn, users: int, skills: int) -> tuple[list[str], list[str]]:
+    """Seeds the users, each one in its shard, and the skills, with conn, a
+    connection to DEFAULT_SHARD."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    user_ids = [uuids.uuid7() for _ in range(users)]
+    user_ids_by_shard = collections.defaultdict(list)
+    for u in user_ids:
+        user_ids_by_shard[await db.shard_of(u)].append(u)
+    for shard, shard_user_ids in user_ids_by_shard.items():
+        async with db.shard_connection(shard, conn) as shard_conn:
+            await shard_conn.executemany(
+                "INSERT INTO uuser (uuser_id, username, email, first_name, "
+                "last_name, password, is_superuser, is_staff, is_active, "
+                "date_joined) "
+                "VALUES ($1, $2, $3, 'Load', 'Test', '!', false, false, true, $4)",
+                [
+                    (u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com", now)
+                    for u in shard_user_ids
+                ],
+            )
+    await conn.executemany(
+        "INSERT INTO uuser_directory (uuser_id, username, email, is_superuser, "
+        "is_active) VALUES ($1, $2, $3, false, true)",
+        [(u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com") for u in user_ids],
+    )
+    skill_ids = [uuids.uuid7() for _ in range(skills)]
+    await conn.executemany(
+        "INSERT INTO skill (skill_id, name) VALUES ($1, $2)",
+        [(s, f"{PREFIX}{s.hex[-16:]}") for s in skill_ids],
+    )
+    return [str(u) for u in user_ids], [str(s) for s in skill_ids]
+
+
+async def _cleanup(conn) -> None:
+    """Deletes what the load test created from every shard, with conn, a
+    connection to DEFAULT_SHARD."""
+    for shard in db.configured_shards():
+        async with db.shard_connection(shard, conn) as shard_conn:
+            await shard_conn.execute(
+                "DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%"
+            )
+    await conn.execute(
+        "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+    )
+    await conn.execute("DELETE FROM skill WHERE name LIKE $1", f"{PREFIX}%")
+
+
+def _request(
+    route: str, i: int, rng: random.Random, user_ids: list[str], skill_ids: list[str]
+) -> tuple[str, str, Optional[dict[str, Any]]]:
+    if route == "create_user":
+        # Usernames have 15 characters at most.
+        return (
+            "POST",
+            "/users",
+            {
+                "username": f"{PREFIX}c{i:05x}",
+                "email": f"c{i}@{PREFIX}example.com",
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": "Test",
+                "password": PASSWORD,
+            },
+        )
+    if route == "get_user":
+        return "GET", f"/users/{rng.choice(user_ids)}", None
+    if route == "update_user":
+        return (
+            "PATCH",
+            f"/users/{rng.choice(user_ids)}",
+            {"first_name": rng.choice(FIRST_NAMES)},
+        )
+    return "GET", f"/skills/{rng.choice(skill_ids)}", None
+
+
+def _db_acquire(server_timing: Optional[str]) -> float:
+    """Returns the milliseconds of the phase db_acquire of a Server-Timing."""
+    for entry in (server_timing or "").split(","):
+        phase, _, duration = entry.strip().partition(";dur=")
+        if phase == "db_acquire":
+            return float(duration)
+    return 0.0
+
+
+class _RouteStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.db_acquires: list[float] = []
+        self.statuses: collections.Counter[str] = collections.Counter()
+        self.exceptions: collections.Counter[str] = collections.Counter()
+        self.last_done = 0.0
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return {
+        "p50": samples[int(last * 0.50)],
+        "p95": samples[int(last * 0.95)],
+        "p99": samples[int(last * 0.99)],
+        "max": samples[-1],
+    }
+
+
+def _lane_peaks(peaks: dict[str, dict[str, float]], stats: dict) -> None:
+    for shard, lanes in stats.items():
+        for lane, lane_stats in lanes.items():
+            peak = peaks.setdefault(f"{shard}.{lane}", {"in_use": 0, "waiting": 0})
+            peak["in_use"] = max(peak["in_use"], lane_stats["in_use"])
+            peak["waiting"] = max(peak["waiting"], lane_stats["waiting"])
+
+
+async def _run(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    rate: float,
+    seconds: float,
+    warmup: float,
+    user_ids: list[str],
+    skill_ids: list[str],
+    rng: random.Random,
+    in_process: bool,
+) -> dict[str, Any]:
+    stats = {route: _RouteStats() for route in mix}
+    lane_peaks: dict[str, dict[str, float]] = {}
+    routes, weights = list(mix), list(mix.values())
+    total = int(rate * (warmup + seconds))
+    recorded_from = int(rate * warmup)
+    pending = set()
+    max_send_lag = 0.0
+
+    async def send(route: str, i: int, due: float) -> None:
+        method, url, body = _request(route, i, rng, user_ids, skill_ids)
+        response = error = None
+        try:
+            response = await client.request(method, url, json=body)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        if i < recorded_from:
+            return
+        route_stats = stats[route]
+        route_stats.latencies.append((done - due) * 1000)
+        route_stats.last_done = max(route_stats.last_done, done)
+        if response is None:
+            route_stats.exceptions[error] += 1
+            return
+        route_stats.statuses[str(response.status_code)] += 1
+        route_stats.db_acquires.append(
+            _db_acquire(response.headers.get("server-timing"))
+        )
+
+    async def sample_lanes() -> None:
+        while True:
+            _lane_peaks(lane_peaks, db.lane_stats())
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.ensure_future(sample_lanes()) if in_process else None
+    start = time.perf_counter()
+    window_start = start + warmup
+    for i in range(total):
+        due = start + i / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif i >= recorded_from:
+            max_send_lag = max(max_send_lag, -delay)
+        task = asyncio.ensure_future(send(rng.choices(routes, weights)[0], i, due))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    await asyncio.gather(*pending)
+    if sampler is not None:
+        sampler.cancel()
+
+    report_routes = {}
+    for route, route_stats in stats.items():
+        requests = len(route_stats.latencies)
+        errors = sum(route_stats.exceptions.values()) + sum(
+            count
+            for status, count in route_stats.statuses.items()
+            if int(status) >= 400
+        )
+        elapsed = max(route_stats.last_done - window_start, 1e-9)
+        report_routes[ROUTES[route]] = {
+            "requests": requests,
+            "throughput_rps": (requests - errors) / elapsed,
+            "latency_ms": {
+                **_percentiles(route_stats.latencies),
+                "mean": sum(route_stats.latencies) / requests if requests else 0.0,
+            },
+            "status_codes": dict(sorted(route_stats.statuses.items())),
+            "exceptions": dict(route_stats.exceptions),
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            "db_acquire_ms": _percentiles(route_stats.db_acquires),
+            # The requests that waited for a connection more than 1 ms.
+            "pool_wait_rate": (
+                sum(wait > 1 for wait in route_stats.db_acquires)
+                / len(route_stats.db_acquires)
+                if route_stats.db_acquires
+                else 0.0
+            ),
+        }
+    requests = sum(route["requests"] for route in report_routes.values())
+    errors = sum(route["errors"] for route in report_routes.values())
+    last_done = max((route_stats.last_done for route_stats in stats.values()))
+    report = {
+        "total": {
+            "requests": requests,
+            "offered_rps": rate,
+            "throughput_rps": (requests - errors) / max(last_done - window_start, 1e-9),
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            # How late the generator sent a request at most, if it is high
+            # the generator, not the app, limited the rate.
+            "max_send_lag_ms": max_send_lag * 1000,
+        },
+        "routes": report_routes,
+    }
+    if in_process:
+        report["pool_lanes"] = {
+            "peaks": lane_peaks,
+            "totals": {
+                f"{shard}.{lane}": {
+                    key: lane_stats[key]
+                    for key in ("acquires", "waits", "wait_time_total", "wait_time_max")
+                }
+                for shard, lanes in db.lane_stats().items()
+                for lane, lane_stats in lanes.items()
+            },
+        }
+    return report
+
+
+@contextlib.asynccontextmanager
+async def _client(
+    url: Optional[str], timeout: float
+) -> AsyncIterator[httpx.AsyncClient]:
+    if url is not None:
+        async with httpx.AsyncClient(
+            base_url=url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=1000),
+        ) as client:
+            yield client
+        return
+    # The pool saturation is read from the Server-Timing header.
+    config.settings.read_dict({"SERVER_TIMING": {"header": "true"}})
+    from fastproject.main import app  # pylint: disable=import-outside-toplevel
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://load-test",
+            timeout=timeout,
+        ) as client:
+            yield client
+    finally:
+        await app.router.shutdown()
+
+
+async def main(
+    url: Optional[str],
+    mix: dict[str, float],
+    rate: float,
+    seconds: float,
+    warmup: float,
+    users: int,
+    skills: int,
+    seed: int,
+    timeout: float,
+    throwaway_postgres: bool,
+    pg_bin: pathlib.Path,
+) -> dict[str, Any]:
+    async with contextlib.AsyncExitStack() as stack:
+        if throwaway_postgres:
+            await stack.enter_async_context(_throwaway_postgres(pg_bin))
+        stack.push_async_callback(db.close_connection_pools)
+        conn_pool = await db.get_connection_pool()
+        async with conn_pool.acquire() as conn:
+            await _cleanup(conn)
+            user_ids, skill_ids = await _seed(conn, users, skills)
+        try:
+            async with _client(url, timeout) as client:
+                report = await _run(
+                    client,
+                    mix,
+                    rate,
+                    seconds,
+                    warmup,
+                    user_ids,
+                    skill_ids,
+                    random.Random(seed),
+                    in_process=url is None,
+                )
+        finally:
+            async with conn_pool.acquire() as conn:
+                await _cleanup(conn)
+    return {
+        "config": {
+            "target": url or "in-process",
+            "mix": {ROUTES[route]: weight for route, weight in mix.items()},
+            "rate": rate,
+            "seconds": seconds,
+            "warmup": warmup,
+            "users": users,
+            "skills": skills,
+            "seed": seed,
+            "database": "throwaway" if throwaway_postgres else "settings",
+        },
+        **report,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--url", help="A running server, instead of the app in process."
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix(DEFAULT_MIX),
+        help=f"The weight of every route, the routes are {', '.join(ROUTES)}.",
+    )
+    parser.add_argument("--rate", type=float, default=100, help="requests per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2, help="seconds")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--skills", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds")
+    database = parser.add_mutually_exclusive_group(required=True)
+    database.add_argument(
+        "--throwaway-postgres",
+        action="store_true",
+        help="Run against a temporary cluster, see --pg-bin.",
+    )
+    database.add_argument(
+        "--settings-database",
+        action="store_true",
+        help=f"Run against the databases of .env, deleting the {PREFIX} rows.",
+    )
+    parser.add_argument(
+        "--pg-bin",
+        type=pathlib.Path,
+        default=pathlib.Path(shutil.which("initdb") or "initdb").parent,
+        help="The directory of initdb and pg_ctl.",
+    )
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="Also write the report here."
+    )
+    args = parser.parse_args()
+    report = asyncio.run(
+        main(
+            args.url,
+            args.mix,
+            args.rate,
+            args.seconds,
+            args.warmup,
+            args.users,
+            args.skills,
+            args.seed,
+            args.timeout,
+            args.throwaway_postgres,
+            args.pg_bin,
+        )
+    )
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    print(output)
@@ -0,0 +1,100 @@
+"""Benchmark of the encoding throughput of JSON responses.
+
+It does not need a database. Run it from the project root:
+
+  python -m tests.benchmarks.bench_json_responses --seconds 2
+
+For a single user, a list of 1,000 users and a list of 1,000 skills it
+measures how many response bodies per second are encoded by the default
+FastAPI path (validation against the response model, jsonable_encoder and
+JSONResponse) and by FastJSONResponse, which FastJSONRoute uses when the
+endpoint returns its response model.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import uuid
+
+import fastapi
+import fastapi.routing
+
+from fastproject.modules.skills.dtos import PublicSkillDTO
+from fastproject.modules.users import models
+from fastproject.utils import json_responses
+
+
+def _user(i: int) -> models.PublicUser:
+    return models.PublicUser(
+        user_id=uuid.uuid4(),
+        username=f"user{i}",
+        email=f"user{i}@example.com",
+        first_name="First",
+        last_name="Last",
+        is_superuser=False,
+        is_staff=False,
+        is_active=True,
+        date_joined=datetime.datetime.now(tz=datetime.timezone.utc),
+        last_login=datetime.datetime.now(tz=datetime.timezone.utc),
+    )
+
+
+def _cases() -> dict[str, tuple[object, object]]:
+    return {
+        "user": (models.PublicUser, _user(0)),
+        "users_1000": (list[models.PublicUser], [_user(i) for i in range(1000)]),
+        "skills_1000": (
+            list[PublicSkillDTO],
+            [
+                PublicSkillDTO(skill_id=uuid.uuid4(), name=f"skill {i}")
+                for i in range(1000)
+            ],
+        ),
+    }
+
+
+async def _throughput(encode, seconds: float) -> float:
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await encode()
+        done += 1
+    return done / (time.perf_counter() - start)
+
+
+async def main(seconds: float) -> dict[str, dict[str, float]]:
+    report = {}
+    for name, (response_model, content) in _cases().items():
+        route = fastapi.routing.APIRoute(
+            "/", lambda: None, response_model=response_model
+        )
+
+        async def default():
+            body = await fastapi.routing.serialize_response(
+                field=route.response_field, response_content=content
+            )
+            return fastapi.responses.JSONResponse(body).body
+
+        async def fast():
+            return json_responses.FastJSONResponse(content).body
+
+        assert json.loads(await default()) == json.loads(await fast())
+        report[name] = {
+            "default_per_second": await _throughput(default, seconds),
+            "fast_per_second": await _throughput(fast, seconds),
+            "bytes": len(await fast()),
+        }
+        report[name]["speedup"] = (
+            report[name]["fast_per_second"] / report[name]["default_per_second"]
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2, help="per measure")
+    args = parser.parse_args()
+    report = asyncio.run(main(args.seconds))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,114 @@
+"""Load test of the load shedding middleware under overload.
+
+It needs a database, the connection parameters are taken from the
+configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_load_shedding --rate 1000 --seconds 3
+
+Requests arrive at a fixed rate (an open loop) at an endpoint that holds a
+database connection for --query seconds, above what the pool can serve. It
+runs without and with the middleware. Goodput counts the successful
+responses that arrived within --slo seconds, the latency a client tolerates.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import fastapi
+import httpx
+
+from fastproject import db, middleware
+
+
+@db.with_connection
+async def _work(conn, seconds: float) -> None:
+    await conn.execute("SELECT pg_sleep($1)", seconds)
+
+
+def _app(shedding: bool, query: float, concurrency: int, queue: int):
+    app = fastapi.FastAPI()
+    if shedding:
+        app.add_middleware(
+            middleware.LoadSheddingMiddleware,
+            limits={
+                middleware.DEFAULT_ROUTE: middleware.RouteLimit(concurrency, queue)
+            },
+            signals={
+                "db_acquire": middleware.Signal(db.recent_acquire_wait, 0.05),
+            },
+        )
+
+    @app.get("/work")
+    async def work():
+        await _work(query)
+        return {}
+
+    return app
+
+
+async def _run(
+    shedding: bool,
+    rate: int,
+    seconds: float,
+    query: float,
+    slo: float,
+    concurrency: int,
+    queue: int,
+) -> dict[str, float]:
+    await db.close_connection_pools()
+    await db.init_connection_pool(use_settings=True)
+    transport = httpx.ASGITransport(app=_app(shedding, query, concurrency, queue))
+    results = []
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def request() -> None:
+            start = time.perf_counter()
+            response = await client.get("/work")
+            results.append((response.status_code, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        pending = []
+        for i in range(int(rate * seconds)):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pending.append(asyncio.ensure_future(request()))
+        await asyncio.gather(*pending)
+    ok = sorted(latency for status, latency in results if status == 200)
+    good = [latency for latency in ok if latency <= slo]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "shed": sum(status == 503 for status, _ in results),
+        "goodput_per_second": len(good) / seconds,
+        "ok_p50_ms": ok[len(ok) // 2] * 1000 if ok else None,
+        "ok_p99_ms": ok[min(len(ok) - 1, int(len(ok) * 0.99))] * 1000 if ok else None,
+    }
+
+
+async def main(**kwargs) -> dict[str, dict[str, float]]:
+    try:
+        return {
+            "no_shedding": await _run(False, **kwargs),
+            "shedding": await _run(True, **kwargs),
+        }
+    finally:
+        await db.close_connection_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--query", type=float, default=0.02, help="seconds")
+    parser.add_argument("--slo", type=float, default=0.5, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--queue", type=int, default=32)
+    args = parser.parse_args()
+    report = asyncio.run(main(**vars(args)))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,98 @@
+"""Benchmark of permission bitsets against sets of codenames.
+
+It measures the memory used per cached user and the number of permission
+checks per second of both representations. Run it from the project root:
+
+  python -m tests.benchmarks.bench_permissions --users 100000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+import uuid
+
+from fastproject.modules.permissions import bitsets
+from fastproject.utils import caches
+
+APPS = ("users", "skills", "groups", "permissions", "reports", "billing")
+ACTIONS = ("add", "change", "delete", "view", "export")
+
+
+def _fill_cache(users: list[uuid.UUID], make_value) -> tuple[caches.LRUCache, float]:
+    """Fills a cache, returns it and the bytes allocated per user (values included)."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    cache = caches.LRUCache(maxsize=len(users))
+    for user_id in users:
+        cache.set(user_id, make_value(user_id))
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cache, (after - before) / len(users)
+
+
+def _checks_per_second(check, checks: int) -> float:
+    start = time.perf_counter()
+    for _ in range(checks):
+        check()
+    return checks / (time.perf_counter() - start)
+
+
+def main(users: int, per_user: int, checks: int) -> dict[str, dict[str, float]]:
+    rng = random.Random(30)
+    codenames = [f"{app}.{action}" for app in APPS for action in ACTIONS]
+    registry = bitsets.PermissionRegistry(
+        1, [(codename, bit) for bit, codename in enumerate(codenames)], []
+    )
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    granted = {
+        user_id: rng.sample(range(len(codenames)), per_user) for user_id in user_ids
+    }
+    # Codename strings read from the database are not shared between users.
+    set_cache, set_bytes = _fill_cache(
+        user_ids,
+        lambda user_id: frozenset(
+            codenames[b].encode().decode() for b in granted[user_id]
+        ),
+    )
+    mask_cache, mask_bytes = _fill_cache(
+        user_ids, lambda user_id: registry.user_mask(False, granted[user_id], [])
+    )
+    wanted = codenames[7]
+    wanted_mask = registry.mask_of(wanted)
+    some_user = user_ids[users // 2]
+    some_set = set_cache.get(some_user)
+    some_mask = mask_cache.get(some_user)
+    return {
+        "codename_set": {
+            "bytes_per_cached_user": set_bytes,
+            "checks_per_second": _checks_per_second(lambda: wanted in some_set, checks),
+            "cached_checks_per_second": _checks_per_second(
+                lambda: wanted in set_cache.get(some_user), checks
+            ),
+        },
+        "bitset": {
+            "bytes_per_cached_user": mask_bytes,
+            "checks_per_second": _checks_per_second(
+                lambda: bitsets.has_permission(some_mask, wanted_mask), checks
+            ),
+            "cached_checks_per_second": _checks_per_second(
+                lambda: bitsets.has_permission(
+                    mask_cache.get(some_user), registry.mask_of(wanted)
+                ),
+                checks,
+            ),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--per-user", type=int, default=12)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.users, args.per_user, args.checks), indent=2))
@@ -0,0 +1,101 @@
+"""Benchmark of interactive latency while bulk jobs hold the connection pool.
+
+It needs a database, the connection parameters and the lanes are taken from
+the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_pool_lanes --bulk-workers 20 --seconds 5
+
+Bulk workers run slow queries back to back while interactive requests arrive
+at a fixed rate and run a fast query. It runs twice: with the bulk workers in
+the interactive lane, like when the pool had no lanes, and in the bulk lane.
+The acquire-wait metrics of every lane are reported with the latencies.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastproject import db
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+@db.with_connection
+async def _fast_query(conn) -> None:
+    await conn.fetchval("SELECT 1")
+
+
+@db.with_connection
+async def _slow_query(conn, seconds: float) -> None:
+    await conn.execute("SELECT pg_sleep($1)", seconds)
+
+
+async def _run(
+    bulk_lane: str, bulk_workers: int, bulk_query: float, rate: int, seconds: float
+) -> dict:
+    await db.close_connection_pools()
+    await db.init_connection_pool(use_settings=True)
+    deadline = time.perf_counter() + seconds
+
+    async def bulk_worker() -> None:
+        with db.use_lane(bulk_lane):
+            while time.perf_counter() < deadline:
+                await _slow_query(bulk_query)
+
+    async def interactive_request() -> float:
+        start = time.perf_counter()
+        await _fast_query()
+        return time.perf_counter() - start
+
+    workers = [asyncio.ensure_future(bulk_worker()) for _ in range(bulk_workers)]
+    start = time.perf_counter()
+    requests = []
+    for i in range(int(rate * seconds)):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        requests.append(asyncio.ensure_future(interactive_request()))
+    samples = await asyncio.gather(*requests)
+    await asyncio.gather(*workers)
+    return {
+        "interactive": _summary(samples),
+        "lanes": db.lane_stats()[db.DEFAULT_SHARD],
+    }
+
+
+async def main(
+    bulk_workers: int, bulk_query: float, rate: int, seconds: float
+) -> dict[str, dict]:
+    try:
+        return {
+            "no_lanes": await _run(
+                db.lanes.INTERACTIVE, bulk_workers, bulk_query, rate, seconds
+            ),
+            "lanes": await _run(db.lanes.BULK, bulk_workers, bulk_query, rate, seconds),
+        }
+    finally:
+        await db.close_connection_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulk-workers", type=int, default=20)
+    parser.add_argument(
+        "--bulk-query", type=float, default=0.05, help="seconds per bulk query"
+    )
+    parser.add_argument("--rate", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    report = asyncio.run(
+        main(args.bulk_workers, args.bulk_query, args.rate, args.seconds)
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,102 @@
+"""Benchmark of SELECT * against explicit and sparse user projections.
+
+It needs a database with the migrations applied, the connection parameters are
+taken from the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_projections --users 1000 --lookups 20000
+
+For every projection it reports the size of the selected rows as stored by
+PostgreSQL (pg_column_size of the row, close to what goes over the wire), the
+size of the JSON response and the latency of fetching users by id. The
+benchmark creates its own users and deletes them when it finishes.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import statistics
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+from fastproject import db
+from fastproject.modules.users import password_hashing, repository
+
+PREFIX = "bench-pj-"
+
+PROJECTIONS = {
+    "select_star": "*",
+    "public": db.select_list(None, repository.PUBLIC_USER_COLUMNS),
+    "sparse": db.select_list(["user_id", "username"], repository.PUBLIC_USER_COLUMNS),
+}
+
+
+async def _seed(conn, users: int) -> list[uuid.UUID]:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    password = password_hashing.make_password("bench password")
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    await conn.executemany(
+        "INSERT INTO uuser (uuser_id, username, email, first_name, last_name, "
+        "password, is_superuser, is_staff, is_active, date_joined, last_login) "
+        "VALUES ($1, $2, $3, 'Bench', 'User', $4, false, false, true, $5, $5)",
+        [
+            (u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com", password, now)
+            for u in user_ids
+        ],
+    )
+    return user_ids
+
+
+async def _cleanup(conn) -> None:
+    await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+
+
+async def _measure(conn, select_list: str, user_ids, lookups: int) -> dict:
+    row_bytes = await conn.fetchval(
+        f"SELECT avg(pg_column_size(t)) FROM (SELECT {select_list} FROM uuser "
+        "WHERE username LIKE $1) AS t",
+        f"{PREFIX}%",
+    )
+    query = f"SELECT {select_list} FROM uuser WHERE uuser_id = $1"
+    row = await conn.fetchrow(query, user_ids[0])
+    json_bytes = len(json.dumps(jsonable_encoder(dict(row))))
+    rng = random.Random(35)
+    samples = []
+    for _ in range(lookups):
+        start = time.perf_counter()
+        await conn.fetchrow(query, rng.choice(user_ids))
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "row_bytes": float(row_bytes),
+        "json_bytes": json_bytes,
+        "mean_us": statistics.mean(samples) * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+    }
+
+
+async def main(users: int, lookups: int) -> dict[str, dict]:
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    async with conn_pool.acquire() as conn:
+        await _cleanup(conn)
+        try:
+            user_ids = await _seed(conn, users)
+            return {
+                name: await _measure(conn, select_list, user_ids, lookups)
+                for name, select_list in PROJECTIONS.items()
+            }
+        finally:
+            await _cleanup(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+    report = asyncio.run(main(args.users, args.lookups))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,121 @@
+"""Benchmark of one insert per registration against coalesced registrations.
+
+It needs a database with the migrations applied, the connection parameters are
+taken from the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_registrations --rate 1000 --seconds 10
+
+Registrations arrive at a fixed rate (an open loop, like real signups do) and
+are inserted with repository.insert_user, then with a Coalescer over
+repository.insert_users. Passwords are hashed beforehand: hashing is the same
+for both modes and would dominate the measurement. The benchmark deletes the
+users it creates when it finishes.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import time
+
+from fastproject import db
+from fastproject.modules.users import password_hashing, repository
+from fastproject.utils import batching
+
+PREFIX = "bench-rg-"
+
+
+def _registration(mode: str, i: int, password: str) -> dict:
+    return {
+        "username": f"{PREFIX}{mode}-{i}",
+        "email": f"{mode}-{i}@{PREFIX}example.com",
+        "first_name": "Bench",
+        "last_name": "User",
+        "password": password,
+        "is_superuser": False,
+        "is_staff": False,
+        "is_active": True,
+        "date_joined": datetime.datetime.now(tz=datetime.timezone.utc),
+        "last_login": None,
+    }
+
+
+async def _cleanup(conn) -> None:
+    await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+    await conn.execute(
+        "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+    )
+
+
+def _summary(samples: list[float], elapsed: float) -> dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "registrations": len(samples),
+        "per_second": len(samples) / elapsed,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+async def _run(register, mode: str, rate: int, seconds: float, password: str):
+    samples = []
+
+    async def timed(i: int) -> None:
+        start = time.perf_counter()
+        await register(_registration(mode, i, password))
+        samples.append(time.perf_counter() - start)
+
+    total = int(rate * seconds)
+    start = time.perf_counter()
+    pending = []
+    for i in range(total):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        pending.append(asyncio.ensure_future(timed(i)))
+    await asyncio.gather(*pending)
+    return _summary(samples, time.perf_counter() - start)
+
+
+async def main(
+    rate: int, seconds: float, batch_delay: float, batch_size: int
+) -> dict[str, dict[str, float]]:
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    password = password_hashing.make_password("bench password")
+    coalescer = batching.Coalescer(
+        repository.insert_users, batch_delay / 1000, batch_size
+    )
+    async with conn_pool.acquire() as conn:
+        await _cleanup(conn)
+    try:
+        return {
+            "single": await _run(
+                lambda user: repository.insert_user(**user),
+                "single",
+                rate,
+                seconds,
+                password,
+            ),
+            "coalesced": await _run(
+                coalescer.submit, "coalesced", rate, seconds, password
+            ),
+        }
+    finally:
+        async with conn_pool.acquire() as conn:
+            await _cleanup(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch-delay", type=float, default=2, help="milliseconds")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    report = asyncio.run(
+        main(args.rate, args.seconds, args.batch_delay, args.batch_size)
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,202 @@
+"""Benchmark of the skill search index against the equivalent SQL queries.
+
+It needs a database with the migrations applied, the connection parameters are
+taken from the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_skill_search --users 200000 --skills 500
+
+The benchmark creates its own users and skills and deletes them when it
+finishes. Use --skip-sql to only measure the index with synthetic data.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import time
+import uuid
+
+from fastproject import db
+from fastproject.modules.skills import repository, search_index
+
+PREFIX = "bench-ss-"
+
+SQL_ALL = """
+    SELECT uuser_id
+      FROM uuser_skill
+     WHERE skill_id = ANY($1::uuid[])
+  GROUP BY uuser_id
+    HAVING count(*) = cardinality($1::uuid[])
+  ORDER BY uuser_id
+     LIMIT $2
+"""
+
+SQL_TOP = """
+    SELECT uuser_id, count(*) AS matched
+      FROM uuser_skill
+     WHERE skill_id = ANY($1::uuid[])
+  GROUP BY uuser_id
+  ORDER BY matched DESC, uuser_id
+     LIMIT $2
+"""
+
+
+def _synthetic_associations(users: int, skill_ids: list[uuid.UUID], per_user: int):
+    rng = random.Random(26)
+    # A few skills are much more popular than the rest, like in real data.
+    weights = [1 / (rank + 1) for rank in range(len(skill_ids))]
+    for _ in range(users):
+        user_id = uuid.uuid4()
+        chosen = set(rng.choices(skill_ids, weights, k=per_user))
+        yield user_id, list(chosen)
+
+
+async def _seed(conn, associations) -> None:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    users, pairs = [], []
+    for user_id, skill_ids in associations:
+        users.append(
+            (
+                user_id,
+                f"{PREFIX}{user_id.hex}",
+                f"{user_id.hex}@{PREFIX}example.com",
+                "Bench",
+                "User",
+                "!",
+                False,
+                False,
+                True,
+                now,
+            )
+        )
+        pairs.extend((uuid.uuid4(), user_id, skill_id) for skill_id in skill_ids)
+    await conn.copy_records_to_table(
+        "uuser",
+        records=users,
+        columns=[
+            "uuser_id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "password",
+            "is_superuser",
+            "is_staff",
+            "is_active",
+            "date_joined",
+        ],
+    )
+    await conn.copy_records_to_table(
+        "uuser_directory",
+        records=[(user[0], user[1], user[2], False, True) for user in users],
+        columns=["uuser_id", "username", "email", "is_superuser", "is_active"],
+    )
+    await conn.copy_records_to_table(
+        "uuser_skill", records=pairs, columns=["uuser_skill_id", "uuser_id", "skill_id"]
+    )
+    await conn.execute("ANALYZE uuser_skill")
+
+
+async def _cleanup(conn) -> None:
+    await conn.execute(
+        "DELETE FROM uuser_skill WHERE uuser_id IN "
+        "(SELECT uuser_id FROM uuser WHERE username LIKE $1)",
+        f"{PREFIX}%",
+    )
+    await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+    await conn.execute(
+        "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+    )
+    await conn.execute("DELETE FROM skill WHERE name LIKE $1", f"{PREFIX}%")
+
+
+def _queries(skill_ids: list[uuid.UUID], count: int) -> list[list[uuid.UUID]]:
+    rng = random.Random(27)
+    popular = skill_ids[: max(3, len(skill_ids) // 20)]
+    return [rng.sample(popular, rng.randint(2, 3)) for _ in range(count)]
+
+
+def _rate(calls: int, elapsed: float) -> dict[str, float]:
+    return {"calls": calls, "mean_ms": elapsed / calls * 1000, "qps": calls / elapsed}
+
+
+async def _bench_sql(conn, queries, limit) -> dict[str, dict[str, float]]:
+    results = {}
+    for name, sql in (("sql_all", SQL_ALL), ("sql_top", SQL_TOP)):
+        start = time.perf_counter()
+        for query in queries:
+            await conn.fetch(sql, query, limit)
+        results[name] = _rate(len(queries), time.perf_counter() - start)
+    return results
+
+
+def _bench_index(index, queries, limit) -> dict[str, dict[str, float]]:
+    results = {}
+    for name, search in (
+        ("index_all", index.search_all),
+        ("index_top", index.search_top),
+    ):
+        start = time.perf_counter()
+        for query in queries:
+            search(query, limit)
+        results[name] = _rate(len(queries), time.perf_counter() - start)
+    return results
+
+
+async def main(
+    users: int, skills: int, per_user: int, queries: int, limit: int, skip_sql: bool
+) -> dict[str, dict[str, float]]:
+    skill_ids = [uuid.uuid4() for _ in range(skills)]
+    associations = list(_synthetic_associations(users, skill_ids, per_user))
+    workload = _queries(skill_ids, queries)
+    results = {}
+    if skip_sql:
+        index = search_index.SkillSearchIndex()
+        start = time.perf_counter()
+        for user_id, user_skill_ids in associations:
+            index.add(user_id, user_skill_ids)
+        results["index_build"] = {"seconds": time.perf_counter() - start}
+        results.update(_bench_index(index, workload, limit))
+        return results
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    async with conn_pool.acquire() as conn:
+        await _cleanup(conn)
+        await conn.executemany(
+            "INSERT INTO skill (skill_id, name) VALUES ($1, $2)",
+            [(s, f"{PREFIX}{s.hex[:16]}") for s in skill_ids],
+        )
+        try:
+            await _seed(conn, associations)
+            index = search_index.SkillSearchIndex()
+            start = time.perf_counter()
+            await repository.load_search_index(index, conn=conn)
+            results["index_build"] = {"seconds": time.perf_counter() - start}
+            results.update(_bench_index(index, workload, limit))
+            results.update(await _bench_sql(conn, workload, limit))
+        finally:
+            await _cleanup(conn)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--skills", type=int, default=500)
+    parser.add_argument("--per-user", type=int, default=15)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--skip-sql", action="store_true")
+    args = parser.parse_args()
+    report = asyncio.run(
+        main(
+            args.users,
+            args.skills,
+            args.per_user,
+            args.queries,
+            args.limit,
+            args.skip_sql,
+        )
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,61 @@
+"""Benchmark of the overhead of the timing spans.
+
+It does not need a database. Run it from the project root:
+
+  python -m tests.benchmarks.bench_timing_spans --iterations 1000000
+
+It measures the cost of an empty `with timing.span(...)` block, in
+nanoseconds, outside of a request (no timings in the context) and inside one,
+next to an empty loop and a generator based context manager for reference.
+"""
+
+import argparse
+import contextlib
+import json
+import time
+
+from fastproject.utils import timing
+
+
+@contextlib.contextmanager
+def _generator_span(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.record(phase, time.perf_counter() - start)
+
+
+def _loop(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    return time.perf_counter() - start
+
+
+def _spans(iterations: int, span) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span("sql"):
+            pass
+    return time.perf_counter() - start
+
+
+def main(iterations: int) -> dict[str, float]:
+    loop = _loop(iterations)
+
+    def per_span(seconds: float) -> float:
+        return round((seconds - loop) / iterations * 1e9, 1)
+
+    report = {"outside_request_ns": per_span(_spans(iterations, timing.span))}
+    with timing.use_timings():
+        report["inside_request_ns"] = per_span(_spans(iterations, timing.span))
+        report["generator_ns"] = per_span(_spans(iterations, _generator_span))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.iterations), indent=2))
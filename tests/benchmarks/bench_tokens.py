@@ -0,0 +1,38 @@
+"""Benchmark of the verification of access tokens.
+
+Run it from the project root:
+
+  python -m tests.benchmarks.bench_tokens --verifications 200000
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+from fastproject.modules.auth import tokens
+
+
+def main(verifications: int) -> dict[str, float]:
+    key = b"a-benchmark-secret-key-that-is-long-enough"
+    token, _ = tokens.issue_token(key, uuid.uuid4(), 900, permission_version=7)
+    deny_list = tokens.DenyList(maxsize=100_000)
+    for i in range(100_000):
+        deny_list.add(i.to_bytes(8, "big"), int(time.time()) + 900)
+    start = time.perf_counter()
+    for _ in range(verifications):
+        claims = tokens.verify_token(key, token)
+        assert claims.token_id not in deny_list
+    elapsed = time.perf_counter() - start
+    return {
+        "token_length": len(token),
+        "verifications_per_second": verifications / elapsed,
+        "microseconds_per_verification": elapsed / verifications * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verifications", type=int, default=200_000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.verifications), indent=2))
@@ -0,0 +1,134 @@
+"""Benchmark of the user-skill association repository functions.
+
+It needs a database with the migrations applied, the connection parameters are
+taken from the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_user_skills --users 20 --skills 500
+
+The benchmark creates its own users and skills and deletes them when it
+finishes.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import statistics
+import time
+import uuid
+
+from fastproject import db
+from fastproject.modules.skills import repository
+
+PREFIX = "bench-us-"
+
+
+async def _seed(
+    conn, users: int, skills: int
+) -> tuple[list[uuid.UUID], list[uuid.UUID]]:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    await conn.executemany(
+        "INSERT INTO uuser (uuser_id, username, email, first_name, last_name, "
+        "password, is_superuser, is_staff, is_active, date_joined) "
+        "VALUES ($1, $2, $3, 'Bench', 'User', '!', false, false, true, $4)",
+        [
+            (u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com", now)
+            for u in user_ids
+        ],
+    )
+    await conn.executemany(
+        "INSERT INTO uuser_directory (uuser_id, username, email, is_superuser, "
+        "is_active) VALUES ($1, $2, $3, false, true)",
+        [(u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com") for u in user_ids],
+    )
+    skill_ids = [uuid.uuid4() for _ in range(skills)]
+    await conn.executemany(
+        "INSERT INTO skill (skill_id, name) VALUES ($1, $2)",
+        [(s, f"{PREFIX}{s.hex[:16]}") for s in skill_ids],
+    )
+    return user_ids, skill_ids
+
+
+async def _cleanup(conn) -> None:
+    await conn.execute(
+        "DELETE FROM uuser_skill WHERE uuser_id IN "
+        "(SELECT uuser_id FROM uuser WHERE username LIKE $1)",
+        f"{PREFIX}%",
+    )
+    await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+    await conn.execute(
+        "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+    )
+    await conn.execute("DELETE FROM skill WHERE name LIKE $1", f"{PREFIX}%")
+
+
+async def _timed(samples: list[float], coro) -> None:
+    start = time.perf_counter()
+    await coro
+    samples.append(time.perf_counter() - start)
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "calls": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+async def main(users: int, skills: int, per_user: int) -> dict[str, dict[str, float]]:
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    results = {name: [] for name in ("set", "add", "remove", "get_user_skills")}
+    results["get_skill_users_page"] = []
+    async with conn_pool.acquire() as conn:
+        await _cleanup(conn)
+        user_ids, skill_ids = await _seed(conn, users, skills)
+        try:
+            for user_id in user_ids:
+                chosen = random.sample(skill_ids, per_user)
+                await _timed(
+                    results["set"],
+                    repository.set_user_skills(user_id, chosen, conn=conn),
+                )
+                extra = random.sample(skill_ids, per_user // 10)
+                await _timed(
+                    results["add"],
+                    repository.add_user_skills(user_id, extra, conn=conn),
+                )
+                await _timed(
+                    results["remove"],
+                    repository.remove_user_skills(user_id, extra, conn=conn),
+                )
+                await _timed(
+                    results["get_user_skills"],
+                    repository.get_user_skills(user_id, conn=conn),
+                )
+            for skill_id in skill_ids[:50]:
+                after = None
+                while True:
+                    start = time.perf_counter()
+                    page = await repository.get_skill_users(
+                        skill_id, after, 10, conn=conn
+                    )
+                    results["get_skill_users_page"].append(time.perf_counter() - start)
+                    after = page.next_after
+                    if after is None:
+                        break
+        finally:
+            await _cleanup(conn)
+    return {name: _summary(samples) for name, samples in results.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--skills", type=int, default=1000)
+    parser.add_argument("--per-user", type=int, default=300)
+    args = parser.parse_args()
+    report = asyncio.run(main(args.users, args.skills, args.per_user))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,91 @@
+"""Benchmark of updating users one by one against a single batch update.
+
+It needs a database with the migrations applied, the connection parameters are
+taken from the configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_users_batch_patch --users 5000
+
+Every round deactivates (or reactivates) all the users, once with a loop of
+repository.update_user_by_id calls, each acquiring its own connection like
+PATCH /users/{user_id} does, and once with repository.update_users. The
+benchmark creates its own users and deletes them when it finishes.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import uuid
+
+from fastproject import db
+from fastproject.modules.users import repository
+
+PREFIX = "bench-bp-"
+
+
+async def _seed(conn, users: int) -> list[uuid.UUID]:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    await conn.executemany(
+        "INSERT INTO uuser (uuser_id, username, email, first_name, last_name, "
+        "password, is_superuser, is_staff, is_active, date_joined) "
+        "VALUES ($1, $2, $3, 'Bench', 'User', '!', false, false, true, $4)",
+        [
+            (u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com", now)
+            for u in user_ids
+        ],
+    )
+    await conn.executemany(
+        "INSERT INTO uuser_directory (uuser_id, username, email, is_superuser, "
+        "is_active) VALUES ($1, $2, $3, false, true)",
+        [(u, f"{PREFIX}{u.hex}", f"{u.hex}@{PREFIX}example.com") for u in user_ids],
+    )
+    return user_ids
+
+
+async def _cleanup(conn) -> None:
+    await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+    await conn.execute(
+        "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+    )
+
+
+async def main(users: int, rounds: int) -> dict[str, dict[str, float]]:
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    async with conn_pool.acquire() as conn:
+        await _cleanup(conn)
+        user_ids = await _seed(conn, users)
+    timings = {"per_user": 0.0, "batch": 0.0}
+    try:
+        for i in range(rounds):
+            is_active = i % 2 == 1
+            start = time.perf_counter()
+            for user_id in user_ids:
+                await repository.update_user_by_id(user_id, is_active=is_active)
+            timings["per_user"] += time.perf_counter() - start
+            start = time.perf_counter()
+            await repository.update_users(
+                [(user_id, {"is_active": not is_active}) for user_id in user_ids]
+            )
+            timings["batch"] += time.perf_counter() - start
+    finally:
+        async with conn_pool.acquire() as conn:
+            await _cleanup(conn)
+    return {
+        name: {
+            "seconds_per_round": elapsed / rounds,
+            "users_per_second": users * rounds / elapsed,
+        }
+        for name, elapsed in timings.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=4)
+    args = parser.parse_args()
+    report = asyncio.run(main(args.users, args.rounds))
+    print(json.dumps(report, indent=2))
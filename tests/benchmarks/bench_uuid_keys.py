@@ -0,0 +1,70 @@
+"""Benchmark of random (v4) against time-ordered (v7) UUID primary keys.
+
+It needs a database, the connection parameters are taken from the
+configuration file ".env". Run it from the project root:
+
+  python -m tests.benchmarks.bench_uuid_keys --rows 10000000
+
+For every kind of key it fills a scratch table shaped like uuser_skill (a UUID
+primary key and two UUID columns) in batches, and reports the insert
+throughput and the size of the primary key index at the end. The scratch
+tables are dropped when the benchmark finishes.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastproject import db
+from fastproject.utils import uuids
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuids.uuid7}
+
+
+async def _fill(conn, table: str, generate, rows: int, batch: int) -> dict:
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"CREATE TABLE {table} (id UUID PRIMARY KEY, a UUID NOT NULL, b UUID NOT NULL)"
+    )
+    a, b = uuid.uuid4(), uuid.uuid4()
+    elapsed = 0.0
+    for done in range(0, rows, batch):
+        records = [(generate(), a, b) for _ in range(min(batch, rows - done))]
+        start = time.perf_counter()
+        await conn.copy_records_to_table(table, records=records)
+        elapsed += time.perf_counter() - start
+    index_bytes = await conn.fetchval(
+        "SELECT pg_relation_size(indexrelid) FROM pg_index "
+        "WHERE indrelid = $1::regclass AND indisprimary",
+        table,
+    )
+    return {
+        "rows_per_second": rows / elapsed,
+        "index_bytes": index_bytes,
+        "table_bytes": await conn.fetchval("SELECT pg_relation_size($1)", table),
+    }
+
+
+async def main(rows: int, batch: int) -> dict[str, dict]:
+    await db.init_connection_pool(use_settings=True)
+    conn_pool = await db.get_connection_pool()
+    results = {}
+    async with conn_pool.acquire() as conn:
+        for name, generate in GENERATORS.items():
+            table = f"bench_keys_{name}"
+            try:
+                results[name] = await _fill(conn, table, generate, rows, batch)
+            finally:
+                await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+    report = asyncio.run(main(args.rows, args.batch))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,144 @@
+"""Measurement of benchmark cases and their comparison with a baseline.
+
+A case calls a function once per input, every call is an operation. For
+every case the harness records:
+
+- ops_per_second: the best of repeat rounds, each one long enough to last
+  round_time seconds, so the noise of the machine slows down the result as
+  little as possible.
+- peak_bytes: the largest memory allocated by one call on top of what was
+  allocated before it, as traced by tracemalloc, the median over the inputs.
+  It only sees the allocations of Python, not the ones of C libraries such as
+  argon2.
+
+A baseline is the JSON of a run, compare() returns the cases that regressed
+against it. The speed of a shared machine drops for seconds at a time, so
+the regressed cases are measured again before they fail, see best_of().
+"""
+
+import dataclasses
+import datetime
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Sequence
+from typing import Any, Callable
+
+
+@dataclasses.dataclass
+class Case:
+    """A benchmark case: func is called with every tuple of inputs."""
+
+    name: str
+    func: Callable[..., Any]
+    inputs: Sequence[tuple[Any, ...]]
+
+
+def _run(case: Case, loops: int) -> float:
+    func = case.func
+    inputs = case.inputs
+    start = time.perf_counter()
+    for _ in range(loops):
+        for args in inputs:
+            func(*args)
+    return time.perf_counter() - start
+
+
+def measure(case: Case, round_time: float = 0.1, repeat: int = 5) -> dict[str, Any]:
+    """Returns the speed and the allocations of a case."""
+    # Calibration, it also warms up the caches of the functions.
+    loops = 1
+    while (elapsed := _run(case, loops)) < round_time:
+        loops = max(loops * 2, int(loops * round_time / max(elapsed, 1e-9)))
+    best = min(_run(case, loops) for _ in range(repeat))
+    peaks = []
+    tracemalloc.start()
+    try:
+        for args in case.inputs:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            case.func(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_second": loops * len(case.inputs) / best,
+        "peak_bytes": int(statistics.median(peaks)),
+    }
+
+
+def machine() -> dict[str, str]:
+    """Returns what a baseline is only meaningful for: the Python and the
+    machine that run it."""
+    return {
+        "python": platform.python_version(),
+        "implementation": sys.implementation.name,
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+    }
+
+
+def run(
+    cases: Sequence[Case], round_time: float = 0.1, repeat: int = 5
+) -> dict[str, Any]:
+    """Returns the measures of the cases, in the format of the baselines."""
+    return {
+        "machine": machine(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "cases": {case.name: measure(case, round_time, repeat) for case in cases},
+    }
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    max_slowdown: float = 0.2,
+    max_peak_growth: float = 0.2,
+    peak_slack: int = 512,
+) -> list[tuple[str, str]]:
+    """Returns the name and a description of every regression of results
+    against baseline.
+
+    Args:
+      results: The output of run().
+      baseline: The output of an earlier run().
+      max_slowdown: A case regressed if its ops_per_second dropped more than
+        this ratio.
+      max_peak_growth: A case regressed if its peak_bytes grew more than this
+        ratio, plus peak_slack bytes, so that tiny peaks do not fail on noise.
+      peak_slack: See max_peak_growth.
+    """
+    regressions = []
+    for name, measures in results["cases"].items():
+        expected = baseline["cases"].get(name)
+        if expected is None:
+            continue
+        ops, expected_ops = measures["ops_per_second"], expected["ops_per_second"]
+        if ops < expected_ops * (1 - max_slowdown):
+            regressions.append(
+                (
+                    name,
+                    f"{ops:,.0f} ops/s, {1 - ops / expected_ops:.0%} slower than"
+                    f" the baseline ({expected_ops:,.0f} ops/s)",
+                )
+            )
+        peak, expected_peak = measures["peak_bytes"], expected["peak_bytes"]
+        if peak > expected_peak * (1 + max_peak_growth) + peak_slack:
+            regressions.append(
+                (
+                    name,
+                    f"peak of {peak:,} bytes, the baseline peaked at"
+                    f" {expected_peak:,} bytes",
+                )
+            )
+    return regressions
+
+
+def best_of(*measures: dict[str, Any]) -> dict[str, Any]:
+    """Returns the best measures of a case measured several times."""
+    return {
+        "ops_per_second": max(measure["ops_per_second"] for measure in measures),
+        "peak_bytes": min(measure["peak_bytes"] for measure in measures),
+    }
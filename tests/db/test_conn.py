@@ -1,9 +1,13 @@
 """Tests for module db.conn."""
 
+import asyncio
+
 import asyncpg.pool
 import pytest
 
 from fastproject import db
+from fastproject.db import lanes
+from fastproject.utils import deadlines
 
 
 class MockPoolAcquireContext:
@@ -15,7 +19,7 @@ class MockPoolAcquireContext:
 
 
 class MockConnectionPool:
-    def acquire(self):
+    def acquire(self, timeout=None):
         return MockPoolAcquireContext()
 
 
@@ -75,3 +79,50 @@ async def test_with_connection(monkeypatch):
 
     await repository_function(conn=MockPoolAcquireContext())
     await repository_function()
+
+
+@pytest.mark.asyncio
+async def test_with_connection_deadline(monkeypatch):
+    limiter = lanes.LaneLimiter(1, {lanes.INTERACTIVE: lanes.Lane(0, 1, 1)})
+    statements = []
+
+    class MockConnection:
+        async def execute(self, query):
+            statements.append(query)
+
+    class MockConnectionPool:
+        def acquire(self, timeout=None):
+            return MockPoolAcquireContext()
+
+    class MockPoolAcquireContext:
+        async def __aenter__(self):
+            return MockConnection()
+
+        async def __aexit__(self, *args):
+            pass
+
+    async def mock_get_connection_pool(shard=db.DEFAULT_SHARD):
+        return MockConnectionPool()
+
+    monkeypatch.setattr(db.conn, "get_connection_pool", mock_get_connection_pool)
+    monkeypatch.setattr(db.conn, "get_lane_limiter", lambda shard: limiter)
+
+    @db.with_connection
+    async def slow_query(conn):
+        await asyncio.sleep(10)
+
+    # The statements of the request are bounded by its deadline.
+    with deadlines.use_deadline(0.05):
+        with pytest.raises(deadlines.DeadlineExceededError):
+            await slow_query()
+    assert len(statements) == 1
+    assert statements[0].startswith("SET statement_timeout = ")
+    assert 0 < int(statements[0].rsplit(" ", 1)[1]) <= 50
+    # The connection was given back, so a request waiting for it gives up too.
+    assert limiter.stats()[lanes.INTERACTIVE]["in_use"] == 0
+    await limiter.acquire(lanes.INTERACTIVE)
+    with deadlines.use_deadline(0.05):
+        with pytest.raises(deadlines.DeadlineExceededError):
+            await slow_query()
+    assert len(statements) == 1
+    assert limiter.stats()[lanes.INTERACTIVE]["waiting"] == 0
@@ -0,0 +1,108 @@
+"""Tests for module db.lanes."""
+
+import asyncio
+
+import pytest
+
+from fastproject import db
+from fastproject.db import lanes
+
+LANES = {
+    lanes.INTERACTIVE: lanes.Lane(priority=0, reserved=2, limit=4),
+    lanes.ADMIN: lanes.Lane(priority=1, reserved=1, limit=1),
+    lanes.BULK: lanes.Lane(priority=2, reserved=0, limit=2),
+}
+
+
+def test_lane_limiter_reserved():
+    with pytest.raises(ValueError):
+        lanes.LaneLimiter(2, LANES)
+
+
+@pytest.mark.asyncio
+async def test_lane_limiter_limits():
+    limiter = lanes.LaneLimiter(5, LANES)
+    # Bulk can only borrow the shared slots, up to its limit.
+    await limiter.acquire(lanes.BULK)
+    await limiter.acquire(lanes.BULK)
+    bulk = asyncio.ensure_future(limiter.acquire(lanes.BULK))
+    await asyncio.sleep(0)
+    assert not bulk.done()
+    # The reserved slots of interactive and admin are still free.
+    await limiter.acquire(lanes.INTERACTIVE)
+    await limiter.acquire(lanes.INTERACTIVE)
+    await limiter.acquire(lanes.ADMIN)
+    interactive = asyncio.ensure_future(limiter.acquire(lanes.INTERACTIVE))
+    await asyncio.sleep(0)
+    assert not interactive.done()
+    stats = limiter.stats()
+    assert stats[lanes.BULK]["in_use"] == 2 and stats[lanes.BULK]["waiting"] == 1
+    # A shared slot goes to the waiter with the highest priority.
+    limiter.release(lanes.BULK)
+    await asyncio.sleep(0)
+    assert interactive.done() and not bulk.done()
+    # Interactive goes back to its reserved slots and frees a shared one.
+    limiter.release(lanes.INTERACTIVE)
+    await asyncio.sleep(0)
+    assert bulk.done()
+    stats = limiter.stats()
+    assert stats[lanes.INTERACTIVE]["acquires"] == 3
+    assert stats[lanes.INTERACTIVE]["waits"] == 1
+    assert stats[lanes.BULK]["waits"] == 1
+    assert stats[lanes.BULK]["wait_time_max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_lane_limiter_cancel():
+    limiter = lanes.LaneLimiter(3, LANES)
+    await limiter.acquire(lanes.INTERACTIVE)
+    await limiter.acquire(lanes.INTERACTIVE)
+    await limiter.acquire(lanes.ADMIN)
+    waiter = asyncio.ensure_future(limiter.acquire(lanes.BULK))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    limiter.release(lanes.ADMIN)
+    assert limiter.stats()[lanes.BULK]["in_use"] == 0
+    async with limiter.slot(lanes.ADMIN):
+        assert limiter.stats()[lanes.ADMIN]["in_use"] == 1
+    assert limiter.stats()[lanes.ADMIN]["in_use"] == 0
+
+
+@pytest.mark.asyncio
+async def test_with_connection_lane(monkeypatch):
+    limiter = lanes.LaneLimiter(10, lanes.lanes_from_settings())
+    used = []
+
+    class MockConnectionPool:
+        def acquire(self, timeout=None):
+            return MockPoolAcquireContext()
+
+    class MockPoolAcquireContext:
+        async def __aenter__(self):
+            used.append([name for name, s in limiter.stats().items() if s["in_use"]][0])
+            return object()
+
+        async def __aexit__(self, *args):
+            pass
+
+    async def mock_get_connection_pool(shard=db.DEFAULT_SHARD):
+        return MockConnectionPool()
+
+    monkeypatch.setattr(db.conn, "get_connection_pool", mock_get_connection_pool)
+    monkeypatch.setattr(db.conn, "get_lane_limiter", lambda shard=0: limiter)
+
+    @db.with_connection
+    async def repository_function(conn):
+        pass
+
+    @db.with_connection(lane=lanes.BULK)
+    async def bulk_repository_function(conn):
+        pass
+
+    await repository_function()
+    with db.use_lane(lanes.ADMIN):
+        await repository_function()
+        await bulk_repository_function()
+    assert used == [lanes.INTERACTIVE, lanes.ADMIN, lanes.BULK]
@@ -0,0 +1,91 @@
+"""Tests for module db.notify."""
+
+import pytest
+
+from fastproject.db import lanes, notify
+
+LANES = {
+    lanes.INTERACTIVE: lanes.Lane(priority=0, reserved=1, limit=1),
+    lanes.ADMIN: lanes.Lane(priority=1, reserved=1, limit=1),
+    lanes.BULK: lanes.Lane(priority=2, reserved=0, limit=1),
+}
+
+
+class FakeConnection:
+    def __init__(self, fail_listening: bool = False):
+        self.fail_listening = fail_listening
+        self.termination_listeners = []
+
+    async def add_listener(self, channel, callback):
+        if self.fail_listening:
+            raise ConnectionError("LISTEN failed.")
+
+    async def remove_listener(self, channel, callback):
+        pass
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def remove_termination_listener(self, callback):
+        self.termination_listeners.remove(callback)
+
+
+class FakePool:
+    def __init__(self, conns):
+        self.conns = conns
+        self.in_use = []
+
+    async def acquire(self):
+        conn = self.conns.pop(0)
+        self.in_use.append(conn)
+        return conn
+
+    async def release(self, conn):
+        self.in_use.remove(conn)
+
+
+@pytest.fixture
+def listener(monkeypatch):
+    def _listener(*conns):
+        pool = FakePool(list(conns))
+        limiter = lanes.LaneLimiter(3, LANES)
+
+        async def get_connection_pool():
+            return pool
+
+        monkeypatch.setattr(notify, "get_connection_pool", get_connection_pool)
+        monkeypatch.setattr(notify, "get_lane_limiter", lambda: limiter)
+        listener = notify.NotificationListener()
+        payloads = []
+        listener.subscribe("channel", payloads.append)
+        return listener, pool, limiter, payloads
+
+    return _listener
+
+
+def _admin_in_use(limiter: lanes.LaneLimiter) -> int:
+    return limiter.stats()[lanes.ADMIN]["in_use"]
+
+
+@pytest.mark.asyncio
+async def test_notification_listener_reconnects_without_leaking(listener):
+    first, second = FakeConnection(), FakeConnection()
+    listener, pool, limiter, payloads = listener(first, second)
+    await listener.start()
+    # Notifications sent before listening were missed.
+    assert listener.listening and payloads == [None]
+    first.termination_listeners[0](first)
+    assert not listener.listening and payloads == [None, None]
+    await listener.start()
+    assert pool.in_use == [second] and _admin_in_use(limiter) == 1
+    await listener.stop()
+    assert pool.in_use == [] and _admin_in_use(limiter) == 0
+
+
+@pytest.mark.asyncio
+async def test_notification_listener_releases_when_listening_fails(listener):
+    listener, pool, limiter, _ = listener(FakeConnection(fail_listening=True))
+    with pytest.raises(ConnectionError):
+        await listener.start()
+    assert not listener.listening
+    assert pool.in_use == [] and _admin_in_use(limiter) == 0
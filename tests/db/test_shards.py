@@ -0,0 +1,377 @@
+"""Tests for modules db.shards and db.reshard.
+
+The tests that need several databases are skipped unless the environment
+variable FASTPROJECT_TEST_SHARDS lists the databases of the extra shards,
+separated by commas. They live in the server of the section [DATABASE] and
+have the migrations applied, for instance:
+
+  FASTPROJECT_TEST_SHARDS=fastprojectdb_shard1 python -m pytest tests/db
+"""
+
+import dataclasses
+import datetime
+import os
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from fastproject import config, db
+from fastproject.db import reshard, shards
+from fastproject.modules.users import exceptions, repository
+
+TEST_SHARDS = [
+    name for name in os.environ.get("FASTPROJECT_TEST_SHARDS", "").split(",") if name
+]
+PREFIX = "test-shards-"
+
+
+class MockPoolAcquireContext:
+    def __init__(self, shard):
+        self.shard = shard
+
+    async def __aenter__(self):
+        return self.shard
+
+    async def __aexit__(self, *args, **kwargs):
+        pass
+
+
+class MockConnectionPool:
+    def __init__(self, shard):
+        self.shard = shard
+
+    def acquire(self, timeout=None):
+        return MockPoolAcquireContext(self.shard)
+
+
+def test_bucket_of():
+    # The same as the SQL expression of bucket_sql().
+    key = uuid.UUID("01a154dd-31e9-76b5-a905-1452d93c23fe")
+    assert shards.bucket_of(key, 1024) == 1019
+    assert (
+        shards.bucket_of(uuid.UUID("ffffffff-31e9-76b5-a905-1452d93c23fe"), 1000) == 706
+    )
+    assert "md5(uuser_id::text)" in shards.bucket_sql("uuser_id", "$1")
+
+
+def test_shard_map():
+    key = uuid.UUID("01a154dd-31e9-76b5-a905-1452d93c23fe")
+    shard_map = shards.ShardMap(1024)
+    assert shard_map.shard_of(key) == db.DEFAULT_SHARD
+    shard_map = shards.ShardMap(1024, {1019: 2, 3: 1})
+    assert shard_map.shard_of(key) == 2
+    assert shard_map.shard_of_bucket(3) == 1
+    assert shard_map.buckets_of(2) == [1019]
+    assert len(shard_map.buckets_of(db.DEFAULT_SHARD)) == 1022
+
+
+def test_configured_shards(monkeypatch):
+    monkeypatch.setattr(config, "settings", config.configparser.ConfigParser())
+    config.settings.read_dict({"DATABASE": {}, "DATABASE.2": {}, "DATABASE.1": {}})
+    assert db.configured_shards() == [0, 1, 2]
+
+
+def test_plan_rebalance():
+    shard_map = shards.ShardMap(10, {0: 1})
+    moves = reshard.plan_rebalance(shard_map, [0, 1, 2])
+    for bucket, shard in moves:
+        shard_map = shards.ShardMap(
+            10,
+            {
+                **{b: shard_map.shard_of_bucket(b) for b in range(10)},
+                bucket: shard,
+            },
+        )
+    assert sorted(len(shard_map.buckets_of(shard)) for shard in (0, 1, 2)) == [3, 3, 4]
+    # Only the buckets of the overloaded shard 0 move.
+    assert len(moves) == 5
+    assert all(bucket != 0 for bucket, _ in moves)
+    assert reshard.plan_rebalance(shard_map, [0, 1, 2]) == []
+
+
+@pytest.mark.asyncio
+async def test_with_connection_shard_key(monkeypatch):
+    key = uuid.UUID("01a154dd-31e9-76b5-a905-1452d93c23fe")
+
+    async def mock_get_connection_pool(shard=db.DEFAULT_SHARD):
+        return MockConnectionPool(shard)
+
+    def mock_get_lane_limiter(shard=db.DEFAULT_SHARD):
+        return db.lanes.LaneLimiter(10, db.lanes.lanes_from_settings())
+
+    monkeypatch.setattr(db.conn, "get_connection_pool", mock_get_connection_pool)
+    monkeypatch.setattr(db.conn, "get_lane_limiter", mock_get_lane_limiter)
+    monkeypatch.setattr(shards, "_shard_map", shards.ShardMap(1024, {1019: 3}))
+
+    @db.with_connection(shard_key="user_id")
+    async def repository_function(conn, user_id, name=None):
+        return conn
+
+    assert await repository_function(key) == 3
+    assert await repository_function(user_id=key) == 3
+    assert await repository_function(uuid.UUID(int=0)) == db.DEFAULT_SHARD
+    assert await repository_function(key, conn="given") == "given"
+    shards.invalidate_shard_map()
+    assert shards._shard_map is None
+
+
+@pytest.mark.asyncio
+async def test_shard_connection(monkeypatch):
+    async def mock_get_connection_pool(shard=db.DEFAULT_SHARD):
+        return MockConnectionPool(shard)
+
+    def mock_get_lane_limiter(shard=db.DEFAULT_SHARD):
+        return db.lanes.LaneLimiter(10, db.lanes.lanes_from_settings())
+
+    monkeypatch.setattr(db.conn, "get_connection_pool", mock_get_connection_pool)
+    monkeypatch.setattr(db.conn, "get_lane_limiter", mock_get_lane_limiter)
+    async with db.shard_connection(1) as conn:
+        assert conn == 1
+    async with db.shard_connection(0, "held") as conn:
+        assert conn == "held"
+    async with db.shard_connection(0, "held", conn_shard=1) as conn:
+        assert conn == 0
+
+
+@pytest_asyncio.fixture
+async def sharded_databases(monkeypatch):
+    settings = config.configparser.ConfigParser()
+    settings.read_dict(config.settings)
+    for shard, dbname in enumerate(TEST_SHARDS, start=1):
+        settings[f"DATABASE.{shard}"] = {**settings["DATABASE"], "dbname": dbname}
+    monkeypatch.setattr(config, "settings", settings)
+    monkeypatch.setattr(shards, "_shard_map", None)
+    # The pools of other tests belong to other event loops.
+    monkeypatch.setattr(db.conn, "_conn_pool", None)
+    monkeypatch.setattr(db.conn, "_shard_conn_pools", {})
+    await _cleanup()
+    yield
+    await _cleanup()
+    await db.close_connection_pools()
+
+
+async def _cleanup():
+    for shard in db.configured_shards():
+        conn_pool = await db.get_connection_pool(shard)
+        async with conn_pool.acquire() as conn:
+            await conn.execute("DELETE FROM moved_bucket")
+            await conn.execute("DELETE FROM uuser WHERE username LIKE $1", f"{PREFIX}%")
+    conn_pool = await db.get_connection_pool()
+    async with conn_pool.acquire() as conn:
+        await conn.execute(
+            "DELETE FROM uuser_directory WHERE username LIKE $1", f"{PREFIX}%"
+        )
+        await conn.execute("DELETE FROM shard_bucket")
+    shards.invalidate_shard_map()
+
+
+async def _assign_buckets(assignments):
+    conn_pool = await db.get_connection_pool()
+    async with conn_pool.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO shard_bucket (bucket, shard) VALUES ($1, $2)",
+            list(assignments.items()),
+        )
+    shards.invalidate_shard_map()
+
+
+async def _shard_usernames(shard):
+    conn_pool = await db.get_connection_pool(shard)
+    async with conn_pool.acquire() as conn:
+        records = await conn.fetch(
+            "SELECT username FROM uuser WHERE username LIKE $1", f"{PREFIX}%"
+        )
+    return {record["username"] for record in records}
+
+
+def _user(name):
+    return {
+        "username": f"{PREFIX}{name}",
+        "email": f"{name}@{PREFIX}kotff.com",
+        "first_name": "Lord",
+        "last_name": "Of Cinder",
+        "password": "averysecrethash",
+        "is_superuser": False,
+        "is_staff": False,
+        "is_active": True,
+        "date_joined": datetime.datetime.now(tz=datetime.timezone.utc),
+        "last_login": None,
+    }
+
+
+@pytest.mark.skipif(not TEST_SHARDS, reason="FASTPROJECT_TEST_SHARDS is not set")
+@pytest.mark.asyncio
+async def test_sharded_users(sharded_databases):
+    buckets = config.settings.getint("SHARDING", "buckets", fallback=1024)
+    shard_count = len(db.configured_shards())
+    await _assign_buckets(
+        {
+            bucket: bucket % shard_count
+            for bucket in range(buckets)
+            if bucket % shard_count
+        }
+    )
+    names = [f"user{i}" for i in range(12)]
+    users = [await repository.insert_user(**_user(name)) for name in names[:6]]
+    users += await repository.insert_users([_user(name) for name in names[6:]])
+    shard_map = await db.get_shard_map()
+    for shard in db.configured_shards():
+        assert await _shard_usernames(shard) == {
+            user.username for user in users if shard_map.shard_of(user.user_id) == shard
+        }
+    # The usernames and emails are unique across the shards.
+    with pytest.raises(exceptions.UsernameAlreadyExistsError):
+        await repository.insert_user(
+            **{**_user("other"), "username": users[0].username}
+        )
+    with pytest.raises(exceptions.EmailAlreadyExistsError):
+        await repository.insert_user(**{**_user("other"), "email": users[1].email})
+    results = await repository.insert_users([_user("user0"), _user("user12")])
+    assert type(results[0]) is exceptions.UsernameAlreadyExistsError
+    users.append(results[1])
+    for user in users:
+        assert await repository.get_user_by_id(user.user_id) == user
+        assert await repository.get_user_by_username(user.username) == user
+    updated = await repository.update_user_by_id(users[0].user_id, first_name="Gwyn")
+    assert updated.first_name == "Gwyn"
+    with pytest.raises(exceptions.UsernameAlreadyExistsError):
+        await repository.update_user_by_id(users[0].user_id, username=users[1].username)
+    updated = await repository.update_user_by_id(
+        users[0].user_id, username=f"{PREFIX}gwyn"
+    )
+    assert await repository.get_user_by_username(f"{PREFIX}gwyn") == updated
+    results = await repository.update_users(
+        [
+            (users[2].user_id, {"username": users[3].username}),
+            (users[3].user_id, {"is_staff": True}),
+            (users[4].user_id, {"is_active": False}),
+        ]
+    )
+    assert type(results[0]) is exceptions.UsernameAlreadyExistsError
+    assert results[1].is_staff and not results[2].is_active
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    await repository.update_last_logins(
+        sorted(user.user_id for user in users), [now] * len(users)
+    )
+    assert (await repository.get_user_by_id(users[5].user_id)).last_login == now
+    deleted = await repository.delete_user_by_id(users[6].user_id)
+    assert deleted.user_id == users[6].user_id
+    assert await repository.get_user_by_id(users[6].user_id) is None
+    assert await repository.get_user_by_username(users[6].username) is None
+
+    # Every user is moved to the last shard.
+    users = [await repository.get_user_by_id(user.user_id) for user in users[7:]]
+    last_shard = db.configured_shards()[-1]
+    stale_shard_map = await db.get_shard_map()
+    for user in users:
+        report = await reshard.move_bucket(
+            shards.bucket_of(user.user_id, buckets), last_shard, grace=0
+        )
+        assert report["to"] == last_shard
+    shards.invalidate_shard_map()
+    for user in users:
+        assert await db.shard_of(user.user_id) == last_shard
+        assert await repository.get_user_by_id(user.user_id) == user
+    for shard in db.configured_shards()[:-1]:
+        assert not await _shard_usernames(shard) & {user.username for user in users}
+    # A stale shard map fails loudly, and is read again.
+    moved = next(
+        user for user in users if stale_shard_map.shard_of(user.user_id) != last_shard
+    )
+    shards._shard_map = stale_shard_map
+    with pytest.raises(shards.BucketMovedError):
+        await repository.update_user_by_id(moved.user_id, first_name="Gwyn")
+    assert shards._shard_map is None
+    updated = await repository.update_user_by_id(moved.user_id, first_name="Gwyn")
+    assert updated.first_name == "Gwyn"
+
+
+@pytest.mark.skipif(not TEST_SHARDS, reason="FASTPROJECT_TEST_SHARDS is not set")
+@pytest.mark.asyncio
+async def test_sharded_writes_are_compensated(sharded_databases, monkeypatch):
+    buckets = config.settings.getint("SHARDING", "buckets", fallback=1024)
+    # Every user is in the last shard, the directory is in shard 0.
+    last_shard = db.configured_shards()[-1]
+    await _assign_buckets({bucket: last_shard for bucket in range(buckets)})
+    user = await repository.insert_user(**_user("user0"))
+    insert_user = repository._queries.insert_user
+
+    async def failing_insert_user(*args, **kwargs):
+        await insert_user(*args, **kwargs)
+        raise ConnectionError("The directory was lost.")
+
+    monkeypatch.setattr(repository._queries, "insert_user", failing_insert_user)
+    with pytest.raises(ConnectionError):
+        await repository.insert_user(**_user("user1"))
+    assert await _shard_usernames(last_shard) == {user.username}
+    insert_users = repository._queries.insert_users
+
+    async def failing_insert_users(*args, **kwargs):
+        await insert_users(*args, **kwargs)
+        raise ConnectionError("The directory was lost.")
+
+    monkeypatch.setattr(repository._queries, "insert_users", failing_insert_users)
+    with pytest.raises(ConnectionError):
+        await repository.insert_users([_user("user1"), _user("user2")])
+    assert await _shard_usernames(last_shard) == {user.username}
+    # The fields of a failed update are restored, unless updated again.
+    updated = await repository.update_user_by_id(
+        user.user_id, username=f"{PREFIX}gwyn", first_name="Gwyn"
+    )
+    update_data = db.updater_fields(
+        repository._UPDATABLE_FIELDS,
+        repository._NULLABLE_UPDATABLE_FIELDS,
+        username=f"{PREFIX}gwyn",
+        first_name="Gwyn",
+    )
+    conn_pool = await db.get_connection_pool(last_shard)
+    async with conn_pool.acquire() as conn:
+        previous = {
+            **dataclasses.asdict(user),
+            "uuser_id": user.user_id,
+            "version": user.version,
+        }
+        await repository._restore_user(conn, previous, {"version": "0"}, update_data)
+        assert await repository.get_user_by_id(user.user_id, conn=conn) == updated
+        await repository._restore_user(
+            conn, previous, {"version": updated.version}, update_data
+        )
+        assert await repository.get_user_by_id(user.user_id, conn=conn) == user
+
+
+@pytest.mark.skipif(not TEST_SHARDS, reason="FASTPROJECT_TEST_SHARDS is not set")
+@pytest.mark.asyncio
+async def test_stopped_moves_are_resumed(sharded_databases, monkeypatch):
+    buckets = config.settings.getint("SHARDING", "buckets", fallback=1024)
+    last_shard = db.configured_shards()[-1]
+    users = await repository.insert_users([_user("user0"), _user("user1")])
+    user_buckets = [shards.bucket_of(user.user_id, buckets) for user in users]
+    assert user_buckets[0] != user_buckets[1]
+    # Stopped before the shard map was updated.
+    shard_map = await db.get_shard_map()
+    async with db.acquire_connection(db.DEFAULT_SHARD) as conn:
+        await reshard._fence_bucket(conn, shard_map, user_buckets[0])
+    with pytest.raises(shards.BucketMovedError):
+        await repository.update_user_by_id(users[0].user_id, first_name="Gwyn")
+
+    # Stopped before the rows were deleted from the former shard.
+    async def stop(seconds):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(reshard.asyncio, "sleep", stop)
+        await reshard.move_bucket(user_buckets[1], last_shard)
+    assert users[1].username in await _shard_usernames(db.DEFAULT_SHARD)
+    report = await reshard.resume_moves()
+    assert report == [
+        {"bucket": bucket, "shard": db.DEFAULT_SHARD, **done}
+        for bucket, done in sorted(
+            [(user_buckets[0], {"unfenced": True}), (user_buckets[1], {"deleted": 1})]
+        )
+    ]
+    shards.invalidate_shard_map()
+    updated = await repository.update_user_by_id(users[0].user_id, first_name="Gwyn")
+    assert updated.first_name == "Gwyn"
+    assert await _shard_usernames(db.DEFAULT_SHARD) == {users[0].username}
+    assert await repository.get_user_by_id(users[1].user_id) == users[1]
@@ -2,6 +2,8 @@
 
 import datetime
 
+import pytest
+
 from fastproject import db
 
 
@@ -54,3 +56,13 @@ def test_updater_fields():
         "birthday": None,
         "upt_birthday": True,
     }
+
+
+def test_select_list():
+    columns = {"user_id": "uuser_id", "username": "username", "email": "email"}
+    assert db.select_list(None, columns) == "uuser_id AS user_id, username, email"
+    assert db.select_list(["email", "user_id"], columns) == "uuser_id AS user_id, email"
+    with pytest.raises(ValueError):
+        db.select_list(["password"], columns)
+    with pytest.raises(ValueError):
+        db.select_list([], columns)
@@ -0,0 +1,67 @@
+"""Tests for module middleware.deadlines."""
+
+import asyncio
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import config, middleware
+from fastproject.utils import deadlines
+
+
+def make_app():
+    app = fastapi.FastAPI()
+    app.add_middleware(
+        middleware.DeadlineMiddleware,
+        route_timeouts={middleware.DEFAULT_ROUTE: 10.0, "GET /fast": 0.5},
+    )
+
+    @app.get("/remaining")
+    async def remaining():
+        return {"remaining": deadlines.remaining()}
+
+    @app.get("/fast")
+    async def fast():
+        return {"remaining": deadlines.remaining()}
+
+    @app.get("/slow")
+    async def slow():
+        await deadlines.wait_for(asyncio.sleep(10))
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_deadline_middleware():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=make_app()), base_url="http://test"
+    ) as client:
+        response = await client.get("/remaining")
+        assert 9 < response.json()["remaining"] <= 10
+        response = await client.get("/fast")
+        assert 0 < response.json()["remaining"] <= 0.5
+        # The timeout of the client wins if it is shorter.
+        response = await client.get("/remaining", headers={"X-Request-Timeout": "2"})
+        assert 1 < response.json()["remaining"] <= 2
+        response = await client.get("/fast", headers={"X-Request-Timeout": "2"})
+        assert response.json()["remaining"] <= 0.5
+        response = await client.get("/remaining", headers={"X-Request-Timeout": "x"})
+        assert response.json()["remaining"] > 9
+        response = await client.get("/slow", headers={"X-Request-Timeout": "0.05"})
+        assert response.status_code == 504
+        assert response.json() == {"detail": "The request deadline was exceeded."}
+
+
+def test_route_timeouts_from_settings(monkeypatch):
+    monkeypatch.setattr(config, "settings", config.configparser.ConfigParser())
+    config.settings.read_dict(
+        {
+            "DEADLINES": {"default_timeout": "8"},
+            "DEADLINES.ROUTES": {"update_users": "patch /users:batch, 30"},
+        }
+    )
+    assert middleware.route_timeouts_from_settings() == {
+        middleware.DEFAULT_ROUTE: 8.0,
+        "PATCH /users:batch": 30.0,
+    }
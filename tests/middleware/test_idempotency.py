@@ -0,0 +1,119 @@
+"""Tests for module middleware.idempotency."""
+
+import asyncio
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import middleware
+from fastproject.middleware import idempotency
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Stores the keys in memory instead of the database."""
+    keys = {}
+
+    async def mock_claim_key(key, fingerprint, lock_timeout):
+        if key not in keys:
+            keys[key] = idempotency.IdempotencyKey(fingerprint, None, [], b"")
+            return None
+        return keys[key]
+
+    async def mock_complete_key(key, status_code, headers, body, ttl):
+        keys[key] = idempotency.IdempotencyKey(
+            keys[key].fingerprint, status_code, headers, body
+        )
+
+    async def mock_release_key(key):
+        if not keys[key].done:
+            del keys[key]
+
+    monkeypatch.setattr(idempotency, "claim_key", mock_claim_key)
+    monkeypatch.setattr(idempotency, "complete_key", mock_complete_key)
+    monkeypatch.setattr(idempotency, "release_key", mock_release_key)
+    return keys
+
+
+def make_app():
+    app = fastapi.FastAPI()
+    app.add_middleware(
+        middleware.IdempotencyMiddleware, routes={"POST /items"}, poll_interval=5.0
+    )
+    app.state.calls = 0
+    app.state.status_code = 201
+    app.state.release = asyncio.Event()
+    app.state.release.set()
+
+    @app.post("/items")
+    async def create_item(item: dict, response: fastapi.Response):
+        app.state.calls += 1
+        await app.state.release.wait()
+        response.status_code = app.state.status_code
+        return {"call": app.state.calls, **item}
+
+    return app
+
+
+def make_client(app):
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_replay(keys):
+    app = make_app()
+    async with make_client(app) as client:
+        headers = {"Idempotency-Key": "k1"}
+        first = await client.post("/items", json={"name": "a"}, headers=headers)
+        retry = await client.post("/items", json={"name": "a"}, headers=headers)
+        other = await client.post("/items", json={"name": "b"}, headers=headers)
+        without_key = await client.post("/items", json={"name": "a"})
+    assert first.status_code == retry.status_code == 201
+    assert first.json() == retry.json() == {"call": 1, "name": "a"}
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    # The key was used by a request with another body.
+    assert other.status_code == 422
+    assert without_key.json() == {"call": 2, "name": "a"}
+    assert app.state.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait(keys):
+    app = make_app()
+    app.state.release.clear()
+    async with make_client(app) as client:
+        requests = [
+            asyncio.ensure_future(
+                client.post("/items", json={}, headers={"Idempotency-Key": "k1"})
+            )
+            for _ in range(3)
+        ]
+        for _ in range(20):
+            await asyncio.sleep(0)
+        app.state.release.set()
+        responses = await asyncio.wait_for(asyncio.gather(*requests), 1.0)
+    assert app.state.calls == 1
+    assert [response.json() for response in responses] == [{"call": 1}] * 3
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_stored(keys):
+    app = make_app()
+    app.state.status_code = 503
+    async with make_client(app) as client:
+        headers = {"Idempotency-Key": "k1"}
+        first = await client.post("/items", json={}, headers=headers)
+        app.state.status_code = 201
+        retry = await client.post("/items", json={}, headers=headers)
+        too_long = await client.post(
+            "/items", json={}, headers={"Idempotency-Key": "k" * 256}
+        )
+    assert first.status_code == 503
+    assert retry.status_code == 201
+    assert "idempotent-replayed" not in retry.headers
+    assert app.state.calls == 2
+    assert too_long.status_code == 400
@@ -0,0 +1,124 @@
+"""Tests for module middleware.load_shedding."""
+
+import asyncio
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import config, middleware
+
+
+def make_app(limits, signals=None, queue_timeout=1.0):
+    app = fastapi.FastAPI()
+    app.add_middleware(
+        middleware.LoadSheddingMiddleware,
+        limits=limits,
+        signals=signals,
+        queue_timeout=queue_timeout,
+        queue_wait_target=10.0,
+        retry_after=2,
+    )
+    app.state.release = asyncio.Event()
+
+    @app.get("/slow/{item_id}")
+    async def slow(item_id: int):
+        await app.state.release.wait()
+        return {"item_id": item_id}
+
+    @app.get("/other")
+    async def other():
+        await app.state.release.wait()
+        return {}
+
+    return app
+
+
+async def _started(*requests):
+    # Lets the requests reach the middleware.
+    for _ in range(10):
+        await asyncio.sleep(0)
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue():
+    app = make_app(
+        {
+            middleware.DEFAULT_ROUTE: middleware.RouteLimit(10, 10),
+            "GET /slow/{item_id}": middleware.RouteLimit(1, 1),
+        }
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = asyncio.ensure_future(client.get("/slow/1"))
+        queued = asyncio.ensure_future(client.get("/slow/2"))
+        await _started(first, queued)
+        shed = await client.get("/slow/3")
+        assert shed.status_code == 503
+        assert shed.headers["retry-after"] == "2"
+        # The other routes have their own limiter.
+        other = asyncio.ensure_future(client.get("/other"))
+        await _started(other)
+        app.state.release.set()
+        assert (await first).status_code == 200
+        assert (await queued).json() == {"item_id": 2}
+        assert (await other).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout():
+    app = make_app({middleware.DEFAULT_ROUTE: middleware.RouteLimit(1, 5)}, None, 0.01)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = asyncio.ensure_future(client.get("/slow/1"))
+        await _started(first)
+        assert (await client.get("/slow/2")).status_code == 503
+        app.state.release.set()
+        assert (await first).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_saturated_signal():
+    saturation = {"value": 1.0}
+    app = make_app(
+        {middleware.DEFAULT_ROUTE: middleware.RouteLimit(1, 5)},
+        {
+            "db_acquire": middleware.Signal(
+                lambda: saturation["value"],
+                0.5,
+                routes=frozenset(("GET /slow/{item_id}",)),
+            )
+        },
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = asyncio.ensure_future(client.get("/slow/1"))
+        other = asyncio.ensure_future(client.get("/other"))
+        await _started(first, other)
+        # The route of the signal is shed instead of queued.
+        assert (await client.get("/slow/2")).status_code == 503
+        queued_other = asyncio.ensure_future(client.get("/other"))
+        saturation["value"] = 0.0
+        queued = asyncio.ensure_future(client.get("/slow/3"))
+        await _started(queued, queued_other)
+        app.state.release.set()
+        for request in (first, other, queued, queued_other):
+            assert (await request).status_code == 200
+
+
+def test_route_limits_from_settings(monkeypatch):
+    monkeypatch.setattr(config, "settings", config.configparser.ConfigParser())
+    config.settings.read_dict(
+        {
+            "LOAD_SHEDDING": {"max_concurrency": "8", "max_queue": "16"},
+            "LOAD_SHEDDING.ROUTES": {"update_users": "PATCH /users:batch, 2, 3"},
+        }
+    )
+    assert middleware.route_limits_from_settings() == {
+        middleware.DEFAULT_ROUTE: middleware.RouteLimit(8, 16),
+        "PATCH /users:batch": middleware.RouteLimit(2, 3),
+    }
@@ -0,0 +1,46 @@
+"""Tests for module middleware.profiling."""
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import middleware
+from fastproject.utils import profiling
+
+
+async def _authorize(headers):
+    return headers.get("authorization") == "Bearer admin"
+
+
+@pytest.mark.asyncio
+async def test_profiling_middleware(tmp_path):
+    store = profiling.ProfileStore(tmp_path)
+    app = fastapi.FastAPI()
+    app.add_middleware(
+        middleware.ProfilingMiddleware, store=store, authorize=_authorize
+    )
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/items/1")
+        assert "x-profile-id" not in response.headers
+        response = await client.get("/items/1", headers={"x-profile": "1"})
+        assert "x-profile-id" not in response.headers
+        assert store.profiles() == []
+        response = await client.get(
+            "/items/1", headers={"x-profile": "1", "authorization": "Bearer admin"}
+        )
+        assert response.json() == {"item_id": 1}
+        deterministic_id = response.headers["x-profile-id"]
+        response = await client.get(
+            "/items/1",
+            headers={"x-profile": "sampling", "authorization": "Bearer admin"},
+        )
+        sampling_id = response.headers["x-profile-id"]
+    assert store.path(deterministic_id).suffix == ".pstats"
+    assert store.path(sampling_id).suffix == ".collapsed"
@@ -0,0 +1,58 @@
+"""Tests for module middleware.timing."""
+
+import json
+import logging
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import middleware
+from fastproject.utils import timing
+
+
+@pytest.mark.asyncio
+async def test_server_timing(caplog):
+    app = fastapi.FastAPI()
+    app.add_middleware(middleware.ServerTimingMiddleware, header=True)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with timing.span("sql"):
+            pass
+        return {"item_id": item_id}
+
+    caplog.set_level(logging.INFO, logger="fastproject.middleware.timing")
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/items/1")
+    phases = [
+        entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")
+    ]
+    assert phases == ["sql", "total"]
+    (record,) = caplog.records
+    line = json.loads(record.getMessage())
+    assert line["route"] == "GET /items/{item_id}"
+    assert line["status"] == 200
+    assert line["counts"] == {"sql": 1}
+    assert set(line["phases"]) == {"sql"}
+
+
+@pytest.mark.asyncio
+async def test_server_timing_without_header(caplog):
+    app = fastapi.FastAPI()
+    app.add_middleware(middleware.ServerTimingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    caplog.set_level(logging.INFO, logger="fastproject.middleware.timing")
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/items/1")
+    assert "server-timing" not in response.headers
+    (record,) = caplog.records
+    assert json.loads(record.getMessage())["status"] == 200
@@ -0,0 +1,60 @@
+"""Tests for module middleware.tracing."""
+
+import asyncio
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import middleware
+from fastproject.utils import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+def make_app(exported, **kwargs):
+    app = fastapi.FastAPI()
+    app.add_middleware(middleware.TracingMiddleware, export=exported.append, **kwargs)
+
+    @tracing.traced
+    async def service_call(delay):
+        await asyncio.sleep(delay)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int, delay: float = 0.0):
+        await service_call(delay)
+        if item_id == 0:
+            raise fastapi.HTTPException(status_code=503)
+        return {"item_id": item_id}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_sampling():
+    exported = []
+    app = make_app(exported, head_sample_ratio=0.0, tail_latency_threshold=0.05)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        # Neither sampled by the client nor slow nor failed.
+        await client.get("/items/1")
+        assert exported == []
+        # Sampled by the client.
+        await client.get(
+            "/items/1", headers={"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01"}
+        )
+        # Tail-sampled: slow, then failed.
+        await client.get("/items/1", params={"delay": 0.06})
+        await client.get("/items/0")
+    sampled, slow, failed = exported
+    root, call = sampled.spans
+    assert sampled.trace_id == TRACE_ID
+    assert root.parent_span_id == SPAN_ID
+    assert root.name == "GET /items/{item_id}"
+    assert root.attributes["http.response.status_code"] == 200
+    assert call.parent_span_id == root.span_id
+    assert slow.spans[0].duration >= 0.05
+    assert failed.spans[0].status_code == tracing.STATUS_ERROR
+    assert len({sampled.trace_id, slow.trace_id, failed.trace_id}) == 3
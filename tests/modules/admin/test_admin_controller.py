@@ -0,0 +1,63 @@
+"""Tests for module modules.admin.controller."""
+
+import uuid
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject import db
+from fastproject.modules.admin import controller
+from fastproject.modules.auth import dependencies as auth_dependencies
+from fastproject.modules.auth import tokens
+from fastproject.modules.permissions import bitsets, repository, service
+from fastproject.utils import caches
+
+ALLOWED_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+DENIED_ID = uuid.UUID("7c1a2b3d-4e5f-4a6b-8c7d-9e0f1a2b3c4d")
+ADMINS_ID = uuid.UUID("0b5e1a3c-46a4-4c5e-9a9e-5d2b8f5b7f10")
+
+
+@pytest.mark.asyncio
+async def test_get_event_loop_report(monkeypatch):
+    async def mock_get_user_permission_bits(user_id):
+        return repository.UserPermissionBits(
+            version=1,
+            is_superuser=False,
+            bit_positions=[],
+            ggroup_ids=[ADMINS_ID] if user_id == ALLOWED_ID else [],
+        )
+
+    async def mock_get_permission_registry():
+        # As seeded by the migration 0014-create-view-diagnostics-permission.sql.
+        return bitsets.PermissionRegistry(
+            1, [("admin.view_diagnostics", 0)], [(ADMINS_ID, [0])]
+        )
+
+    monkeypatch.setattr(
+        repository, "get_user_permission_bits", mock_get_user_permission_bits
+    )
+    monkeypatch.setattr(
+        repository, "get_permission_registry", mock_get_permission_registry
+    )
+    monkeypatch.setattr(service, "_cache", caches.LRUCache(maxsize=10))
+    monkeypatch.setattr(service, "_version", 0)
+    monkeypatch.setattr(service, "_registry", None)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    app = fastapi.FastAPI()
+    app.include_router(controller)
+    user_id = ALLOWED_ID
+
+    def mock_get_token():
+        return tokens.issue_token(b"a-test-secret-key", user_id, 900)[1]
+
+    app.dependency_overrides[auth_dependencies.get_token] = mock_get_token
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/admin/event-loop", params={"limit": 5})
+        assert response.status_code == 200
+        assert response.json()["sites"] == []
+        user_id = DENIED_ID
+        response = await client.get("/admin/event-loop")
+        assert response.status_code == 403
@@ -0,0 +1,54 @@
+"""Tests for module modules.admin.service."""
+
+import uuid
+
+import pytest
+from starlette.datastructures import Headers
+
+from fastproject import db
+from fastproject.modules.admin import service
+from fastproject.modules.auth import service as auth_service
+from fastproject.modules.auth import tokens
+from fastproject.modules.permissions import bitsets, repository
+from fastproject.modules.permissions import service as permissions_service
+from fastproject.utils import caches
+
+ALLOWED_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+DENIED_ID = uuid.UUID("7c1a2b3d-4e5f-4a6b-8c7d-9e0f1a2b3c4d")
+
+
+@pytest.mark.asyncio
+async def test_can_profile(monkeypatch):
+    async def mock_get_user_permission_bits(user_id):
+        return repository.UserPermissionBits(
+            version=1,
+            is_superuser=False,
+            bit_positions=[1] if user_id == ALLOWED_ID else [0],
+            ggroup_ids=[],
+        )
+
+    async def mock_get_permission_registry():
+        # As seeded by the migrations 0014 and 0015.
+        return bitsets.PermissionRegistry(
+            1, [("admin.view_diagnostics", 0), (service.PROFILE_PERMISSION, 1)], []
+        )
+
+    def mock_verify_token(token):
+        return tokens.issue_token(b"a-test-secret-key", uuid.UUID(token), 900)[1]
+
+    monkeypatch.setattr(
+        repository, "get_user_permission_bits", mock_get_user_permission_bits
+    )
+    monkeypatch.setattr(
+        repository, "get_permission_registry", mock_get_permission_registry
+    )
+    monkeypatch.setattr(auth_service, "verify_token", mock_verify_token)
+    monkeypatch.setattr(permissions_service, "_cache", caches.LRUCache(maxsize=10))
+    monkeypatch.setattr(permissions_service, "_version", 0)
+    monkeypatch.setattr(permissions_service, "_registry", None)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    assert await service.can_profile(Headers({"authorization": f"Bearer {ALLOWED_ID}"}))
+    assert not await service.can_profile(
+        Headers({"authorization": f"Bearer {DENIED_ID}"})
+    )
+    assert not await service.can_profile(Headers({}))
@@ -0,0 +1,52 @@
+"""Tests for module modules.auth.service."""
+
+import asyncio
+import logging
+
+import pytest
+
+from fastproject import config
+from fastproject.modules.auth import exceptions, service
+
+
+@pytest.fixture
+def secret_key(monkeypatch):
+    settings = config.configparser.ConfigParser()
+    settings.read_dict(config.settings)
+    monkeypatch.setattr(config, "settings", settings)
+    service._secret_key.cache_clear()
+
+    def _secret_key(value):
+        settings["SECURITY"] = {"secret_key": value}
+        service._secret_key.cache_clear()
+
+    yield _secret_key
+    service._secret_key.cache_clear()
+
+
+def test_check_secret_key(secret_key):
+    for insecure in ["", "change-me-to-a-long-random-string", "x" * 31]:
+        secret_key(insecure)
+        with pytest.raises(exceptions.InsecureSecretKeyError):
+            service.check_secret_key()
+    secret_key("x" * 32)
+    service.check_secret_key()
+    assert service._secret_key() == b"x" * 32
+
+
+@pytest.mark.asyncio
+async def test_on_token_revoked_reloads_in_background(monkeypatch, caplog):
+    loaded = asyncio.Event()
+
+    async def mock_load_revoked_tokens():
+        loaded.set()
+        raise ConnectionError("The database is down.")
+
+    monkeypatch.setattr(service, "load_revoked_tokens", mock_load_revoked_tokens)
+    # Notifications may have been lost.
+    service._on_token_revoked(None)
+    (task,) = service._revoked_token_loads
+    await task
+    assert loaded.is_set() and not service._revoked_token_loads
+    (record,) = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert record.getMessage() == "Could not load the revoked tokens."
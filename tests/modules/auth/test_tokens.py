@@ -0,0 +1,62 @@
+"""Tests for module modules.auth.tokens."""
+
+import uuid
+
+import pytest
+
+from fastproject.modules.auth import exceptions, tokens
+
+KEY = b"averysecretkey"
+USER_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+
+
+def test_issue_and_verify_token():
+    token, claims = tokens.issue_token(
+        KEY, USER_ID, 900, is_staff=True, permission_version=42, now=1_000_000
+    )
+    verified = tokens.verify_token(KEY, token, now=1_000_899)
+    assert verified == claims
+    assert verified.user_id == USER_ID
+    assert verified.is_staff and not verified.is_superuser
+    assert verified.permission_version == 42
+    assert len(token) < 80
+    # Expired.
+    with pytest.raises(exceptions.InvalidTokenError, match="Expired"):
+        tokens.verify_token(KEY, token, now=1_000_900)
+    # Signed with another key.
+    with pytest.raises(exceptions.InvalidTokenError, match="signature"):
+        tokens.verify_token(b"anotherkey", token, now=1_000_000)
+    # Tampered payload.
+    payload, signature = token.split(".")
+    tampered = payload[:-2] + ("A" if payload[-2] != "A" else "B") + payload[-1]
+    with pytest.raises(exceptions.InvalidTokenError, match="signature"):
+        tokens.verify_token(KEY, f"{tampered}.{signature}", now=1_000_000)
+    # Malformed.
+    for malformed in ("", "spam", "spam.eggs", ".", "é.é"):
+        with pytest.raises(exceptions.InvalidTokenError):
+            tokens.verify_token(KEY, malformed, now=1_000_000)
+    signature = tokens._sign(KEY, "c3BhbQ")
+    with pytest.raises(exceptions.InvalidTokenError, match="Malformed"):
+        tokens.verify_token(KEY, f"c3BhbQ.{signature}", now=1_000_000)
+
+
+def test_deny_list():
+    deny_list = tokens.DenyList(maxsize=2)
+    deny_list.add(b"first", expires_at=100, now=0)
+    deny_list.add(b"second", expires_at=200, now=0)
+    assert b"first" in deny_list
+    # Full, the revocations that did not expire are kept.
+    assert deny_list.full(now=0)
+    with pytest.raises(exceptions.DenyListFullError):
+        deny_list.add(b"third", expires_at=300, now=0)
+    assert b"first" in deny_list
+    assert b"third" not in deny_list
+    # Adding a revocation again does not need room.
+    deny_list.add(b"second", expires_at=200, now=0)
+    # Expired revocations are purged, which makes room.
+    assert not deny_list.full(now=150)
+    deny_list.add(b"third", expires_at=300, now=150)
+    assert list(deny_list._revoked) == [b"second", b"third"]
+    # An expired token does not need to be revoked.
+    deny_list.add(b"fourth", expires_at=100, now=150)
+    assert b"fourth" not in deny_list
@@ -0,0 +1,32 @@
+"""Tests for module modules.permissions.bitsets."""
+
+import uuid
+
+from fastproject.modules.permissions import bitsets
+
+EDITORS_ID = uuid.UUID("4f0c7f0e-7f5e-4a35-8b52-9c8f3a1d2e11")
+ADMINS_ID = uuid.UUID("0b5e1a3c-46a4-4c5e-9a9e-5d2b8f5b7f10")
+
+
+def test_permission_registry():
+    registry = bitsets.PermissionRegistry(
+        3,
+        [("skills.add", 0), ("skills.delete", 1), ("users.delete", 70)],
+        [(EDITORS_ID, [0, 1]), (ADMINS_ID, [70])],
+    )
+    assert registry.version == 3
+    assert registry.mask_of("skills.delete") == 0b10
+    assert registry.mask_of("unknown") == 0
+    mask = registry.user_mask(False, [0], [EDITORS_ID])
+    assert mask == 0b11
+    assert bitsets.has_permission(mask, registry.mask_of("skills.delete"))
+    assert not bitsets.has_permission(mask, registry.mask_of("users.delete"))
+    assert not bitsets.has_permission(mask, registry.mask_of("unknown"))
+    assert registry.codenames(mask) == {"skills.add", "skills.delete"}
+    mask = registry.user_mask(False, [], [ADMINS_ID, uuid.uuid4()])
+    assert registry.codenames(mask) == {"users.delete"}
+    mask = registry.user_mask(True, [], [])
+    assert mask == bitsets.ALL_PERMISSIONS
+    assert registry.codenames(mask) == {"skills.add", "skills.delete", "users.delete"}
+    assert bitsets.has_permission(mask, registry.mask_of("users.delete"))
+    assert bitsets.has_permission(mask, registry.mask_of("unknown"))
@@ -0,0 +1,59 @@
+"""Tests for module modules.permissions.dependencies."""
+
+import uuid
+
+import fastapi
+import pytest
+
+from fastproject import db
+from fastproject.modules.auth import tokens
+from fastproject.modules.permissions import bitsets, dependencies, repository, service
+from fastproject.utils import caches
+
+USER_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+
+
+@pytest.mark.asyncio
+async def test_require_permission_ignores_the_superuser_flag_of_the_token(
+    monkeypatch,
+):
+    async def mock_has_permission(user_id, codename):
+        # The user is not a superuser anymore.
+        return False
+
+    monkeypatch.setattr(service, "has_permission", mock_has_permission)
+    _, claims = tokens.issue_token(
+        b"a-test-secret-key", USER_ID, 900, is_superuser=True, permission_version=1
+    )
+    dependency = dependencies.require_permission("skills.add")
+    with pytest.raises(fastapi.HTTPException) as exc_info:
+        await dependency(token=claims)
+    assert exc_info.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_require_permission_lets_superusers_through(monkeypatch):
+    async def mock_get_user_permission_bits(user_id):
+        return repository.UserPermissionBits(
+            version=1, is_superuser=True, bit_positions=[], ggroup_ids=[]
+        )
+
+    async def mock_get_permission_registry():
+        return bitsets.PermissionRegistry(1, [("skills.add", 0)], [])
+
+    monkeypatch.setattr(
+        repository, "get_user_permission_bits", mock_get_user_permission_bits
+    )
+    monkeypatch.setattr(
+        repository, "get_permission_registry", mock_get_permission_registry
+    )
+    monkeypatch.setattr(service, "_cache", caches.LRUCache(maxsize=10))
+    monkeypatch.setattr(service, "_version", 0)
+    monkeypatch.setattr(service, "_registry", None)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    _, claims = tokens.issue_token(
+        b"a-test-secret-key", USER_ID, 900, is_superuser=True, permission_version=1
+    )
+    # The codename is not in the permission table.
+    dependency = dependencies.require_permission("admin.view_diagnostics")
+    await dependency(token=claims)
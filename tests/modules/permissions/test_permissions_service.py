@@ -0,0 +1,70 @@
+"""Tests for module modules.permissions.service."""
+
+import uuid
+
+import pytest
+
+from fastproject import db
+from fastproject.modules.permissions import bitsets, repository, service
+from fastproject.utils import caches
+
+USER_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+GGROUP_ID = uuid.UUID("4f0c7f0e-7f5e-4a35-8b52-9c8f3a1d2e11")
+
+
+@pytest.mark.asyncio
+async def test_has_permission(monkeypatch):
+    calls = []
+    version = 7
+
+    async def mock_get_user_permission_bits(user_id):
+        calls.append(user_id)
+        return repository.UserPermissionBits(
+            version=version,
+            is_superuser=False,
+            bit_positions=[0],
+            ggroup_ids=[GGROUP_ID],
+        )
+
+    async def mock_get_permission_registry():
+        return bitsets.PermissionRegistry(
+            version,
+            [("skills.add", 0), ("skills.delete", 1), ("users.delete", 2)],
+            [(GGROUP_ID, [1])],
+        )
+
+    monkeypatch.setattr(
+        repository, "get_user_permission_bits", mock_get_user_permission_bits
+    )
+    monkeypatch.setattr(
+        repository, "get_permission_registry", mock_get_permission_registry
+    )
+    monkeypatch.setattr(service, "_cache", caches.LRUCache(maxsize=10))
+    monkeypatch.setattr(service, "_version", 0)
+    monkeypatch.setattr(service, "_registry", None)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    assert await service.has_permission(USER_ID, "skills.add")
+    assert await service.has_permission(USER_ID, "skills.delete")
+    assert not await service.has_permission(USER_ID, "users.delete")
+    assert not await service.has_permission(USER_ID, "unknown")
+    assert await service.get_user_permissions(USER_ID) == {
+        "skills.add",
+        "skills.delete",
+    }
+    assert len(calls) == 1
+    # A change in the auth tables invalidates the cached permissions.
+    version = 8
+    service._on_auth_changed("8")
+    assert await service.has_permission(USER_ID, "skills.add")
+    assert service._registry.version == 8
+    assert len(calls) == 2
+    # Notifications may have been lost, everything is invalidated.
+    service._on_auth_changed(None)
+    assert await service.has_permission(USER_ID, "skills.add")
+    assert len(calls) == 3
+    # Without the listener nothing is cached.
+    monkeypatch.setattr(db.NotificationListener, "listening", False)
+    service._on_auth_changed(None)
+    await service.has_permission(USER_ID, "skills.add")
+    await service.has_permission(USER_ID, "skills.add")
+    assert len(calls) == 5
@@ -0,0 +1,50 @@
+"""Tests for module modules.skills.bitmaps."""
+
+import random
+
+from fastproject.modules.skills import bitmaps
+
+
+def test_bitmap():
+    values = {0, 1, 63, 64, 65535, 65536, 1_000_000, 7_000_001}
+    bitmap = bitmaps.Bitmap(values)
+    assert len(bitmap) == len(values)
+    assert list(bitmap) == sorted(values)
+    assert 65536 in bitmap
+    assert 65537 not in bitmap
+    bitmap.discard(65536)
+    bitmap.discard(65537)
+    assert 65536 not in bitmap
+    assert len(bitmap) == len(values) - 1
+    for value in values:
+        bitmap.discard(value)
+    assert not bitmap
+    assert list(bitmap) == []
+
+
+def test_set_operations():
+    rng = random.Random(1999)
+    sets = [set(rng.sample(range(300_000), 5_000)) for _ in range(4)]
+    bitmap_list = [bitmaps.Bitmap(s) for s in sets]
+    assert list(bitmap_list[0] & bitmap_list[1]) == sorted(sets[0] & sets[1])
+    assert list(bitmap_list[0] | bitmap_list[1]) == sorted(sets[0] | sets[1])
+    assert list(bitmaps.intersection(bitmap_list)) == sorted(set.intersection(*sets))
+    assert list(bitmaps.union(bitmap_list)) == sorted(set.union(*sets))
+    assert list(bitmaps.intersection([])) == []
+
+
+def test_top_overlap():
+    rng = random.Random(2002)
+    sets = [set(rng.sample(range(200_000), 20_000)) for _ in range(6)]
+    counts = {}
+    for s in sets:
+        for value in s:
+            counts[value] = counts.get(value, 0) + 1
+    expected = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:50]
+    top = bitmaps.top_overlap([bitmaps.Bitmap(s) for s in sets], 50)
+    assert top == expected
+    assert bitmaps.top_overlap([bitmaps.Bitmap({3})], 0) == []
+    assert bitmaps.top_overlap([bitmaps.Bitmap({3, 5}), bitmaps.Bitmap({5})], 10) == [
+        (5, 2),
+        (3, 1),
+    ]
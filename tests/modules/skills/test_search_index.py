@@ -0,0 +1,31 @@
+"""Tests for module modules.skills.search_index."""
+
+import uuid
+
+from fastproject.modules.skills import search_index
+
+PYTHON_ID, SQL_ID, RUST_ID = (uuid.uuid4() for _ in range(3))
+
+
+def test_skill_search_index():
+    alice, bob, carol = (uuid.uuid4() for _ in range(3))
+    index = search_index.SkillSearchIndex()
+    index.add(alice, [PYTHON_ID, SQL_ID, RUST_ID])
+    index.add(bob, [PYTHON_ID, SQL_ID])
+    index.add(carol, [RUST_ID])
+    assert index.search_all([PYTHON_ID, SQL_ID], 10) == [alice, bob]
+    assert index.search_all([PYTHON_ID, SQL_ID], 1) == [alice]
+    assert index.search_all([PYTHON_ID, uuid.uuid4()], 10) == []
+    assert index.search_any([SQL_ID, RUST_ID], 10) == [alice, bob, carol]
+    assert index.search_top([PYTHON_ID, SQL_ID, RUST_ID], 2) == [(alice, 3), (bob, 2)]
+    index.remove(alice, [SQL_ID])
+    index.remove(uuid.uuid4(), [SQL_ID])
+    assert index.search_all([PYTHON_ID, SQL_ID], 10) == [bob]
+    assert index.search_top([PYTHON_ID, SQL_ID, RUST_ID], 3) == [
+        (alice, 2),
+        (bob, 2),
+        (carol, 1),
+    ]
+    index.remove(carol, [RUST_ID])
+    index.remove(alice, [RUST_ID])
+    assert index.search_any([RUST_ID], 10) == []
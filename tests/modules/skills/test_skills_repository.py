@@ -0,0 +1,159 @@
+"""Tests for module modules.skills.repository."""
+
+import uuid
+
+import asyncpg
+import pytest
+
+from fastproject.modules.skills import dtos, exceptions, repository
+
+USER_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+PYTHON_ID = uuid.UUID("0b5e1a3c-46a4-4c5e-9a9e-5d2b8f5b7f10")
+SQL_ID = uuid.UUID("4f0c7f0e-7f5e-4a35-8b52-9c8f3a1d2e11")
+
+
+class MockPoolAcquireContext:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_set_user_skills(monkeypatch):
+    async def mock_set_user_skills(conn, uuser_id, skill_ids):
+        return {"added": [SQL_ID], "removed": [PYTHON_ID]}
+
+    monkeypatch.setattr(repository._queries, "set_user_skills", mock_set_user_skills)
+    changed = await repository.set_user_skills(
+        USER_ID, [SQL_ID], conn=MockPoolAcquireContext()
+    )
+    assert changed == dtos.UserSkillsChangeDTO(added=[SQL_ID], removed=[PYTHON_ID])
+
+    async def mock_set_user_skills(conn, uuser_id, skill_ids):
+        raise asyncpg.ForeignKeyViolationError("uuser_skill_uuser_id_fkey")
+
+    monkeypatch.setattr(repository._queries, "set_user_skills", mock_set_user_skills)
+    with pytest.raises(exceptions.UserDoesNotExistError):
+        await repository.set_user_skills(
+            USER_ID, [SQL_ID], conn=MockPoolAcquireContext()
+        )
+
+    async def mock_set_user_skills(conn, uuser_id, skill_ids):
+        raise asyncpg.ForeignKeyViolationError("uuser_skill_skill_id_fkey")
+
+    monkeypatch.setattr(repository._queries, "set_user_skills", mock_set_user_skills)
+    with pytest.raises(exceptions.SkillDoesNotExistError):
+        await repository.set_user_skills(
+            USER_ID, [SQL_ID], conn=MockPoolAcquireContext()
+        )
+
+
+@pytest.mark.asyncio
+async def test_add_user_skills(monkeypatch):
+    async def mock_add_user_skills(conn, uuser_id, skill_ids):
+        return [{"skill_id": skill_id} for skill_id in skill_ids]
+
+    monkeypatch.setattr(repository._queries, "add_user_skills", mock_add_user_skills)
+    added = await repository.add_user_skills(
+        USER_ID, [PYTHON_ID, SQL_ID], conn=MockPoolAcquireContext()
+    )
+    assert added == [PYTHON_ID, SQL_ID]
+
+    async def mock_add_user_skills(conn, uuser_id, skill_ids):
+        raise asyncpg.ForeignKeyViolationError("uuser_skill_skill_id_fkey")
+
+    monkeypatch.setattr(repository._queries, "add_user_skills", mock_add_user_skills)
+    with pytest.raises(exceptions.SkillDoesNotExistError):
+        await repository.add_user_skills(
+            USER_ID, [PYTHON_ID], conn=MockPoolAcquireContext()
+        )
+
+
+@pytest.mark.asyncio
+async def test_remove_user_skills(monkeypatch):
+    async def mock_remove_user_skills(conn, uuser_id, skill_ids):
+        return [{"skill_id": PYTHON_ID}]
+
+    monkeypatch.setattr(
+        repository._queries, "remove_user_skills", mock_remove_user_skills
+    )
+    removed = await repository.remove_user_skills(
+        USER_ID, [PYTHON_ID, SQL_ID], conn=MockPoolAcquireContext()
+    )
+    assert removed == [PYTHON_ID]
+
+
+@pytest.mark.asyncio
+async def test_get_user_skills(monkeypatch):
+    async def mock_get_user_skills(conn, uuser_id):
+        return [
+            {"skill_id": PYTHON_ID, "name": "Python"},
+            {"skill_id": SQL_ID, "name": "SQL"},
+        ]
+
+    monkeypatch.setattr(repository._queries, "get_user_skills", mock_get_user_skills)
+    skills = await repository.get_user_skills(USER_ID, conn=MockPoolAcquireContext())
+    assert [skill.name for skill in skills] == ["Python", "SQL"]
+
+
+@pytest.mark.asyncio
+async def test_get_skill_users(monkeypatch):
+    user_ids = sorted(uuid.uuid4() for _ in range(5))
+
+    def rows(user_ids, limit):
+        return [{"uuser_id": u, "username": u.hex[:8]} for u in user_ids[:limit]]
+
+    async def mock_get_skill_users(conn, skill_id, limit):
+        return rows(user_ids, limit)
+
+    async def mock_get_skill_users_after(conn, skill_id, after, limit):
+        return rows([u for u in user_ids if u > after], limit)
+
+    monkeypatch.setattr(repository._queries, "get_skill_users", mock_get_skill_users)
+    monkeypatch.setattr(
+        repository._queries, "get_skill_users_after", mock_get_skill_users_after
+    )
+    page = await repository.get_skill_users(
+        PYTHON_ID, limit=3, conn=MockPoolAcquireContext()
+    )
+    assert [user.user_id for user in page.users] == user_ids[:3]
+    assert page.next_after == user_ids[2]
+    page = await repository.get_skill_users(
+        PYTHON_ID, after=page.next_after, limit=3, conn=MockPoolAcquireContext()
+    )
+    assert [user.user_id for user in page.users] == user_ids[3:]
+    assert page.next_after is None
+
+
+class MockFetchConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, query, *args):
+        self.queries.append(query)
+        return self.rows
+
+    async def fetchrow(self, query, *args):
+        self.queries.append(query)
+        return self.rows[0] if self.rows else None
+
+
+@pytest.mark.asyncio
+async def test_get_skill_fields_by_id():
+    conn = MockFetchConnection([{"name": "Python", "version": "740"}])
+    searched = await repository.get_skill_fields_by_id(PYTHON_ID, ["name"], conn=conn)
+    assert searched == ({"name": "Python"}, "740")
+    assert conn.queries[0].startswith(
+        "SELECT skill.name AS name, skill.xmin::text AS version FROM skill"
+    )
+    conn = MockFetchConnection([])
+    assert await repository.get_skill_fields_by_id(PYTHON_ID, conn=conn) is None
+    with pytest.raises(ValueError):
+        await repository.get_skill_fields_by_id(PYTHON_ID, ["user_count"], conn=conn)
+
+
+@pytest.mark.asyncio
+async def test_get_user_skills_fields():
+    conn = MockFetchConnection([{"skill_id": PYTHON_ID}, {"skill_id": SQL_ID}])
+    skills = await repository.get_user_skills_fields(USER_ID, ["skill_id"], conn=conn)
+    assert skills == [{"skill_id": PYTHON_ID}, {"skill_id": SQL_ID}]
+    assert "skill.name" not in conn.queries[0].split("FROM")[0]
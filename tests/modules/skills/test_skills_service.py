@@ -0,0 +1,81 @@
+"""Tests for module modules.skills.service."""
+
+import asyncio
+import uuid
+
+import pytest
+
+from fastproject import db
+from fastproject.modules.skills import repository, service
+
+ANA_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+BETO_ID = uuid.UUID("7c1a2b3d-4e5f-4a6b-8c7d-9e0f1a2b3c4d")
+PYTHON_ID = uuid.UUID("0b5e1a3c-46a4-4c5e-9a9e-5d2b8f5b7f10")
+SQL_ID = uuid.UUID("4f0c7f0e-7f5e-4a35-8b52-9c8f3a1d2e11")
+
+
+@pytest.fixture
+def search_index(monkeypatch):
+    loaded = []
+
+    async def mock_load_search_index(index):
+        loaded.append(index)
+        index.add(ANA_ID, [PYTHON_ID])
+
+    monkeypatch.setattr(repository, "load_search_index", mock_load_search_index)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    service._forget_search_index()
+    yield loaded
+    service._forget_search_index()
+
+
+@pytest.mark.asyncio
+async def test_on_user_skills_changed(search_index):
+    index = await service.get_search_index()
+    service._on_user_skills_changed(
+        f"{ANA_ID}:+{SQL_ID},-{PYTHON_ID};{BETO_ID}:+{PYTHON_ID}"
+    )
+    assert index.search_all([SQL_ID], 10) == [ANA_ID]
+    assert index.search_all([PYTHON_ID], 10) == [BETO_ID]
+    # Notifications may have been lost, the index is loaded again.
+    service._on_user_skills_changed(None)
+    assert await service.get_search_index() is not index
+    assert len(search_index) == 2
+
+
+@pytest.mark.asyncio
+async def test_on_user_skills_changed_while_loading(search_index, monkeypatch):
+    loading, loaded = asyncio.Event(), asyncio.Event()
+    load = repository.load_search_index
+
+    async def mock_load_search_index(index):
+        await load(index)
+        loaded.set()
+        await loading.wait()
+
+    monkeypatch.setattr(repository, "load_search_index", mock_load_search_index)
+    stale = asyncio.ensure_future(service.get_search_index())
+    await loaded.wait()
+    # The change is replayed on top of the index once loaded.
+    service._on_user_skills_changed(f"{ANA_ID}:+{SQL_ID}")
+    # A load that started before the index was forgotten is not kept.
+    service._on_user_skills_changed(None)
+    loaded.clear()
+    current = asyncio.ensure_future(service.get_search_index())
+    await loaded.wait()
+    loading.set()
+    assert (await stale).search_all([SQL_ID], 10) == [ANA_ID]
+    index = await current
+    assert index is not await stale
+    assert await service.get_search_index() is index
+
+
+@pytest.mark.asyncio
+async def test_search_index_without_listener(search_index, monkeypatch):
+    index = await service.get_search_index()
+    # The changes of the other workers would go unnoticed.
+    monkeypatch.setattr(db.NotificationListener, "listening", False)
+    first = await service.get_search_index()
+    second = await service.get_search_index()
+    assert len({id(index), id(first), id(second)}) == 3
+    assert len(search_index) == 3
@@ -0,0 +1,85 @@
+"""Tests for module modules.users.last_login."""
+
+import asyncio
+import datetime
+import random
+import uuid
+
+import pytest
+
+from fastproject.modules.users import last_login, service
+
+
+def _datetime(second: int) -> datetime.datetime:
+    return datetime.datetime(2023, 5, 1, 8, 0, second, tzinfo=datetime.timezone.utc)
+
+
+def test_last_login_buffer():
+    gwyn_id, ornstein_id = sorted(uuid.uuid4() for _ in range(2))
+    buffer = last_login.LastLoginBuffer()
+    buffer.record(ornstein_id, _datetime(3))
+    buffer.record(gwyn_id, _datetime(1))
+    buffer.record(ornstein_id, _datetime(2))
+    assert len(buffer) == 2
+    assert buffer.drain() == ([gwyn_id, ornstein_id], [_datetime(1), _datetime(3)])
+    assert len(buffer) == 0
+    buffer.record(gwyn_id, _datetime(5))
+    buffer.restore([gwyn_id, ornstein_id], [_datetime(1), _datetime(3)])
+    assert buffer.drain() == ([gwyn_id, ornstein_id], [_datetime(5), _datetime(3)])
+
+
+@pytest.mark.asyncio
+async def test_record_last_login_write_reduction(monkeypatch):
+    writes = []
+    stored = {}
+
+    async def mock_update_last_logins(user_ids, last_logins):
+        writes.append(len(user_ids))
+        stored.update(zip(user_ids, last_logins))
+
+    async def mock_notify_users_changed(channel, payloads):
+        pass
+
+    monkeypatch.setattr(
+        service.repository, "update_last_logins", mock_update_last_logins
+    )
+    monkeypatch.setattr(
+        service.repository, "notify_users_changed", mock_notify_users_changed
+    )
+    monkeypatch.setattr(service, "_last_logins", last_login.LastLoginBuffer())
+    monkeypatch.setattr(service, "_last_login_flush_size", 100)
+    rng = random.Random(32)
+    user_ids = [uuid.uuid4() for _ in range(500)]
+    logins = 10_000
+    latest = {}
+    for second in range(logins):
+        user_id = rng.choice(user_ids)
+        login = _datetime(0) + datetime.timedelta(seconds=second)
+        latest[user_id] = login
+        service.record_last_login(user_id, login)
+        # Data loss is bounded: no more than flush_size users are ever waiting.
+        assert len(service._last_logins) <= 100
+        await asyncio.sleep(0)
+    # The updates still buffered are flushed on shutdown.
+    await service.last_login_flusher.stop(run_last=True)
+    assert len(service._last_logins) == 0
+    assert stored == latest
+    # One UPDATE per flush instead of one per login.
+    assert len(writes) <= logins // 100 + 1
+    assert sum(writes) < logins
+
+
+@pytest.mark.asyncio
+async def test_flush_last_logins_restores_on_failure(monkeypatch):
+    async def mock_update_last_logins(user_ids, last_logins):
+        raise ConnectionError
+
+    monkeypatch.setattr(
+        service.repository, "update_last_logins", mock_update_last_logins
+    )
+    monkeypatch.setattr(service, "_last_logins", last_login.LastLoginBuffer())
+    user_id = uuid.uuid4()
+    service.record_last_login(user_id, _datetime(1))
+    with pytest.raises(ConnectionError):
+        await service.flush_last_logins()
+    assert service._last_logins.drain() == ([user_id], [_datetime(1)])
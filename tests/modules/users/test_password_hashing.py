@@ -1,8 +1,13 @@
 """Tests for module modules.users.password_hashing."""
 
+import asyncio
+import concurrent.futures
+import threading
+
 import pytest
 
 from fastproject.modules.users import password_hashing
+from fastproject.utils import deadlines
 
 
 @pytest.mark.parametrize(
@@ -66,3 +71,28 @@ def test_make_password():
     assert not password_hashing.is_password_usable(encoded)
     with pytest.raises(TypeError, match="Password must be a string"):
         password_hashing.make_password(1)
+
+
+@pytest.mark.asyncio
+async def test_run_in_thread_deadline():
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    loop.set_default_executor(executor)
+    release = threading.Event()
+    hashed = []
+    try:
+        # The only thread is busy, the next hash is queued.
+        busy = asyncio.ensure_future(password_hashing.run_in_thread(release.wait))
+        await asyncio.sleep(0.01)
+        with deadlines.use_deadline(0.05):
+            with pytest.raises(deadlines.DeadlineExceededError):
+                await password_hashing.run_in_thread(hashed.append, "password")
+        assert password_hashing.recent_thread_wait() >= 0.05
+        release.set()
+        await busy
+        # The abandoned hash never runs.
+        await password_hashing.run_in_thread(lambda: None)
+        assert not hashed
+    finally:
+        release.set()
+        executor.shutdown()
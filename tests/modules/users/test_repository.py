@@ -9,13 +9,28 @@ import pytest
 from fastproject.modules.users import exceptions, repository
 
 
+class MockTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
 class MockPoolAcquireContext:
-    pass
+    def transaction(self):
+        return MockTransaction()
 
 
 @pytest.mark.asyncio
 async def test_insert_user(monkeypatch):
+    directory = []
+
+    async def mock_insert_directory_entry(conn, uuser_id, **kwargs):
+        directory.append((uuser_id, kwargs))
+
     async def mock_insert_user(conn, **kwargs):
+        assert kwargs["uuser_id"].version == 7
         return {
             "uuser_id": uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
             "username": kwargs["username"],
@@ -30,35 +45,48 @@ async def test_insert_user(monkeypatch):
             "last_login": kwargs["last_login"],
         }
 
-    monkeypatch.setattr(repository._queries, "insert_user", mock_insert_user)
-    inserted = await repository.insert_user(
-        username="soulofcinder",
-        email="soc@kotff.com",
-        first_name="Soul",
-        last_name="Of Cinder",
-        password="averysecrethash",
-        is_superuser=True,
-        is_staff=True,
-        is_active=True,
-        date_joined=datetime.datetime(1999, 1, 22),
-        last_login=datetime.datetime(2002, 11, 26),
-        conn=MockPoolAcquireContext(),
+    user = {
+        "username": "soulofcinder",
+        "email": "soc@kotff.com",
+        "first_name": "Soul",
+        "last_name": "Of Cinder",
+        "password": "averysecrethash",
+        "is_superuser": True,
+        "is_staff": True,
+        "is_active": True,
+        "date_joined": datetime.datetime(1999, 1, 22),
+        "last_login": datetime.datetime(2002, 11, 26),
+    }
+    monkeypatch.setattr(
+        repository._queries, "insert_directory_entry", mock_insert_directory_entry
     )
+    monkeypatch.setattr(repository._queries, "insert_user", mock_insert_user)
+    inserted = await repository.insert_user(**user, conn=MockPoolAcquireContext())
     assert type(inserted) is repository.User
+    assert directory[0][1] == {
+        "username": "soulofcinder",
+        "email": "soc@kotff.com",
+        "is_superuser": True,
+        "is_active": True,
+    }
 
-    async def mock_insert_user(conn, **kwargs):
+    async def mock_insert_directory_entry(conn, **kwargs):
         raise asyncpg.UniqueViolationError("username")
 
-    monkeypatch.setattr(repository._queries, "insert_user", mock_insert_user)
+    monkeypatch.setattr(
+        repository._queries, "insert_directory_entry", mock_insert_directory_entry
+    )
     with pytest.raises(exceptions.UsernameAlreadyExistsError):
-        await repository.insert_user(conn=MockPoolAcquireContext())
+        await repository.insert_user(**user, conn=MockPoolAcquireContext())
 
-    async def mock_insert_user(conn, **kwargs):
+    async def mock_insert_directory_entry(conn, **kwargs):
         raise asyncpg.UniqueViolationError("email")
 
-    monkeypatch.setattr(repository._queries, "insert_user", mock_insert_user)
+    monkeypatch.setattr(
+        repository._queries, "insert_directory_entry", mock_insert_directory_entry
+    )
     with pytest.raises(exceptions.EmailAlreadyExistsError):
-        await repository.insert_user(conn=MockPoolAcquireContext())
+        await repository.insert_user(**user, conn=MockPoolAcquireContext())
 
 
 @pytest.mark.asyncio
@@ -91,6 +119,46 @@ async def test_get_user_by_id(monkeypatch):
     assert searched is None
 
 
+@pytest.mark.asyncio
+async def test_get_user_by_username(monkeypatch):
+    async def mock_get_uuser_id_by_username(conn, username):
+        if username == "soulofcinder":
+            return uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+        return None
+
+    async def mock_get_user_by_id(conn, uuser_id):
+        if uuser_id == uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"):
+            return {
+                "uuser_id": uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
+                "username": "soulofcinder",
+                "email": "soc@kotff.com",
+                "first_name": "Soul",
+                "last_name": "Of Cinder",
+                "password": "averysecrethash",
+                "is_superuser": True,
+                "is_staff": True,
+                "is_active": True,
+                "date_joined": datetime.datetime(1999, 1, 22),
+                "last_login": datetime.datetime(2002, 11, 26),
+            }
+        return None
+
+    monkeypatch.setattr(
+        repository._queries,
+        "get_uuser_id_by_username",
+        mock_get_uuser_id_by_username,
+    )
+    monkeypatch.setattr(repository._queries, "get_user_by_id", mock_get_user_by_id)
+    searched = await repository.get_user_by_username(
+        "soulofcinder", conn=MockPoolAcquireContext()
+    )
+    assert type(searched) is repository.User
+    searched = await repository.get_user_by_username(
+        "nameless_king", conn=MockPoolAcquireContext()
+    )
+    assert searched is None
+
+
 @pytest.mark.asyncio
 async def test_update_user_by_id(monkeypatch):
     async def mock_update_user_by_id(conn, uuser_id, **kwargs):
@@ -145,6 +213,113 @@ async def test_update_user_by_id(monkeypatch):
         )
 
 
+@pytest.mark.asyncio
+async def test_update_user_by_id_directory_fields(monkeypatch):
+    shard_updates = []
+
+    async def mock_update_directory_entry(conn, uuser_id, username, **kwargs):
+        if username == "nameless_king":
+            raise asyncpg.UniqueViolationError(
+                'unique constraint "uuser_directory_username_key"'
+            )
+        if uuser_id == uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"):
+            return uuser_id
+        return None
+
+    async def mock_update_user_by_id(conn, uuser_id, **kwargs):
+        shard_updates.append(uuser_id)
+        return {
+            "uuser_id": uuser_id,
+            "username": kwargs["username"],
+            "email": "soc@kotff.com",
+            "first_name": "Soul",
+            "last_name": "Of Cinder",
+            "password": "averysecrethash",
+            "is_superuser": True,
+            "is_staff": True,
+            "is_active": True,
+            "date_joined": datetime.datetime(1999, 1, 22),
+            "last_login": datetime.datetime(2002, 11, 26),
+        }
+
+    monkeypatch.setattr(
+        repository._queries, "update_directory_entry", mock_update_directory_entry
+    )
+    monkeypatch.setattr(
+        repository._queries, "update_user_by_id", mock_update_user_by_id
+    )
+    updated = await repository.update_user_by_id(
+        uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
+        username="soulofcinder2",
+        conn=MockPoolAcquireContext(),
+    )
+    assert updated.username == "soulofcinder2"
+    updated = await repository.update_user_by_id(
+        uuid.UUID("de623351-1398-4a83-98c5-91a34f5919AA"),
+        username="soulofcinder2",
+        conn=MockPoolAcquireContext(),
+    )
+    assert updated is None
+    with pytest.raises(exceptions.UsernameAlreadyExistsError):
+        await repository.update_user_by_id(
+            uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
+            username="nameless_king",
+            conn=MockPoolAcquireContext(),
+        )
+    assert shard_updates == [uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")]
+
+
+@pytest.mark.asyncio
+async def test_update_user_by_id_versions(monkeypatch):
+    soc_id = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+    current = {soc_id: "740"}
+
+    async def mock_update_user_by_id(conn, uuser_id, versions, **kwargs):
+        if uuser_id not in current:
+            return None
+        if versions is not None and current[uuser_id] not in versions:
+            return None
+        current[uuser_id] = "741"
+        return {
+            "uuser_id": uuser_id,
+            "username": "soulofcinder",
+            "email": "soc@kotff.com",
+            "first_name": "Soul",
+            "last_name": "Of Cinder",
+            "password": "averysecrethash",
+            "is_superuser": True,
+            "is_staff": True,
+            "is_active": True,
+            "date_joined": datetime.datetime(1999, 1, 22),
+            "last_login": datetime.datetime(2002, 11, 26),
+            "version": "741",
+        }
+
+    async def mock_get_user_version(conn, uuser_id):
+        return current.get(uuser_id)
+
+    monkeypatch.setattr(
+        repository._queries, "update_user_by_id", mock_update_user_by_id
+    )
+    monkeypatch.setattr(repository._queries, "get_user_version", mock_get_user_version)
+    updated = await repository.update_user_by_id(
+        soc_id, ["739", "740"], first_name="Soul", conn=MockPoolAcquireContext()
+    )
+    assert updated.version == "741"
+    # The user was updated by someone else.
+    with pytest.raises(exceptions.UserVersionMismatchError):
+        await repository.update_user_by_id(
+            soc_id, ["740"], first_name="Lord", conn=MockPoolAcquireContext()
+        )
+    updated = await repository.update_user_by_id(
+        uuid.UUID("de623351-1398-4a83-98c5-91a34f5919AA"),
+        ["740"],
+        first_name="Lord",
+        conn=MockPoolAcquireContext(),
+    )
+    assert updated is None
+
+
 @pytest.mark.asyncio
 async def test_delete_user_by_id(monkeypatch):
     async def mock_delete_user_by_id(conn, uuser_id):
@@ -164,6 +339,20 @@ async def test_delete_user_by_id(monkeypatch):
             }
         return None
 
+    async def mock_set_constraints_immediate(conn):
+        pass
+
+    async def mock_delete_directory_entry(conn, uuser_id):
+        pass
+
+    monkeypatch.setattr(
+        repository._queries,
+        "set_constraints_immediate",
+        mock_set_constraints_immediate,
+    )
+    monkeypatch.setattr(
+        repository._queries, "delete_directory_entry", mock_delete_directory_entry
+    )
     monkeypatch.setattr(
         repository._queries, "delete_user_by_id", mock_delete_user_by_id
     )
@@ -175,3 +364,190 @@ async def test_delete_user_by_id(monkeypatch):
         uuid.UUID("de623351-1398-4a83-98c5-91a34f5919aE"), conn=MockPoolAcquireContext()
     )
     assert deleted is None
+
+
+@pytest.mark.asyncio
+async def test_update_last_logins(monkeypatch):
+    calls = []
+
+    async def mock_update_last_logins(conn, uuser_ids, last_logins):
+        calls.append((uuser_ids, last_logins))
+
+    monkeypatch.setattr(
+        repository._queries, "update_last_logins", mock_update_last_logins
+    )
+    user_ids = [uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")]
+    last_logins = [datetime.datetime(2002, 11, 26)]
+    await repository.update_last_logins(
+        user_ids, last_logins, conn=MockPoolAcquireContext()
+    )
+    assert calls == [(user_ids, last_logins)]
+
+
+@pytest.mark.asyncio
+async def test_insert_users(monkeypatch):
+    existing = {"soulofcinder"}
+
+    def user(username, email):
+        return {
+            "username": username,
+            "email": email,
+            "first_name": "Soul",
+            "last_name": "Of Cinder",
+            "password": "averysecrethash",
+            "is_superuser": False,
+            "is_staff": False,
+            "is_active": True,
+            "date_joined": datetime.datetime(1999, 1, 22),
+            "last_login": None,
+        }
+
+    async def mock_insert_directory_entries(conn, uuser_ids, usernames, emails, **_):
+        reserved = []
+        emails_taken = {"taken@kotff.com"}
+        for uuser_id, username, email in zip(uuser_ids, usernames, emails):
+            if username in existing or email in emails_taken:
+                continue
+            existing.add(username)
+            emails_taken.add(email)
+            reserved.append({"uuser_id": uuser_id})
+        return reserved
+
+    async def mock_insert_users(conn, uuser_ids, usernames, emails, **kwargs):
+        return [
+            {"uuser_id": uuser_id, **user(username, email)}
+            for uuser_id, username, email in zip(uuser_ids, usernames, emails)
+        ]
+
+    async def mock_get_existing_usernames(conn, usernames):
+        return [{"username": u} for u in usernames if u in existing]
+
+    monkeypatch.setattr(
+        repository._queries,
+        "insert_directory_entries",
+        mock_insert_directory_entries,
+    )
+    monkeypatch.setattr(repository._queries, "insert_users", mock_insert_users)
+    monkeypatch.setattr(
+        repository._queries, "get_existing_usernames", mock_get_existing_usernames
+    )
+    results = await repository.insert_users(
+        [
+            user("gwyn", "gwyn@kotff.com"),
+            user("soulofcinder", "soc@kotff.com"),
+            user("ornstein", "taken@kotff.com"),
+            user("gwyn", "gwyn2@kotff.com"),
+            user("smough", "gwyn@kotff.com"),
+        ],
+        conn=MockPoolAcquireContext(),
+    )
+    assert type(results[0]) is repository.User
+    assert results[0].username == "gwyn"
+    assert type(results[1]) is exceptions.UsernameAlreadyExistsError
+    assert type(results[2]) is exceptions.EmailAlreadyExistsError
+    assert type(results[3]) is exceptions.UsernameAlreadyExistsError
+    assert type(results[4]) is exceptions.EmailAlreadyExistsError
+
+
+@pytest.mark.asyncio
+async def test_update_users(monkeypatch):
+    gwyn_id, ornstein_id, missing_id = (uuid.uuid4() for _ in range(3))
+    usernames = {gwyn_id: "gwyn", ornstein_id: "ornstein"}
+
+    def record(user_id, **kwargs):
+        return {
+            "uuser_id": user_id,
+            "username": usernames[user_id],
+            "email": f"{usernames[user_id]}@kotff.com",
+            "first_name": "Lord",
+            "last_name": "Of Cinder",
+            "password": "averysecrethash",
+            "is_superuser": False,
+            "is_staff": False,
+            "is_active": kwargs.get("is_active") is not False,
+            "date_joined": datetime.datetime(1999, 1, 22),
+            "last_login": None,
+        }
+
+    async def mock_update_directory_entries(conn, uuser_ids, usernames, **kwargs):
+        if "gwyn" in usernames:
+            raise asyncpg.UniqueViolationError(
+                'unique constraint "uuser_directory_username_key"'
+            )
+        return [{"uuser_id": user_id} for user_id in uuser_ids if user_id != missing_id]
+
+    async def mock_update_directory_entry(conn, uuser_id, username, **kwargs):
+        if username == "gwyn":
+            raise asyncpg.UniqueViolationError(
+                'unique constraint "uuser_directory_username_key"'
+            )
+        return uuser_id if uuser_id != missing_id else None
+
+    async def mock_update_users(conn, uuser_ids, is_actives, **kwargs):
+        return [
+            record(user_id, is_active=is_active)
+            for user_id, is_active in zip(uuser_ids, is_actives)
+            if user_id != missing_id
+        ]
+
+    monkeypatch.setattr(
+        repository._queries,
+        "update_directory_entries",
+        mock_update_directory_entries,
+    )
+    monkeypatch.setattr(
+        repository._queries, "update_directory_entry", mock_update_directory_entry
+    )
+    monkeypatch.setattr(repository._queries, "update_users", mock_update_users)
+    results = await repository.update_users(
+        [
+            (gwyn_id, {"is_active": False}),
+            (missing_id, {"is_active": False}),
+            (ornstein_id, {"is_staff": True}),
+        ],
+        conn=MockPoolAcquireContext(),
+    )
+    assert results[0].user_id == gwyn_id and results[0].is_active is False
+    assert results[1] is None
+    assert results[2].user_id == ornstein_id
+    results = await repository.update_users(
+        [(ornstein_id, {"username": "gwyn"}), (gwyn_id, {"is_active": True})],
+        conn=MockPoolAcquireContext(),
+    )
+    assert type(results[0]) is exceptions.UsernameAlreadyExistsError
+    assert isinstance(results[0].__cause__, asyncpg.UniqueViolationError)
+    assert results[1].user_id == gwyn_id
+
+
+@pytest.mark.asyncio
+async def test_get_user_fields_by_id():
+    queries = []
+
+    class MockConnection:
+        async def fetchrow(self, query, user_id):
+            queries.append(query)
+            if user_id == uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"):
+                return {"user_id": user_id, "username": "soulofcinder", "version": "7"}
+            return None
+
+    searched = await repository.get_user_fields_by_id(
+        uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
+        ["username", "user_id"],
+        conn=MockConnection(),
+    )
+    assert searched[0]["username"] == "soulofcinder"
+    assert searched[1] == "7"
+    assert queries[0].startswith(
+        "SELECT uuser_id AS user_id, username, xmin::text AS version FROM uuser"
+    )
+    searched = await repository.get_user_fields_by_id(
+        uuid.UUID("de623351-1398-4a83-98c5-91a34f5919aE"), conn=MockConnection()
+    )
+    assert searched is None
+    assert "password" not in queries[1]
+    with pytest.raises(ValueError):
+        await repository.get_user_fields_by_id(
+            uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee"),
+            ["password"],
+            conn=MockConnection(),
+        )
@@ -0,0 +1,129 @@
+"""Tests for the user cache of module modules.users.service."""
+
+import uuid
+
+import pytest
+
+from fastproject import db
+from fastproject.modules.users import repository, service
+from fastproject.utils import caches
+
+USER_ID = uuid.UUID("de623351-1398-4a83-98c5-91a34f5919ee")
+USER = {
+    "user_id": USER_ID,
+    "username": "soulofcinder",
+    "email": "soc@kotff.com",
+    "first_name": "Soul",
+}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = caches.LRUCache(maxsize=10)
+    monkeypatch.setattr(service, "_cache", cache)
+    monkeypatch.setattr(db.NotificationListener, "listening", True)
+    notified = []
+
+    async def mock_notify_users_changed(channel, payloads):
+        notified.append((channel, payloads))
+
+    monkeypatch.setattr(repository, "notify_users_changed", mock_notify_users_changed)
+    cache.notified = notified
+    return cache
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    reads = []
+
+    async def mock_get_user_fields_by_id(user_id, fields=None):
+        reads.append(user_id)
+        return dict(USER), str(len(reads))
+
+    monkeypatch.setattr(repository, "get_user_fields_by_id", mock_get_user_fields_by_id)
+    return reads
+
+
+@pytest.mark.asyncio
+async def test_get_user_fields_by_id_cached(cache, reads):
+    assert await service.get_user_fields_by_id(USER_ID, ["username"]) == (
+        {"username": "soulofcinder"},
+        "1",
+    )
+    assert await service.get_user_fields_by_id(USER_ID) == (USER, "1")
+    assert await service.get_user_version(USER_ID) == "1"
+    assert reads == [USER_ID]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+    # The cached entry has only public fields.
+    user, _ = cache.get(USER_ID)
+    assert "password" not in user
+    # The returned dicts are copies.
+    (await service.get_user_fields_by_id(USER_ID))[0]["username"] = "x"
+    assert cache.get(USER_ID)[0]["username"] == "soulofcinder"
+    with pytest.raises(ValueError):
+        await service.get_user_fields_by_id(USER_ID, ["password"])
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate(monkeypatch, cache, reads):
+    async def mock_update_user_by_id(user_id, versions=None, **kwargs):
+        return user_id
+
+    async def mock_delete_user_by_id(user_id):
+        return user_id
+
+    monkeypatch.setattr(repository, "update_user_by_id", mock_update_user_by_id)
+    monkeypatch.setattr(repository, "delete_user_by_id", mock_delete_user_by_id)
+    await service.get_user_fields_by_id(USER_ID)
+    await service.update_user_by_id(USER_ID, first_name="Aldrich")
+    assert cache.get(USER_ID) is None
+    assert cache.notified == [(service.USERS_CHANGED_CHANNEL, [str(USER_ID)])]
+    assert await service.get_user_fields_by_id(USER_ID) == (USER, "2")
+    await service.delete_user_by_id(USER_ID)
+    assert cache.get(USER_ID) is None
+    assert len(cache.notified) == 2
+
+
+@pytest.mark.asyncio
+async def test_notifications_invalidate(cache, reads):
+    other_id = uuid.uuid4()
+    cache.set(other_id, ({}, "1"))
+    await service.get_user_fields_by_id(USER_ID)
+    service._on_users_changed(f"{uuid.uuid4()},{USER_ID}")
+    assert cache.get(USER_ID) is None
+    assert cache.get(other_id) is not None
+    # The notifications may have been lost.
+    service._on_users_changed(None)
+    assert cache.get(other_id) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_read(monkeypatch, cache):
+    async def mock_get_user_fields_by_id(user_id, fields=None):
+        service._on_users_changed(str(user_id))
+        return dict(USER), "1"
+
+    monkeypatch.setattr(repository, "get_user_fields_by_id", mock_get_user_fields_by_id)
+    assert await service.get_user_fields_by_id(USER_ID) == (USER, "1")
+    assert cache.get(USER_ID) is None
+
+
+@pytest.mark.asyncio
+async def test_update_user_by_id_hashes_in_a_thread(monkeypatch, cache):
+    updates = []
+    hashed = []
+
+    async def mock_update_user_by_id(user_id, versions=None, **kwargs):
+        updates.append(kwargs)
+        return None
+
+    async def mock_run_in_thread(func, *args):
+        hashed.append(args)
+        return "hashed"
+
+    monkeypatch.setattr(repository, "update_user_by_id", mock_update_user_by_id)
+    monkeypatch.setattr(service.password_hashing, "run_in_thread", mock_run_in_thread)
+    await service.update_user_by_id(USER_ID, first_name="Aldrich", password="secret")
+    assert hashed == [("secret",)]
+    assert updates == [{"first_name": "Aldrich", "password": "hashed"}]
@@ -0,0 +1,68 @@
+"""Tests for module utils.batching."""
+
+import asyncio
+
+import pytest
+
+from fastproject.utils import batching
+
+
+@pytest.mark.asyncio
+async def test_coalescer():
+    batches = []
+
+    async def func(items):
+        batches.append(items)
+        return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+    coalescer = batching.Coalescer(func, max_delay=0.01, max_size=3)
+    results = await asyncio.gather(
+        *(coalescer.submit(item) for item in (1, -2, 3, 4, 5)),
+        return_exceptions=True,
+    )
+    # The first batch is full before max_delay, the second one waits for it.
+    assert batches == [[1, -2, 3], [4, 5]]
+    assert results[0] == 2
+    assert isinstance(results[1], ValueError)
+    assert results[2:] == [6, 8, 10]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_batch_failure():
+    async def func(items):
+        raise ConnectionError
+
+    coalescer = batching.Coalescer(func, max_delay=0.01, max_size=10)
+    results = await asyncio.gather(
+        coalescer.submit(1), coalescer.submit(2), return_exceptions=True
+    )
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_coalescer_wrong_number_of_results():
+    async def func(items):
+        return items[:1]
+
+    coalescer = batching.Coalescer(func, max_delay=0.01, max_size=10)
+    results = await asyncio.gather(
+        coalescer.submit(1), coalescer.submit(2), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_coalescer_cancelled_caller():
+    batches = []
+
+    async def func(items):
+        batches.append(items)
+        return items
+
+    coalescer = batching.Coalescer(func, max_delay=0.01, max_size=10)
+    cancelled = asyncio.ensure_future(coalescer.submit(1))
+    kept = asyncio.ensure_future(coalescer.submit(2))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    assert await kept == 2
+    assert batches == [[2]]
@@ -0,0 +1,36 @@
+"""Tests for module utils.caches."""
+
+from fastproject.utils import caches
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache():
+    timer = FakeTimer()
+    cache = caches.LRUCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used entry now.
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    timer.now = 11
+    assert cache.get("a", "expired") == "expired"
+    assert len(cache) == 1
+    assert cache.pop("c") == 3
+    assert cache.pop("c") is None
+    assert cache.stats() == {
+        "size": 0,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 2,
+        "evictions": 1,
+    }
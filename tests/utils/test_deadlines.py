@@ -0,0 +1,30 @@
+"""Tests for module utils.deadlines."""
+
+import asyncio
+
+import pytest
+
+from fastproject.utils import deadlines
+
+
+@pytest.mark.asyncio
+async def test_deadlines():
+    assert deadlines.remaining() is None
+    deadlines.check()
+    assert await deadlines.wait_for(asyncio.sleep(0, "done")) == "done"
+    with deadlines.use_deadline(1.0):
+        assert 0.9 < deadlines.remaining() <= 1.0
+        # An earlier deadline is kept.
+        with deadlines.use_deadline(5.0):
+            assert deadlines.remaining() <= 1.0
+        with deadlines.use_deadline(0.01):
+            with pytest.raises(deadlines.DeadlineExceededError):
+                await deadlines.wait_for(asyncio.sleep(1))
+            with pytest.raises(deadlines.DeadlineExceededError):
+                deadlines.check()
+            with deadlines.without_deadline():
+                assert deadlines.remaining() is None
+            with pytest.raises(deadlines.DeadlineExceededError):
+                await deadlines.wait_for(asyncio.sleep(0))
+        assert deadlines.remaining() > 0.5
+    assert deadlines.remaining() is None
@@ -0,0 +1,21 @@
+"""Tests for module utils.etags."""
+
+from fastproject.utils import etags
+
+
+def test_if_none_match():
+    etag = etags.make_etag("740")
+    assert etag == '"740"'
+    assert not etags.if_none_match(None, etag)
+    assert etags.if_none_match('"740"', etag)
+    assert etags.if_none_match('"1", W/"740"', etag)
+    assert etags.if_none_match("*", etag)
+    assert not etags.if_none_match('"741"', etag)
+
+
+def test_if_match_versions():
+    assert etags.if_match_versions(None) is None
+    assert etags.if_match_versions("*") is None
+    assert etags.if_match_versions('"740", "741"') == ["740", "741"]
+    # The comparison is strong, weak tags never match.
+    assert etags.if_match_versions('W/"740"') == []
@@ -0,0 +1,89 @@
+"""Tests for module utils.json_responses."""
+
+import datetime
+import json
+import uuid
+
+import fastapi
+import fastapi.routing
+import httpx
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from fastproject.modules.skills.dtos import PublicSkillDTO
+from fastproject.modules.users import models
+from fastproject.utils import json_responses
+
+USER = models.PublicUser(
+    user_id=uuid.UUID("01a154dd-31e9-76b5-a905-1452d93c23fe"),
+    username="soraya",
+    email="soraya@example.com",
+    first_name="Soraya",
+    last_name="Núñez",
+    is_superuser=False,
+    is_staff=False,
+    is_active=True,
+    date_joined=datetime.datetime(
+        2023, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc
+    ),
+    last_login=None,
+)
+SKILLS = [PublicSkillDTO(skill_id=uuid.uuid4(), name=f"skill {i}") for i in range(3)]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(json_responses, "orjson", None)
+    for content in (USER, SKILLS, {"users": [USER], "next": USER.user_id}):
+        assert json.loads(json_responses.dumps(content)) == jsonable_encoder(content)
+    with pytest.raises(TypeError):
+        json_responses.dumps(object())
+
+
+@pytest.mark.asyncio
+async def test_fast_json_route(monkeypatch):
+    encoded = []
+
+    def counting_jsonable_encoder(obj, *args, **kwargs):
+        encoded.append(obj)
+        return jsonable_encoder(obj, *args, **kwargs)
+
+    monkeypatch.setattr(fastapi.routing, "jsonable_encoder", counting_jsonable_encoder)
+    router = fastapi.APIRouter(route_class=json_responses.FastJSONRoute)
+
+    @router.get("/user", response_model=models.PublicUser, status_code=201)
+    async def get_user():
+        return USER
+
+    @router.get("/skills", response_model=list[PublicSkillDTO])
+    async def get_skills():
+        return SKILLS
+
+    @router.get("/user-dict", response_model=models.PublicUser)
+    async def get_user_dict():
+        return USER.dict()
+
+    @router.get("/user-header", response_model=models.PublicUser)
+    async def get_user_header(response: fastapi.Response):
+        response.headers["x-test"] = "1"
+        return USER
+
+    app = fastapi.FastAPI(default_response_class=json_responses.FastJSONResponse)
+    app.include_router(router)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/user")
+        assert response.status_code == 201
+        assert response.json() == jsonable_encoder(USER)
+        response = await client.get("/skills")
+        assert response.json() == jsonable_encoder(SKILLS)
+        assert not encoded
+        # Other values take the usual path.
+        response = await client.get("/user-dict")
+        assert response.json() == jsonable_encoder(USER)
+        assert len(encoded) == 1
+        response = await client.get("/user-header")
+        assert response.headers["x-test"] == "1"
+        assert len(encoded) == 2
@@ -0,0 +1,55 @@
+"""Tests for module utils.loop_watchdog."""
+
+import asyncio
+import time
+import traceback
+
+import pytest
+
+from fastproject.utils import loop_watchdog
+
+
+def _block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_loop_watchdog():
+    watchdog = loop_watchdog.LoopWatchdog(threshold=0.05, interval=0.01)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert watchdog.report()["blocks"] == 0
+        for _ in range(2):
+            _block_the_loop(0.2)
+            await asyncio.sleep(0.03)
+    finally:
+        await watchdog.stop()
+    report = watchdog.report()
+    assert not report["running"]
+    assert report["blocks"] == 2
+    assert report["lag_max"] >= 0.15
+    assert report["blocked_total"] >= 0.3
+    (site,) = report["sites"]
+    assert site["call_site"].endswith("in _block_the_loop")
+    assert site["blocks"] == 2
+    # Sampled every 10 ms while blocked for 2 * (200 - 50) ms.
+    assert 10 <= site["samples"] <= 40
+    assert site["stack"][0] == site["call_site"]
+    watchdog.reset()
+    assert watchdog.report()["sites"] == []
+
+
+def test_call_site():
+    def frame(filename, name):
+        return traceback.FrameSummary(filename, 1, name)
+
+    stack = [
+        frame("/app/fastproject/modules/users/controller.py", "register_user"),
+        frame("/app/fastproject/modules/users/password_hashing.py", "make_password"),
+        frame("/venv/site-packages/argon2/low_level.py", "hash_secret"),
+    ]
+    assert loop_watchdog.call_site(stack) == (
+        "/app/fastproject/modules/users/password_hashing.py:1 in make_password"
+    )
+    assert loop_watchdog.call_site(stack[2:]).endswith("in hash_secret")
@@ -0,0 +1,52 @@
+"""Tests for module utils.otlp."""
+
+import json
+
+import pytest
+
+from fastproject.utils import otlp, tracing
+
+
+@pytest.mark.asyncio
+async def test_file_exporter(tmp_path):
+    trace = tracing.Trace("4bf92f3577b34da6a3ce929d0e0e4736", sampled=True)
+    root = tracing.Span(trace, "POST /users", kind=tracing.SERVER)
+    trace.add(root)
+    child = tracing.Span(
+        trace,
+        "aiosql insert-user",
+        root.span_id,
+        tracing.CLIENT,
+        {"db.rows": 1, "db.pool_wait_ms": 0.25, "db.system": "postgresql"},
+    )
+    trace.add(child)
+    child.set_error("UniqueViolationError")
+    child.end()
+    root.end()
+
+    exporter = otlp.FileExporter(str(tmp_path / "traces.jsonl"), max_queue=1)
+    exporter.export(trace)
+    exporter.export(trace)
+    await exporter.flush()
+    await exporter.flush()
+    assert (exporter.exported, exporter.dropped) == (1, 1)
+    (line,) = (tmp_path / "traces.jsonl").read_text().splitlines()
+    (resource_spans,) = json.loads(line)["resourceSpans"]
+    (scope_spans,) = resource_spans["scopeSpans"]
+    encoded_root, encoded_child = scope_spans["spans"]
+    assert "parentSpanId" not in encoded_root
+    assert encoded_root["kind"] == tracing.SERVER
+    assert encoded_child["parentSpanId"] == root.span_id
+    assert encoded_child["traceId"] == trace.trace_id
+    assert int(encoded_child["endTimeUnixNano"]) >= int(
+        encoded_child["startTimeUnixNano"]
+    )
+    assert encoded_child["attributes"] == [
+        {"key": "db.rows", "value": {"intValue": "1"}},
+        {"key": "db.pool_wait_ms", "value": {"doubleValue": 0.25}},
+        {"key": "db.system", "value": {"stringValue": "postgresql"}},
+    ]
+    assert encoded_child["status"] == {
+        "code": tracing.STATUS_ERROR,
+        "message": "UniqueViolationError",
+    }
@@ -0,0 +1,54 @@
+"""Tests for module utils.profiling."""
+
+import pstats
+import time
+
+from fastproject.utils import profiling
+
+
+def _busy_function():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_deterministic_profiler(tmp_path):
+    profiler = profiling.DeterministicProfiler()
+    profiler.start()
+    _busy_function()
+    profiler.stop()
+    path = tmp_path / "profile.pstats"
+    profiler.dump(path)
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_busy_function" in functions
+
+
+def test_sampling_profiler():
+    profiler = profiling.SamplingProfiler(interval=0.001)
+    profiler.start()
+    _busy_function()
+    profiler.stop()
+    assert profiler.samples > 0
+    lines = profiler.collapsed().splitlines()
+    stack, _ = lines[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("_busy_function (")
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == profiler.samples
+
+
+def test_profile_store(tmp_path):
+    store = profiling.ProfileStore(tmp_path / "profiles", max_profiles=2)
+    assert store.profiles() == []
+    profile_ids = []
+    for _ in range(3):
+        profile_id = store.new_profile_id()
+        profiler = profiling.SamplingProfiler()
+        profiler.sample()
+        store.save(profile_id, profiler)
+        profile_ids.append(profile_id)
+    profiles = store.profiles()
+    # The oldest profile was deleted, the newest is first.
+    assert [profile["profile_id"] for profile in profiles] == profile_ids[:0:-1]
+    assert profiles[0]["format"] == "collapsed"
+    assert store.path(profile_ids[0]) is None
+    assert store.path(profile_ids[2]).suffix == ".collapsed"
+    assert store.path("../../etc/passwd") is None
@@ -0,0 +1,18 @@
+"""Tests for module utils.saturation."""
+
+from fastproject.utils import saturation
+
+
+def test_wait_monitor():
+    now = [0.0]
+    monitor = saturation.WaitMonitor(window=1.0, maxlen=3, timer=lambda: now[0])
+    assert monitor.value() == 0.0
+    monitor.record(0.1)
+    monitor.record(0.3)
+    assert abs(monitor.value() - 0.2) < 1e-9
+    monitor.record(0.5)
+    monitor.record(0.7)
+    # Only the last maxlen waits are kept.
+    assert abs(monitor.value() - 0.5) < 1e-9
+    now[0] = 1.5
+    assert monitor.value() == 0.0
@@ -0,0 +1,28 @@
+"""Tests for module utils.tasks."""
+
+import asyncio
+
+import pytest
+
+from fastproject.utils import tasks
+
+
+@pytest.mark.asyncio
+async def test_periodic_task():
+    calls = []
+
+    async def func():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("A failure must not stop the task.")
+
+    task = tasks.PeriodicTask(func, 0.01)
+    task.start()
+    assert task.running
+    await asyncio.sleep(0.1)
+    await task.stop()
+    assert not task.running
+    assert len(calls) >= 2
+    called = len(calls)
+    await task.stop(run_last=True)
+    assert len(calls) == called + 1
@@ -0,0 +1,59 @@
+"""Tests for module utils.timing."""
+
+import asyncio
+
+import fastapi
+import httpx
+import pytest
+
+from fastproject.utils import timing
+
+
+def test_span():
+    with timing.span("outside"):
+        pass
+    with timing.use_timings() as timings:
+        for _ in range(3):
+            with timing.span("sql"):
+                pass
+        with pytest.raises(ValueError):
+            with timing.span("hash"):
+                raise ValueError()
+        timing.record("sql", 1.0)
+    assert timing.current_timings.get() is None
+    assert list(timings.durations) == ["sql", "hash"]
+    assert timings.counts == {"sql": 4, "hash": 1}
+    assert 1.0 < timings.durations["sql"] < 1.1
+    header = timings.server_timing(total=2.0)
+    assert header.startswith("sql;dur=1")
+    assert header.endswith(", total;dur=2000.000")
+
+
+@pytest.mark.asyncio
+async def test_timed_route():
+    app = fastapi.FastAPI()
+    router = fastapi.APIRouter(route_class=timing.TimedRoute)
+    recorded = []
+
+    @router.post("/items")
+    async def create_item(item: dict):
+        await asyncio.sleep(0.01)
+        recorded.append(timing.current_timings.get())
+        return item
+
+    app.include_router(router)
+
+    @app.middleware("http")
+    async def use_timings(request, call_next):
+        with timing.use_timings():
+            return await call_next(request)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post("/items", json={"name": "a"})
+    assert response.json() == {"name": "a"}
+    (timings,) = recorded
+    assert timings.counts == {"validate": 1, "endpoint": 1}
+    assert timings.durations["endpoint"] >= 0.01
+    assert timings.durations["validate"] < 0.01
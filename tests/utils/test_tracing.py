@@ -0,0 +1,77 @@
+"""Tests for module utils.tracing."""
+
+import pytest
+
+from fastproject.utils import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+def test_parse_traceparent():
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-01") == (
+        TRACE_ID,
+        SPAN_ID,
+        True,
+    )
+    assert tracing.parse_traceparent(f"00-{TRACE_ID.upper()}-{SPAN_ID}-00") == (
+        TRACE_ID,
+        SPAN_ID,
+        False,
+    )
+    # Future versions may append fields.
+    assert tracing.parse_traceparent(f"01-{TRACE_ID}-{SPAN_ID}-01-extra")
+    for invalid in (
+        None,
+        "",
+        f"00-{TRACE_ID}-{SPAN_ID}-01-extra",
+        f"ff-{TRACE_ID}-{SPAN_ID}-01",
+        f"00-{'0' * 32}-{SPAN_ID}-01",
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+        f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+    ):
+        assert tracing.parse_traceparent(invalid) is None
+
+
+@pytest.mark.asyncio
+async def test_spans():
+    @tracing.traced
+    async def get_user(user_id):
+        with tracing.start_span("query", tracing.CLIENT, {"db.rows": 1}):
+            tracing.set_attribute("db.pool_wait_ms", 0.5)
+        return user_id
+
+    # Outside of a trace nothing is recorded.
+    with tracing.start_span("orphan") as span:
+        assert span is None
+    assert await get_user(1) == 1
+
+    trace = tracing.Trace(TRACE_ID, sampled=False, max_spans=4)
+    root = tracing.Span(trace, "GET /users/{user_id}", kind=tracing.SERVER)
+    trace.add(root)
+    token = tracing.current_span.set(root)
+    try:
+        assert await get_user(2) == 2
+        with pytest.raises(ValueError):
+            with tracing.start_span("failing"):
+                raise ValueError("invalid")
+        # The trace is full.
+        with tracing.start_span("dropped") as span:
+            assert span is None
+    finally:
+        tracing.current_span.reset(token)
+    root.end()
+    assert [span.name for span in trace.spans] == [
+        "GET /users/{user_id}",
+        tracing.span_name(get_user),
+        "query",
+        "failing",
+    ]
+    _, traced, query, failing = trace.spans
+    assert traced.parent_span_id == root.span_id
+    assert query.parent_span_id == traced.span_id
+    assert query.attributes == {"db.rows": 1, "db.pool_wait_ms": 0.5}
+    assert failing.status_code == tracing.STATUS_ERROR
+    assert failing.status_message == "ValueError: invalid"
+    assert trace.dropped_spans == 1
+    assert all(span.end_time >= span.start_time for span in trace.spans)
@@ -0,0 +1,40 @@
+"""Tests for module utils.uuids."""
+
+import threading
+import time
+
+from fastproject.utils import uuids
+
+
+def test_uuid7():
+    before = time.time_ns() // 1_000_000
+    generated = [uuids.uuid7() for _ in range(10_000)]
+    after = time.time_ns() // 1_000_000
+    assert all(value.version == 7 for value in generated)
+    assert all(value.variant == "specified in RFC 4122" for value in generated)
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert before <= uuids.uuid7_timestamp(generated[0])
+    # The timestamp may run ahead of the clock if the counter overflowed.
+    assert uuids.uuid7_timestamp(generated[-1]) <= after + len(generated) // 2048
+
+
+def test_uuid7_same_millisecond():
+    generated = [uuids.uuid7(timestamp_ms=1) for _ in range(5000)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert uuids.uuid7_timestamp(generated[-1]) > uuids.uuid7_timestamp(generated[0])
+
+
+def test_uuid7_threads():
+    generated = []
+
+    def generate():
+        generated.extend(uuids.uuid7() for _ in range(2000))
+
+    threads = [threading.Thread(target=generate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(generated)) == len(generated)